@@ -13,7 +13,7 @@ from flagscale.runner.auto_tuner.prune.history import (
     prune_by_sequence_parallel as original_prune_by_sp,
 )
 from flagscale.runner.auto_tuner.prune.pruner import Pruner
-from flagscale.runner.auto_tuner.utils import beside, compare_by_recompute
+from flagscale.runner.auto_tuner.utils import beside, compare_by_recompute, select
 
 
 class HeteroPruner(Pruner):
@@ -199,26 +199,22 @@ class HeteroPruner(Pruner):
     ) -> bool:
         """Checks if an identical hardware assignment + MBS failed OOM in history."""
         current_meshes = strategy.get("hetero_process_meshes")
-        current_mbs = strategy.get("micro_batch_size")
 
         if not current_meshes:
             return False
 
-        for item in history:
+        # Items with identical hardware and batch configuration
+        retrieval = select(["hetero_process_meshes", "micro_batch_size"], strategy, history)
+        for item in retrieval:
             # Only look at failed items
             if item.get("max_mem_per_device") == "OOM" or item.get("max_mem") == "OOM":
-                # Check for identical hardware and batch configuration
-                if (
-                    item.get("hetero_process_meshes") == current_meshes
-                    and item.get("micro_batch_size") == current_mbs
-                ):
-                    # Check if the failed item had less or equal recompute usage.
-                    # If a strategy with MORE recompute OOM'd, the current one (with less) will definitely OOM.
-                    if compare_by_recompute(strategy, item):
-                        strategy["prune_reason"] = (
-                            f"History task {item.get('idx')} OOM'd with same meshes/mbs."
-                        )
-                        return True
+                # Check if the failed item had less or equal recompute usage.
+                # If a strategy with MORE recompute OOM'd, the current one (with less) will definitely OOM.
+                if compare_by_recompute(strategy, item):
+                    strategy["prune_reason"] = (
+                        f"History task {item.get('idx')} OOM'd with same meshes/mbs."
+                    )
+                    return True
         return False
 
     def _corrected_prune_by_sequence_parallel(self, config, strategy, history=[]):
@@ -73,8 +73,8 @@ class HeteroRecorder(Recorder):
 
         # Gather Metrics
         max_mem = self.grep_max_memory(host_path)
-        performance = self.grep_performance(performance_path, self.metric)
-        errors = self.grep_error(host_path)
+        performance = self.grep_performance(performance_path, self.metric, final=True)
+        errors = self.grep_error(host_path, final=True)
 
         # Update Strategy
         strategy["max_mem_per_device"] = max_mem
@@ -100,6 +100,7 @@ class HeteroRecorder(Recorder):
         platform_cfg = self.config.experiment.auto_tuner.get("platform", {})
         if platform_cfg.get("airs_switch", False) and strategy.get("performance"):
             self.pass_back_to_platform(strategy)
+        self.release(task)
 
     def grep_max_memory(self, path, pattern=None) -> dict[str, Any]:
         """
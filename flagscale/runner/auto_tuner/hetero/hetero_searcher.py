@@ -1,6 +1,10 @@
+import bisect
 import copy
+import functools
+import heapq
 import itertools
 import logging
+import math
 import time
 
 from omegaconf import DictConfig, ListConfig, OmegaConf
@@ -34,32 +38,162 @@ def calculate_hetero_memory(strategy, config):
     return total_memory_list_or_inf
 
 
-def _generate_all_partitions_with_max_diff(n, k, max_diff):
+def _generate_layer_splits_best_first(
+    total_layers, pp_sizes, stage_speeds, inter_diff, intra_diff, max_layers_per_stage=None
+):
     """
-    Generates all integer partitions of n into k parts with max difference constraint.
+    Lazily yields the layer splits over all pipeline stages, fastest predicted first.
+
+    The predicted step time of a split is its slowest stage, layers / speed. Stages are
+    assigned one after another in a branch-and-bound search: a partial split is expanded
+    only within the constraints (every stage of mesh i holds 1..max_layers_per_stage[i]
+    layers, the stages of a mesh differ by at most intra_diff layers and the layer totals
+    of the meshes by at most inter_diff), and partial splits are explored in the order of a
+    lower bound of their step time, so the first yielded splits are the best ones and the
+    enumeration can stop after as many as needed.
+
+    A partial split is only kept when it can still be completed: for every window of
+    inter_diff layers that holds the totals of the finished meshes, the layers left must fit
+    between the smallest and the largest totals that the other meshes can reach in it. Without
+    this, a fast mesh fills up with partial splits that all fail the inter-mesh limit later.
+    The least total each mesh left must take in such a window also tightens the lower bound,
+    so that tied partial splits are not all expanded before a slow mesh is reached.
+
+    Args:
+        total_layers (int): Layers of the model.
+        pp_sizes (list): Pipeline stages of each mesh.
+        stage_speeds (list): Predicted layers per unit time of one stage of each mesh.
+        inter_diff (int): Max difference of the layer totals of two meshes.
+        intra_diff (int): Max difference of the layers of two stages of one mesh.
+        max_layers_per_stage (list, optional): Max layers of one stage of each mesh.
     """
-    if k == 0:
-        if n == 0:
-            yield []
+    mesh_of = [mesh for mesh, pp in enumerate(pp_sizes) for _ in range(pp)]
+    num_stages = len(mesh_of)
+    if num_stages == 0 or total_layers < num_stages:
         return
-    if k == 1:
-        if n > 0:
-            yield [n]
-        return
-
-    # Optimized bounds
-    start = (n + k - 1) // k
-    end = n - (k - 1) + 1
-
-    for i in range(start, end):
-        if n - i < (k - 1):
-            continue
-        for rest in _generate_all_partitions_with_max_diff(n - i, k - 1, max_diff):
-            if i < rest[0]:
+    speeds = [stage_speeds[mesh] for mesh in mesh_of]
+    caps = [
+        min(
+            total_layers - num_stages + 1,
+            (max_layers_per_stage or [None] * len(pp_sizes))[mesh] or total_layers,
+        )
+        for mesh in mesh_of
+    ]
+    # Speed and capacity of the stages from i on, to bound the rest of a partial split
+    suffix_speed = [sum(speeds[i:]) for i in range(num_stages + 1)]
+    suffix_cap = [sum(caps[i:]) for i in range(num_stages + 1)]
+    mesh_start = [mesh_of.index(mesh) for mesh in range(len(pp_sizes))]
+    mesh_caps = [caps[start] for start in mesh_start]
+
+    @functools.cache
+    def reachable_totals(mesh, placed_count, placed_sum, placed_min, placed_max):
+        """Sorted layer totals that a mesh can reach from the stages placed so far."""
+        cap, rest = mesh_caps[mesh], pp_sizes[mesh] - placed_count
+        # The layers of all stages of the mesh lie in some [a, a + intra_diff]
+        lows = range(1, cap + 1)
+        if placed_count:
+            lows = range(max(1, placed_max - intra_diff), placed_min + 1)
+        totals = set()
+        for a in lows:
+            totals.update(
+                range(placed_sum + rest * a, placed_sum + rest * min(a + intra_diff, cap) + 1)
+            )
+        return sorted(totals)
+
+    @functools.cache
+    def completion_bound(stage, done_min, done_max, done_sum, placed):
+        """
+        Lower bound of the step time of the meshes left to fill after `stage` stages, or
+        infinity when the partial split cannot be completed, see the docstring.
+        """
+        options = []
+        for mesh in range(len(pp_sizes)):
+            start = mesh_start[mesh]
+            if start + pp_sizes[mesh] <= stage:
                 continue
-            if i - rest[-1] > max_diff:
+            if start < stage:
+                options.append((mesh, placed[0], placed[1], reachable_totals(mesh, *placed)))
+            else:
+                options.append((mesh, 0, 0, reachable_totals(mesh, 0, 0, 0, 0)))
+        if not options:
+            if done_sum == total_layers and done_max - done_min <= inter_diff:
+                return 0.0
+            return math.inf
+        lowest = max(min(done_max, total_layers), max(option[3][0] for option in options))
+        highest = min(done_min, min(option[3][-1] for option in options))
+        best = math.inf
+        for window_low in range(max(1, lowest - inter_diff), highest + 1):
+            window_high = window_low + inter_diff
+            if window_low > done_min or window_high < done_max:
                 continue
-            yield [i, *rest]
+            ranges = []
+            for _, _, _, totals in options:
+                first = bisect.bisect_left(totals, window_low)
+                last = bisect.bisect_right(totals, window_high) - 1
+                if first > last:
+                    break
+                ranges.append((first, last))
+            else:
+                low_sum = done_sum + sum(options[i][3][r[0]] for i, r in enumerate(ranges))
+                high_sum = done_sum + sum(options[i][3][r[1]] for i, r in enumerate(ranges))
+                if not low_sum <= total_layers <= high_sum:
+                    continue
+                # Each mesh takes at least what the others cannot, its slowest stage at least
+                # the average of its stages left
+                window_time = 0.0
+                for (mesh, count, placed_sum, totals), (first, last) in zip(options, ranges):
+                    least = max(totals[first], total_layers - (high_sum - totals[last]))
+                    least = totals[bisect.bisect_left(totals, least)]
+                    rest = pp_sizes[mesh] - count
+                    stage_layers = -(-(least - placed_sum) // rest)
+                    window_time = max(window_time, stage_layers / stage_speeds[mesh])
+                best = min(best, window_time)
+        return best
+
+    def bound_of_completion(split):
+        stage = len(split)
+        done = [
+            sum(split[start : start + pp])
+            for start, pp in zip(mesh_start, pp_sizes)
+            if start + pp <= stage
+        ]
+        placed = (0, 0, 0, 0)
+        if stage < num_stages and mesh_start[mesh_of[stage]] < stage:
+            mesh_layers = split[mesh_start[mesh_of[stage]] :]
+            placed = (len(mesh_layers), sum(mesh_layers), min(mesh_layers), max(mesh_layers))
+        if not done:
+            return completion_bound(stage, total_layers, 0, 0, placed)
+        return completion_bound(stage, min(done), max(done), sum(done), placed)
+
+    # (lower bound of the step time, -stages, tie breaker, split, step time of the split so
+    # far), deeper partial splits first among equal bounds to keep the heap small
+    heap = [(total_layers / suffix_speed[0], 0, 0, (), 0.0)]
+    counter = itertools.count(1)
+    while heap:
+        _, _, _, split, time_so_far = heapq.heappop(heap)
+        stage = len(split)
+        if stage == num_stages:
+            yield list(split)
+            continue
+        remaining = total_layers - sum(split)
+        mesh = mesh_of[stage]
+        low = max(1, remaining - suffix_cap[stage + 1])
+        high = min(caps[stage], remaining - (num_stages - stage - 1))
+        mesh_layers = split[mesh_start[mesh] :]
+        if mesh_layers:
+            low = max(low, max(mesh_layers) - intra_diff)
+            high = min(high, min(mesh_layers) + intra_diff)
+        for layers in range(low, high + 1):
+            child = (*split, layers)
+            completion = bound_of_completion(child)
+            if completion == math.inf:
+                continue
+            child_time = max(time_so_far, layers / speeds[stage])
+            rest = remaining - layers
+            child_bound = max(child_time, completion)
+            if stage + 1 < num_stages:
+                child_bound = max(child_bound, rest / suffix_speed[stage + 1])
+            heapq.heappush(heap, (child_bound, -len(child), next(counter), child, child_time))
 
 
 class HeteroSearcher:
@@ -106,6 +240,8 @@ class HeteroSearcher:
 
         # Build search algorithm
         self.algo = self.build_algo(self.strategies, self.config)
+        # Trial journal of the strategies tuned by this or previous sessions
+        self.journal = None
 
     def _sort(self, key, dim, priority=None):
         if priority is not None:
@@ -159,6 +295,16 @@ class HeteroSearcher:
         space["intra_mesh_max_diff"] = safe_to_container(
             hetero_space.get("hetero_intra_mesh_max_layer_diff", "auto")
         )
+        # Max layers of one stage, an int or per device type, e.g. known from OOM trials
+        space["max_layers_per_stage"] = safe_to_container(
+            hetero_space.get("hetero_max_layers_per_stage", None)
+        )
+        # Relative throughput of each device type, predicts the step time of a layer split
+        space["device_throughput"] = (
+            safe_to_container(hetero_space.get("hetero_device_throughput", None)) or {}
+        )
+        # Number of best predicted layer splits kept per hardware assignment
+        space["layer_split_limit"] = hetero_space.get("hetero_layer_split_limit", 100)
 
         # 3. Training Params
 
@@ -218,7 +364,14 @@ class HeteroSearcher:
             raise NotImplementedError("Currently only grid search is supported.")
 
     def search(self):
-        return self.algo.search()
+        strategy = self.algo.search()
+        while strategy and self.journal is not None and self.journal.is_done(strategy):
+            strategy = self.algo.search()
+        return strategy
+
+    def restore(self, journal):
+        """Resume from a trial journal: the strategies it knows as done are not searched."""
+        self.journal = journal
 
     def has_done(self):
         return self.algo.has_done()
@@ -451,9 +604,8 @@ class HeteroSearcher:
         unique_result = set()
         total_layers = config.train.model.num_layers
 
-        # Inter-Mesh: Full Permutations (Find optimal load balance between A800/MLU)
-        # Intra-Mesh: Top-5 Permutations (Find optimal memory balance inside a Mesh, e.g., avoid heavy Stage 0)
-
+        # Splits are searched over all meshes at once, in the order of the step time predicted
+        # from the device throughputs, and only the best ones are kept per assignment
         for strategy in assignment_part:
             pp_sizes = [mesh[4] for mesh in strategy["hetero_process_meshes"]]
             global_pp_size = sum(pp_sizes)
@@ -473,51 +625,24 @@ class HeteroSearcher:
                     else total_layers
                 )
 
-                # 2. Generate Inter-Mesh Partitions
-                inter_parts = _generate_all_partitions_with_max_diff(
-                    total_layers, len(pp_sizes), inter_diff
+                # 2. Predicted speed of one stage of each mesh: the throughput of its device
+                # type times the devices of the stage
+                stage_speeds = []
+                max_layers = []
+                for mesh, device_type in zip(
+                    strategy["hetero_process_meshes"], strategy["hetero_device_types"]
+                ):
+                    tp, cp, ep, dp, _ = mesh
+                    throughput = space["device_throughput"].get(device_type, 1.0)
+                    stage_speeds.append(throughput * tp * cp * ep * dp)
+                    caps = space["max_layers_per_stage"]
+                    max_layers.append(caps.get(device_type) if isinstance(caps, dict) else caps)
+
+                # 3. Enumerate the splits best first within the balance and memory bounds
+                splits = _generate_layer_splits_best_first(
+                    total_layers, pp_sizes, stage_speeds, inter_diff, intra_diff, max_layers
                 )
-
-                for part in inter_parts:
-                    # Permute Mesh-to-Mesh assignments
-                    for dist in set(itertools.permutations(part)):
-                        possible_splits_per_mesh = []
-                        is_distribution_possible = True
-
-                        # 3. Generate Intra-Mesh Splits
-                        for i, layers_for_this_mesh in enumerate(dist):
-                            local_pp = pp_sizes[i]
-                            if layers_for_this_mesh < local_pp:
-                                is_distribution_possible = False
-                                break
-
-                            # Generate partitions (e.g. 18 -> [5, 5, 4, 4])
-                            mesh_i_partitions = _generate_all_partitions_with_max_diff(
-                                layers_for_this_mesh, local_pp, intra_diff
-                            )
-
-                            # [Restored Optimization: Top 5 Permutations]
-                            # We need permutations to test if [4,4,5,5] is better than [5,5,4,4] for Stage 0 memory.
-                            # Limiting to 5 prevents explosion while keeping diversity.
-                            mesh_i_candidates = []
-                            for p in mesh_i_partitions:
-                                perms = list(set(itertools.permutations(p)))
-                                mesh_i_candidates.extend(perms[:5])  # Keep top 5 variations
-
-                            if not mesh_i_candidates:
-                                is_distribution_possible = False
-                                break
-                            possible_splits_per_mesh.append(mesh_i_candidates)
-
-                        # 4. Combine
-                        if is_distribution_possible:
-                            for combined_splits_tuple in itertools.product(
-                                *possible_splits_per_mesh
-                            ):
-                                final_split = []
-                                for single_mesh_split in combined_splits_tuple:
-                                    final_split.extend(single_mesh_split)
-                                valid_splits.append(final_split)
+                valid_splits = list(itertools.islice(splits, space["layer_split_limit"]))
 
             elif isinstance(split_config, (list, tuple)):
                 if len(split_config) > 0 and isinstance(split_config[0], (list, tuple)):
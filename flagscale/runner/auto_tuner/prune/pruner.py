@@ -32,3 +32,8 @@ class Pruner:
         if not_run:
             self.pruned_count += 1
         return not_run
+
+    def restore(self, journal):
+        """Resume the prune counters from a trial journal."""
+        self.pruned_count = journal.count("pruned")
+        self.pruned_by_memory_model = journal.count("pruned", by_memory_model=True)
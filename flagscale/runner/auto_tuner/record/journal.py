@@ -0,0 +1,200 @@
+import collections
+import fcntl
+import json
+import os
+import socket
+import time
+import uuid
+
+# Fields added to a strategy while it is tuned, they are not part of its identity
+_NON_DIM_FIELDS = {
+    "idx",
+    "performance",
+    "max_mem",
+    "max_mem_per_device",
+    "error",
+    "pruned",
+    "prune_reason",
+    "running",
+    "stopped_by_tuner",
+    "early_stopped",
+    "elapsed_time",
+    "start_time",
+    "memory_model",
+    "gpu_utilization",
+    "hetero_memory_model",
+    "hetero_memory_model_calibrated",
+}
+
+# Events that end the life of a strategy
+_FINAL_EVENTS = ("pruned", "finished")
+
+
+def strategy_key(strategy):
+    """Canonical identity of a strategy: its search dims as sorted JSON."""
+    dims = {k: v for k, v in strategy.items() if k not in _NON_DIM_FIELDS}
+    return json.dumps(dims, sort_keys=True, default=str)
+
+
+class TrialJournal:
+    """
+    Append-only JSONL journal of the trials of an auto-tuner, the state to resume from.
+
+    Every line is one state transition of a strategy, identified by its canonical key:
+        claimed:  reserved by a tuner session, which prunes or runs it next
+        pruned:   not run, with the prune reason
+        running:  launched as task ``idx``
+        finished: recorded, with the metrics
+    Each record carries a snapshot of the strategy. Lines are appended under an exclusive
+    lock of the file and fsynced, so tuner processes can share one journal, and a crash
+    loses at most the line being written, which replay ignores. The strategies claimed or
+    running in a session whose process died are interrupted and tuned again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.session = uuid.uuid4().hex
+        self.host = socket.gethostname()
+        # key -> last record, in the order the keys first appeared
+        self.states = collections.OrderedDict()
+        self._offset = 0
+        self._max_idx = 0
+        self._keys = {}
+        self.refresh()
+
+    def key(self, strategy):
+        # Cached by identity: tuning adds fields, and the key must not change with them
+        key = self._keys.get(id(strategy))
+        if key is None:
+            key = self._keys[id(strategy)] = (strategy_key(strategy), strategy)
+        return key[0]
+
+    def refresh(self):
+        """Replay the records appended since the last call, also by other processes."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # A line without newline is still being written, or was cut by a crash
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self.states[record["key"]] = record
+            self._max_idx = max(self._max_idx, record.get("idx") or 0)
+
+    def _alive(self, record):
+        if record["session"] == self.session:
+            return True
+        if record["host"] != self.host:
+            # Sessions on other hosts can not be checked, their claims are honored
+            return True
+        try:
+            os.kill(record["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _write(self, f, event, strategy, **fields):
+        record = {
+            "key": self.key(strategy),
+            "event": event,
+            "time": time.time(),
+            "session": self.session,
+            "host": self.host,
+            "pid": os.getpid(),
+            **fields,
+            "strategy": strategy,
+        }
+        f.write((json.dumps(record, default=str) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+        self.refresh()
+        return record
+
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        f = open(self.path, "a+b")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        # Writers hold the lock until their line is complete, so a last line without newline
+        # was cut by a crash: end it, replay skips it as invalid JSON
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        return f
+
+    def append(self, event, strategy, **fields):
+        """Record a state transition of a strategy."""
+        with self._locked() as f:
+            return self._write(f, event, strategy, **fields)
+
+    def is_done(self, strategy):
+        """Whether the strategy is pruned, finished, or taken by another live session."""
+        self.refresh()
+        record = self.states.get(self.key(strategy))
+        if record is None:
+            return False
+        if record["event"] in _FINAL_EVENTS:
+            return True
+        return record["session"] != self.session and self._alive(record)
+
+    def claim(self, strategy):
+        """Reserve a strategy for this session, False if it is already done or taken."""
+        with self._locked() as f:
+            self.refresh()
+            record = self.states.get(self.key(strategy))
+            if record is not None and (
+                record["event"] in _FINAL_EVENTS
+                or (record["session"] != self.session and self._alive(record))
+            ):
+                return False
+            self._write(f, "claimed", strategy)
+        return True
+
+    def start(self, strategy, after=0):
+        """
+        Record that a claimed strategy runs, and return its task idx: the next one after all
+        tasks of the journal and after ``after``, e.g. tasks of a session without journal.
+        """
+        with self._locked() as f:
+            self.refresh()
+            idx = max(self.max_idx(), after) + 1
+            strategy["idx"] = idx
+            self._write(f, "running", strategy, idx=idx)
+        return idx
+
+    def max_idx(self):
+        """The largest task idx of all sessions, 0 if no task ran yet."""
+        return self._max_idx
+
+    def history(self):
+        """Snapshots of the pruned and finished strategies, in the order they were tuned."""
+        self.refresh()
+        records = [r for r in self.states.values() if r["event"] in _FINAL_EVENTS]
+        return [dict(r["strategy"]) for r in sorted(records, key=lambda r: r["time"])]
+
+    def interrupted(self):
+        """Records of strategies claimed or running in sessions that died."""
+        self.refresh()
+        return [
+            r
+            for r in self.states.values()
+            if r["event"] not in _FINAL_EVENTS and r["session"] != self.session
+            if not self._alive(r)
+        ]
+
+    def count(self, event, **fields):
+        """Number of strategies whose last event matches."""
+        self.refresh()
+        return sum(
+            1
+            for r in self.states.values()
+            if r["event"] == event and all(r.get(k) == v for k, v in fields.items())
+        )
@@ -7,6 +7,22 @@ import subprocess
 import numpy as np
 import pandas as pd
 
+# Megatron training log fields of one iteration
+_ITERATION_PATTERN = re.compile(r"\biteration\s+(\d+)\s*/\s*\d+")
+_TFLOPS_PATTERN = re.compile(r"TFLOP/s/GPU\)?:\s*(\d+(?:\.\d*)?)")
+_LOSS_PATTERN = re.compile(r"lm loss:\s*([-+\d.eE]+)")
+_MEMORY_PATTERN = re.compile(r"\(after (\d+) iterations\) memory.*max reserved:\s*(\d+(?:\.\d*)?)")
+
+
+class _LogTail:
+    """Read position in a log file and the state folded from the lines read so far."""
+
+    def __init__(self, state, inode):
+        self.state = state
+        self.inode = inode
+        self.offset = 0
+        self.partial = b""
+
 
 class Recorder:
     def __init__(self, config):
@@ -34,13 +50,111 @@ class Recorder:
 
         self.logger = logging.getLogger("FlagScale-AutoTuner")
         self.cur_strategy = None
+        # (log path, consumer) -> _LogTail, so that logs are parsed incrementally
+        self._tails = {}
+
+    def _follow(self, path, consumer, init, fold, final=False):
+        """
+        Fold the lines appended to a log since the last call of the same consumer.
+
+        Args:
+            path (str): The log file.
+            consumer (tuple): Identifies the state, e.g. the kind of metric and its pattern.
+            init (callable): Creates the initial state.
+            fold (callable): ``fold(state, line)`` updates the state with a decoded line.
+            final (bool): The log is complete, also fold a last line without newline.
+
+        Returns:
+            The state, rebuilt from the start when the log was replaced or truncated.
+        """
+        stat = os.stat(path)
+        tail = self._tails.get((path, consumer))
+        if tail is None or tail.inode != stat.st_ino or stat.st_size < tail.offset:
+            tail = self._tails[(path, consumer)] = _LogTail(init(), stat.st_ino)
+        if stat.st_size > tail.offset:
+            with open(path, "rb") as f:
+                f.seek(tail.offset)
+                data = f.read(stat.st_size - tail.offset)
+            tail.offset += len(data)
+            data = tail.partial + data
+            end = data.rfind(b"\n") + 1
+            tail.partial = data[end:]
+            for raw in data[:end].split(b"\n")[:-1]:
+                try:
+                    line = (raw + b"\n").decode("utf-8")
+                except UnicodeDecodeError:
+                    continue
+                fold(tail.state, line)
+        if final and tail.partial:
+            try:
+                fold(tail.state, tail.partial.decode("utf-8"))
+            except UnicodeDecodeError:
+                pass
+            tail.partial = b""
+        return tail.state
+
+    def release(self, task):
+        """Forget the parse state of the logs of a task, once it is recorded."""
+        logs = os.path.join(task.experiment.exp_dir, "logs")
+        for key in [key for key in self._tails if key[0].startswith(logs + os.sep)]:
+            del self._tails[key]
+
+    def metrics_table(self, task):
+        """
+        Per-iteration metrics of a task, parsed from the bytes appended to its logs since the
+        last call, so it is cheap to poll while the task runs.
+
+        Returns:
+            list: One dict per logged iteration with keys iteration, performance (the value
+            of the performance metric), tflops, loss and max_memory (None if not logged).
+        """
+        try:
+            performance_paths, _ = self.get_all_performance_and_host_paths(task)
+        except (OSError, ValueError):
+            return []
+        metric_pattern = re.compile(
+            self.metric + r":* *(\d+(\.\d*)?)|(\d+(\.\d*)?) *" + self.metric
+        )
+
+        def fold(rows, line):
+            memory = _MEMORY_PATTERN.search(line)
+            if memory:
+                iteration, value = int(memory.group(1)), float(memory.group(2))
+                for row in reversed(rows):
+                    if row["iteration"] == iteration:
+                        row["max_memory"] = value
+                        break
+                return
+            iteration = _ITERATION_PATTERN.search(line)
+            if not iteration:
+                return
+            row = dict.fromkeys(("performance", "tflops", "loss", "max_memory"))
+            row["iteration"] = int(iteration.group(1))
+            metric = metric_pattern.search(line)
+            if metric:
+                row["performance"] = float(metric.group(1) or metric.group(3))
+            for key, pattern in (("tflops", _TFLOPS_PATTERN), ("loss", _LOSS_PATTERN)):
+                match = pattern.search(line)
+                if match:
+                    try:
+                        row[key] = float(match.group(1))
+                    except ValueError:
+                        pass
+            rows.append(row)
+
+        # As in grep_performance, the first rank log with iterations holds the metrics
+        for path in performance_paths:
+            rows = self._follow(path, ("table", self.metric), list, fold)
+            if rows:
+                return [dict(row) for row in rows]
+        return []
 
     def record(self, task, strategy):
         """Record the performance and max memory of task"""
         self.cur_strategy = strategy
         performance_path, host_path = self.get_all_performance_and_host_paths(task)
 
-        errors = self.grep_error(host_path)
+        errors = self.grep_error(host_path, final=True)
         if errors:
             # If OOM in errors, the task must fail.
             if "OOM" in errors:
@@ -50,25 +164,26 @@ class Recorder:
 
             # If task is stopped by autotuner, task may not be failed,just hang or too slow.
             elif self.cur_strategy.get("stopped_by_tuner", False):
-                performance = self.grep_performance(performance_path, self.metric)
+                performance = self.grep_performance(performance_path, self.metric, final=True)
                 strategy["performance"] = performance
-                strategy["max_mem"] = self.grep_max_memory(host_path)
+                strategy["max_mem"] = self.grep_max_memory(host_path, final=True)
                 strategy["error"] = None
 
             # Task failed and the code may have logical errors
             else:
                 # HACK: record the performance when task exits in the last allreduce of training
-                performance = self.grep_performance(performance_path, self.metric)
+                performance = self.grep_performance(performance_path, self.metric, final=True)
                 strategy["performance"] = performance
-                strategy["max_mem"] = self.grep_max_memory(host_path)
+                strategy["max_mem"] = self.grep_max_memory(host_path, final=True)
                 strategy["error"] = "|".join(list(errors))
 
         # Task ended properly
         else:
-            strategy["max_mem"] = self.grep_max_memory(host_path)
-            performance = self.grep_performance(performance_path, self.metric)
+            strategy["max_mem"] = self.grep_max_memory(host_path, final=True)
+            performance = self.grep_performance(performance_path, self.metric, final=True)
             strategy["performance"] = performance
             strategy["error"] = None
+        self.release(task)
 
         # Pass back to platform if need
         if (
@@ -141,36 +256,36 @@ class Recorder:
         except Exception as e:
             self.logger.info(f"Failed to pass back to platform: {e}")
 
-    def grep_max_memory(self, path, pattern="max reserved"):
+    def grep_max_memory(self, path, pattern="max reserved", final=False):
         """Read the log file and return the max memory."""
         if not os.path.exists(path):
             raise ValueError(f"The path do not exist: {path}")
         memory_pattern = pattern + r":* *(\d+(\.\d*)?)|(\d+(\.\d*)?) *" + pattern
+
+        def fold(state, line):
+            memory = re.findall(memory_pattern, line, re.IGNORECASE)
+            if memory:
+                value = None
+                for item in memory[0]:
+                    try:
+                        value = float(item)
+                        if state[0] is None or value > state[0]:
+                            state[0] = value
+                        break
+                    except:
+                        continue
+                assert value is not None, "Can't grep the max memory"
+
         max_memory = None
         for item in os.listdir(path):
             if not item.startswith("host_") and not item.endswith(".output"):
                 continue
             file_path = os.path.join(path, item)
-            with open(file_path, "rb") as f:
-                for _ in f:
-                    try:
-                        line = _.decode("utf-8")
-                    except UnicodeDecodeError:
-                        continue
-                    memory = re.findall(memory_pattern, line, re.IGNORECASE)
-                    if memory:
-                        value = None
-                        for item in memory[0]:
-                            try:
-                                value = float(item)
-                                if max_memory is None:
-                                    max_memory = value
-                                if value > max_memory:
-                                    max_memory = value
-                                break
-                            except:
-                                continue
-                        assert value is not None, "Can't grep the max memory"
+            (memory,) = self._follow(
+                file_path, ("max_memory", pattern), lambda: [None], fold, final
+            )
+            if memory is not None and (max_memory is None or memory > max_memory):
+                max_memory = memory
         self.logger.info(f"task_{self.cur_strategy['idx']} max_memory: {max_memory}")
         return max_memory
 
@@ -211,31 +326,27 @@ class Recorder:
                             all_log_paths.append(log_path)
         return all_log_paths, logs
 
-    def grep_performance(self, paths, pattern="elapsed time per iteration \(ms\):"):
+    def grep_performance(self, paths, pattern="elapsed time per iteration \(ms\):", final=False):
         """Read the log file and return the performance."""
         metric_pattern = pattern + r":* *(\d+(\.\d*)?)|(\d+(\.\d*)?) *" + pattern
+
+        def fold(values, line):
+            metric = re.findall(metric_pattern, line)
+            if metric:
+                for item in metric[0]:
+                    try:
+                        values.append(float(item))
+                        break
+                    except:
+                        continue
+
         if not paths:
             return None
         performance = []
         for path in paths:
             if not path or not os.path.exists(path):
                 continue
-            with open(path, "rb") as f:
-                for _ in f:
-                    try:
-                        line = _.decode("utf-8")
-                    except UnicodeDecodeError:
-                        continue
-                    metric = re.findall(metric_pattern, line)
-                    if metric:
-                        value = None
-                        for item in metric[0]:
-                            try:
-                                value = float(item)
-                                performance.append(value)
-                                break
-                            except:
-                                continue
+            performance = self._follow(path, ("performance", pattern), list, fold, final)
             if performance:
                 break
         if not performance:
@@ -249,30 +360,28 @@ class Recorder:
             self.logger.info(f"task_{self.cur_strategy['idx']} performance: {average} ms")
             return round(average, 3)
 
-    def grep_error(self, path, pattern="Error:"):
+    def grep_error(self, path, pattern="Error:", final=False):
         """Read the log file and return the error"""
         if not os.path.exists(path):
             raise ValueError(f"The path do not exist: {path}")
 
         oom = "out of memory"
+
+        def fold(errors, line):
+            error = re.findall(pattern, line, re.IGNORECASE)
+            if error:
+                if oom in line:
+                    errors.add("OOM")
+                    errors.add(line)
+                else:
+                    errors.add(line)
+
         errors_info = set()
         for item in os.listdir(path):
             if not item.startswith("host_") and not item.endswith(".output"):
                 continue
             file_path = os.path.join(path, item)
-            with open(file_path, "rb") as f:
-                for _ in f:
-                    try:
-                        line = _.decode("utf-8")
-                    except UnicodeDecodeError:
-                        continue
-                    error = re.findall(pattern, line, re.IGNORECASE)
-                    if error:
-                        if oom in line:
-                            errors_info.add("OOM")
-                            errors_info.add(line)
-                        else:
-                            errors_info.add(line)
+            errors_info |= self._follow(file_path, ("error", pattern), set, fold, final)
 
         self.logger.info(f"task_{self.cur_strategy['idx']} error: {errors_info}")
         return errors_info
@@ -344,11 +453,24 @@ class Recorder:
             pass
         return s
 
-    def read(self):
-        if not os.path.exists(self.path):
+    def restore(self, journal):
+        """
+        Resume the history from a trial journal and rewrite the csv from it.
+
+        Returns:
+            list: The pruned and finished strategies, in the order they were tuned.
+        """
+        history = journal.history()
+        if history:
+            self.save(history)
+        return history
+
+    def read(self, path=None):
+        path = path or self.path
+        if not os.path.exists(path):
             return []
         df = pd.read_csv(
-            self.path, dtype=str, keep_default_na=False, na_filter=False, escapechar="\\"
+            path, dtype=str, keep_default_na=False, na_filter=False, escapechar="\\"
         )
         for c in df.columns:
             df[c] = df[c].map(self.parse_value)
@@ -376,6 +498,7 @@ class ServeRecorder(Recorder):
             self.sorted_order = "ascend"
         self.logger = logging.getLogger("FlagScale-AutoTuner")
         self.cur_strategy = None
+        self._tails = {}
         self.path = os.path.join(config.experiment.exp_dir, "auto_tuner", "history.csv")
 
     def record(self, strategy, performance):
@@ -385,6 +508,11 @@ class ServeRecorder(Recorder):
         strategy["ttft"] = round(performance["mean_ttft_ms"], 2)
         strategy["itl"] = round(performance["mean_itl_ms"], 2)
         strategy["topt"] = round(performance["mean_tpot_ms"], 2)
+        # Only present when the profile sets goodput SLOs / sweeps request rates
+        if performance.get("request_goodput") is not None:
+            strategy["goodput"] = round(performance["request_goodput"], 2)
+        if performance.get("saturation_request_rate") is not None:
+            strategy["saturation_request_rate"] = round(performance["saturation_request_rate"], 2)
         self.cur_strategy = strategy
 
     def sort(self, history):
@@ -392,12 +520,16 @@ class ServeRecorder(Recorder):
         if self.sorted_order == "ascend":
             sorted_history = sorted(
                 history,
-                key=lambda x: (x[self.metric] if x[self.metric] is not None else float("inf")),
+                key=lambda x: (
+                    x.get(self.metric) if x.get(self.metric) is not None else float("inf")
+                ),
             )
         elif self.sorted_order == "descend":
             sorted_history = sorted(
                 history,
-                key=lambda x: (x[self.metric] if x[self.metric] is not None else float("-inf")),
+                key=lambda x: (
+                    x.get(self.metric) if x.get(self.metric) is not None else float("-inf")
+                ),
                 reverse=True,
             )
         else:
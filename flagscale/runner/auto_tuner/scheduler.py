@@ -0,0 +1,111 @@
+import collections
+import os
+
+
+def strategy_world_size(strategy):
+    """Number of devices a strategy runs on."""
+    return (
+        strategy["data_parallel_size"]
+        * strategy["tensor_model_parallel_size"]
+        * strategy["pipeline_model_parallel_size"]
+        * (strategy.get("context_parallel_size") or 1)
+    )
+
+
+class TrialScheduler:
+    """
+    Bin-pack concurrent trials onto disjoint subsets of the cluster.
+
+    A trial that fits in one node gets devices of a single node, choosing the node with the
+    fewest free devices that still fit (best fit) to keep whole nodes free for larger trials.
+    A larger trial gets whole, completely free nodes with the same number of slots.
+    """
+
+    def __init__(self, resources):
+        # host -> {"slots": int, "type": str | None}
+        self.resources = collections.OrderedDict(resources)
+        self._free = {host: list(range(info["slots"])) for host, info in self.resources.items()}
+
+    def fits(self, num_devices):
+        """Whether a trial of this size can run at all, on an otherwise idle cluster."""
+        slots = [info["slots"] for info in self.resources.values()]
+        if num_devices <= max(slots):
+            return True
+        return any(num_devices % n == 0 and num_devices // n <= slots.count(n) for n in set(slots))
+
+    def allocate(self, num_devices):
+        """
+        Reserve devices for a trial.
+        :return: ordered mapping from host to the device indices reserved on it, or None if
+            the trial does not fit right now.
+        """
+        single = [host for host, free in self._free.items() if len(free) >= num_devices]
+        if single:
+            host = min(single, key=lambda h: len(self._free[h]))
+            return self._take({host: num_devices})
+
+        idle = [h for h, free in self._free.items() if len(free) == self.resources[h]["slots"]]
+        for slots in sorted({self.resources[h]["slots"] for h in idle}, reverse=True):
+            if num_devices % slots:
+                continue
+            hosts = [h for h in idle if self.resources[h]["slots"] == slots]
+            if len(hosts) >= num_devices // slots:
+                return self._take({h: slots for h in hosts[: num_devices // slots]})
+        return None
+
+    def _take(self, counts):
+        allocation = collections.OrderedDict()
+        for host, count in counts.items():
+            allocation[host] = self._free[host][:count]
+            self._free[host] = self._free[host][count:]
+        return allocation
+
+    def release(self, allocation):
+        for host, devices in allocation.items():
+            self._free[host] = sorted(self._free[host] + list(devices))
+
+    def is_idle(self):
+        return all(len(free) == self.resources[h]["slots"] for h, free in self._free.items())
+
+
+def apply_allocation(config, allocation, resources, use_hostfile=True):
+    """
+    Restrict a trial config to its allocated hosts and devices.
+
+    A hostfile with only the allocated hosts is written into the trial's exp_dir, and the
+    visible devices are narrowed when the trial uses part of a node. Rendezvous settings
+    are dropped so that concurrent trials do not share a master address or port.
+    """
+    hosts = list(allocation)
+    nproc_per_node = len(allocation[hosts[0]])
+    runner_config = config.experiment.runner
+    for key in ("master_addr", "master_port", "rdzv_endpoint"):
+        if key in runner_config:
+            del runner_config[key]
+    runner_config.nnodes = len(hosts)
+    runner_config.nproc_per_node = nproc_per_node
+
+    if use_hostfile:
+        os.makedirs(config.experiment.exp_dir, exist_ok=True)
+        hostfile = os.path.abspath(os.path.join(config.experiment.exp_dir, "hostfile"))
+        with open(hostfile, "w") as f:
+            for host in hosts:
+                line = f"{host} slots={nproc_per_node}"
+                if resources[host].get("type"):
+                    line += f" type={resources[host]['type']}"
+                f.write(line + "\n")
+        runner_config.hostfile = hostfile
+
+    devices = allocation[hosts[0]]
+    if len(devices) == resources[hosts[0]]["slots"]:
+        return config
+    # Partial node: narrow the visible devices, keeping the user's device ids if given
+    if "envs" not in config.experiment or config.experiment.envs is None:
+        config.experiment.envs = {}
+    envs = config.experiment.envs
+    key = next((k for k in envs if str(k).endswith("_VISIBLE_DEVICES")), "CUDA_VISIBLE_DEVICES")
+    if key in envs:
+        visible = str(envs[key]).split(",")
+        devices = [visible[i] for i in devices]
+    envs[key] = ",".join(str(d) for d in devices)
+    return config
@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+from scipy.stats import norm
+
 from flagscale.runner.auto_tuner.utils import (
     sort_by_memory,
     sort_by_memory_model,
@@ -20,6 +23,12 @@ class Algo(ABC):
     def has_done(self):
         pass
 
+    def bind_history(self, history):
+        """Give the algorithm access to the recorded history, unused by default."""
+
+    def warm_start(self, history):
+        """Learn from the history of previous runs, unused by default."""
+
 
 class GridAlgo(Algo):
     def __init__(self, strategies, config):
@@ -54,3 +63,192 @@ class GridAlgo(Algo):
     def has_done(self):
         """Return True if the task space is empty."""
         return self.idx >= len(self.strategies)
+
+
+class ModelAlgo(Algo):
+    """
+    Model-based search over the candidate strategies.
+
+    A Gaussian process over the strategy dims models log performance of the runs recorded so
+    far, and a kernel classifier estimates the probability that a strategy fails (mostly OOM),
+    using the analytic memory model, if configured, as its prior. The next strategy is the
+    untried one with the highest expected improvement times probability of running. History
+    recorded by previous runs warm-starts the models.
+    """
+
+    def __init__(self, strategies, config):
+        super().__init__(strategies, config)
+        # Lazy import to avoid circular import with searcher
+        from flagscale.runner.auto_tuner.search.searcher import BUILT_IN_STRATEGY_DIMS
+
+        self.dims = BUILT_IN_STRATEGY_DIMS
+        self.idx = 0
+        self.history = []
+        self.warm_history = []
+        self._tried = set()
+
+        algo_config = self.config.experiment.auto_tuner.algo
+        self.num_initial = algo_config.get("num_initial", 3)
+        self.max_trials = algo_config.get("max_trials", None)
+        self.xi = algo_config.get("xi", 0.01)
+        performance_config = self.config.experiment.auto_tuner.get("performance", {})
+        self.maximize = performance_config.get("order", "ascend") == "descend"
+        memory_model_config = self.config.experiment.auto_tuner.get("memory_model", {})
+        self.gpu_memory = memory_model_config.get("gpu_memory", None)
+
+        self._encode = self._build_encoder(strategies)
+        self._features = np.array([self._encode(s) for s in strategies], dtype=float)
+        self._prior = np.array([self._failure_prior(s) for s in strategies], dtype=float)
+
+    def _key(self, strategy):
+        return tuple(strategy.get(dim) for dim in self.dims)
+
+    def _build_encoder(self, strategies):
+        """Numeric dims are log-scaled, the others are one-hot encoded."""
+        columns = []
+        for dim in self.dims:
+            values = {s.get(dim) for s in strategies}
+            if all(v is None or isinstance(v, (bool, int, float)) for v in values):
+                columns.append((dim, None))
+            else:
+                columns.append((dim, sorted(values, key=str)))
+
+        def encode(strategy):
+            row = []
+            for dim, categories in columns:
+                value = strategy.get(dim)
+                if categories is None:
+                    row.append(np.log2(1 + float(value or 0)))
+                else:
+                    row.extend(float(value == c) for c in categories)
+            return row
+
+        raw = np.array([encode(s) for s in strategies], dtype=float).reshape(len(strategies), -1)
+        scale = raw.std(axis=0) if len(raw) else np.ones(raw.shape[1])
+        scale[scale == 0] = 1.0
+        return lambda strategy: np.asarray(encode(strategy), dtype=float) / scale
+
+    def _failure_prior(self, strategy):
+        memory = strategy.get("memory_model")
+        if memory is None or not self.gpu_memory or isinstance(memory, list):
+            return 0.2
+        # Probability of OOM rises steeply once the modeled memory exceeds the device memory
+        margin = (memory - self.gpu_memory) / (0.05 * self.gpu_memory)
+        return float(1.0 / (1.0 + np.exp(-np.clip(margin, -50, 50))))
+
+    def bind_history(self, history):
+        """Use the tuner history, including runs restored from previous sessions."""
+        self.history = history
+        for strategy in history:
+            self._tried.add(self._key(strategy))
+
+    def warm_start(self, history):
+        """Fit the models to runs of previous experiments without marking them as tried."""
+        self.warm_history.extend(history)
+
+    def _observations(self):
+        features, objectives, failures = [], [], []
+        for strategy in self.warm_history + self.history:
+            # Concurrent trials still running have no result yet
+            if strategy.get("running", False):
+                continue
+            if strategy.get("pruned", False) and strategy.get("max_mem") != "OOM":
+                continue
+            performance = strategy.get("performance")
+            features.append(self._encode(strategy))
+            if performance:
+                objective = np.log(performance)
+                objectives.append(-objective if self.maximize else objective)
+                failures.append(0.0)
+            else:
+                objectives.append(None)
+                failures.append(1.0)
+        features = np.array(features, dtype=float).reshape(len(features), self._features.shape[1])
+        return features, objectives, np.array(failures)
+
+    def _kernel(self, a, b, lengthscale):
+        sq_dist = ((a[:, None, :] - b[None, :, :]) ** 2).sum(-1)
+        return np.exp(-0.5 * sq_dist / lengthscale**2)
+
+    def _lengthscale(self):
+        return max(1.0, np.sqrt(self._features.shape[1]) / 2)
+
+    def predict_failure(self, candidates):
+        """Probability that each candidate fails, smoothed from the observed runs."""
+        features, _, failures = self._observations()
+        prior = self._prior[candidates]
+        if not len(failures):
+            return prior
+        weights = self._kernel(self._features[candidates], features, self._lengthscale())
+        return (prior + weights @ failures) / (1.0 + weights.sum(axis=1))
+
+    def predict_objective(self, candidates, noise=1e-2):
+        """GP posterior mean and std of the objective, and the best observed objective."""
+        features, objectives, _ = self._observations()
+        mask = np.array([o is not None for o in objectives], dtype=bool)
+        if not mask.any():
+            return None
+        x = features[mask]
+        y = np.array([o for o in objectives if o is not None])
+        y_mean, y_std = y.mean(), y.std() or 1.0
+        y_norm = (y - y_mean) / y_std
+
+        lengthscale = self._lengthscale()
+        k_xx = self._kernel(x, x, lengthscale) + noise * np.eye(len(x))
+        k_cx = self._kernel(self._features[candidates], x, lengthscale)
+        chol = np.linalg.cholesky(k_xx)
+        alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, y_norm))
+        v = np.linalg.solve(chol, k_cx.T)
+        mean = k_cx @ alpha
+        var = np.clip(1.0 - (v**2).sum(axis=0), 1e-12, None)
+        return mean * y_std + y_mean, np.sqrt(var) * y_std, y.min()
+
+    def expected_improvement(self, mean, std, best):
+        improvement = best - mean - self.xi
+        z = improvement / std
+        return improvement * norm.cdf(z) + std * norm.pdf(z)
+
+    def _initial_choice(self, candidates, p_fail):
+        tried = [self._encode(s) for s in self.history]
+        tried += [f for f, s in zip(self._features, self.strategies) if self._key(s) in self._tried]
+        if not tried:
+            if "memory_model" in self.config.experiment.auto_tuner:
+                # Largest modeled memory that is still unlikely to OOM, like GridAlgo
+                safe = [c for c, p in zip(candidates, p_fail) if p < 0.5] or candidates
+                return max(safe, key=lambda c: sort_by_memory_model(self.strategies[c]))
+            return candidates[0]
+        # Spread the initial runs: farthest from what has been tried, among likely runnable
+        tried = np.array(tried, dtype=float)
+        dist = ((self._features[candidates][:, None, :] - tried[None, :, :]) ** 2).sum(-1).min(1)
+        score = dist * (p_fail < 0.5) - p_fail
+        return candidates[int(np.argmax(score))]
+
+    def search(self):
+        """Return the untried strategy with the highest expected improvement."""
+        if self.has_done():
+            return None
+        candidates = [i for i, s in enumerate(self.strategies) if self._key(s) not in self._tried]
+        p_fail = self.predict_failure(candidates)
+        prediction = self.predict_objective(candidates)
+        observed = self.warm_history + self.history
+        num_success = sum(1 for s in observed if s.get("performance"))
+        if prediction is None or num_success < self.num_initial:
+            choice = self._initial_choice(candidates, p_fail)
+        else:
+            mean, std, best = prediction
+            score = self.expected_improvement(mean, std, best) * (1.0 - p_fail)
+            choice = candidates[int(np.argmax(score))]
+
+        strategy = self.strategies[choice]
+        self._tried.add(self._key(strategy))
+        self.idx += 1
+        return strategy
+
+    def checkout(self, mode):
+        """The models already account for memory and performance."""
+
+    def has_done(self):
+        """Return True if all strategies are tried or the trial budget is used up."""
+        if self.max_trials is not None and len(self._tried) >= self.max_trials:
+            return True
+        return all(self._key(s) in self._tried for s in self.strategies)
@@ -6,8 +6,8 @@ import time
 
 from omegaconf import OmegaConf
 
-from flagscale.runner.auto_tuner.memory_model import default_model
-from flagscale.runner.auto_tuner.search.algorithm import GridAlgo
+from flagscale.runner.auto_tuner.memory_model import FactoredMemoryModel
+from flagscale.runner.auto_tuner.search.algorithm import GridAlgo, ModelAlgo
 from flagscale.runner.auto_tuner.utils import divisible
 
 BUILT_IN_STRATEGY_DIMS = [
@@ -117,8 +117,14 @@ class Searcher:
                     "The memory model {} is not implemented yet.".format(model_name)
                 )
 
-            for strategy in self.strategies:
-                strategy["memory_model"] = default_model(strategy, self.config)
+            # Evaluate the whole space at once, sharing the terms common to many strategies
+            start_time = time.time()
+            memory = FactoredMemoryModel(self.config).estimate(self.strategies)
+            self.logger.info(
+                f"Searcher: evaluate memory model of {len(self.strategies)} strategies in {time.time() - start_time:.2f} seconds."
+            )
+            for strategy, memory_model in zip(self.strategies, memory.tolist()):
+                strategy["memory_model"] = memory_model
                 strategy["gpu_utilization"] = self.config.experiment.auto_tuner.memory_model.get(
                     "gpu_utilization", [0.2, 0.8]
                 )
@@ -128,6 +134,8 @@ class Searcher:
 
         # Build search algorithm to explore strategies
         self.algo = self.build_algo(self.strategies, self.config)
+        # Trial journal of the strategies tuned by this or previous sessions
+        self.journal = None
 
     def _sort(self, key, dim, priority=None):
         """Sort the dim according to priority."""
@@ -312,8 +320,10 @@ class Searcher:
         name = self.config.experiment.auto_tuner.algo.name
         if name == "grid":
             return GridAlgo(strategies, self.config)
+        elif name == "model":
+            return ModelAlgo(strategies, self.config)
         else:
-            raise NotImplementedError("Currently only grid search is supported.")
+            raise NotImplementedError("Currently only grid and model search are supported.")
 
     def _product_parallel_dims(self, space, config):
         # Avoid space explosion after product
@@ -585,8 +595,15 @@ class Searcher:
             result.append(copied_dim)
 
     def search(self):
-        """Search once and return one strategy."""
-        return self.algo.search()
+        """Search once and return one strategy, skipping those the journal knows as done."""
+        strategy = self.algo.search()
+        while strategy and self.journal is not None and self.journal.is_done(strategy):
+            strategy = self.algo.search()
+        return strategy
+
+    def restore(self, journal):
+        """Resume from a trial journal: the strategies it knows as done are not searched."""
+        self.journal = journal
 
     def has_done(self):
         """Return True if search is finished."""
@@ -6,6 +6,9 @@ FLAGSCALE_USE_V1 = os.environ.get("FLAGSCALE_USE_V1", "1").lower() in ("1", "tru
 
 
 class AutoTunerBase(ABC):
+    # Trial journal to resume from, see TrialJournal
+    journal = None
+
     @abstractmethod
     def run(self, *args, **kwargs):
         raise NotImplementedError
@@ -19,12 +22,13 @@ class AutoTunerBase(ABC):
         # 1. Get a strategy from searcher
         # 2. Whether prune by pruner
         # 3. If not pruned, generate the task by generator
-        strategy = self.searcher.search()
-        while strategy and (self.pruner is not None and self.pruner.prune(strategy, self.history)):
-            strategy = self.searcher.search()
+        strategy = self._next_strategy()
         if strategy:
-            self.idx += 1
-            strategy["idx"] = self.idx
+            if self.journal is not None:
+                self.idx = self.journal.start(strategy, after=self.idx)
+            else:
+                self.idx += 1
+                strategy["idx"] = self.idx
             pruned_count = self.pruner.pruned_count if self.pruner is not None else 0
             pruned_by_memory_model = (
                 self.pruner.pruned_by_memory_model if self.pruner is not None else 0
@@ -43,6 +47,27 @@ class AutoTunerBase(ABC):
         else:
             self.cur_strategy = None
 
+    def _next_strategy(self):
+        """The next strategy from the searcher that is neither pruned nor taken."""
+        while True:
+            strategy = self.searcher.search()
+            if not strategy:
+                return None
+            # Another tuner sharing the journal may have taken it since it was searched
+            if self.journal is not None and not self.journal.claim(strategy):
+                continue
+            if self.pruner is None:
+                return strategy
+            pruned_by_memory_model = self.pruner.pruned_by_memory_model
+            if not self.pruner.prune(strategy, self.history):
+                return strategy
+            if self.journal is not None:
+                self.journal.append(
+                    "pruned",
+                    strategy,
+                    by_memory_model=self.pruner.pruned_by_memory_model > pruned_by_memory_model,
+                )
+
     def need_stop(self):
         """Judge whether need to stop tuning."""
         end_time = time.time()
@@ -134,7 +134,7 @@ class ServeAutoTuner(AutoTunerBase):
             best_strategy = self.get_best()
             if best_strategy:
                 self.logger.info(
-                    f"Best strategy tuned so far: {best_strategy}, and {self.recorder.metric} is {best_strategy[self.recorder.metric]}."
+                    f"Best strategy tuned so far: {best_strategy}, and {self.recorder.metric} is {best_strategy.get(self.recorder.metric)}."
                 )
             else:
                 self.logger.info("No strategy can run so far.")
@@ -242,6 +242,6 @@ class ServeAutoTuner(AutoTunerBase):
 
     def get_best(self):
         sorted_history = self.recorder.sort(self.history)
-        if sorted_history and sorted_history[0] and sorted_history[0][self.recorder.metric]:
+        if sorted_history and sorted_history[0] and sorted_history[0].get(self.recorder.metric):
             return sorted_history[0]
         return None
@@ -19,9 +19,16 @@ from flagscale.runner.auto_tuner.hetero import (
 )
 from flagscale.runner.auto_tuner.platform import set_jiuding_platform_args
 from flagscale.runner.auto_tuner.prune.pruner import Pruner
+from flagscale.runner.auto_tuner.record.journal import TrialJournal
 from flagscale.runner.auto_tuner.record.recorder import Recorder
+from flagscale.runner.auto_tuner.scheduler import (
+    TrialScheduler,
+    apply_allocation,
+    strategy_world_size,
+)
 from flagscale.runner.auto_tuner.search.searcher import Searcher
 from flagscale.runner.auto_tuner.tuner import AutoTunerBase
+from flagscale.runner.auto_tuner.utils import StrategyHistory
 from flagscale.runner.utils import JobStatus, parse_hostfile
 
 FLAGSCALE_USE_V1 = os.environ.get("FLAGSCALE_USE_V1", "1").lower() in ("1", "true")
@@ -34,6 +41,19 @@ else:
     from flagscale.runner.runner_train import SSHTrainRunner
 
 
+class _Trial:
+    """A launched task and what is needed to monitor it."""
+
+    def __init__(self, strategy, task, runner, allocation, start_time):
+        self.strategy = strategy
+        self.task = task
+        self.runner = runner
+        self.allocation = allocation
+        self.start_time = start_time
+        self.running = False
+        self.sub_process_running = False
+
+
 class TrainAutoTuner(AutoTunerBase):
     def __init__(self, config: DictConfig):
         # Set logger
@@ -89,11 +109,33 @@ class TrainAutoTuner(AutoTunerBase):
             * self.config.experiment.auto_tuner.nproc_per_node
         )
 
+        # Trials run concurrently on disjoint parts of the cluster if more than one is allowed
+        self.max_concurrent_trials = self.config.experiment.auto_tuner.control.get(
+            "max_concurrent_trials", 1
+        )
+        hostfile = config.experiment.runner.get("hostfile", None)
+        self.use_hostfile = bool(hostfile)
+        resources = parse_hostfile(hostfile) if hostfile else None
+        if resources:
+            self.resources = {
+                host: {"slots": min(info["slots"], nproc_per_node), "type": info["type"]}
+                for host, info in list(resources.items())[:nnodes]
+            }
+        else:
+            self.resources = {"localhost": {"slots": nproc_per_node, "type": None}}
+        # Search scaled-down strategies that only need part of the cluster
+        cards_per_trial = self.config.experiment.auto_tuner.control.get("cards_per_trial", None)
+        if cards_per_trial:
+            self.config.experiment.auto_tuner.cards = cards_per_trial
+
         # Build core sub modules, such as Searcher, Pruner, Generator and Recorder
         is_hetero_enabled = self.config.train.system.get("hetero", {}).get("enable_hetero", False)
 
         if is_hetero_enabled:
             self.logger.info("Initializing in Heterogeneous Mode.")
+            if self.max_concurrent_trials > 1:
+                self.logger.info("Concurrent trials are not supported in heterogeneous mode.")
+                self.max_concurrent_trials = 1
             hostfile_path = self.config.experiment.runner.get("hostfile", None)
             resources = parse_hostfile(hostfile_path)
             if not resources:
@@ -126,11 +168,27 @@ class TrainAutoTuner(AutoTunerBase):
                 pure = OmegaConf.to_container(copy.deepcopy(self.config), resolve=True)
                 json.dump(pure, f, ensure_ascii=False, indent=2)
 
-        # History strategy
-        self.history = self.recorder.read()
+        # Durable record of every strategy tuned, shareable by several tuner processes
+        self.journal = TrialJournal(os.path.join(dir_path, "journal.jsonl"))
 
-        # resume searcher idx
-        self.searcher.algo.idx = max(0, int(self.find_search_num_value(log_path)) - 1)
+        # History strategy
+        # Indexed so that history based prune rules are dict lookups
+        if self.journal.states:
+            self.history = StrategyHistory(self.recorder.restore(self.journal))
+        else:
+            self.history = StrategyHistory(self.recorder.read())
+        self.searcher.algo.bind_history(self.history)
+        # Runs of previous experiments only inform the search, they are not part of history
+        for path in self.config.experiment.auto_tuner.algo.get("warm_start", []) or []:
+            warm_history = self.recorder.read(path)
+            self.logger.info(f"Warm start search with {len(warm_history)} strategies from {path}")
+            self.searcher.algo.warm_start(warm_history)
+
+        # Resume from the journal, or from the tuner log of a session that had none
+        resume_from_log = not self.journal.states
+        self.searcher.restore(self.journal)
+        if resume_from_log:
+            self.searcher.algo.idx = max(0, int(self.find_search_num_value(log_path)) - 1)
 
         # Each task has its own runner
         self.runner = None
@@ -141,6 +199,10 @@ class TrainAutoTuner(AutoTunerBase):
             "max_time_per_task", 300
         )
 
+        # Stop a trial early once its steady iteration time is clearly worse than the best one,
+        # e.g. {"min_iterations": 5, "threshold": 1.2, "max_variation": 0.1}. Disabled if None.
+        self.early_stop = self.config.experiment.auto_tuner.control.get("early_stop", None)
+
         # The max time of auto tuner, if None, no limit.
         self.max_time = self.config.experiment.auto_tuner.control.get("max_time", None)
 
@@ -150,17 +212,25 @@ class TrainAutoTuner(AutoTunerBase):
         # The start time of tuner, used to control the tuner when stop
         self.start_time = time.time()
 
-        # The history pruned count
-        self.pruner.pruned_count = int(self.find_pruned_num_value(log_path))
+        if resume_from_log:
+            # The history pruned count
+            self.pruner.pruned_count = int(self.find_pruned_num_value(log_path))
 
-        # Task id
-        self.idx = self.searcher.algo.idx - self.pruner.pruned_count
+            # Task id
+            self.idx = self.searcher.algo.idx - self.pruner.pruned_count
 
-        # clear breakpoint task log
-        if self.searcher.algo.idx >= 0:
-            breakpoint_task_path = os.path.join(dir_path, "task_" + str(self.idx + 1))
-            self.clear_log(breakpoint_task_path)
-            self.searcher.algo.idx = self.idx - 1
+            # clear breakpoint task log
+            if self.searcher.algo.idx >= 0:
+                breakpoint_task_path = os.path.join(dir_path, "task_" + str(self.idx + 1))
+                self.clear_log(breakpoint_task_path)
+                self.searcher.algo.idx = self.idx - 1
+        else:
+            self.pruner.restore(self.journal)
+            self.idx = self.journal.max_idx()
+            # Trials cut off by a crash of their tuner are run again from scratch
+            for record in self.journal.interrupted():
+                if record.get("idx"):
+                    self.clear_log(os.path.join(dir_path, f"task_{record['idx']}"))
 
         # Checkout search mode on the platform
         self.has_checkout = False
@@ -206,6 +276,16 @@ class TrainAutoTuner(AutoTunerBase):
             Step5. Run the best task
         """
         tuner_start_time = time.time()
+        if self.max_concurrent_trials > 1:
+            self.tune_concurrent()
+        else:
+            self.tune_sequential()
+        tuner_end_time = time.time()
+        self.logger.info(f"AutoTuner Ended in {tuner_end_time - tuner_start_time} seconds.")
+        self.run_best()
+
+    def tune_sequential(self):
+        """Run one trial at a time on the whole cluster."""
         while not self.need_stop():
             self.gen()
             if not self.cur_strategy:
@@ -224,18 +304,76 @@ class TrainAutoTuner(AutoTunerBase):
             ):
                 self.checkout()
 
-            # get best strategy
-            best_strategy = self.get_best()
-            if best_strategy:
-                self.logger.info(
-                    f"Best strategy tuned so far: {best_strategy}, and performance is {best_strategy['performance']}."
+            self.log_best()
+
+    def log_best(self):
+        # get best strategy
+        best_strategy = self.get_best()
+        if best_strategy:
+            self.logger.info(
+                f"Best strategy tuned so far: {best_strategy}, and performance is {best_strategy['performance']}."
+            )
+        else:
+            self.logger.info("No strategy can run so far.")
+
+    def tune_concurrent(self):
+        """
+        Run several trials at once, each on its own subset of nodes or devices.
+        A strategy that does not fit into the free resources waits for running trials to end.
+        """
+        scheduler = TrialScheduler(self.resources)
+        running = []
+        pending = None
+        while True:
+            while len(running) < self.max_concurrent_trials and not self.need_stop():
+                if pending is None:
+                    self.gen()
+                    if not self.cur_strategy:
+                        break
+                    pending = (self.cur_strategy, self.cur_task)
+                strategy, task = pending
+                world_size = strategy_world_size(strategy)
+                if not scheduler.fits(world_size):
+                    self.logger.info(f"task_{strategy['idx']} needs {world_size} cards, skip it.")
+                    strategy["performance"] = None
+                    strategy["max_mem"] = None
+                    strategy["error"] = f"Can not place {world_size} cards on the cluster"
+                    self.journal.append("finished", strategy)
+                    pending = None
+                    continue
+                allocation = scheduler.allocate(world_size)
+                if allocation is None:
+                    break
+                pending = None
+                apply_allocation(task, allocation, self.resources, self.use_hostfile)
+                # Placeholders so that pruning and searching treat the trial as not yet known
+                strategy["performance"] = None
+                strategy["max_mem"] = None
+                strategy["running"] = True
+                placement = {host: len(devices) for host, devices in allocation.items()}
+                self.logger.info(f"Run task_{strategy['idx']} on {placement}: {strategy}")
+                self.run(task)
+                running.append(
+                    _Trial(strategy, task, self.runner, allocation, self.task_start_time)
                 )
-            else:
-                self.logger.info("No strategy can run so far.")
-        tuner_end_time = time.time()
-        self.logger.info(f"AutoTuner Ended in {tuner_end_time - tuner_start_time} seconds.")
 
-        # Run the best task
+            if not running:
+                break
+            time.sleep(self.interval)
+            for trial in list(running):
+                if not self._poll(trial):
+                    continue
+                running.remove(trial)
+                scheduler.release(trial.allocation)
+                self._finish_monitor(trial)
+                strategy = trial.strategy
+                strategy.pop("running", None)
+                self.logger.info(f"Record task_{strategy['idx']}:")
+                self.record(trial.task, strategy)
+                self.log_best()
+
+    def run_best(self):
+        """Run the best strategy found on the whole cluster."""
         if self.config.experiment.auto_tuner.control.get("run_best", True):
             best_strategy = self.get_best()
             if best_strategy:
@@ -262,79 +400,116 @@ class TrainAutoTuner(AutoTunerBase):
         self.runner.run(enable_monitoring=enable_monitoring)
         # set start time
         self.task_start_time = time.time()
+        return self.runner
 
     def monitor(self):
         """Monitor the task until task timeout or completed."""
         # Sleep 3s to ensure the task is started
         time.sleep(3)
-        running = False
-        sub_process_running = False
-        while True:
-            # If the task timeout, stop monitoring
-            end_time = time.time()
-            # To increase the time to 600s for the first task with data processing and cache.
-            if self.idx == 1:
-                max_time_per_task = 2 * self.max_time_per_task
-            else:
-                max_time_per_task = self.max_time_per_task
-            if end_time - self.task_start_time > max_time_per_task:
-                self.runner.stop()
-                self.cur_strategy["stopped_by_tuner"] = True
-                break
-            # If the task is completed or idle, stop monitoring
-            try:
-                if FLAGSCALE_USE_V1:
-                    status = self.runner.launcher._query_status()
-                else:
-                    status = self.runner._query_status()
-                self.logger.info(f"task_{self.cur_strategy['idx']} status: {status.name}")
-                if status == JobStatus.COMPLETED_OR_IDLE:
-                    break
-                if status == JobStatus.RUNNING:
-                    running = True
-                if status == JobStatus.TRANSITIONAL:
-                    if running:
-                        self.runner.stop()
-                        break
-
-                # Add sub process monitor
-                if FLAGSCALE_USE_V1:
-                    sub_process = self.runner.launcher._query_sub_process_status()
-                else:
-                    sub_process = self.runner._query_sub_process_status()
-                if sub_process:
-                    sub_process_running = True
-
-                elif not sub_process:
-                    if sub_process_running:
-                        self.logger.info("Sub process not working, stop the task.")
-                        self.runner.stop()
-                        self.cur_strategy["stopped_by_tuner"] = True
-                        break
-
-            except Exception as e:
-                self.logger.info(e)
-                time.sleep(self.interval)
+        trial = _Trial(self.cur_strategy, self.cur_task, self.runner, None, self.task_start_time)
+        while not self._poll(trial):
             time.sleep(self.interval)
+        self._finish_monitor(trial)
+
+    def _poll(self, trial):
+        """Check the status of a trial once, stop it if needed, return True once it ended."""
+        # To increase the time to 600s for the first task with data processing and cache.
+        if trial.strategy["idx"] == 1:
+            max_time_per_task = 2 * self.max_time_per_task
+        else:
+            max_time_per_task = self.max_time_per_task
+        # If the task timeout, stop monitoring
+        if time.time() - trial.start_time > max_time_per_task:
+            trial.runner.stop()
+            trial.strategy["stopped_by_tuner"] = True
+            return True
+        # If the task is completed or idle, stop monitoring
+        launcher = trial.runner.launcher if FLAGSCALE_USE_V1 else trial.runner
+        try:
+            status = launcher._query_status()
+            self.logger.info(f"task_{trial.strategy['idx']} status: {status.name}")
+            if status == JobStatus.COMPLETED_OR_IDLE:
+                return True
+            if status == JobStatus.RUNNING:
+                trial.running = True
+                if self._should_stop_early(trial):
+                    trial.runner.stop()
+                    trial.strategy["stopped_by_tuner"] = True
+                    trial.strategy["early_stopped"] = True
+                    return True
+            if status == JobStatus.TRANSITIONAL:
+                if trial.running:
+                    trial.runner.stop()
+                    return True
+
+            # Add sub process monitor
+            if launcher._query_sub_process_status():
+                trial.sub_process_running = True
+            elif trial.sub_process_running:
+                self.logger.info("Sub process not working, stop the task.")
+                trial.runner.stop()
+                trial.strategy["stopped_by_tuner"] = True
+                return True
+        except Exception as e:
+            self.logger.info(e)
+        return False
+
+    def _should_stop_early(self, trial):
+        """
+        Whether a running trial is hopeless: its last ``min_iterations`` iteration times,
+        excluding the first iteration, are stable within ``max_variation`` and their mean is
+        worse than the best performance so far by more than ``threshold``.
+        """
+        if not self.early_stop:
+            return False
+        best = self.get_best()
+        if best is None:
+            return False
+        min_iterations = self.early_stop.get("min_iterations", 5)
+        rows = self.recorder.metrics_table(trial.task)
+        values = [row["performance"] for row in rows[1:] if row["performance"] is not None]
+        if len(values) < min_iterations:
+            return False
+        recent = values[-min_iterations:]
+        mean = sum(recent) / len(recent)
+        max_variation = self.early_stop.get("max_variation", 0.1)
+        if mean <= 0 or (max(recent) - min(recent)) / mean > max_variation:
+            return False
+        threshold = self.early_stop.get("threshold", 1.2)
+        if self.recorder.sorted_order == "descend":
+            hopeless = mean * threshold < best["performance"]
+        else:
+            hopeless = mean > best["performance"] * threshold
+        if hopeless:
+            self.logger.info(
+                f"task_{trial.strategy['idx']} performance {mean:.3f} after {len(values)} "
+                f"iterations is worse than the best {best['performance']}, stop it early."
+            )
+        return hopeless
 
+    def _finish_monitor(self, trial):
         end_time = time.time()
 
         # Add elapsed time
-        self.cur_strategy["elapsed_time"] = round(end_time - self.task_start_time, 2)
+        trial.strategy["elapsed_time"] = round(end_time - trial.start_time, 2)
         # Add start time
-        readable_task_start_time = datetime.datetime.fromtimestamp(self.task_start_time).strftime(
+        readable_task_start_time = datetime.datetime.fromtimestamp(trial.start_time).strftime(
             "%Y-%m-%d %H:%M:%S"
         )
-        self.cur_strategy["start_time"] = readable_task_start_time
+        trial.strategy["start_time"] = readable_task_start_time
 
         self.logger.info(
-            f"task_{self.cur_strategy['idx']} monitor time: {self.cur_strategy['elapsed_time']:.2f}s"
+            f"task_{trial.strategy['idx']} monitor time: {trial.strategy['elapsed_time']:.2f}s"
         )
 
-    def record(self):
+    def record(self, task=None, strategy=None):
         """Record the task result to csv"""
-        self.recorder.record(self.cur_task, self.cur_strategy)
-        self.recorder.save(self.history)
+        if task is None:
+            task, strategy = self.cur_task, self.cur_strategy
+        self.recorder.record(task, strategy)
+        self.journal.append("finished", strategy, idx=strategy["idx"])
+        # Trials still running have no result yet
+        self.recorder.save([s for s in self.history if not s.get("running", False)])
 
     def get_best(self):
         sorted_history = self.recorder.sort(self.history)
@@ -9,6 +9,9 @@ def divisible(x, y):
 
 def beside(keys, strategy, history):
     """Compare strategy with history strategies Whether same besides given keys"""
+    if isinstance(history, StrategyHistory):
+        return history.beside(keys, strategy)
+
     from flagscale.runner.auto_tuner.search.searcher import BUILT_IN_STRATEGY_DIMS
 
     retrieval = []
@@ -27,6 +30,116 @@ def beside(keys, strategy, history):
     return retrieval
 
 
+def select(dims, strategy, history):
+    """History strategies whose given dims equal those of strategy, missing dims are None."""
+    if isinstance(history, StrategyHistory):
+        return history.select(dims, strategy)
+    return [task for task in history if all(task.get(d) == strategy.get(d) for d in dims)]
+
+
+_MISSING = object()
+
+
+def _freeze(value):
+    """Hashable form of a strategy value, lists such as process meshes become tuples."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class StrategyHistory(list):
+    """
+    Strategy history with hash indexes for the lookups done by prune rules.
+
+    It behaves as the plain list of strategies used elsewhere. ``beside`` and ``select``
+    build an index the first time they are called with a given key set, bucketing every
+    strategy by the values of the compared dims, and keep it updated on ``append``, so
+    each lookup is a dict access instead of a scan over the whole history.
+    """
+
+    def __init__(self, strategies=()):
+        super().__init__(strategies)
+        self._indexes = {}
+
+    def append(self, strategy):
+        super().append(strategy)
+        position = len(self) - 1
+        for (kind, dims), index in self._indexes.items():
+            self._add(index, kind, dims, position, strategy)
+
+    def extend(self, strategies):
+        for strategy in strategies:
+            self.append(strategy)
+
+    def __iadd__(self, strategies):
+        self.extend(strategies)
+        return self
+
+    def _invalidate(method):
+        def wrapper(self, *args, **kwargs):
+            self._indexes.clear()
+            return method(self, *args, **kwargs)
+
+        return wrapper
+
+    insert = _invalidate(list.insert)
+    remove = _invalidate(list.remove)
+    pop = _invalidate(list.pop)
+    clear = _invalidate(list.clear)
+    sort = _invalidate(list.sort)
+    reverse = _invalidate(list.reverse)
+    __setitem__ = _invalidate(list.__setitem__)
+    __delitem__ = _invalidate(list.__delitem__)
+    del _invalidate
+
+    @staticmethod
+    def _add(index, kind, dims, position, strategy):
+        buckets, partial = index
+        if kind == "beside" and any(d not in strategy for d in dims):
+            # Dims missing from a history strategy are not compared, keep it aside
+            partial.append((position, strategy))
+            return
+        key = tuple(_freeze(strategy.get(d)) for d in dims)
+        buckets.setdefault(key, []).append((position, strategy))
+
+    def _lookup(self, kind, dims, strategy):
+        index = self._indexes.get((kind, dims))
+        if index is None:
+            index = ({}, [])
+            for position, task in enumerate(self):
+                self._add(index, kind, dims, position, task)
+            self._indexes[(kind, dims)] = index
+        buckets, partial = index
+        if kind == "beside":
+            key = tuple(_freeze(strategy.get(d, _MISSING)) for d in dims)
+        else:
+            key = tuple(_freeze(strategy.get(d)) for d in dims)
+        found = buckets.get(key, [])
+        if partial:
+            # Keep history order for the rules that stop at the first matched strategy
+            found = sorted(
+                found + [item for item in partial if self._same(item[1], strategy, dims)]
+            )
+        return [task for _, task in found]
+
+    @staticmethod
+    def _same(task, strategy, dims):
+        return all(strategy[d] == task[d] for d in dims if d in task)
+
+    def beside(self, keys, strategy):
+        """Same as the module level ``beside``, served by an index."""
+        from flagscale.runner.auto_tuner.search.searcher import BUILT_IN_STRATEGY_DIMS
+
+        dims = tuple(d for d in BUILT_IN_STRATEGY_DIMS if d not in keys)
+        return self._lookup("beside", dims, strategy)
+
+    def select(self, dims, strategy):
+        """Same as the module level ``select``, served by an index."""
+        return self._lookup("select", tuple(dims), strategy)
+
+
 def sort_by_memory(strategy):
     """Sort strategy by memory."""
     return (
@@ -216,6 +329,13 @@ def convert_config_to_megatron_args(config, strategy):
             "untie_embeddings_and_output_weights"
         ]
 
+    return apply_strategy_to_megatron_args(args, config, strategy)
+
+
+def apply_strategy_to_megatron_args(args, config, strategy):
+    """Set the parallel, batch and recompute dims of a strategy on megatron args."""
+    flagscale_args = config.train.model
+    args.tensor_model_parallel_size = strategy["tensor_model_parallel_size"]
     args.pipeline_model_parallel_size = strategy["pipeline_model_parallel_size"]
     args.data_parallel_size = strategy["data_parallel_size"]
     args.expert_model_parallel_size = strategy["expert_model_parallel_size"]
@@ -1,10 +1,12 @@
+import collections
 import os
+import re
 import time
 
 from flagscale.runner.utils import logger
 
-# Record the number of rows last diagnosed and analyzed by each host
-_diagnostic_offsets = {}
+# Incremental log scanner of each host, see LogScanner
+_log_scanners = {}
 
 error_types = {
     # Success indicators
@@ -63,6 +65,164 @@ def find_error_lines(lines, error_key, start_line=0):
     return matches
 
 
+def _keyword_trie_pattern(keywords):
+    """Regex matching any of the keywords, with common prefixes factored out."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A keyword may end here while longer ones continue
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return build(trie)
+
+
+class LogScanner:
+    """
+    Scan a growing log file for all error keywords in one pass over the new bytes.
+
+    Like the byte offsets of log_collector, the scanner remembers how far it has read, so
+    every call only reads what was appended since. All keywords are compiled into a single
+    regex that runs over the lower-cased chunk, and only the matched lines are checked
+    against each keyword. The regex is a trie of the keywords, so at each position of the
+    log it follows one branch instead of trying every keyword. Memory is bounded: per
+    keyword it keeps a counter, the line range found since the last report and the last
+    ``max_contexts`` matches with their context.
+
+    Args:
+        patterns (dict): Error keywords to their descriptions, defaults to ``error_types``.
+        context_lines (int): Number of lines kept before and after a matched line.
+        max_contexts (int): Number of recent matches kept per keyword.
+        chunk_size (int): Bytes read from the file at a time.
+    """
+
+    # A line longer than this is scanned before its end is seen
+    max_line_bytes = 1 << 20
+
+    def __init__(self, patterns=None, context_lines=2, max_contexts=5, chunk_size=1 << 22):
+        self.patterns = {key.lower(): desc for key, desc in (patterns or error_types).items()}
+        self._regex = re.compile(_keyword_trie_pattern(self.patterns))
+        self.context_lines = context_lines
+        self.max_contexts = max_contexts
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def reset(self):
+        """Forget everything read so far, e.g. when the log file was replaced."""
+        self.offset = 0
+        self.line_count = 0
+        self.counts = dict.fromkeys(self.patterns, 0)
+        self.contexts = {key: collections.deque(maxlen=self.max_contexts) for key in self.patterns}
+        self._file_id = None
+        self._partial = b""
+        self._recent = collections.deque(maxlen=self.context_lines)
+        # Context windows still waiting for their following lines: [lines, remaining]
+        self._pending = []
+        self._new_ranges = {}
+
+    def scan_file(self, path, final=False):
+        """
+        Scan the bytes appended to the file since the last call.
+        Args:
+            path (str): Path to the log file.
+            final (bool): Also scan the incomplete last line, once the writer has exited.
+        Returns:
+            dict: keyword -> (first line, last line, count) of the matches found by this call,
+            with line numbers starting from 1.
+        """
+        stat = os.stat(path)
+        file_id = (path, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self.offset:
+            self.reset()
+            self._file_id = file_id
+        with open(path, "rb") as f:
+            f.seek(self.offset)
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                self.offset += len(data)
+                self.feed(data)
+        if final:
+            self.flush()
+        return self.pop_new_matches()
+
+    def feed(self, data):
+        """Scan raw log bytes, an incomplete last line is kept until its end arrives."""
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        if end == 0 and len(data) > self.max_line_bytes:
+            end = len(data)
+        self._partial = data[end:]
+        if end:
+            self._scan(data[:end].decode("utf-8", errors="ignore"))
+
+    def flush(self):
+        """Scan the incomplete last line, e.g. once the process has exited."""
+        if self._partial:
+            partial, self._partial = self._partial, b""
+            self._scan(partial.decode("utf-8", errors="ignore") + "\n")
+
+    def _scan(self, text):
+        lines = text.split("\n")
+        lines.pop()  # text ends with a newline
+        # str.lower never adds or removes newlines, so line indexes match
+        lowered = text.lower()
+        matched = []
+        line_index, position = 0, 0
+        for match in self._regex.finditer(lowered):
+            line_index += lowered.count("\n", position, match.start())
+            position = match.start()
+            if not matched or matched[-1] != line_index:
+                matched.append(line_index)
+
+        self._complete_pending(lines)
+        for index in matched:
+            line = lines[index]
+            lower = line.lower()
+            line_number = self.line_count + index + 1
+            need = self.context_lines - index
+            before = list(self._recent)[-need:] if need > 0 else []
+            before += lines[max(0, index - self.context_lines) : index]
+            after = lines[index + 1 : index + 1 + self.context_lines]
+            window = {"line": line_number, "context": [*before, line, *after]}
+            if len(after) < self.context_lines:
+                self._pending.append([window, self.context_lines - len(after)])
+            for key in self.patterns:
+                if key in lower:
+                    self.counts[key] += 1
+                    self.contexts[key].append(window)
+                    first, _, count = self._new_ranges.get(key, (line_number, 0, 0))
+                    self._new_ranges[key] = (first, line_number, count + 1)
+
+        self.line_count += len(lines)
+        self._recent.extend(lines[-self.context_lines :] if self.context_lines else [])
+
+    def _complete_pending(self, lines):
+        pending = []
+        for window, remaining in self._pending:
+            window["context"].extend(lines[:remaining])
+            remaining -= min(remaining, len(lines))
+            if remaining:
+                pending.append([window, remaining])
+        self._pending = pending
+
+    def pop_new_matches(self):
+        """Matches found since the last call, see ``scan_file``."""
+        new_ranges, self._new_ranges = self._new_ranges, {}
+        return new_ranges
+
+
 def format_line_range(line_numbers):
     """
     Format the line number range display
@@ -79,7 +239,17 @@ def format_line_range(line_numbers):
         return f"{min(line_numbers)}-{max(line_numbers)}"
 
 
-def generate_diagnostic_report(config, host, node_rank, log_file, return_content=False):
+def get_log_scanner(host, node_rank):
+    """The incremental log scanner of a host, created on first use."""
+    host_key = f"{host}_{node_rank}"
+    if host_key not in _log_scanners:
+        _log_scanners[host_key] = LogScanner()
+    return _log_scanners[host_key]
+
+
+def generate_diagnostic_report(
+    config, host, node_rank, log_file, return_content=False, final=False
+):
     """
     Generate an incremental diagnostic report from a log file.
     Args:
@@ -88,32 +258,26 @@ def generate_diagnostic_report(config, host, node_rank, log_file, return_content
         node_rank (int): Node rank.
         log_file (str): Path to the log file.
         return_content (bool): If True, return report as string instead of writing to file.
+        final (bool): The job is no longer running, also report an unterminated last line.
     Returns:
         str: Diagnostic report content if return_content=True, else diagnostic file path.
     """
-    global _diagnostic_offsets
-
     # Always use the monitor subdirectory for diagnostic files (unified for single/multi-node)
     base_log_dir = config.train.system.logging.log_dir
     monitor_dir = os.path.join(base_log_dir, "monitor")
     os.makedirs(monitor_dir, exist_ok=True)
 
     diagnostic_file = os.path.join(monitor_dir, f"host_{node_rank}_{host}_diagnostic.txt")
-    host_key = f"{host}_{node_rank}"
 
     try:
         if not os.path.exists(log_file) or os.path.getsize(log_file) == 0:
             logger.debug(f"Log file {log_file} is empty or does not exist")
             return diagnostic_file if not return_content else ""
-        # Read all lines of the log file
-        with open(log_file, "r", encoding="utf-8", errors="ignore") as f:
-            all_lines = f.readlines()
 
-        # Get the number of rows analyzed last time
-        last_analyzed_line = _diagnostic_offsets.get(host_key, 0)
+        scanner = get_log_scanner(host, node_rank)
 
         # If it is the first analysis, create the header of the diagnostic file
-        if last_analyzed_line == 0 and not os.path.exists(diagnostic_file):
+        if scanner.offset == 0 and not os.path.exists(diagnostic_file):
             os.makedirs(os.path.dirname(diagnostic_file), exist_ok=True)
             header_content = f"Diagnostic Report for {host} (node {node_rank})\n"
             header_content += (
@@ -124,35 +288,24 @@ def generate_diagnostic_report(config, host, node_rank, log_file, return_content
             with open(diagnostic_file, "w", encoding="utf-8") as f:
                 f.write(header_content)
 
-        # Only analyze the newly added rows
-        new_lines = all_lines[last_analyzed_line:]
-        if not new_lines:
+        # Only analyze the newly appended bytes
+        last_offset = scanner.offset
+        new_matches = scanner.scan_file(log_file, final=final)
+        if scanner.offset == last_offset and not new_matches:
             logger.debug(f"No new lines to analyze in {log_file}")
             return diagnostic_file if not return_content else ""
 
         # Analyze the errors in the new lines
         current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
         new_errors = []
-        error_lines_by_type = {key: [] for key in error_types}
-
-        # Iterate through new lines once and check against all error types
-        for i, line in enumerate(all_lines[last_analyzed_line:], start=last_analyzed_line):
-            for key, desc in error_types.items():
-                if find_error_lines([line], key, 0):  # Check single line
-                    error_lines_by_type[key].append(i)
-
-        # Process error lines for each type
-        for key, desc in error_types.items():
-            error_lines = error_lines_by_type[key]
-            if error_lines:
-                line_range = format_line_range(error_lines)
-                log_filename = os.path.basename(log_file)
+        log_filename = os.path.basename(log_file)
+        for key, desc in scanner.patterns.items():
+            if key in new_matches:
+                first, last, _ = new_matches[key]
+                line_range = format_line_range([first, last] if first != last else [first])
                 error_entry = f"[{current_time}] {desc} Check {log_filename} line:{line_range}"
                 new_errors.append(error_entry)
 
-        # Update Analysis Location
-        _diagnostic_offsets[host_key] = len(all_lines)
-
         # If there are new errors, append them to the diagnostic file
         if new_errors:
             os.makedirs(os.path.dirname(diagnostic_file), exist_ok=True)
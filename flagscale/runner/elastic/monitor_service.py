@@ -4,9 +4,11 @@ import subprocess
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from flagscale.runner.elastic.diagnostic import generate_diagnostic_report
 from flagscale.runner.elastic.log_collector import collect_logs
+from flagscale.runner.elastic.progress_watcher import LogProgressWatcher
 from flagscale.runner.utils import JobStatus, get_remote_file_mtime, logger
 
 
@@ -36,6 +38,10 @@ class MonitorService:
         self.hang_detection_timeout = config.experiment.runner.get(
             "hang_detection_timeout", 1800
         )  # 30 minutes in seconds
+        # Hosts are probed concurrently, so a sweep does not grow with the cluster size
+        self.max_workers = config.experiment.runner.get("monitor_max_workers", 32)
+        # Hangs are decided from the iteration progress in the logs, see LogProgressWatcher
+        self.progress_watcher = None
         self.last_log_check_times = {}  # Track last modification time for each log file
         self.last_job_status = None  # Track previous job status for kill detection
         self.process_start_time = time.time()  # Track when monitoring started
@@ -65,6 +71,9 @@ class MonitorService:
 
         self.is_running = True
 
+        if self.diagnostic_enabled:
+            self._start_progress_watcher()
+
         self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.monitor_thread.start()
 
@@ -79,6 +88,9 @@ class MonitorService:
             return
 
         self.is_running = False
+        if self.progress_watcher is not None:
+            self.progress_watcher.stop()
+            self.progress_watcher = None
         if self.monitor_thread and self.monitor_thread.is_alive():
             self.monitor_thread.join(timeout=5)
 
@@ -104,6 +116,11 @@ class MonitorService:
 
                     if job_status == JobStatus.COMPLETED_OR_IDLE:
                         logger.info("Job completed, stopping monitoring")
+                        # The last lines the job wrote before exiting are reported too
+                        if self.log_collection_enabled:
+                            self._collect_logs()
+                        if self.diagnostic_enabled:
+                            self._generate_diagnostics(final=True)
                         break
 
                     if self.log_collection_enabled:
@@ -112,7 +129,8 @@ class MonitorService:
                     if self.diagnostic_enabled:
                         self._generate_diagnostics()
 
-                    if self.diagnostic_enabled:
+                    # The progress watcher reports hangs as soon as they happen
+                    if self.diagnostic_enabled and self.progress_watcher is None:
                         self._check_and_report_hang()
 
                 except Exception as e:
@@ -130,6 +148,53 @@ class MonitorService:
             logger.info("Monitor loop ended")
             self.is_running = False
 
+    def _monitored_hosts(self):
+        """(host, node_rank) pairs watched by this service."""
+        if self.single_node_mode:
+            # Single-node monitoring mode - each node monitors only itself
+            return [(self.monitored_host, self.monitored_node_rank)]
+        if not hasattr(self.runner, "resources") or self.runner.resources is None:
+            # Local mode (backward compatibility)
+            return [("localhost", 0)]
+        # Multi-node mode (centralized monitoring)
+        return [(host, node_rank) for node_rank, host in enumerate(self.runner.resources)]
+
+    def _for_each_host(self, func):
+        """Run func(host, node_rank) for all monitored hosts concurrently."""
+        hosts = self._monitored_hosts()
+        if len(hosts) == 1:
+            return [func(*hosts[0])]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(hosts))) as executor:
+            return list(executor.map(lambda target: func(*target), hosts))
+
+    def _host_log_file(self, host: str, node_rank: int) -> str:
+        if self.config.experiment.runner.get("no_shared_fs", False):
+            return os.path.join(self.config.train.system.logging.log_dir, "host.output")
+        return os.path.join(
+            self.config.train.system.logging.log_dir, f"host_{node_rank}_{host}.output"
+        )
+
+    def _start_progress_watcher(self):
+        runner_config = self.config.experiment.runner
+        watcher = LogProgressWatcher(
+            timeout=self.hang_detection_timeout,
+            min_timeout=runner_config.get("hang_detection_min_timeout", 600),
+            iteration_factor=runner_config.get("hang_detection_iteration_factor", 20),
+            tick=min(self.interval, runner_config.get("hang_detection_tick", 1.0)),
+            on_hang=lambda key, detail: self._generate_hang_diagnostic(*key, detail=detail),
+            ssh_port=runner_config.get("ssh_port", 22),
+            ssh_command=runner_config.get("ssh_command", "ssh"),
+        )
+        no_shared_fs = runner_config.get("no_shared_fs", False)
+        for host, node_rank in self._monitored_hosts():
+            log_file = self._host_log_file(host, node_rank)
+            if no_shared_fs and host != "localhost" and not self.single_node_mode:
+                watcher.add_remote((host, node_rank), host, log_file)
+            else:
+                watcher.add_local((host, node_rank), log_file)
+        watcher.start()
+        self.progress_watcher = watcher
+
     def _get_job_status(self) -> JobStatus:
         return self.runner._query_status()
 
@@ -175,15 +240,7 @@ class MonitorService:
         """
         try:
             # Check if PID files still exist but processes are gone
-            if not hasattr(self.runner, "resources") or self.runner.resources is None:
-                # Local mode
-                return self._check_pid_file_anomaly("localhost", 0)
-            else:
-                # Multi-node mode
-                for node_rank, (host, _) in enumerate(self.runner.resources.items()):
-                    if self._check_pid_file_anomaly(host, node_rank):
-                        return True
-            return False
+            return any(self._for_each_host(self._check_pid_file_anomaly))
         except Exception as e:
             logger.error(f"Error detecting abnormal termination: {e}")
             return False
@@ -223,18 +280,8 @@ class MonitorService:
             # Write monitor-detected kill entry (won't be re-detected by diagnostic.py)
             kill_entry = f"[{current_time}] MonitorDetected: MANUAL KILL DETECTED - Process terminated unexpectedly, likely killed manually"
 
-            if self.single_node_mode:
-                # Single-node monitoring mode
-                self._write_diagnostic_entry(
-                    self.monitored_host, self.monitored_node_rank, kill_entry
-                )
-            elif not hasattr(self.runner, "resources") or self.runner.resources is None:
-                # Local mode (backward compatibility)
-                self._write_diagnostic_entry("localhost", 0, kill_entry)
-            else:
-                # Multi-node mode (centralized monitoring)
-                for node_rank, (host, _) in enumerate(self.runner.resources.items()):
-                    self._write_diagnostic_entry(host, node_rank, kill_entry)
+            for host, node_rank in self._monitored_hosts():
+                self._write_diagnostic_entry(host, node_rank, kill_entry)
 
             logger.warning("⚠️ MANUAL KILL DETECTED - Diagnostic entry written to files")
 
@@ -281,16 +328,7 @@ class MonitorService:
             logger.error(f"Failed to write status log: {e}")
 
     def _collect_logs(self):
-        if self.single_node_mode:
-            # Single-node monitoring mode - each node monitors only itself
-            self._collect_logs_for_host(self.monitored_host, self.monitored_node_rank)
-        elif not hasattr(self.runner, "resources") or self.runner.resources is None:
-            # Local mode (backward compatibility)
-            self._collect_logs_for_host("localhost", 0)
-        else:
-            # Multi-node mode (centralized monitoring)
-            for node_rank, (host, _) in enumerate(self.runner.resources.items()):
-                self._collect_logs_for_host(host, node_rank)
+        self._for_each_host(self._collect_logs_for_host)
 
     def _collect_logs_for_host(self, host: str, node_rank: int):
         try:
@@ -303,19 +341,13 @@ class MonitorService:
         except Exception as e:
             logger.error(f"Failed to collect logs for {host} (node {node_rank}): {e}")
 
-    def _generate_diagnostics(self):
-        """Generate diagnostc report"""
-        if self.single_node_mode:
-            # Single-node monitoring mode - each node monitors only itself
-            self._generate_diagnostic_for_host(self.monitored_host, self.monitored_node_rank)
-        elif not hasattr(self.runner, "resources") or self.runner.resources is None:
-            self._generate_diagnostic_for_host("localhost", 0)
-        else:
-            # Multi-nodes (centralized monitoring)
-            for node_rank, (host, _) in enumerate(self.runner.resources.items()):
-                self._generate_diagnostic_for_host(host, node_rank)
-
-    def _generate_diagnostic_for_host(self, host: str, node_rank: int):
+    def _generate_diagnostics(self, final: bool = False):
+        """Generate diagnostc report, ``final`` once the job is no longer running"""
+        self._for_each_host(
+            lambda host, node_rank: self._generate_diagnostic_for_host(host, node_rank, final)
+        )
+
+    def _generate_diagnostic_for_host(self, host: str, node_rank: int, final: bool = False):
         try:
             log_file_path = None
             current_log_file = os.path.join(
@@ -343,7 +375,7 @@ class MonitorService:
 
             if log_file_path and os.path.exists(log_file_path):
                 diagnostic_file = generate_diagnostic_report(
-                    self.config, host, node_rank, log_file_path, return_content=False
+                    self.config, host, node_rank, log_file_path, return_content=False, final=final
                 )
                 if diagnostic_file:
                     logger.debug(
@@ -410,13 +442,14 @@ class MonitorService:
             logger.error(f"Error checking log hang for {host} (node {node_rank}): {e}")
             return False
 
-    def _generate_hang_diagnostic(self, host: str, node_rank: int):
+    def _generate_hang_diagnostic(self, host: str, node_rank: int, detail: str | None = None):
         """
         Generate hang diagnostic entry when log file is not updating
 
         Args:
             host (str): Hostname
             node_rank (int): Node rank
+            detail (str, optional): What stopped progressing, e.g. the stuck ranks
         """
         try:
             # Create a temporary diagnostic content for hang detection
@@ -434,7 +467,11 @@ class MonitorService:
             else:
                 log_filename = f"host_{node_rank}_{host}.output"
 
-            hang_entry = f"[{current_time}] HangError: Process appears to be hanging - log file not updated for over {self.hang_detection_timeout // 60} minutes. Check {log_filename}"
+            if detail is None:
+                detail = (
+                    f"log file not updated for over {self.hang_detection_timeout // 60} minutes"
+                )
+            hang_entry = f"[{current_time}] HangError: Process appears to be hanging - {detail}. Check {log_filename}"
 
             # Ensure diagnostic file exists with header if it doesn't
             if not os.path.exists(diagnostic_file):
@@ -458,17 +495,10 @@ class MonitorService:
             logger.error(f"Failed to generate hang diagnostic for {host} (node {node_rank}): {e}")
 
     def _check_and_report_hang(self):
-        """Check for hanging processes and report them"""
-        if self.single_node_mode:
-            # Single-node monitoring mode
-            if self._check_log_hang(self.monitored_host, self.monitored_node_rank):
-                self._generate_hang_diagnostic(self.monitored_host, self.monitored_node_rank)
-        elif not hasattr(self.runner, "resources") or self.runner.resources is None:
-            # Local mode (backward compatibility)
-            if self._check_log_hang("localhost", 0):
-                self._generate_hang_diagnostic("localhost", 0)
-        else:
-            # Multi-node mode (centralized monitoring)
-            for node_rank, (host, _) in enumerate(self.runner.resources.items()):
-                if self._check_log_hang(host, node_rank):
-                    self._generate_hang_diagnostic(host, node_rank)
+        """Check for hanging processes by log mtime and report them"""
+
+        def check(host, node_rank):
+            if self._check_log_hang(host, node_rank):
+                self._generate_hang_diagnostic(host, node_rank)
+
+        self._for_each_host(check)
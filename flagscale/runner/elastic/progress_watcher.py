@@ -0,0 +1,281 @@
+import collections
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import threading
+import time
+
+from flagscale.runner.utils import logger
+
+# Megatron training log line, e.g. " [2025-01-01 00:00:00] iteration       10/    1000 |",
+# optionally prefixed by the local rank tag of torchrun, e.g. "[default3]:"
+_ITERATION_PATTERN = re.compile(r"^(?:\[(?:default)?(\d+)\]:)?.*?\biteration\s+(\d+)\s*/\s*\d+")
+# Collective phases between iterations, e.g. "saving checkpoint at iteration 100 to ..." or
+# "validation loss at iteration 100 | ...", that may take much longer than an iteration
+_PHASE_PATTERN = re.compile(r"checkpoint|validation|evaluat", re.IGNORECASE)
+_ACTIVITY_BYTES = re.compile(rb"iteration|checkpoint|validation|evaluat", re.IGNORECASE)
+
+
+class RankProgress:
+    """Iteration progress of one rank, with the recent iteration intervals."""
+
+    def __init__(self, iteration, now):
+        self.iteration = iteration
+        self.last_progress = now
+        self.intervals = collections.deque(maxlen=32)
+        self.reported = False
+
+    def update(self, iteration, now):
+        if iteration <= self.iteration:
+            return
+        self.intervals.append((now - self.last_progress) / (iteration - self.iteration))
+        self.iteration = iteration
+        self.last_progress = now
+        self.reported = False
+
+
+class _Stream:
+    """State of one followed log: bytes not yet parsed and per-rank progress."""
+
+    def __init__(self, now):
+        self.partial = b""
+        self.last_activity = now
+        self.ranks = {}
+        self.reported = False
+        # Local file
+        self.path = None
+        self.offset = 0
+        self.file_id = None
+        # Remote stream
+        self.host = None
+        self.process = None
+        self.next_connect = 0
+        self.reader = None
+
+
+class LogProgressWatcher:
+    """
+    Follow the training logs of all hosts and decide hangs from per-rank progress.
+
+    Local (or shared file system) logs are followed by their size: a cheap stat per tick and
+    only the appended bytes are read. Remote logs are streamed by one long-lived
+    ``ssh host tail -F`` per host, whose output is parsed as it arrives. The iteration
+    counters in the logs give the progress of every rank. A rank hangs when it has not
+    advanced for ``iteration_factor`` times its typical iteration time (at least
+    ``min_timeout``, at most ``timeout``). Once a checkpoint or evaluation line is logged on
+    any host, ranks that have not advanced since are given the full ``timeout``, as saving
+    or evaluating can take much longer than an iteration. Logs without iteration counters
+    fall back to ``timeout`` seconds without any output. Every stall is reported once via
+    ``on_hang``.
+
+    Args:
+        timeout (float): Seconds without progress that always count as a hang.
+        min_timeout (float): Lower bound of the adaptive hang timeout.
+        iteration_factor (float): Hang timeout in units of the median iteration time.
+        tick (float): Seconds between two checks of the watcher thread.
+        on_hang (callable): Called as ``on_hang(key, detail)`` for each new hang.
+        ssh_port (int): SSH port of the remote hosts.
+        ssh_command (str): The ssh client.
+    """
+
+    def __init__(
+        self,
+        timeout=1800,
+        min_timeout=600,
+        iteration_factor=20,
+        tick=1.0,
+        on_hang=None,
+        ssh_port=22,
+        ssh_command="ssh",
+    ):
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.iteration_factor = iteration_factor
+        self.tick = tick
+        self.on_hang = on_hang
+        self.ssh_port = ssh_port
+        self.ssh_command = ssh_command
+        # Seconds between two connection attempts of a remote stream
+        self.reconnect_interval = 30
+        self._streams = {}
+        # Time of the last checkpoint or evaluation line of any stream
+        self._last_phase = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add_local(self, key, path):
+        """Follow a log file readable on this machine, from its current end."""
+        stream = _Stream(time.time())
+        stream.path = path
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stream.offset, stream.file_id = stat.st_size, stat.st_ino
+            # The log may already be quiet, as judged by file mtime before
+            stream.last_activity = stat.st_mtime
+        with self._lock:
+            self._streams[key] = stream
+
+    def add_remote(self, key, host, path):
+        """Stream a log file of a remote host over ssh."""
+        stream = _Stream(time.time())
+        stream.host, stream.path = host, path
+        with self._lock:
+            self._streams[key] = stream
+        self._connect(key, stream)
+
+    def _connect(self, key, stream):
+        cmd = [
+            *shlex.split(self.ssh_command),
+            "-o",
+            "BatchMode=yes",
+            "-p",
+            str(self.ssh_port),
+            stream.host,
+            f"tail -n 0 -F {shlex.quote(stream.path)}",
+        ]
+        stream.next_connect = time.time() + self.reconnect_interval
+        try:
+            stream.process = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            logger.error(f"Failed to stream log of {stream.host}: {e}")
+            stream.process = None
+            return
+        stream.reader = threading.Thread(
+            target=self._read_stream, args=(key, stream.process), daemon=True
+        )
+        stream.reader.start()
+
+    def _read_stream(self, key, process):
+        while True:
+            data = process.stdout.read1(1 << 16)
+            if not data:
+                break
+            self.feed(key, data)
+
+    def feed(self, key, data, now=None):
+        """Parse new log bytes of a stream."""
+        now = time.time() if now is None else now
+        with self._lock:
+            stream = self._streams[key]
+            stream.last_activity = now
+            data = stream.partial + data
+            end = data.rfind(b"\n") + 1
+            stream.partial = data[end:]
+            # Iteration and phase lines are rare, skip the decode of chunks without any
+            if _ACTIVITY_BYTES.search(data, 0, end) is None:
+                return
+            for line in data[:end].decode("utf-8", errors="ignore").splitlines():
+                match = _ITERATION_PATTERN.match(line)
+                if match is None:
+                    if _PHASE_PATTERN.search(line):
+                        self._last_phase = now
+                    continue
+                rank, iteration = match.group(1) or "0", int(match.group(2))
+                progress = stream.ranks.get(rank)
+                if progress is None:
+                    stream.ranks[rank] = RankProgress(iteration, now)
+                else:
+                    progress.update(iteration, now)
+
+    def poll(self):
+        """Read the bytes appended to local logs and restart dead remote streams."""
+        with self._lock:
+            streams = list(self._streams.items())
+        for key, stream in streams:
+            if stream.host is not None:
+                dead = stream.process is None or stream.process.poll() is not None
+                if dead and time.time() >= stream.next_connect:
+                    self._connect(key, stream)
+                continue
+            try:
+                stat = os.stat(stream.path)
+            except OSError:
+                continue
+            if stat.st_ino != stream.file_id or stat.st_size < stream.offset:
+                # The log was replaced, e.g. by a restarted job
+                stream.offset, stream.file_id, stream.partial = 0, stat.st_ino, b""
+            if stat.st_size == stream.offset:
+                continue
+            with open(stream.path, "rb") as f:
+                f.seek(stream.offset)
+                while stream.offset < stat.st_size:
+                    data = f.read(min(1 << 22, stat.st_size - stream.offset))
+                    if not data:
+                        break
+                    stream.offset += len(data)
+                    self.feed(key, data)
+
+    def hang_timeout(self, progress):
+        """Seconds without progress after which the rank is considered hanging."""
+        if len(progress.intervals) < 2:
+            return self.timeout
+        if self._last_phase is not None and self._last_phase >= progress.last_progress:
+            # Saving a checkpoint or evaluating since the last iteration of this rank
+            return self.timeout
+        adaptive = self.iteration_factor * statistics.median(progress.intervals)
+        return min(self.timeout, max(self.min_timeout, adaptive))
+
+    def check(self, now=None):
+        """
+        Find the streams that started hanging since the last check.
+        Returns:
+            list: (key, detail) of each new hang.
+        """
+        now = time.time() if now is None else now
+        hangs = []
+        with self._lock:
+            for key, stream in self._streams.items():
+                if not stream.ranks:
+                    idle = now - stream.last_activity
+                    if idle > self.timeout and not stream.reported:
+                        stream.reported = True
+                        hangs.append((key, f"log not updated for {idle:.0f} seconds"))
+                    elif idle <= self.timeout:
+                        stream.reported = False
+                    continue
+                stalled = []
+                for rank, progress in sorted(stream.ranks.items()):
+                    idle = now - progress.last_progress
+                    if idle > self.hang_timeout(progress) and not progress.reported:
+                        progress.reported = True
+                        stalled.append(
+                            f"rank {rank} stuck at iteration {progress.iteration} "
+                            f"for {idle:.0f} seconds"
+                        )
+                if stalled:
+                    hangs.append((key, ", ".join(stalled)))
+        return hangs
+
+    def start(self):
+        """Follow the logs and report hangs in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+        self._thread.start()
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(self.tick):
+            try:
+                self.poll()
+                for key, detail in self.check():
+                    if self.on_hang is not None:
+                        self.on_hang(key, detail)
+            except Exception as e:
+                logger.error(f"Error in log progress watcher: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            if stream.process is not None and stream.process.poll() is None:
+                stream.process.terminate()
@@ -0,0 +1,199 @@
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flagscale.runner.utils import logger
+
+# ssh exits with 255 when the connection itself fails, otherwise with the remote exit code
+_SSH_ERROR_CODE = 255
+
+
+class HostStatusPoller:
+    """
+    Run short status scripts on many hosts concurrently.
+
+    Remote hosts are reached through multiplexed ssh connections (ControlMaster), so only
+    the first query to a host pays for the ssh handshake and later ones reuse the master
+    connection. The script is sent on stdin of a remote ``bash -s``, so no remote mkdir or
+    scp is needed. Queries run on a bounded thread pool and the outputs are cached for
+    ``ttl`` seconds, so callers polling the same job within the ttl share one sweep.
+
+    Args:
+        ssh_port (int, optional): Port of the remote ssh servers.
+        max_workers (int): Maximum number of hosts queried at the same time.
+        ttl (float): Seconds a query result stays valid, 0 disables the cache.
+        multiplex (bool): Whether to keep persistent ControlMaster connections.
+        control_persist (int): Seconds an idle master connection is kept alive.
+        connect_timeout (int): Timeout in seconds of one query, including the connection.
+        ssh_command (str): The ssh client, replaceable by a stand-in for testing.
+    """
+
+    def __init__(
+        self,
+        ssh_port=None,
+        max_workers=32,
+        ttl=0.0,
+        multiplex=True,
+        control_persist=600,
+        connect_timeout=10,
+        ssh_command="ssh",
+    ):
+        self.ssh_port = ssh_port
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.multiplex = multiplex
+        self.control_persist = control_persist
+        self.connect_timeout = connect_timeout
+        self.ssh_command = ssh_command
+        self.control_dir = os.path.join(tempfile.gettempdir(), f"flagscale-ssh-{os.getuid()}")
+        # Wall time of the last sweep over all hosts, in seconds
+        self.last_sweep_seconds = None
+        self._cache = {}
+        self._masters = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __getstate__(self):
+        # Launchers are pickled into worker processes, threads and locks cannot be
+        state = self.__dict__.copy()
+        state.update(_cache={}, _masters=set(), _lock=None, _executor=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _ssh_args(self, host):
+        args = [
+            *shlex.split(self.ssh_command),
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            f"ConnectTimeout={self.connect_timeout}",
+        ]
+        if self.multiplex:
+            os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+            args += [
+                "-o",
+                "ControlMaster=auto",
+                "-o",
+                f"ControlPath={os.path.join(self.control_dir, '%C')}",
+                "-o",
+                f"ControlPersist={self.control_persist}",
+            ]
+        if self.ssh_port:
+            args += ["-p", str(self.ssh_port)]
+        return [*args, host]
+
+    def _connect(self, host):
+        """
+        Start the master connection of a host once, detached from our pipes: a master
+        started by a query would otherwise hold its output open until ControlPersist ends.
+        """
+        if not self.multiplex:
+            return
+        with self._lock:
+            if host in self._masters:
+                return
+            self._masters.add(host)
+        cmd = self._ssh_args(host)
+        cmd[-1:-1] = ["-f", "-N"]
+        try:
+            subprocess.run(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self.connect_timeout + 5,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            # The query itself reports the failure
+            logger.debug(f"Failed to start ssh master connection to {host}: {e}")
+
+    def _run(self, host, script):
+        if host == "localhost":
+            cmd = ["bash", "-s"]
+        else:
+            self._connect(host)
+            cmd = [*self._ssh_args(host), "bash -s"]
+        try:
+            result = subprocess.run(
+                cmd,
+                input=script,
+                capture_output=True,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                timeout=self.connect_timeout + 30,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.error(f"Failed to query status on {host}: {e}")
+            return ""
+        if host != "localhost" and result.returncode == _SSH_ERROR_CODE:
+            # Reconnect on the next query
+            with self._lock:
+                self._masters.discard(host)
+            logger.error(f"Failed to query status on {host}: {result.stderr.strip()}")
+            return ""
+        return result.stdout.rstrip()
+
+    def query(self, host, script):
+        """Run the script on the host and return its stdout, cached for ``ttl`` seconds."""
+        key = (host, script)
+        if self.ttl > 0:
+            with self._lock:
+                cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+        output = self._run(host, script)
+        if self.ttl > 0:
+            with self._lock:
+                self._cache[key] = (time.monotonic(), output)
+        return output
+
+    def query_all(self, queries):
+        """
+        Run the scripts of all hosts concurrently.
+
+        Args:
+            queries (list): (host, script) pairs.
+
+        Returns:
+            list: The outputs, in the order of the queries.
+        """
+        start = time.monotonic()
+        if len(queries) <= 1 or self.max_workers <= 1:
+            outputs = [self.query(host, script) for host, script in queries]
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="host-status"
+                )
+            outputs = list(self._executor.map(lambda query: self.query(*query), queries))
+        self.last_sweep_seconds = time.monotonic() - start
+        logger.debug(f"Queried status of {len(queries)} hosts in {self.last_sweep_seconds:.3f}s")
+        return outputs
+
+    def invalidate(self):
+        """Drop all cached results, e.g. after the job was started or stopped."""
+        with self._lock:
+            self._cache.clear()
+
+    def close(self, hosts=()):
+        """Stop the pool and ask the master connections of the given hosts to exit."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if not self.multiplex:
+            return
+        for host in hosts:
+            if host == "localhost":
+                continue
+            cmd = self._ssh_args(host)
+            cmd[-1:-1] = ["-O", "exit"]
+            subprocess.run(cmd, capture_output=True, check=False)
+            self._masters.discard(host)
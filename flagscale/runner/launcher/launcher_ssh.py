@@ -1,4 +1,3 @@
-import asyncio
 import multiprocessing
 import os
 import shlex
@@ -10,11 +9,11 @@ from datetime import datetime
 from omegaconf import DictConfig, OmegaConf
 
 from flagscale.runner.elastic.monitor_service import MonitorService
+from flagscale.runner.launcher.host_status import HostStatusPoller
 from flagscale.runner.launcher.launcher_base import LauncherBase
 from flagscale.runner.utils import (
     JobStatus,
     add_decive_extra_config,
-    benchmark,
     dummy_random_input,
     get_free_port,
     get_nnodes,
@@ -22,6 +21,7 @@ from flagscale.runner.utils import (
     logger,
     parse_hostfile,
     run_local_command,
+    run_profile_benchmark,
     run_scp_command,
     run_ssh_command,
     update_cmd_with_node_specific_config,
@@ -187,6 +187,22 @@ class SshLauncher(LauncherBase):
             "elastic",
             "gpu_health_check.py",
         )
+        self._status_poller = None
+
+    @property
+    def status_poller(self):
+        """Poller used by the status queries, configured by experiment.runner."""
+        if self._status_poller is None:
+            runner_config = self.config.experiment.runner
+            self._status_poller = HostStatusPoller(
+                ssh_port=runner_config.get("ssh_port", 22),
+                max_workers=runner_config.get("query_max_workers", 32),
+                ttl=runner_config.get("query_cache_ttl", 2.0),
+                multiplex=runner_config.get("ssh_multiplex", True),
+                control_persist=runner_config.get("ssh_control_persist", 600),
+                ssh_command=runner_config.get("ssh_command", "ssh"),
+            )
+        return self._status_poller
 
     def _run_each(
         self,
@@ -317,6 +333,8 @@ class SshLauncher(LauncherBase):
         enable_monitoring=None,
         enable_gpu_health_check=None,
     ):
+        # Cached statuses describe the previous job
+        self.status_poller.invalidate()
         if enable_gpu_health_check is None:
             enable_gpu_health_check = self.config.experiment.runner.get(
                 "enable_gpu_health_check", False
@@ -476,6 +494,7 @@ class SshLauncher(LauncherBase):
                 run_local_command(f"bash {host_stop_script_file}")
 
     def stop(self):
+        self.status_poller.invalidate()
         if self.resources is None or self.task_type == "serve":
             self._stop_each("localhost", 0)
             return
@@ -575,88 +594,31 @@ class SshLauncher(LauncherBase):
 
     def _query_each(self, host, node_rank):
         "Query each node status."
-        host_query_script_file = self._generate_query_script(host, node_rank)
-        if self.task_type == "train":
-            logging_config = self.config.train.system.logging
-        elif self.task_type == "serve":
-            logging_config = self.config.logging
-        result = ""
-        if self.task_type == "serve":
-            try:
-                result = run_local_command(f"bash {host_query_script_file}", query=True)
-            except Exception as e:
-                logger.error(f"Failed to query job status on {host}: {e}")
-        else:
-            if host != "localhost":
-                ssh_port = self.config.experiment.runner.get("ssh_port", 22)
-                # Step 1: make sure the scripts_dir exists on the remote host
-                run_ssh_command(
-                    host, f"mkdir -p {logging_config.scripts_dir}", ssh_port, query=True
-                )
-                # Step 2: copy the host_run_script_file to the remote host
-                no_shared_fs = self.config.experiment.runner.get("no_shared_fs", False)
-                if no_shared_fs:
-                    run_scp_command(
-                        host, host_query_script_file, logging_config.scripts_dir, ssh_port
-                    )
-                # Step 3: run the host_run_script_file on the remote host
-                try:
-                    result = run_ssh_command(
-                        host, f"bash {host_query_script_file}", ssh_port, query=True
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to query job status on {host}: {e}")
-            else:
-                try:
-                    result = run_local_command(f"bash {host_query_script_file}", query=True)
-                except Exception as e:
-                    logger.error(f"Failed to query job status on {host}: {e}")
-        result = result.stdout.rstrip() if result else ""
-        return result
+        return self._query_hosts([(host, node_rank)], self._generate_query_script)[0]
 
     def _query_each_sub_process(self, host, node_rank):
         "Query each node sub process status."
-        host_query_script_file = self._generate_query_sub_process_script(host, node_rank)
-        if self.task_type == "train":
-            logging_config = self.config.train.system.logging
-        elif self.task_type == "serve":
-            logging_config = self.config.logging
-        result = ""
-        if host != "localhost":
-            ssh_port = self.config.experiment.runner.get("ssh_port", 22)
-            # Step 1: make sure the scripts_dir exists on the remote host
-            run_ssh_command(host, f"mkdir -p {logging_config.scripts_dir}", ssh_port, query=True)
-            # Step 2: copy the host_run_script_file to the remote host
-            no_shared_fs = self.config.experiment.runner.get("no_shared_fs", False)
-            if no_shared_fs:
-                run_scp_command(host, host_query_script_file, logging_config.scripts_dir, ssh_port)
-            # Step 3: run the host_run_script_file on the remote host
-            try:
-                result = run_ssh_command(
-                    host, f"bash {host_query_script_file}", ssh_port, query=True
-                )
-            except Exception as e:
-                logger.error(f"Failed to query sub process status on {host}: {e}")
-        else:
-            try:
-                result = run_local_command(f"bash {host_query_script_file}", query=True)
-            except Exception as e:
-                logger.error(f"Failed to query sub process status on {host}: {e}")
-        result = result.stdout.rstrip() if result else ""
-        return result
+        return self._query_hosts([(host, node_rank)], self._generate_query_sub_process_script)[0]
+
+    def _query_hosts(self, hosts, generate_script):
+        """
+        Run a generated query script on the given (host, node_rank) pairs concurrently.
+        The script is streamed to the remote shell, so it does not need to be copied there.
+        """
+        queries = []
+        for host, node_rank in hosts:
+            with open(generate_script(host, node_rank)) as f:
+                queries.append((host, f.read()))
+        return self.status_poller.query_all(queries)
+
+    def _query_targets(self):
+        if self.resources is None or self.task_type == "serve":
+            return [("localhost", 0)]
+        return [(host, node_rank) for node_rank, host in enumerate(self.resources)]
 
     def _query_status(self):
         "Query Job status."
-        results = []
-        if self.resources is None or self.task_type == "serve":
-            result = self._query_each("localhost", 0)
-            results.append(result)
-        else:
-            host_list = list(self.resources.keys())
-            for host, _ in self.resources.items():
-                node_rank = host_list.index(host)
-                result = self._query_each(host, node_rank)
-                results.append(result)
+        results = self._query_hosts(self._query_targets(), self._generate_query_script)
         if all((status != "" and status != "Z") for status in results):
             job_status = JobStatus.RUNNING
         elif all((status == "" or status == "Z") for status in results):
@@ -667,22 +629,13 @@ class SshLauncher(LauncherBase):
 
     def _query_sub_process_status(self):
         "Query sub process status."
-        results = []
-        if self.resources is None:
-            result = self._query_each_sub_process("localhost", 0)
-            results.append(result)
-
-        else:
-            host_list = list(self.resources.keys())
-            for host, _ in self.resources.items():
-                node_rank = host_list.index(host)
-                result = self._query_each_sub_process(host, node_rank)
-                results.append(result)
-        if all(status for status in results):
-            status = True
-        else:
-            status = False
-        return status
+        hosts = (
+            [("localhost", 0)]
+            if self.resources is None
+            else [(host, node_rank) for node_rank, host in enumerate(self.resources)]
+        )
+        results = self._query_hosts(hosts, self._generate_query_sub_process_script)
+        return all(status for status in results)
 
     def query_once(self):
         """
@@ -816,18 +769,13 @@ class SshLauncher(LauncherBase):
         api_url = f"http://{self.host}:{self.port}/v1/chat/completions"
         logger.info(f"Profiling API {api_url}")
 
-        ### allow metric = [\"ttft\", \"tpot\", \"itl\", \"e2el\"]
-        ### allow percentiles = [\"25,50,75\"]
-        result = asyncio.run(
-            benchmark(
-                api_url,
-                model=model_name,
-                served_model_name=served_model_name,
-                tokenizer=tokenizer,
-                input_requests=dummy_input_requests,
-                selected_percentile_metrics="ttft,tpot,itl,e2el".split(","),
-                selected_percentiles=[float(99)],
-            )
+        result = run_profile_benchmark(
+            api_url,
+            model=model_name,
+            served_model_name=served_model_name,
+            tokenizer=tokenizer,
+            input_requests=dummy_input_requests,
+            profile_args=profile_args,
         )
         return result
 
@@ -1,4 +1,3 @@
-import asyncio
 import collections
 import contextlib
 import copy
@@ -16,7 +15,6 @@ from omegaconf import DictConfig, OmegaConf
 from flagscale.runner.runner_base_legacy import JobStatus, RunnerBase
 from flagscale.runner.utils import (
     ResourceManager,
-    benchmark,
     dummy_random_input,
     flatten_dict_to_args,
     get_addr,
@@ -28,6 +26,7 @@ from flagscale.runner.utils import (
     logger,
     parse_hostfile,
     run_local_command,
+    run_profile_benchmark,
     wait_for_ray_master,
 )
 
@@ -1280,18 +1279,13 @@ class SSHServeRunner(RunnerBase):
         api_url = f"http://{self.host}:{self.port}/v1/chat/completions"
         logger.info(f"Profiling API {api_url}")
 
-        ### allow metric = [\"ttft\", \"tpot\", \"itl\", \"e2el\"]
-        ### allow percentiles = [\"25,50,75\"]
-        result = asyncio.run(
-            benchmark(
-                api_url,
-                model=model_name,
-                served_model_name=served_model_name,
-                tokenizer=tokenizer,
-                input_requests=dummy_input_requests,
-                selected_percentile_metrics="ttft,tpot,itl,e2el".split(","),
-                selected_percentiles=[float(99)],
-            )
+        result = run_profile_benchmark(
+            api_url,
+            model=model_name,
+            served_model_name=served_model_name,
+            tokenizer=tokenizer,
+            input_requests=dummy_input_requests,
+            profile_args=profile_args,
         )
         return result
 
@@ -637,102 +637,168 @@ def dummy_random_input(
 
 
 async def async_request_openai_chat_completions(
-    request_func_input: RequestFuncInput, pbar: tqdm | None = None
+    request_func_input: RequestFuncInput,
+    pbar: tqdm | None = None,
+    session: aiohttp.ClientSession | None = None,
 ) -> RequestFuncOutput:
+    if session is None:
+        async with aiohttp.ClientSession(trust_env=True, timeout=AIOHTTP_TIMEOUT) as session:
+            return await async_request_openai_chat_completions(request_func_input, pbar, session)
+
     api_url = request_func_input.api_url
     assert api_url.endswith(("chat/completions", "profile")), (
         "OpenAI Chat Completions API URL must end with 'chat/completions'."
     )
 
-    async with aiohttp.ClientSession(trust_env=True, timeout=AIOHTTP_TIMEOUT) as session:
-        content = [{"type": "text", "text": request_func_input.prompt}]
-        if request_func_input.multi_modal_content:
-            content.append(request_func_input.multi_modal_content)
-        payload = {
-            "model": (
-                request_func_input.model_name
-                if request_func_input.model_name
-                else request_func_input.model
-            ),
-            "messages": [{"role": "user", "content": content}],
-            "temperature": 0.0,
-            "max_completion_tokens": request_func_input.output_len,
-            "stream": True,
-            "stream_options": {"include_usage": True},
-            # max_completion_tokens is invalid for llama.cpp
-            "n_predict": request_func_input.output_len,
-        }
-        if request_func_input.ignore_eos:
-            payload["ignore_eos"] = request_func_input.ignore_eos
-        if request_func_input.extra_body:
-            payload.update(request_func_input.extra_body)
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}",
-        }
+    content = [{"type": "text", "text": request_func_input.prompt}]
+    if request_func_input.multi_modal_content:
+        content.append(request_func_input.multi_modal_content)
+    payload = {
+        "model": (
+            request_func_input.model_name
+            if request_func_input.model_name
+            else request_func_input.model
+        ),
+        "messages": [{"role": "user", "content": content}],
+        "temperature": 0.0,
+        "max_completion_tokens": request_func_input.output_len,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        # max_completion_tokens is invalid for llama.cpp
+        "n_predict": request_func_input.output_len,
+    }
+    if request_func_input.ignore_eos:
+        payload["ignore_eos"] = request_func_input.ignore_eos
+    if request_func_input.extra_body:
+        payload.update(request_func_input.extra_body)
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}",
+    }
 
-        output = RequestFuncOutput()
-        output.prompt_len = request_func_input.prompt_len
-
-        generated_text = ""
-        ttft = 0.0
-        st = time.perf_counter()
-        most_recent_timestamp = st
-        try:
-            async with session.post(url=api_url, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    async for chunk_bytes in response.content:
-                        chunk_bytes = chunk_bytes.strip()
-                        if not chunk_bytes:
-                            continue
-
-                        chunk = chunk_bytes.decode("utf-8").removeprefix("data: ")
-                        if chunk != "[DONE]":
-                            timestamp = time.perf_counter()
-                            data = json.loads(chunk)
-
-                            if choices := data.get("choices"):
-                                content = choices[0]["delta"].get("content")
-                                # First token
-                                if ttft == 0.0:
-                                    ttft = timestamp - st
-                                    output.ttft = ttft
-
-                                # Decoding phase
-                                else:
-                                    output.itl.append(timestamp - most_recent_timestamp)
-
-                                generated_text += content or ""
-
-                            # llamap.cpp's last response has "choices", bot delta is null
-                            # sglang's response has key "usage" but value is null
-                            if usage := data.get("usage", {}):
-                                if completion_tokens := usage.get("completion_tokens"):
-                                    output.output_tokens = completion_tokens
-
-                            most_recent_timestamp = timestamp
-
-                    output.generated_text = generated_text
-                    output.success = True
-                    output.latency = most_recent_timestamp - st
-                else:
-                    output.error = response.reason or ""
-                    output.success = False
-        except Exception:
-            output.success = False
-            exc_info = sys.exc_info()
-            output.error = "".join(traceback.format_exception(*exc_info))
+    output = RequestFuncOutput()
+    output.prompt_len = request_func_input.prompt_len
+
+    generated_text = ""
+    ttft = 0.0
+    st = time.perf_counter()
+    most_recent_timestamp = st
+    try:
+        async with session.post(url=api_url, json=payload, headers=headers) as response:
+            if response.status == 200:
+                async for chunk_bytes in response.content:
+                    chunk_bytes = chunk_bytes.strip()
+                    if not chunk_bytes:
+                        continue
+
+                    chunk = chunk_bytes.decode("utf-8").removeprefix("data: ")
+                    if chunk != "[DONE]":
+                        timestamp = time.perf_counter()
+                        data = json.loads(chunk)
+
+                        if choices := data.get("choices"):
+                            content = choices[0]["delta"].get("content")
+                            # First token
+                            if ttft == 0.0:
+                                ttft = timestamp - st
+                                output.ttft = ttft
+
+                            # Decoding phase
+                            else:
+                                output.itl.append(timestamp - most_recent_timestamp)
+
+                            generated_text += content or ""
+
+                        # llamap.cpp's last response has "choices", bot delta is null
+                        # sglang's response has key "usage" but value is null
+                        if usage := data.get("usage", {}):
+                            if completion_tokens := usage.get("completion_tokens"):
+                                output.output_tokens = completion_tokens
+
+                        most_recent_timestamp = timestamp
+
+                output.generated_text = generated_text
+                output.success = True
+                output.latency = most_recent_timestamp - st
+            else:
+                output.error = response.reason or ""
+                output.success = False
+    except Exception:
+        output.success = False
+        exc_info = sys.exc_info()
+        output.error = "".join(traceback.format_exception(*exc_info))
 
     if pbar:
         pbar.update(1)
     return output
 
 
-async def get_request(input_requests):
-    input_requests = iter(input_requests)
+async def get_request(input_requests, request_rate=float("inf"), burstiness=1.0):
+    """
+    Yield requests following an open-loop arrival process.
+    :param request_rate: mean requests per second; inf sends every request at once.
+    :param burstiness: shape of the gamma inter-arrival distribution; 1.0 is a Poisson
+        process, lower values are burstier and higher values are more uniform.
+    """
+    assert burstiness > 0, f"burstiness must be positive, but got {burstiness}."
     # Calculate scale parameter theta to maintain the desired request_rate.
+    theta = 1.0 / (request_rate * burstiness)
     for request in input_requests:
         yield request
+        if request_rate == float("inf"):
+            continue
+        await asyncio.sleep(np.random.gamma(shape=burstiness, scale=theta))
+
+
+def span_rate(timestamps):
+    """Events per second between the first and the last of the sorted timestamps."""
+    if len(timestamps) < 2:
+        return float("inf") if timestamps else 0.0
+    span = timestamps[-1] - timestamps[0]
+    return (len(timestamps) - 1) / span if span > 0 else float("inf")
+
+
+def find_saturation_knee(sweep_results, threshold=0.9):
+    """
+    Find the highest offered request rate the server still sustains.
+    A rate is sustained when requests complete as fast as they arrived and, if SLOs are set,
+    most completed requests meet them.
+
+    Arrivals are compared with completions over their own spans (``arrival_rate`` and
+    ``completion_rate`` of a benchmark result), not with ``request_throughput``: the benchmark
+    duration includes draining the last responses, so with few prompts and long outputs even an
+    idle server would look saturated. Results without these keys fall back to the offered rate
+    and the request throughput.
+    :param sweep_results: benchmark results ordered by increasing ``request_rate``.
+    :param threshold: minimum completion/arrival (and goodput/throughput) ratio.
+    :return: the result at the knee, or None if even the lowest rate saturates.
+    """
+    knee = None
+    for result in sweep_results:
+        arrival_rate = result.get("arrival_rate", result["request_rate"])
+        completion_rate = result.get("completion_rate", result["request_throughput"])
+        if completion_rate < threshold * arrival_rate:
+            break
+        goodput = result.get("request_goodput")
+        if goodput is not None and goodput < threshold * result["request_throughput"]:
+            break
+        knee = result
+    return knee
+
+
+def make_warmup_requests(input_requests, num_requests):
+    """
+    Copies of the first requests with a unique prefix in front of each prompt.
+
+    Prefix caching is keyed on the leading tokens, so the warmup shares no cached block with the
+    measured requests and cannot make their TTFT look better than a cold run.
+    """
+    warmup = []
+    for i in range(num_requests):
+        prompt, prompt_len, output_len, mm_content = input_requests[i % len(input_requests)]
+        salt = f"[warmup {i} {os.urandom(4).hex()}] "
+        warmup.append((salt + prompt, prompt_len, output_len, mm_content))
+    return warmup
 
 
 async def benchmark(
@@ -743,22 +809,24 @@ async def benchmark(
     input_requests,
     selected_percentile_metrics,
     selected_percentiles,
+    request_rate=float("inf"),
+    burstiness=1.0,
+    max_concurrency=None,
+    warmup_requests=0,
+    goodput_config=None,
+    bucket_seconds=1.0,
+    metrics_export_path=None,
 ):
-    async def limited_request_func(request_func_input, pbar):
-        return await request_func(request_func_input=request_func_input, pbar=pbar)
+    ### import here to avoid dependency issue
+    from flagscale.serve.metric import StreamingMetrics, resolve_output_len
 
     request_func = async_request_openai_chat_completions
     req_model_id = model
     req_model_name = served_model_name if served_model_name is not None else model
 
-    pbar = tqdm(total=len(input_requests))
-
-    benchmark_start_time = time.perf_counter()
-    tasks = []
-    async for request in get_request(input_requests):
+    def make_request_input(request):
         prompt, prompt_len, output_len, mm_content = request
-
-        request_func_input = RequestFuncInput(
+        return RequestFuncInput(
             model=req_model_id,
             model_name=req_model_name,
             prompt=prompt,
@@ -767,27 +835,78 @@ async def benchmark(
             output_len=output_len,
             multi_modal_content=mm_content,
         )
-        tasks.append(
-            asyncio.create_task(
-                limited_request_func(request_func_input=request_func_input, pbar=pbar)
-            )
-        )
-    outputs = await asyncio.gather(*tasks)
-    pbar.close()
 
-    benchmark_duration = time.perf_counter() - benchmark_start_time
+    # One pooled session for all requests, so connection setup is not measured
+    connector = aiohttp.TCPConnector(limit=max_concurrency or 0, keepalive_timeout=60)
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    async with aiohttp.ClientSession(
+        connector=connector, trust_env=True, timeout=AIOHTTP_TIMEOUT
+    ) as session:
+
+        async def limited_request_func(request_func_input, pbar):
+            if semaphore is None:
+                return await request_func(
+                    request_func_input=request_func_input, pbar=pbar, session=session
+                )
+            async with semaphore:
+                return await request_func(
+                    request_func_input=request_func_input, pbar=pbar, session=session
+                )
 
-    ### import here to avoid dependency issue
-    from flagscale.serve.metric import calculate_metrics
+        if warmup_requests and input_requests:
+            logger.info(f"Sending {warmup_requests} warmup requests, excluded from metrics")
+            await asyncio.gather(
+                *(
+                    limited_request_func(make_request_input(request), None)
+                    for request in make_warmup_requests(input_requests, warmup_requests)
+                )
+            )
 
-    metrics, actual_output_lens = calculate_metrics(
-        input_requests=input_requests,
-        outputs=outputs,
-        dur_s=benchmark_duration,
-        tokenizer=tokenizer,
-        selected_percentile_metrics=selected_percentile_metrics,
-        selected_percentiles=selected_percentiles,
-    )
+        logger.info(
+            f"Traffic request rate: {request_rate}, burstiness: {burstiness}, "
+            f"max concurrency: {max_concurrency}"
+        )
+        pbar = tqdm(total=len(input_requests))
+        aggregator = StreamingMetrics(bucket_seconds, goodput_config=goodput_config)
+
+        async def measured_request_func(request):
+            output = await limited_request_func(make_request_input(request), pbar)
+            finished_at = time.perf_counter() - benchmark_start_time
+            if output.success and output.output_tokens is None:
+                # Tokenize off the event loop so that in-flight requests are not delayed
+                output_len = await asyncio.to_thread(resolve_output_len, output, tokenizer)
+            else:
+                output_len = resolve_output_len(output, tokenizer)
+            if output.success:
+                finish_times.append(finished_at)
+            row = aggregator.add(output, request[1], output_len, finished_at)
+            if row is not None:
+                logger.info(
+                    f"[{row['start_s']:.0f}s-{row['end_s']:.0f}s] "
+                    f"completed: {row['completed']}, failed: {row['failed']}, "
+                    f"output tok/s: {row['output_throughput']:.2f}, "
+                    f"p99 TTFT: {row['p99_ttft_ms']:.2f}ms, p99 ITL: {row['p99_itl_ms']:.2f}ms"
+                )
+            # Per-token data now lives in the aggregator, drop it to bound memory
+            output.itl = []
+            output.generated_text = ""
+
+        benchmark_start_time = time.perf_counter()
+        tasks = []
+        arrival_times = []
+        finish_times = []
+        async for request in get_request(input_requests, request_rate, burstiness):
+            arrival_times.append(time.perf_counter() - benchmark_start_time)
+            tasks.append(asyncio.create_task(measured_request_func(request)))
+        await asyncio.gather(*tasks)
+        pbar.close()
+
+        benchmark_duration = time.perf_counter() - benchmark_start_time
+
+    metrics = aggregator.summary(benchmark_duration, selected_percentiles)
+    if metrics_export_path:
+        aggregator.export(metrics_export_path, benchmark_duration)
+        logger.info(f"Benchmark time series saved to {metrics_export_path}")
 
     print("{s:{c}^{n}}".format(s=" Serving Benchmark Result ", n=50, c="="))
     print("{:<40} {:<10}".format("Successful requests:", metrics.completed))
@@ -795,6 +914,8 @@ async def benchmark(
     print("{:<40} {:<10}".format("Total input tokens:", metrics.total_input))
     print("{:<40} {:<10}".format("Total generated tokens:", metrics.total_output))
     print("{:<40} {:<10.2f}".format("Request throughput (req/s):", metrics.request_throughput))
+    if goodput_config:
+        print("{:<40} {:<10.2f}".format("Request goodput (req/s):", metrics.request_goodput))
     print("{:<40} {:<10.2f}".format("Output token throughput (tok/s):", metrics.output_throughput))
     print(
         "{:<40} {:<10.2f}".format("Total Token throughput (tok/s):", metrics.total_token_throughput)
@@ -803,9 +924,15 @@ async def benchmark(
     result = {
         "duration": benchmark_duration,
         "completed": metrics.completed,
+        "request_rate": request_rate,
+        "burstiness": burstiness,
+        "max_concurrency": max_concurrency,
         "total_input_tokens": metrics.total_input,
         "total_output_tokens": metrics.total_output,
         "request_throughput": metrics.request_throughput,
+        "request_goodput": metrics.request_goodput if goodput_config else None,
+        "arrival_rate": span_rate(arrival_times),
+        "completion_rate": span_rate(sorted(finish_times)),
         "output_throughput": metrics.output_throughput,
         "total_token_throughput": metrics.total_token_throughput,
     }
@@ -858,6 +985,89 @@ async def benchmark(
     return result
 
 
+async def sweep_request_rates(request_rates, saturation_threshold=0.9, **benchmark_kwargs):
+    """
+    Benchmark at increasing request rates until the server saturates.
+    :param request_rates: offered request rates to try, in requests per second.
+    :param saturation_threshold: see ``find_saturation_knee``.
+    :param benchmark_kwargs: forwarded to ``benchmark``.
+    :return: (results of every rate run, result at the saturation knee or None)
+    """
+    results = []
+    export_path = benchmark_kwargs.pop("metrics_export_path", None)
+    for rate in sorted(float(r) for r in request_rates):
+        if export_path:
+            root, ext = os.path.splitext(export_path)
+            benchmark_kwargs["metrics_export_path"] = f"{root}_rate{rate:g}{ext}"
+        results.append(await benchmark(request_rate=rate, **benchmark_kwargs))
+        # Higher rates can only be more saturated, stop at the first saturated point
+        if find_saturation_knee(results, saturation_threshold) is not results[-1]:
+            break
+    knee = find_saturation_knee(results, saturation_threshold)
+    logger.info(f"Saturation knee at request rate: {knee['request_rate'] if knee else None}")
+    return results, knee
+
+
+def run_profile_benchmark(
+    api_url, model, served_model_name, tokenizer, input_requests, profile_args
+):
+    """
+    Run the serve benchmark described by the ``profile`` block of a serve config.
+
+    With ``request_rates`` set, the rates are swept and the result at the saturation knee is
+    returned together with ``saturation_request_rate``; otherwise a single run at
+    ``request_rate`` (default: all requests at once) is returned.
+    """
+    goodput_config = profile_args.get("goodput", None)
+    benchmark_kwargs = dict(
+        api_url=api_url,
+        model=model,
+        served_model_name=served_model_name,
+        tokenizer=tokenizer,
+        input_requests=input_requests,
+        ### allow metric = [\"ttft\", \"tpot\", \"itl\", \"e2el\"]
+        ### allow percentiles = [\"25,50,75\"]
+        selected_percentile_metrics="ttft,tpot,itl,e2el".split(","),
+        selected_percentiles=[float(99)],
+        burstiness=float(profile_args.get("burstiness", 1.0)),
+        max_concurrency=profile_args.get("max_concurrency", None),
+        warmup_requests=profile_args.get("warmup_requests", 0),
+        goodput_config=dict(goodput_config) if goodput_config else None,
+        bucket_seconds=float(profile_args.get("bucket_seconds", 1.0)),
+        metrics_export_path=profile_args.get("metrics_export", None),
+    )
+    request_rates = profile_args.get("request_rates", None)
+    if not request_rates:
+        request_rate = float(profile_args.get("request_rate", "inf"))
+        return asyncio.run(benchmark(request_rate=request_rate, **benchmark_kwargs))
+
+    results, knee = asyncio.run(
+        sweep_request_rates(
+            list(request_rates),
+            saturation_threshold=profile_args.get("saturation_threshold", 0.9),
+            **benchmark_kwargs,
+        )
+    )
+    result = dict(knee or results[0])
+    result["saturation_request_rate"] = knee["request_rate"] if knee else 0.0
+    result["sweep"] = [
+        {
+            key: item[key]
+            for key in (
+                "request_rate",
+                "arrival_rate",
+                "completion_rate",
+                "request_throughput",
+                "request_goodput",
+                "mean_ttft_ms",
+            )
+            if key in item
+        }
+        for item in results
+    ]
+    return result
+
+
 class ResourceManager:
     def __init__(self, nodes):
         """
@@ -1,3 +1,5 @@
+import asyncio
+import inspect
 import socket
 
 from flagscale.logger import logger
@@ -30,3 +32,129 @@ def check_and_get_port(target_port=None, host="0.0.0.0"):
             else:
                 logger.warning(f"Port {port} is occupied. Allocated free port: {free_port}")
             return free_port
+
+
+def normalize_depends(depends):
+    """
+    Normalize a node's ``depends`` field to a list of node names.
+    :param depends: None, a single node name or a sequence of node names.
+    :return: list of dependency names, in declaration order.
+    """
+    if not depends:
+        return []
+    if isinstance(depends, str):
+        return [depends]
+    return list(depends)
+
+
+def topological_order(dependencies, root=None):
+    """
+    Order nodes so that every node comes after all of its dependencies.
+    :param dependencies: mapping from node name to the list of nodes it depends on.
+    :param root: if given, only the root and its ancestors are ordered.
+    :return: list of node names in topological order.
+    """
+    order = []
+    state = {}  # node -> "visiting" | "done"
+
+    def _visit(node):
+        if state.get(node) == "done":
+            return
+        if state.get(node) == "visiting":
+            raise ValueError(f"The graph contains a cycle through node {node!r}.")
+        if node not in dependencies:
+            raise ValueError(f"Unknown node {node!r} in the graph.")
+        state[node] = "visiting"
+        for dep in dependencies[node]:
+            _visit(dep)
+        state[node] = "done"
+        order.append(node)
+
+    for node in [root] if root is not None else dependencies:
+        _visit(node)
+    return order
+
+
+async def execute_dag(dependencies, root, call_node, order=None):
+    """
+    Run the DAG ending at ``root``, scheduling every node as soon as its dependencies resolve.
+
+    Each node is wrapped in exactly one future per call, so independent branches run
+    concurrently and a shared ancestor is computed once no matter how many branches need it.
+    :param dependencies: mapping from node name to the list of nodes it depends on.
+    :param root: the node whose result is returned.
+    :param call_node: ``async (node_name, dep_results) -> result``; ``dep_results`` is empty
+        for source nodes.
+    :param order: precomputed ``topological_order(dependencies, root)``.
+    :return: the result of the root node.
+    """
+    if order is None:
+        order = topological_order(dependencies, root)
+    futures = {}
+
+    async def _run(node):
+        deps = dependencies[node]
+        dep_results = list(await asyncio.gather(*(futures[dep] for dep in deps))) if deps else []
+        return await call_node(node, dep_results)
+
+    # Topological order guarantees dependency futures exist before their consumers start.
+    for node in order:
+        futures[node] = asyncio.ensure_future(_run(node))
+
+    try:
+        return await futures[root]
+    finally:
+        for future in futures.values():
+            if not future.done():
+                future.cancel()
+        # Retrieve every outcome so failed branches do not log "exception never retrieved".
+        await asyncio.gather(*futures.values(), return_exceptions=True)
+
+
+def is_streaming_forward(forward):
+    """Return True if ``forward`` is a generator or async generator function."""
+    return inspect.isgeneratorfunction(forward) or inspect.isasyncgenfunction(forward)
+
+
+class ChunkStream:
+    """
+    Replayable view over an async chunk source.
+
+    The source is pulled at most once; every chunk is buffered so that several downstream
+    consumers can iterate the same stream independently, each at its own pace.
+    """
+
+    def __init__(self, source):
+        self._source = source
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._lock = asyncio.Lock()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        index = 0
+        while True:
+            while index < len(self._chunks):
+                yield self._chunks[index]
+                index += 1
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                return
+            async with self._lock:
+                # Another consumer may have pulled while we waited for the lock.
+                if index == len(self._chunks) and not self._done:
+                    try:
+                        self._chunks.append(await self._source.__anext__())
+                    except StopAsyncIteration:
+                        self._done = True
+                    except Exception as e:
+                        self._error = e
+                        self._done = True
+
+    async def collect(self):
+        """Drain the stream and return all chunks as a list."""
+        return [chunk async for chunk in self]
@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import aiohttp
+
+
+def prompt_hash(prompt) -> str:
+    """
+    Stable digest of a prompt (a string or a list of chat messages).
+    :param prompt: text prompt or JSON-serializable chat messages.
+    :return: hex digest used as a cache key.
+    """
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class InstanceSessionPool:
+    """
+    Long-lived aiohttp sessions, one per P/D instance.
+
+    Each instance gets its own connector so that keep-alive connections are reused across
+    requests and the number of concurrent connections to a single instance is bounded.
+    Sessions must be created and closed on the event loop that serves the requests.
+    """
+
+    def __init__(self, limit_per_instance=256, keepalive_timeout=60, timeout=None):
+        self.limit_per_instance = limit_per_instance
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout or aiohttp.ClientTimeout(total=6 * 60 * 60)
+        self._sessions: dict[str, aiohttp.ClientSession] = {}
+
+    def get(self, http_addr: str) -> aiohttp.ClientSession:
+        session = self._sessions.get(http_addr)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit_per_instance,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._sessions[http_addr] = session
+        return session
+
+    async def close(self, http_addr: str):
+        session = self._sessions.pop(http_addr, None)
+        if session is not None:
+            await session.close()
+
+    async def close_all(self):
+        for http_addr in list(self._sessions):
+            await self.close(http_addr)
+
+
+class AsyncTokenCounter:
+    """
+    Runs token counting in a worker pool so tokenization never blocks the event loop.
+
+    Results are memoized in an LRU cache keyed by the prompt hash, and concurrent requests
+    for the same prompt share a single tokenization.
+    """
+
+    def __init__(
+        self, count_chat_fn, count_text_fn, max_workers=4, cache_size=4096, executor="thread"
+    ):
+        if executor == "thread":
+            self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="tokenize")
+        elif executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers)
+        else:
+            raise ValueError(f"Unknown tokenize executor: {executor}")
+        self._count_fns = {"chat": count_chat_fn, "text": count_text_fn}
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def _cache_put(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _on_done(self, key, future):
+        self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self._cache_put(key, future.result())
+
+    async def _count(self, kind, prompt) -> int:
+        key = f"{kind}:{prompt_hash(prompt)}"
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._count_fns[kind], prompt)
+            future.add_done_callback(lambda f: self._on_done(key, f))
+            self._inflight[key] = future
+        # Shield so that one cancelled client does not cancel the shared tokenization.
+        return await asyncio.shield(future)
+
+    async def count_chat(self, messages) -> int:
+        return await self._count("chat", messages)
+
+    async def count_text(self, prompt: str) -> int:
+        return await self._count("text", prompt)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def prompt_text(data) -> str:
+    """
+    Flatten a completion or chat completion request body into the text used for prefix matching.
+    :param data: request body with either ``prompt`` or ``messages``.
+    :return: prompt text, with chat roles kept so different turns do not collide.
+    """
+    if "messages" not in data:
+        prompt = data.get("prompt", "")
+        return prompt if isinstance(prompt, str) else json.dumps(prompt)
+    parts = []
+    for msg in data["messages"]:
+        content = msg.get("content") or ""
+        if isinstance(content, list):
+            content = "".join(part["text"] for part in content if part.get("type") == "text")
+        parts.append(f"<|{msg.get('role', '')}|>{content}")
+    return "".join(parts)
+
+
+class PrefixCacheIndex:
+    """
+    Approximate router-side view of the prefix (KV) cache held by each instance.
+
+    Prompts are split into fixed-size character blocks and every block is identified by a
+    rolling hash of the whole prefix ending at it, so a matching block hash means a matching
+    prefix. Each instance remembers at most ``max_blocks_per_instance`` hashes and evicts the
+    least recently routed ones first.
+    """
+
+    def __init__(self, block_size=128, max_blocks_per_instance=65536):
+        self.block_size = block_size
+        self.max_blocks_per_instance = max_blocks_per_instance
+        self._blocks: dict[str, OrderedDict[int, None]] = {}
+        self._owners: dict[int, set[str]] = {}
+
+    def block_hashes(self, text: str) -> list[int]:
+        hashes = []
+        prev = 0
+        for start in range(0, len(text) - self.block_size + 1, self.block_size):
+            prev = hash((prev, text[start : start + self.block_size]))
+            hashes.append(prev)
+        return hashes
+
+    def match(self, hashes: list[int]) -> dict[str, int]:
+        """Return the number of leading blocks of ``hashes`` cached on each instance."""
+        matched = {}
+        candidates = None
+        for depth, h in enumerate(hashes):
+            owners = self._owners.get(h, set())
+            still = owners if candidates is None else candidates & owners
+            for instance in (candidates or set()) - still:
+                matched[instance] = depth
+            if not still:
+                return matched
+            candidates = still
+        for instance in candidates or ():
+            matched[instance] = len(hashes)
+        return matched
+
+    def insert(self, instance: str, hashes: list[int]):
+        blocks = self._blocks.setdefault(instance, OrderedDict())
+        for h in hashes:
+            if h in blocks:
+                blocks.move_to_end(h)
+            else:
+                blocks[h] = None
+                self._owners.setdefault(h, set()).add(instance)
+        while len(blocks) > self.max_blocks_per_instance:
+            h, _ = blocks.popitem(last=False)
+            self._discard_owner(h, instance)
+
+    def remove_instance(self, instance: str):
+        for h in self._blocks.pop(instance, {}):
+            self._discard_owner(h, instance)
+
+    def _discard_owner(self, h, instance):
+        owners = self._owners.get(h)
+        if owners is not None:
+            owners.discard(instance)
+            if not owners:
+                del self._owners[h]
+
+
+class InstanceHealth:
+    """
+    Liveness and observed throughput of one P/D instance.
+
+    Registrations double as heartbeats. Request failures put the instance in an exponential
+    back-off during which it is skipped, and successful requests feed an EWMA of the
+    instance's tokens/sec that is used to derive its ``compute_ratio``.
+    """
+
+    def __init__(self, alpha=0.2, backoff=5.0, max_backoff=60.0, now=None):
+        self.alpha = alpha
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.last_seen = time.monotonic() if now is None else now
+        self.failures = 0
+        self.down_until = 0.0
+        self.tokens_per_sec = None
+
+    def heartbeat(self, now=None):
+        self.last_seen = time.monotonic() if now is None else now
+
+    def is_alive(self, timeout, now=None) -> bool:
+        now = time.monotonic() if now is None else now
+        return timeout <= 0 or now - self.last_seen <= timeout
+
+    def is_available(self, now=None) -> bool:
+        now = time.monotonic() if now is None else now
+        return now >= self.down_until
+
+    def record_success(self, tokens=0, seconds=0.0):
+        self.failures = 0
+        self.down_until = 0.0
+        if tokens > 0 and seconds > 0:
+            rate = tokens / seconds
+            if self.tokens_per_sec is None:
+                self.tokens_per_sec = rate
+            else:
+                self.tokens_per_sec += self.alpha * (rate - self.tokens_per_sec)
+
+    def record_failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.failures += 1
+        delay = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+        self.down_until = now + delay
+
+    def __repr__(self):
+        rate = "n/a" if self.tokens_per_sec is None else f"{self.tokens_per_sec:.1f}"
+        return f"InstanceHealth(failures={self.failures}, tokens_per_sec={rate})"
+
+
+def compute_ratios(healths: dict[str, InstanceHealth], min_ratio=0.1, max_ratio=10.0):
+    """
+    Relative speed of each instance, normalized so the mean observed instance is 1.0.
+    Instances without observations are assumed to be average.
+    :param healths: mapping from instance address to its health record.
+    :return: mapping from instance address to compute ratio.
+    """
+    observed = [h.tokens_per_sec for h in healths.values() if h.tokens_per_sec]
+    if not observed:
+        return dict.fromkeys(healths, 1.0)
+    mean = sum(observed) / len(observed)
+    return {
+        addr: min(max_ratio, max(min_ratio, h.tokens_per_sec / mean)) if h.tokens_per_sec else 1.0
+        for addr, h in healths.items()
+    }
+
+
+def count_streamed_tokens(chunk: bytes) -> int:
+    """Approximate the tokens in a chunk of an OpenAI-style SSE stream by its data events."""
+    return chunk.count(b"data:") - chunk.count(b"data: [DONE]")
+
+
+class StreamedTokenCounter:
+    """
+    Count the tokens of an OpenAI-style SSE stream read in arbitrary chunks.
+    An event split across chunks is carried over and counted once it is complete.
+    """
+
+    def __init__(self):
+        self.tokens = 0
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> int:
+        """Count the events completed by a chunk, returns the running total."""
+        data = self._tail + chunk
+        end = data.rfind(b"\n\n")
+        if end < 0:
+            self._tail = data
+        else:
+            self.tokens += count_streamed_tokens(data[: end + 2])
+            self._tail = data[end + 2 :]
+        return self.tokens
+
+    def finish(self) -> int:
+        """Count a last event that was not terminated by a blank line, returns the total."""
+        self.tokens += count_streamed_tokens(self._tail)
+        self._tail = b""
+        return self.tokens
@@ -2,6 +2,7 @@ import ast
 import importlib
 import importlib.util
 import inspect
+import json
 import logging
 import os
 import sys
@@ -13,11 +14,20 @@ import numpy as np
 import omegaconf
 import ray
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from omegaconf import DictConfig, OmegaConf
 from pydantic import BaseModel, create_model
 from ray import serve
 from ray.serve.handle import DeploymentHandle
 
+from flagscale.serve.dag_utils import (
+    ChunkStream,
+    execute_dag,
+    is_streaming_forward,
+    normalize_depends,
+    topological_order,
+)
+
 # from flagscale.logger import logger
 logger = logging.getLogger("ray.serve")
 logger.setLevel(logging.INFO)
@@ -200,61 +210,109 @@ def make_deployment(logic_cls, **deploy_kwargs):
             self.logic = logic_cls()
 
         async def forward(self, *args, **kwargs):
+            if is_streaming_forward(self.logic.forward):
+                return [chunk async for chunk in self.forward_stream(*args, **kwargs)]
             if inspect.iscoroutinefunction(self.logic.forward):
                 return await self.logic.forward(*args, **kwargs)
             return self.logic.forward(*args, **kwargs)
 
+        async def forward_stream(self, *args, **kwargs):
+            """Yield the chunks of a generator forward; a plain forward yields one chunk."""
+            if inspect.isasyncgenfunction(self.logic.forward):
+                async for chunk in self.logic.forward(*args, **kwargs):
+                    yield chunk
+            elif inspect.isgeneratorfunction(self.logic.forward):
+                for chunk in self.logic.forward(*args, **kwargs):
+                    yield chunk
+            else:
+                yield await self.forward(*args, **kwargs)
+
     return WrappedModel
 
 
+def _encode_chunk(chunk):
+    if isinstance(chunk, (bytes, str)):
+        return chunk
+    return json.dumps(chunk) + "\n"
+
+
 @serve.deployment
 class FinalModel:
     def __init__(
-        self, graph_config: dict[str, Any], handles: dict[str, DeploymentHandle], config: DictConfig
+        self,
+        graph_config: dict[str, Any],
+        handles: dict[str, DeploymentHandle],
+        config: DictConfig,
+        streaming_nodes: set[str] | None = None,
     ):
         self.graph_config = graph_config
         self.handles = handles
+        self.streaming_nodes = set(streaming_nodes or ())
+
+        self.dependencies = {
+            name: normalize_depends(cfg.get("depends")) for name, cfg in graph_config.items()
+        }
 
         # determine return nodes
         all_nodes = set(graph_config.keys())
-        dep_nodes = {dep for cfg in graph_config.values() for dep in cfg.get("depends", [])}
+        dep_nodes = {dep for deps in self.dependencies.values() for dep in deps}
         self.roots = list(all_nodes - dep_nodes)
         assert len(self.roots) == 1, "Only one return node is allowed"
+        self.order = topological_order(self.dependencies, self.roots[0])
         request_config = config.experiment.runner.deploy.request
         self.request_base = build_request_model(request_config)
 
+    async def _invoke(self, node_name, *args, **kwargs):
+        handle = self.handles[node_name]
+        if node_name in self.streaming_nodes:
+            response = handle.options(stream=True).forward_stream.remote(*args, **kwargs)
+            return ChunkStream(aiter(response))
+        return await handle.forward.remote(*args, **kwargs)
+
+    async def _feed_incrementally(self, node_name, dep_results, stream_index):
+        """Call the node once per chunk of its streaming input and stream what it returns."""
+        async for chunk in dep_results[stream_index]:
+            args = list(dep_results)
+            args[stream_index] = chunk
+            result = await self._invoke(node_name, *args)
+            if isinstance(result, ChunkStream):
+                async for out in result:
+                    yield out
+            else:
+                yield result
+
+    async def _call_node(self, node_name, dep_results, request_data):
+        if not dep_results:
+            return await self._invoke(node_name, **request_data)
+
+        stream_index = None
+        if self.graph_config[node_name].get("stream_input", False):
+            stream_index = next(
+                (i for i, r in enumerate(dep_results) if isinstance(r, ChunkStream)), None
+            )
+        # Only one input is fed chunk by chunk; any other streaming input is passed whole.
+        dep_results = [
+            await r.collect() if isinstance(r, ChunkStream) and i != stream_index else r
+            for i, r in enumerate(dep_results)
+        ]
+        if stream_index is not None:
+            return ChunkStream(self._feed_incrementally(node_name, dep_results, stream_index))
+        return await self._invoke(node_name, *dep_results)
+
     async def __call__(self, http_request):
         origin_request = await http_request.json()
         request_data = self.request_base(**origin_request).dict()
 
-        results_cache = {}
-
-        async def run_node(node_name, **input_data):
-            if node_name in results_cache:
-                return results_cache[node_name]
-
-            node_cfg = self.graph_config[node_name]
-            handle = self.handles[node_name]
-
-            if node_cfg.get("depends"):
-                dep_results = []
-                for dep in node_cfg["depends"]:
-                    res = await run_node(dep, **input_data)
-                    dep_results.append(res)
-                if len(dep_results) == 1:
-                    result = await handle.forward.remote(dep_results[0])
-                else:
-                    result = await handle.forward.remote(*dep_results)
-            else:
-                result = await handle.forward.remote(**input_data)
-
-            results_cache[node_name] = result
-            return result
+        async def call_node(node_name, dep_results):
+            return await self._call_node(node_name, dep_results, request_data)
 
-        final_results = {}
-        root = self.roots[0]
-        final_results[root] = await run_node(root, **request_data)
-        return final_results[root]
+        # Every ready node is dispatched at once, so fan-in latency is the max of its branches.
+        result = await execute_dag(self.dependencies, self.roots[0], call_node, order=self.order)
+        if isinstance(result, ChunkStream):
+            return StreamingResponse(
+                (_encode_chunk(chunk) async for chunk in result), media_type="text/plain"
+            )
+        return result
 
 
 def build_graph(config):
@@ -267,6 +325,7 @@ def build_graph(config):
 
     handles = {}
     deployments = {}
+    streaming_nodes = set()
     scale_config_items = [
         "min_replicas",
         "max_replicas",
@@ -294,10 +353,12 @@ def build_graph(config):
             deploy_kwargs["autoscaling_config"] = scale_config
             deploy_kwargs.pop("num_replicas")
             logger.info(f"autoscaling config {scale_config}")
+        if is_streaming_forward(logic_cls.forward):
+            streaming_nodes.add(name)
         deployments[name] = make_deployment(logic_cls, **deploy_kwargs)
         handles[name] = deployments[name].bind()
 
-    root_model = FinalModel.bind(connection, handles, config)
+    root_model = FinalModel.bind(connection, handles, config, streaming_nodes)
     return root_model
 
 
@@ -1,3 +1,3 @@
-from .serve_metric import calculate_metrics
+from .serve_metric import LatencyHistogram, StreamingMetrics, calculate_metrics, resolve_output_len
 
-__all__ = ["calculate_metrics"]
+__all__ = ["LatencyHistogram", "StreamingMetrics", "calculate_metrics", "resolve_output_len"]
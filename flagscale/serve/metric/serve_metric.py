@@ -1,8 +1,13 @@
+import csv
+import json
+import math
 import warnings
 from dataclasses import dataclass
 
 import numpy as np
 
+SLO_METRICS = ("ttft", "tpot", "e2el")
+
 
 @dataclass
 class Metrics:
@@ -31,84 +36,302 @@ class Metrics:
     median_e2el_ms: float
     std_e2el_ms: float
     percentiles_e2el_ms: list[tuple[float, float]]
+    # Goodput is the rate of completed requests that meet every configured SLO.
+    request_goodput: float = 0.0
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram with log-spaced buckets of fixed relative width.
+
+    Percentiles are accurate to ``relative_error`` and memory grows with the number of
+    distinct buckets hit, not with the number of samples. Mean and standard deviation are
+    exact. Values at or below ``lowest`` share the first bucket.
+    """
+
+    def __init__(self, relative_error=0.001, lowest=1e-6):
+        self.relative_error = relative_error
+        self.lowest = lowest
+        self._log_base = math.log1p(2 * relative_error)
+        self._counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value):
+        if value <= self.lowest:
+            return 0
+        return int(math.log(value / self.lowest) / self._log_base) + 1
+
+    def _value(self, index):
+        if index == 0:
+            return self.lowest
+        # Geometric midpoint of the bucket
+        return self.lowest * math.exp((index - 0.5) * self._log_base)
+
+    def add(self, value, count=1):
+        index = self._index(value)
+        self._counts[index] = self._counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.total_sq += value * value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def extend(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if not self.count:
+            return 0.0
+        mean = self.mean()
+        return math.sqrt(max(0.0, self.total_sq / self.count - mean * mean))
+
+    def percentiles(self, ps):
+        """Values at the given percentiles in [0, 100], like ``np.percentile``."""
+        if not self.count:
+            return [0.0 for _ in ps]
+        ordered = sorted(self._counts.items())
+        cumulative = np.cumsum([count for _, count in ordered])
+        results = []
+        for p in ps:
+            rank = p / 100 * (self.count - 1)
+            # The extremes are tracked exactly
+            if rank <= 0 or rank >= self.count - 1:
+                results.append(self.min if rank <= 0 else self.max)
+                continue
+            pos = int(np.searchsorted(cumulative, rank, side="right"))
+            value = self._value(ordered[min(pos, len(ordered) - 1)][0])
+            results.append(min(self.max, max(self.min, value)))
+        return results
+
+    def percentile(self, p):
+        return self.percentiles([p])[0]
+
+    def median(self):
+        return self.percentile(50)
+
+
+class _SeriesBucket:
+    def __init__(self, relative_error):
+        self.completed = 0
+        self.failed = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.histograms = {
+            name: LatencyHistogram(relative_error) for name in ("ttft", "itl", "e2el")
+        }
+
+
+class StreamingMetrics:
+    """
+    Incremental aggregation of serve benchmark results.
+
+    Requests are added one at a time as they finish, so per-token latencies never have to be
+    kept in memory. Besides the run-wide summary returned by ``summary``, finished requests
+    are grouped into ``bucket_seconds`` wide time buckets that can be exported with
+    ``to_json`` or ``to_csv``.
+    """
+
+    def __init__(self, bucket_seconds=1.0, goodput_config=None, relative_error=0.001):
+        goodput_config = dict(goodput_config or {})
+        unknown = set(goodput_config) - set(SLO_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown goodput SLO metrics: {sorted(unknown)}")
+        self.bucket_seconds = bucket_seconds
+        self.goodput_config = goodput_config
+        self.relative_error = relative_error
+        self.histograms = {
+            name: LatencyHistogram(relative_error) for name in ("ttft", "tpot", "itl", "e2el")
+        }
+        self.completed = 0
+        self.failed = 0
+        self.good_completed = 0
+        self.total_input = 0
+        self.total_output = 0
+        self._buckets: dict[int, _SeriesBucket] = {}
+        self._last_bucket = None
+
+    def add(self, output, prompt_len, output_len, finished_at):
+        """
+        Add one finished request.
+        :param output: the request's ``RequestFuncOutput``.
+        :param prompt_len: number of prompt tokens.
+        :param output_len: number of generated tokens.
+        :param finished_at: seconds since the start of the benchmark.
+        :return: the series row of the previous bucket when this request opened a new
+            one, so that callers can report progress; otherwise None.
+        """
+        index = int(finished_at // self.bucket_seconds)
+        bucket = self._buckets.get(index)
+        if bucket is None:
+            bucket = self._buckets[index] = _SeriesBucket(self.relative_error)
+        if not output.success:
+            self.failed += 1
+            bucket.failed += 1
+            return self._advance(index)
+
+        tpot = 0
+        if output_len > 1:
+            tpot = (output.latency - output.ttft) / (output_len - 1)
+            self.histograms["tpot"].add(tpot)
+        self.histograms["ttft"].add(output.ttft)
+        self.histograms["itl"].extend(output.itl)
+        self.histograms["e2el"].add(output.latency)
+        bucket.histograms["ttft"].add(output.ttft)
+        bucket.histograms["itl"].extend(output.itl)
+        bucket.histograms["e2el"].add(output.latency)
+
+        self.completed += 1
+        self.total_input += prompt_len
+        self.total_output += output_len
+        bucket.completed += 1
+        bucket.input_tokens += prompt_len
+        bucket.output_tokens += output_len
+
+        observed_ms = {
+            "ttft": output.ttft * 1000,
+            "tpot": tpot * 1000,
+            "e2el": output.latency * 1000,
+        }
+        if all(observed_ms[key] <= slo for key, slo in self.goodput_config.items()):
+            self.good_completed += 1
+        return self._advance(index)
+
+    def _advance(self, index):
+        previous = self._last_bucket
+        if previous is None or index > previous:
+            self._last_bucket = index
+            if previous is not None and previous in self._buckets:
+                return self._row(previous, self._buckets[previous])
+        return None
+
+    def summary(self, dur_s, selected_percentiles) -> Metrics:
+        if self.completed == 0:
+            warnings.warn(
+                "All requests failed. This is likely due to a misconfiguration "
+                "on the benchmark arguments.",
+                stacklevel=2,
+            )
+        kwargs = {}
+        for name, hist in self.histograms.items():
+            kwargs[f"mean_{name}_ms"] = hist.mean() * 1000
+            kwargs[f"std_{name}_ms"] = hist.std() * 1000
+            kwargs[f"median_{name}_ms"] = hist.median() * 1000
+            values = hist.percentiles(selected_percentiles)
+            kwargs[f"percentiles_{name}_ms"] = [
+                (p, value * 1000) for p, value in zip(selected_percentiles, values)
+            ]
+        return Metrics(
+            completed=self.completed,
+            total_input=self.total_input,
+            total_output=self.total_output,
+            request_throughput=self.completed / dur_s,
+            request_goodput=self.good_completed / dur_s,
+            output_throughput=self.total_output / dur_s,
+            total_token_throughput=(self.total_input + self.total_output) / dur_s,
+            **kwargs,
+        )
+
+    def _row(self, index, bucket):
+        row = {
+            "start_s": index * self.bucket_seconds,
+            "end_s": (index + 1) * self.bucket_seconds,
+            "completed": bucket.completed,
+            "failed": bucket.failed,
+            "request_throughput": bucket.completed / self.bucket_seconds,
+            "output_throughput": bucket.output_tokens / self.bucket_seconds,
+            "total_token_throughput": (bucket.input_tokens + bucket.output_tokens)
+            / self.bucket_seconds,
+        }
+        for name, hist in bucket.histograms.items():
+            p50, p99 = hist.percentiles([50, 99])
+            row[f"p50_{name}_ms"] = p50 * 1000
+            row[f"p99_{name}_ms"] = p99 * 1000
+        return row
+
+    def series(self):
+        """One row per time bucket, including empty buckets between the first and last."""
+        if not self._buckets:
+            return []
+        rows = []
+        for index in range(min(self._buckets), max(self._buckets) + 1):
+            bucket = self._buckets.get(index) or _SeriesBucket(self.relative_error)
+            rows.append(self._row(index, bucket))
+        return rows
+
+    def to_json(self, path, dur_s=None, selected_percentiles=(50, 90, 99)):
+        data = {"bucket_seconds": self.bucket_seconds, "series": self.series()}
+        if dur_s:
+            summary = self.summary(dur_s, list(selected_percentiles))
+            data["summary"] = summary.__dict__
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def to_csv(self, path):
+        rows = self.series()
+        with open(path, "w", newline="") as f:
+            if not rows:
+                return
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def export(self, path, dur_s=None):
+        """Write the time series as CSV if ``path`` ends with .csv, otherwise as JSON."""
+        if str(path).endswith(".csv"):
+            self.to_csv(path)
+        else:
+            self.to_json(path, dur_s)
+
+
+def resolve_output_len(output, tokenizer):
+    """Number of generated tokens, tokenizing the text only when the server did not report it."""
+    if not output.success:
+        return 0
+    if output.output_tokens is None:
+        # We use the tokenizer to count the number of output tokens
+        # for some serving backends instead of looking at
+        # len(output.itl) since multiple output tokens may be
+        # bundled together
+        # Note : this may inflate the output token count slightly
+        return len(tokenizer(output.generated_text, add_special_tokens=False).input_ids)
+    return output.output_tokens
 
 
 def calculate_metrics(
-    input_requests, outputs, dur_s, tokenizer, selected_percentile_metrics, selected_percentiles
+    input_requests,
+    outputs,
+    dur_s,
+    tokenizer,
+    selected_percentile_metrics,
+    selected_percentiles,
+    goodput_config=None,
 ):
+    """
+    Aggregate per-request outputs into benchmark metrics.
+    :param goodput_config: optional SLOs in milliseconds keyed by ``ttft``, ``tpot`` and
+        ``e2el``; a completed request counts towards goodput only if it meets all of them.
+    """
+    aggregator = StreamingMetrics(goodput_config=goodput_config)
     actual_output_lens = []
-    total_input = 0
-    completed = 0
-
-    itls = []
-    tpots = []
-    all_tpots = []
-    ttfts = []
-    e2els = []
-    for i in range(len(outputs)):
-        if outputs[i].success:
-            output_len = outputs[i].output_tokens
-
-            if output_len is None:
-                # We use the tokenizer to count the number of output tokens
-                # for some serving backends instead of looking at
-                # len(outputs[i].itl) since multiple output tokens may be
-                # bundled together
-                # Note : this may inflate the output token count slightly
-                output_len = len(
-                    tokenizer(outputs[i].generated_text, add_special_tokens=False).input_ids
-                )
-            actual_output_lens.append(output_len)
-            total_input += input_requests[i][1]
-            tpot = 0
-            if output_len > 1:
-                latency_minus_ttft = outputs[i].latency - outputs[i].ttft
-                tpot = latency_minus_ttft / (output_len - 1)
-                tpots.append(tpot)
-            all_tpots.append(tpot)
-            itls += outputs[i].itl
-            ttfts.append(outputs[i].ttft)
-            e2els.append(outputs[i].latency)
-            completed += 1
-        else:
-            actual_output_lens.append(0)
-
-    if completed == 0:
-        warnings.warn(
-            "All requests failed. This is likely due to a misconfiguration "
-            "on the benchmark arguments.",
-            stacklevel=2,
-        )
-    metrics = Metrics(
-        completed=completed,
-        total_input=total_input,
-        total_output=sum(actual_output_lens),
-        request_throughput=completed / dur_s,
-        output_throughput=sum(actual_output_lens) / dur_s,
-        total_token_throughput=(total_input + sum(actual_output_lens)) / dur_s,
-        mean_ttft_ms=np.mean(ttfts or 0)
-        * 1000,  # ttfts is empty if streaming is not supported by backend
-        std_ttft_ms=np.std(ttfts or 0) * 1000,
-        median_ttft_ms=np.median(ttfts or 0) * 1000,
-        percentiles_ttft_ms=[
-            (p, np.percentile(ttfts or 0, p) * 1000) for p in selected_percentiles
-        ],
-        mean_tpot_ms=np.mean(tpots or 0) * 1000,
-        std_tpot_ms=np.std(tpots or 0) * 1000,
-        median_tpot_ms=np.median(tpots or 0) * 1000,
-        percentiles_tpot_ms=[
-            (p, np.percentile(tpots or 0, p) * 1000) for p in selected_percentiles
-        ],
-        mean_itl_ms=np.mean(itls or 0) * 1000,
-        std_itl_ms=np.std(itls or 0) * 1000,
-        median_itl_ms=np.median(itls or 0) * 1000,
-        percentiles_itl_ms=[(p, np.percentile(itls or 0, p) * 1000) for p in selected_percentiles],
-        mean_e2el_ms=np.mean(e2els or 0) * 1000,
-        std_e2el_ms=np.std(e2els or 0) * 1000,
-        median_e2el_ms=np.median(e2els or 0) * 1000,
-        percentiles_e2el_ms=[
-            (p, np.percentile(e2els or 0, p) * 1000) for p in selected_percentiles
-        ],
-    )
-
-    return metrics, actual_output_lens
+    for i, output in enumerate(outputs):
+        output_len = resolve_output_len(output, tokenizer)
+        actual_output_lens.append(output_len)
+        aggregator.add(output, input_requests[i][1], output_len, finished_at=0.0)
+    return aggregator.summary(dur_s, selected_percentiles), actual_output_lens
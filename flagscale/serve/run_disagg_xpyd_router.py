@@ -6,10 +6,12 @@
 #
 
 
+import asyncio
 import os
 import random
 import socket
 import threading
+import time
 import uuid
 from functools import lru_cache
 from typing import Any
@@ -22,15 +24,23 @@ from transformers import AutoTokenizer
 
 from flagscale import serve
 from flagscale.logger import logger
+from flagscale.serve.disagg_utils import (
+    AsyncTokenCounter,
+    InstanceHealth,
+    InstanceSessionPool,
+    PrefixCacheIndex,
+    StreamedTokenCounter,
+    compute_ratios,
+    prompt_text,
+)
 
 serve.load_args()
 TASK_CONFIG = serve.task_config
 MODEL_PATH = TASK_CONFIG.serve[0].get("engine_args", {}).get("model", None)
+DEPLOY_CONFIG = TASK_CONFIG.experiment.get("runner", {}).get("deploy", {})
 
-# Scheduling strategy: 'random', 'robin', 'slo'
-SCHEDULING_STRATEGY = (
-    TASK_CONFIG.experiment.get("runner", {}).get("deploy", {}).get("prefill_decode_strategy", "slo")
-)
+# Scheduling strategy: 'random', 'robin', 'slo', 'prefix'
+SCHEDULING_STRATEGY = DEPLOY_CONFIG.get("prefill_decode_strategy", "slo")
 
 
 @lru_cache(maxsize=32)
@@ -63,71 +73,190 @@ def count_text_tokens(prompt: str) -> int:
 class LoadManager:
     def __init__(self):
         self._lock = threading.Lock()
-        # Each resource type 'P' or 'D' maps to {http_addr: {'zmq': zmq_addr, 'load_num': int, 'load_len': int, 'compute_ratio': float}}
+        # Each resource type 'P' or 'D' maps to {http_addr: {'zmq': zmq_addr, 'load_num': int, 'load_len': int, 'compute_ratio': float, 'health': InstanceHealth, 'generation': int}}
         # load_num: num of req, load_len: num of tokens
         self._instances: dict[str, dict[str, dict[str, object]]] = {"P": {}, "D": {}}
+        # Bumped on every new registration, so that requests still in flight on an evicted
+        # instance do not release load on its next registration
+        self._generation = 0
+        # Approximate prefix cache of each P instance, used by the 'prefix' strategy
+        self.prefix_index = PrefixCacheIndex(
+            block_size=DEPLOY_CONFIG.get("prefix_block_size", 128),
+            max_blocks_per_instance=DEPLOY_CONFIG.get("prefix_max_blocks", 65536),
+        )
+        # Instances that have not re-registered within this many seconds are evicted, 0 disables
+        self.heartbeat_timeout = DEPLOY_CONFIG.get("heartbeat_timeout", 30)
 
     def register(self, rtype: str, http_addr: str, zmq_addr: str):
         with self._lock:
             if http_addr not in self._instances[rtype]:
+                self._generation += 1
                 self._instances[rtype][http_addr] = {
                     "zmq": zmq_addr,
                     "load_num": 0,
                     "load_len": 0,
                     "compute_ratio": 1.0,
+                    "health": InstanceHealth(
+                        alpha=DEPLOY_CONFIG.get("compute_ratio_alpha", 0.2),
+                        backoff=DEPLOY_CONFIG.get("failure_backoff", 5.0),
+                        max_backoff=DEPLOY_CONFIG.get("failure_backoff_max", 60.0),
+                    ),
+                    "generation": self._generation,
                 }
+                self._update_compute_ratios(rtype)
                 logger.info(f"Registered new {rtype}-instance {http_addr} (zmq={zmq_addr})")
             else:
+                # Registrations are re-sent periodically and double as heartbeats
+                self._instances[rtype][http_addr]["health"].heartbeat()
                 # If zmq address changed, synchronize it
                 self._instances[rtype][http_addr]["zmq"] = zmq_addr
 
-    def increment_load(self, rtype: str, http_addr: str, tokens=0):
+    def evict_stale(self) -> list[tuple[str, str]]:
+        """Drop instances whose heartbeat timed out; they are re-admitted when they register again."""
+        evicted = []
         with self._lock:
-            self._instances[rtype][http_addr]["load_num"] += 1
-            self._instances[rtype][http_addr]["load_len"] += tokens
-            logger.debug(
-                f"[{rtype}] +1 load on {http_addr}, now={self._instances[rtype][http_addr]['load_num']}"
-            )
+            for rtype, instances in self._instances.items():
+                stale = [
+                    http_addr
+                    for http_addr, info in instances.items()
+                    if not info["health"].is_alive(self.heartbeat_timeout)
+                ]
+                for http_addr in stale:
+                    del instances[http_addr]
+                    if rtype == "P":
+                        self.prefix_index.remove_instance(http_addr)
+                    evicted.append((rtype, http_addr))
+                    logger.warning(f"Evicted {rtype}-instance {http_addr}: heartbeat timed out")
+                if stale:
+                    self._update_compute_ratios(rtype)
+        return evicted
+
+    def _update_compute_ratios(self, rtype: str):
+        instances = self._instances[rtype]
+        ratios = compute_ratios({addr: info["health"] for addr, info in instances.items()})
+        for addr, ratio in ratios.items():
+            instances[addr]["compute_ratio"] = ratio
+
+    def record_success(self, rtype: str, http_addr: str, tokens=0, seconds=0.0):
+        with self._lock:
+            info = self._instances[rtype].get(http_addr)
+            if info is None:
+                return
+            info["health"].record_success(tokens, seconds)
+            self._update_compute_ratios(rtype)
 
-    def decrement_load(self, rtype: str, http_addr: str, tokens=0):
+    def record_failure(self, rtype: str, http_addr: str):
         with self._lock:
-            self._instances[rtype][http_addr]["load_num"] -= 1
-            self._instances[rtype][http_addr]["load_len"] -= tokens
-            logger.debug(
-                f"[{rtype}] -1 load on {http_addr}, now={self._instances[rtype][http_addr]['load_num']}"
+            info = self._instances[rtype].get(http_addr)
+            if info is None:
+                return
+            info["health"].record_failure()
+            logger.warning(
+                f"{rtype}-instance {http_addr} failed {info['health'].failures} time(s) in a row"
             )
 
-    def get_random(self, rtype: str) -> tuple[str, str]:
+    def increment_load(self, rtype: str, http_addr: str, tokens=0) -> int | None:
+        """Add a request to the load of an instance, returns the registration it was added to."""
+        with self._lock:
+            info = self._instances[rtype].get(http_addr)
+            if info is None:
+                return None
+            info["load_num"] += 1
+            info["load_len"] += tokens
+            logger.debug(f"[{rtype}] +1 load on {http_addr}, now={info['load_num']}")
+            return info["generation"]
+
+    def decrement_load(self, rtype: str, http_addr: str, tokens=0, generation=None):
+        with self._lock:
+            # The instance may have been evicted while the request was in flight, and may
+            # have registered again since, starting from a fresh load
+            info = self._instances[rtype].get(http_addr)
+            if info is None or info["generation"] != generation:
+                return
+            info["load_num"] = max(0, info["load_num"] - 1)
+            info["load_len"] = max(0, info["load_len"] - tokens)
+            logger.debug(f"[{rtype}] -1 load on {http_addr}, now={info['load_num']}")
+
+    def _candidates(self, rtype: str, exclude=()) -> list[tuple[str, dict[str, object]]]:
+        """Instances eligible for a new request, must be called with the lock held."""
+        items = [kv for kv in self._instances[rtype].items() if kv[0] not in exclude]
+        available = [kv for kv in items if kv[1]["health"].is_available()]
+        # If every instance is backing off, still try one rather than failing outright
+        candidates = available or items
+        if not candidates:
+            raise RuntimeError(f"No available {rtype}-instance")
+        return candidates
+
+    def get_random(self, rtype: str, exclude=()) -> tuple[str, str]:
         with self._lock:
-            items = list(self._instances[rtype].items())
+            items = self._candidates(rtype, exclude)
             logger.info(f"========== whole instance status {self._instances}==========")
         http_addr, info = random.choice(items)
         return http_addr, info["zmq"]
 
-    def get_robin_loaded(self, rtype: str) -> tuple[str, str]:
+    def get_robin_loaded(self, rtype: str, exclude=()) -> tuple[str, str]:
         with self._lock:
-            http_addr, info = min(self._instances[rtype].items(), key=lambda kv: kv[1]["load_num"])
+            http_addr, info = min(
+                self._candidates(rtype, exclude), key=lambda kv: kv[1]["load_num"]
+            )
             logger.info(f"========== whole instance status {self._instances}==========")
         return http_addr, info["zmq"]
 
-    def get_slo_loaded(self, rtype: str, token_num: int = -1) -> tuple[str, str]:
+    def get_slo_loaded(self, rtype: str, token_num: int = -1, exclude=()) -> tuple[str, str]:
         with self._lock:
             http_addr, info = min(
-                self._instances[rtype].items(),
+                self._candidates(rtype, exclude),
                 key=lambda kv: (kv[1]["load_len"] + token_num) / kv[1]["compute_ratio"],
             )
             logger.info(f"========== whole instance status {self._instances}==========")
         return http_addr, info["zmq"]
 
+    def get_prefix_loaded(
+        self,
+        rtype: str,
+        token_num: int = 0,
+        block_hashes: list[int] | None = None,
+        exclude=(),
+    ) -> tuple[str, str]:
+        """
+        Pick the instance with the least expected work, discounting the part of the prompt
+        whose prefix is likely still cached there. Decode instances hold no reusable prefix
+        cache, so they are chosen by the 'slo' rule.
+        """
+        if rtype != "P" or not block_hashes:
+            return self.get_slo_loaded(rtype, token_num, exclude)
+        with self._lock:
+            matched = self.prefix_index.match(block_hashes)
+
+            def _cost(kv):
+                cached_ratio = matched.get(kv[0], 0) / len(block_hashes)
+                uncached = token_num * (1 - cached_ratio)
+                return (kv[1]["load_len"] + uncached) / kv[1]["compute_ratio"]
+
+            http_addr, info = min(self._candidates(rtype, exclude), key=_cost)
+            self.prefix_index.insert(http_addr, block_hashes)
+            logger.info(
+                f"Prefix match {matched.get(http_addr, 0)}/{len(block_hashes)} blocks "
+                f"on {rtype}-instance {http_addr}"
+            )
+        return http_addr, info["zmq"]
+
     def get_loaded(
-        self, rtype: str, load_type: str = "robin", token_num: int = 0
+        self,
+        rtype: str,
+        load_type: str = "robin",
+        token_num: int = 0,
+        block_hashes: list[int] | None = None,
+        exclude=(),
     ) -> tuple[str, str]:
         if load_type == "random":
-            return self.get_random(rtype)
+            return self.get_random(rtype, exclude)
         elif load_type == "robin":
-            return self.get_robin_loaded(rtype)
+            return self.get_robin_loaded(rtype, exclude)
         elif load_type == "slo":
-            return self.get_slo_loaded(rtype, token_num)
+            return self.get_slo_loaded(rtype, token_num, exclude)
+        elif load_type == "prefix":
+            return self.get_prefix_loaded(rtype, token_num, block_hashes, exclude)
         else:
             raise ValueError(f"Unknown load type: {load_type}")
 
@@ -147,9 +276,20 @@ decode_cv = threading.Condition()
 # -----------------------------------------------------------------------------
 # Service discovery: receive instance registrations
 # -----------------------------------------------------------------------------
+def _evict_stale_instances():
+    for rtype, http_addr in lm.evict_stale():
+        cv, legacy = (
+            (prefill_cv, prefill_instances) if rtype == "P" else (decode_cv, decode_instances)
+        )
+        with cv:
+            legacy.pop(http_addr, None)
+
+
 def _listen_for_register(poller, router_socket):
     while True:
-        socks = dict(poller.poll())
+        # Wake up periodically so instances that stopped sending heartbeats get evicted
+        socks = dict(poller.poll(timeout=1000))
+        _evict_stale_instances()
         if router_socket in socks:
             remote_addr, message = router_socket.recv_multipart()
             data = msgpack.loads(message)
@@ -194,24 +334,92 @@ def start_service_discovery(hostname, port):
 AIOHTTP_TIMEOUT = aiohttp.ClientTimeout(total=6 * 60 * 60)
 app = Quart(__name__)
 
+# Keep-alive connections to every P/D instance, created on the serving event loop
+session_pool: InstanceSessionPool | None = None
+token_counter = AsyncTokenCounter(
+    count_chat_tokens,
+    count_text_tokens,
+    max_workers=DEPLOY_CONFIG.get("tokenize_workers", 4),
+    cache_size=DEPLOY_CONFIG.get("token_cache_size", 4096),
+    executor=DEPLOY_CONFIG.get("tokenize_executor", "thread"),
+)
+
+
+@app.before_serving
+async def _open_sessions():
+    global session_pool
+    session_pool = InstanceSessionPool(
+        limit_per_instance=DEPLOY_CONFIG.get("connection_limit_per_instance", 256),
+        keepalive_timeout=DEPLOY_CONFIG.get("keepalive_timeout", 60),
+        timeout=AIOHTTP_TIMEOUT,
+    )
+
+
+@app.after_serving
+async def _close_sessions():
+    await session_pool.close_all()
+    token_counter.shutdown()
+
 
 def random_uuid() -> str:
     return uuid.uuid4().hex
 
 
-async def forward_request(url, data, request_id):
-    async with aiohttp.ClientSession(timeout=AIOHTTP_TIMEOUT) as session:
-        headers = {
-            "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}",
-            "X-Request-Id": request_id,
-        }
-        async with session.post(url=url, json=data, headers=headers) as resp:
-            if resp.status == 200:
-                async for chunk in resp.content.iter_chunked(1024):
-                    yield chunk
-            else:
-                content = await resp.read()
-                yield content
+class InstanceUnavailableError(Exception):
+    """Raised when a P/D instance cannot serve a request and another one should be tried."""
+
+
+# Failures that are retried on another instance, as long as nothing was streamed yet
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, InstanceUnavailableError)
+
+
+async def forward_request(http_addr, endpoint, data, request_id):
+    session = session_pool.get(http_addr)
+    headers = {
+        "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY')}",
+        "X-Request-Id": request_id,
+    }
+    async with session.post(
+        url=f"http://{http_addr}{endpoint}", json=data, headers=headers
+    ) as resp:
+        if resp.status == 200:
+            async for chunk in resp.content.iter_chunked(1024):
+                yield chunk
+        elif resp.status >= 500:
+            content = await resp.read()
+            raise InstanceUnavailableError(f"{http_addr} returned {resp.status}: {content[:200]}")
+        else:
+            content = await resp.read()
+            yield content
+
+
+async def run_prefill(prefill_addr, endpoint, prefill_request, request_id, prompt_tokens_num):
+    generation = lm.increment_load("P", prefill_addr, prompt_tokens_num)
+    try:
+        start = time.perf_counter()
+        async for _ in forward_request(prefill_addr, endpoint, prefill_request, request_id):
+            pass
+        lm.record_success("P", prefill_addr, prompt_tokens_num, time.perf_counter() - start)
+    finally:
+        lm.decrement_load("P", prefill_addr, prompt_tokens_num, generation)
+
+
+async def tracked_decode(decode_addr, endpoint, original_data, request_id, prompt_tokens_num):
+    generation = lm.increment_load("D", decode_addr, prompt_tokens_num)
+    try:
+        first_chunk_time = None
+        counter = StreamedTokenCounter()
+        async for chunk in forward_request(decode_addr, endpoint, original_data, request_id):
+            if first_chunk_time is None:
+                first_chunk_time = time.perf_counter()
+            counter.feed(chunk)
+            yield chunk
+        if first_chunk_time is not None:
+            lm.record_success(
+                "D", decode_addr, counter.finish(), time.perf_counter() - first_chunk_time
+            )
+    finally:
+        lm.decrement_load("D", decode_addr, prompt_tokens_num, generation)
 
 
 # support both /v1/completions and /v1/chat/completions
@@ -224,50 +432,69 @@ async def handle_request():
 
         # calculate tokens num
         prompt_tokens_num = 0
-        if SCHEDULING_STRATEGY == "slo":
+        if SCHEDULING_STRATEGY in ("slo", "prefix"):
             if request.path.endswith("/chat/completions"):
-                prompt_tokens_num = count_chat_tokens(original_data["messages"])
+                prompt_tokens_num = await token_counter.count_chat(original_data["messages"])
             else:
-                prompt_tokens_num = count_text_tokens(original_data["prompt"])
+                prompt_tokens_num = await token_counter.count_text(original_data["prompt"])
         logger.info(f"---------------- prompt_tokens_num {prompt_tokens_num} -------------- ")
 
         # Prefill request: max_tokens=1
         prefill_request = original_data.copy()
         prefill_request["max_tokens"] = 1
 
-        # Select Prefill instance
-        prefill_addr, prefill_zmq = lm.get_loaded("P", SCHEDULING_STRATEGY, prompt_tokens_num)
-        logger.info(f"Selected P-instance {prefill_addr} via '{SCHEDULING_STRATEGY}'")
-
-        # Select Decode instance
-        decode_addr, decode_zmq = lm.get_loaded("D", SCHEDULING_STRATEGY, prompt_tokens_num)
-        logger.info(f"Selected D-instance {decode_addr} via '{SCHEDULING_STRATEGY}'")
-
-        # Keep original request_id composition format
-        request_id = f"___prefill_addr_{prefill_zmq}___decode_addr_{decode_zmq}_{random_uuid()}"
-
-        # Execute Prefill and update load
-        lm.increment_load("P", prefill_addr, prompt_tokens_num)
-        try:
-            async for _ in forward_request(
-                f"http://{prefill_addr}{endpoint}", prefill_request, request_id
-            ):
-                pass
-        finally:
-            lm.decrement_load("P", prefill_addr, prompt_tokens_num)
-
-        # Execute Decode and update load
-        async def tracked_decode():
-            lm.increment_load("D", decode_addr, prompt_tokens_num)
+        block_hashes = None
+        if SCHEDULING_STRATEGY == "prefix":
+            block_hashes = lm.prefix_index.block_hashes(prompt_text(original_data))
+
+        # The KV cache goes from the chosen P to the chosen D, so a failure on either side
+        # retries the whole pair. Retrying stops once the first decode chunk is in hand.
+        excluded = {"P": set(), "D": set()}
+        max_attempts = DEPLOY_CONFIG.get("max_retries", 2) + 1
+        for attempt in range(max_attempts):
+            # Select Prefill instance
+            prefill_addr, prefill_zmq = lm.get_loaded(
+                "P", SCHEDULING_STRATEGY, prompt_tokens_num, block_hashes, excluded["P"]
+            )
+            logger.info(f"Selected P-instance {prefill_addr} via '{SCHEDULING_STRATEGY}'")
+
+            # Select Decode instance
+            decode_addr, decode_zmq = lm.get_loaded(
+                "D", SCHEDULING_STRATEGY, prompt_tokens_num, exclude=excluded["D"]
+            )
+            logger.info(f"Selected D-instance {decode_addr} via '{SCHEDULING_STRATEGY}'")
+
+            # Keep original request_id composition format
+            request_id = f"___prefill_addr_{prefill_zmq}___decode_addr_{decode_zmq}_{random_uuid()}"
+
+            rtype, failed_addr = "P", prefill_addr
+            try:
+                await run_prefill(
+                    prefill_addr, endpoint, prefill_request, request_id, prompt_tokens_num
+                )
+                rtype, failed_addr = "D", decode_addr
+                decode_stream = tracked_decode(
+                    decode_addr, endpoint, original_data, request_id, prompt_tokens_num
+                )
+                first_chunk = await anext(decode_stream, None)
+                break
+            except RETRYABLE_ERRORS as e:
+                lm.record_failure(rtype, failed_addr)
+                excluded[rtype].add(failed_addr)
+                if attempt == max_attempts - 1:
+                    raise
+                logger.warning(f"{rtype}-instance {failed_addr} failed ({e!r}), retrying")
+
+        async def stream_decode():
             try:
-                async for chunk in forward_request(
-                    f"http://{decode_addr}{endpoint}", original_data, request_id
-                ):
+                if first_chunk is not None:
+                    yield first_chunk
+                async for chunk in decode_stream:
                     yield chunk
             finally:
-                lm.decrement_load("D", decode_addr, prompt_tokens_num)
+                await decode_stream.aclose()
 
-        resp = await make_response(tracked_decode())
+        resp = await make_response(stream_decode())
         resp.timeout = None
         return resp
 
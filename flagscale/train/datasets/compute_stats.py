@@ -15,6 +15,10 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 
 from flagscale.train.datasets.utils import load_image_as_numpy
@@ -22,6 +26,49 @@ from flagscale.train.datasets.utils import load_image_as_numpy
 DEFAULT_QUANTILES = [0.01, 0.10, 0.50, 0.90, 0.99]
 
 
+def _find_bins(values: np.ndarray, edges: np.ndarray, side: str) -> np.ndarray:
+    """Vectorized ``np.searchsorted(edges[i], values[:, i], side) - 1`` for every feature i.
+
+    Args:
+        values: Array of shape (N, num_features).
+        edges: Sorted bin edges of shape (num_features, num_bins + 1).
+
+    Returns:
+        Bin indices of shape (N, num_features), in [-1, num_bins].
+    """
+    num_bins = edges.shape[1] - 1
+    features = np.arange(edges.shape[0])
+    # -inf and +inf around the edges, so that every index in [-1, num_bins] has two bounds
+    padded = np.pad(edges.astype(np.float64), ((0, 0), (1, 1)), constant_values=(-np.inf, np.inf))
+
+    # Guess from the uniform spacing, then step to the exact bin
+    first, last = edges[:, 0], edges[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        guess = np.floor((values - first) * (num_bins / (last - first)))
+    indices = np.clip(np.nan_to_num(guess), -1, num_bins).astype(np.intp)
+    while True:
+        lower = padded[features, indices + 1]
+        upper = padded[features, indices + 2]
+        if side == "right":
+            down, up = values < lower, values >= upper
+        else:
+            down, up = values <= lower, values > upper
+        if not (down.any() or up.any()):
+            return indices
+        indices = indices - down + up
+
+
+def _linspace_edges(low: np.ndarray, high: np.ndarray, num_bins: int) -> np.ndarray:
+    """Bin edges of every feature, equal to ``np.linspace(low[i], high[i], num_bins + 1)``."""
+    edges = np.empty((low.shape[0], num_bins + 1))
+    # np.linspace of arrays computes all rows as zero-step ones if any step is zero
+    zero_step = (high - low) / num_bins == 0
+    for rows in (zero_step, ~zero_step):
+        if rows.any():
+            edges[rows] = np.linspace(low[rows], high[rows], num_bins + 1, axis=-1)
+    return edges
+
+
 class RunningQuantileStats:
     """
     Maintains running statistics for batches of vectors, including mean,
@@ -30,6 +77,9 @@ class RunningQuantileStats:
     Statistics are computed per feature dimension and updated incrementally
     as new batches are observed. Quantiles are estimated using histograms,
     which adapt dynamically if the observed data range expands.
+
+    The histograms of all features are one (features, bins) array, updated, re-binned and
+    queried without a loop over the features.
     """
 
     def __init__(self, quantile_list: list[float] | None = None, num_quantile_bins: int = 5000):
@@ -61,11 +111,10 @@ class RunningQuantileStats:
             self._mean_of_squares = np.mean(batch**2, axis=0)
             self._min = np.min(batch, axis=0)
             self._max = np.max(batch, axis=0)
-            self._histograms = [np.zeros(self._num_quantile_bins) for _ in range(vector_length)]
-            self._bin_edges = [
-                np.linspace(self._min[i] - 1e-10, self._max[i] + 1e-10, self._num_quantile_bins + 1)
-                for i in range(vector_length)
-            ]
+            self._histograms = np.zeros((vector_length, self._num_quantile_bins))
+            # Edges in float64, the padding vanishes in lower precision
+            low, high = self._min.astype(np.float64), self._max.astype(np.float64)
+            self._bin_edges = _linspace_edges(low - 1e-10, high + 1e-10, self._num_quantile_bins)
         else:
             if vector_length != self._mean.size:
                 raise ValueError(
@@ -125,77 +174,73 @@ class RunningQuantileStats:
 
         return stats
 
+    def _rebin(
+        self, histograms: np.ndarray, edges: np.ndarray, new_edges: np.ndarray
+    ) -> np.ndarray:
+        """Redistribute histogram counts to new bins, by the new bin of each old bin center."""
+        num_features = histograms.shape[0]
+        centers = (edges[:, :-1] + edges[:, 1:]) / 2
+        bins = _find_bins(centers.T, new_edges, side="left").T
+        bins = np.clip(bins, 0, self._num_quantile_bins - 1)
+        flat_bins = bins + np.arange(num_features)[:, None] * self._num_quantile_bins
+        new_histograms = np.bincount(
+            flat_bins.ravel(),
+            weights=histograms.ravel(),
+            minlength=num_features * self._num_quantile_bins,
+        )
+        return new_histograms.reshape(num_features, self._num_quantile_bins)
+
     def _adjust_histograms(self):
         """Adjust histograms when min or max changes."""
-        for i in range(len(self._histograms)):
-            old_edges = self._bin_edges[i]
-            old_hist = self._histograms[i]
-
-            # Create new edges with small padding to ensure range coverage
-            padding = (self._max[i] - self._min[i]) * 1e-10
-            new_edges = np.linspace(
-                self._min[i] - padding, self._max[i] + padding, self._num_quantile_bins + 1
-            )
-
-            # Redistribute existing histogram counts to new bins
-            # We need to map each old bin center to the new bins
-            old_centers = (old_edges[:-1] + old_edges[1:]) / 2
-            new_hist = np.zeros(self._num_quantile_bins)
-
-            for old_center, count in zip(old_centers, old_hist, strict=False):
-                if count > 0:
-                    # Find which new bin this old center belongs to
-                    bin_idx = np.searchsorted(new_edges, old_center) - 1
-                    bin_idx = max(0, min(bin_idx, self._num_quantile_bins - 1))
-                    new_hist[bin_idx] += count
-
-            self._histograms[i] = new_hist
-            self._bin_edges[i] = new_edges
+        # Create new edges with small padding to ensure range coverage
+        low, high = self._min.astype(np.float64), self._max.astype(np.float64)
+        padding = (self._max - self._min).astype(np.float64) * 1e-10
+        new_edges = _linspace_edges(low - padding, high + padding, self._num_quantile_bins)
+        self._histograms = self._rebin(self._histograms, self._bin_edges, new_edges)
+        self._bin_edges = new_edges
 
     def _update_histograms(self, batch: np.ndarray) -> None:
         """Update histograms with new vectors."""
-        for i in range(batch.shape[1]):
-            hist, _ = np.histogram(batch[:, i], bins=self._bin_edges[i])
-            self._histograms[i] += hist
+        num_features, num_bins = self._histograms.shape
+        # Same binning as np.histogram: the last bin includes the upper edge
+        bins = _find_bins(batch, self._bin_edges, side="right")
+        in_range = (bins >= 0) & ((bins < num_bins) | (batch <= self._bin_edges[:, -1]))
+        bins = np.minimum(bins, num_bins - 1) + np.arange(num_features) * num_bins
+        self._histograms += np.bincount(bins[in_range], minlength=num_features * num_bins).reshape(
+            num_features, num_bins
+        )
 
     def _compute_quantiles(self) -> list[np.ndarray]:
         """Compute quantiles based on histograms."""
+        cumsum = np.cumsum(self._histograms, axis=1)
+        edges = self._bin_edges
+        num_bins = cumsum.shape[1]
+        features = np.arange(cumsum.shape[0])
+
         results = []
         for q in self._quantile_list:
             target_count = q * self._count
-            q_values = []
-
-            for hist, edges in zip(self._histograms, self._bin_edges, strict=True):
-                q_value = self._compute_single_quantile(hist, edges, target_count)
-                q_values.append(q_value)
+            # np.searchsorted(cumsum, target_count) of every feature
+            idx = np.count_nonzero(cumsum < target_count, axis=1)
+
+            inner = np.clip(idx, 1, num_bins - 1)
+            count_before = cumsum[features, inner - 1]
+            count_in_bin = cumsum[features, inner] - count_before
+            lower = edges[features, inner]
+            upper = edges[features, inner + 1]
+            # Linear interpolation within the bin, or the bin edge if it has no samples
+            with np.errstate(divide="ignore", invalid="ignore"):
+                fraction = (target_count - count_before) / count_in_bin
+                interpolated = np.where(
+                    count_in_bin == 0, lower, lower + fraction * (upper - lower)
+                )
 
-            results.append(np.array(q_values))
+            q_values = np.where(
+                idx == 0, edges[:, 0], np.where(idx >= num_bins, edges[:, -1], interpolated)
+            )
+            results.append(q_values)
         return results
 
-    def _compute_single_quantile(
-        self, hist: np.ndarray, edges: np.ndarray, target_count: float
-    ) -> float:
-        """Compute a single quantile value from histogram and bin edges."""
-        cumsum = np.cumsum(hist)
-        idx = np.searchsorted(cumsum, target_count)
-
-        if idx == 0:
-            return edges[0]
-        if idx >= len(cumsum):
-            return edges[-1]
-
-        # If not edge case, interpolate within the bin
-        count_before = cumsum[idx - 1]
-        count_in_bin = cumsum[idx] - count_before
-
-        # If no samples in this bin, use the bin edge
-        if count_in_bin == 0:
-            return edges[idx]
-
-        # Linear interpolation within the bin
-        fraction = (target_count - count_before) / count_in_bin
-        return edges[idx] + fraction * (edges[idx + 1] - edges[idx])
-
 
 def estimate_num_samples(
     dataset_len: int, min_num_samples: int = 100, max_num_samples: int = 10_000, power: float = 0.75
@@ -543,6 +588,43 @@ def compute_episode_stats(
     return ep_stats
 
 
+def compute_episodes_stats(
+    episodes_data: list[dict[str, list[str] | np.ndarray]],
+    features: dict,
+    quantile_list: list[float] | None = None,
+    num_workers: int | None = None,
+) -> list[dict]:
+    """Compute the statistics of many episodes in parallel processes.
+
+    The result is the same as `compute_episode_stats` of each episode, combine the episodes with
+    `aggregate_stats` as for episodes saved one by one.
+
+    Args:
+        episodes_data: The `episode_data` of each episode, see `compute_episode_stats`.
+        features: Dictionary describing each feature's dtype and shape
+        num_workers: Number of processes, defaults to the number of CPUs. With 1 the episodes are
+            computed in this process.
+
+    Returns:
+        The statistics of each episode, in the order of `episodes_data`.
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(episodes_data))
+    if num_workers <= 1:
+        return [compute_episode_stats(data, features, quantile_list) for data in episodes_data]
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(
+            executor.map(
+                compute_episode_stats,
+                episodes_data,
+                itertools.repeat(features),
+                itertools.repeat(quantile_list),
+            )
+        )
+
+
 def _validate_stat_value(value: np.ndarray, key: str, feature_key: str) -> None:
     """Validate a single statistic value."""
     if not isinstance(value, np.ndarray):
@@ -15,8 +15,10 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import bisect
 import concurrent.futures
 import contextlib
+import itertools
 import logging
 import shutil
 import tempfile
@@ -28,6 +30,7 @@ import numpy as np
 import packaging.version
 import pandas as pd
 import PIL.Image
+import pyarrow as pa
 import torch
 import torch.utils
 from huggingface_hub import HfApi, snapshot_download
@@ -36,6 +39,7 @@ from huggingface_hub.errors import RevisionNotFoundError
 from flagscale.models.utils.constants import HF_LEROBOT_HOME
 from flagscale.train.datasets.compute_stats import aggregate_stats, compute_episode_stats
 from flagscale.train.datasets.image_writer import AsyncImageWriter, write_image
+from flagscale.train.datasets.sampler import MixtureSampler
 from flagscale.train.datasets.utils import (
     DEFAULT_EPISODES_PATH,
     DEFAULT_FEATURES,
@@ -67,11 +71,12 @@ from flagscale.train.datasets.utils import (
 from flagscale.train.datasets.video_utils import (
     VideoFrame,
     concatenate_video_files,
-    decode_video_frames,
+    decode_video_frames_batch,
     encode_video_frames,
     get_safe_default_codec,
     get_video_duration_in_s,
     get_video_info,
+    prefetch_video_decoders,
 )
 
 CODEBASE_VERSION = "v3.0"
@@ -575,6 +580,121 @@ def _encode_video_worker(video_key: str, episode_index: int, root: Path, fps: in
     return temp_path
 
 
+class _ColumnarFrameCache:
+    """
+    Numeric columns of the loaded frames as numpy arrays, with the episode bounds of every row,
+    so the delta-timestamp queries of a sample or a whole batch are a few clamped fancy-index
+    gathers instead of one Arrow fetch per key and sample.
+
+    Only the queried keys and the index, episode_index and timestamp columns are held. Columns
+    that are already float32 or int64 are views of the memory-mapped Arrow buffers, the others
+    are converted to the dtypes hf_transform_to_torch returns. Build it before the DataLoader
+    forks its workers so they share it. Image, string and multi-dimensional columns are not
+    cached, they are still queried from the hf_dataset.
+    """
+
+    def __init__(
+        self,
+        hf_dataset: datasets.Dataset,
+        episodes: datasets.Dataset,
+        features: dict,
+        delta_keys: list[str],
+    ):
+        self.source = hf_dataset
+        self.delta_keys = frozenset(delta_keys)
+        candidates = [*delta_keys, "index", "episode_index", "timestamp"]
+        keys = [
+            key
+            for key in dict.fromkeys(candidates)
+            if key in hf_dataset.column_names
+            and features[key]["dtype"] not in ("image", "video", "string")
+        ]
+        # The Arrow formatter honors an indices mapping and slices the memory-mapped table
+        table = hf_dataset.with_format("arrow", columns=keys)[:]
+        self.columns = {}
+        for key in keys:
+            array = self._to_numpy(table.column(key))
+            if array is not None:
+                self.columns[key] = array
+        self.keys = list(self.columns)
+
+        index = self.columns["index"]
+        # absolute index -> row by binary search, the index is sorted unless the parquet files
+        # were written out of order
+        self._order = None
+        if len(index) > 1 and np.any(index[1:] < index[:-1]):
+            self._order = np.argsort(index, kind="stable")
+            index = index[self._order]
+        self._sorted_index = index
+
+        # episode_index is the row of its episode in the metadata
+        self.ep_from = np.asarray(episodes["dataset_from_index"], dtype=np.int64)
+        self.ep_to = np.asarray(episodes["dataset_to_index"], dtype=np.int64)
+
+    @staticmethod
+    def _to_numpy(column: pa.ChunkedArray) -> np.ndarray | None:
+        """
+        A (N, ...) array of a scalar or fixed-size list column, zero-copy when it is a single
+        chunk without nulls of the target dtype. None for columns of any other type.
+        """
+        array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        shape = []
+        while pa.types.is_fixed_size_list(array.type):
+            shape.append(array.type.list_size)
+            array = array.flatten()
+        if pa.types.is_floating(array.type):
+            dtype = np.float32
+        elif pa.types.is_integer(array.type):
+            dtype = np.int64
+        elif pa.types.is_boolean(array.type):
+            dtype = np.bool_
+        else:
+            return None
+        values = array.to_numpy(zero_copy_only=False)
+        return values.astype(dtype, copy=False).reshape(-1, *shape)
+
+    def rows_of(self, indices: np.ndarray) -> np.ndarray:
+        """Rows of the given absolute indices, which must belong to the loaded episodes."""
+        rows = np.searchsorted(self._sorted_index, indices)
+        return rows if self._order is None else self._order[rows]
+
+    def query(
+        self, rows: np.ndarray, delta_indices: dict[str, list[int]]
+    ) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray], dict[str, np.ndarray]]:
+        """
+        Gather the delta-timestamp queries of a batch of rows.
+
+        Returns:
+            tuple: per key, the clamped absolute query indices (B, D), the padding masks (B, D)
+                and the queried values (B, D, ...) of the cached columns.
+        """
+        keys = list(delta_indices)
+        sizes = [len(delta_indices[key]) for key in keys]
+        deltas = np.concatenate([np.asarray(delta_indices[key], dtype=np.int64) for key in keys])
+        episode_index = self.columns["episode_index"][rows]
+        start = self.ep_from[episode_index][:, None]
+        end = self.ep_to[episode_index][:, None]
+        # The queries of all keys at once, clamped to the episode of each row
+        query = self.columns["index"][rows][:, None] + deltas[None, :]
+        is_pad = (query < start) | (query >= end)
+        query = np.clip(query, start, end - 1)
+        query_rows = self.rows_of(query)
+
+        splits = np.cumsum(sizes)[:-1]
+        query_indices, padding, values = {}, {}, {}
+        for key, key_query, key_rows, key_pad in zip(
+            keys,
+            np.split(query, splits, axis=1),
+            np.split(query_rows, splits, axis=1),
+            np.split(is_pad, splits, axis=1),
+        ):
+            query_indices[key] = np.ascontiguousarray(key_query)
+            padding[f"{key}_is_pad"] = np.ascontiguousarray(key_pad)
+            if key in self.columns:
+                values[key] = self.columns[key][key_rows]
+        return query_indices, padding, values
+
+
 class LeRobotDataset(torch.utils.data.Dataset):
     def __init__(
         self,
@@ -751,20 +871,18 @@ class LeRobotDataset(torch.utils.data.Dataset):
             # self.download(download_videos)
             # self.hf_dataset = self.load_hf_dataset()
 
-        # Create mapping from absolute indices to relative indices when only a subset of the episodes are loaded
-        # Build a mapping: absolute_index -> relative_index_in_filtered_dataset
-        self._absolute_to_relative_idx = None
-        if self.episodes is not None:
-            self._absolute_to_relative_idx = {
-                abs_idx.item() if isinstance(abs_idx, torch.Tensor) else abs_idx: rel_idx
-                for rel_idx, abs_idx in enumerate(self.hf_dataset["index"])
-            }
-
         # Setup delta_indices
         if self.delta_timestamps is not None:
             check_delta_timestamps(self.delta_timestamps, self.fps, self.tolerance_s)
             self.delta_indices = get_delta_indices(self.delta_timestamps, self.fps)
 
+        # Numeric columns of the queried keys, also the map from absolute indices to rows when
+        # only a subset of the episodes is loaded. Built here so that DataLoader workers forked
+        # from this process share it, see _get_frame_cache
+        self._frame_cache = None
+        if self.delta_indices is not None:
+            self._get_frame_cache()
+
     def _close_writer(self) -> None:
         """Close and cleanup the parquet writer if it exists."""
         writer = getattr(self, "writer", None)
@@ -957,49 +1075,56 @@ class LeRobotDataset(torch.utils.data.Dataset):
         else:
             return get_hf_features_from_features(self.features)
 
-    def _get_query_indices(self, idx: int, ep_idx: int) -> tuple[dict[str, list[int | bool]]]:
-        ep = self.meta.episodes[ep_idx]
-        ep_start = ep["dataset_from_index"]
-        ep_end = ep["dataset_to_index"]
-        query_indices = {
-            key: [max(ep_start, min(ep_end - 1, idx + delta)) for delta in delta_idx]
-            for key, delta_idx in self.delta_indices.items()
-        }
-        padding = {  # Pad values outside of current episode range
-            f"{key}_is_pad": torch.BoolTensor(
-                [(idx + delta < ep_start) | (idx + delta >= ep_end) for delta in delta_idx]
+    def _get_frame_cache(self) -> _ColumnarFrameCache:
+        """
+        The columnar cache of the loaded frames, rebuilt when the hf_dataset is reloaded or the
+        delta-timestamp keys change.
+        """
+        cache = self._frame_cache
+        if (
+            cache is None
+            or cache.source is not self.hf_dataset
+            or cache.delta_keys != frozenset(self.delta_indices)
+        ):
+            self._frame_cache = _ColumnarFrameCache(
+                self.hf_dataset, self.meta.episodes, self.features, list(self.delta_indices)
             )
-            for key, delta_idx in self.delta_indices.items()
-        }
-        return query_indices, padding
+        return self._frame_cache
+
+    def _get_query_indices(
+        self, indices: list[int]
+    ) -> tuple[dict[str, np.ndarray], dict[str, np.ndarray], dict[str, np.ndarray]]:
+        """
+        Query indices, padding masks and the cached values of the delta timestamps of a batch of
+        frames, see _ColumnarFrameCache.query. Indices are clamped to the episode of each frame
+        and padded outside of it.
+        """
+        rows = np.asarray(indices, dtype=np.int64)
+        return self._get_frame_cache().query(rows, self.delta_indices)
 
     def _get_query_timestamps(
-        self, current_ts: float, query_indices: dict[str, list[int]] | None = None
+        self, current_ts: float, query_indices: dict[str, np.ndarray] | None = None
     ) -> dict[str, list[float]]:
         query_timestamps = {}
         for key in self.meta.video_keys:
             if query_indices is not None and key in query_indices:
-                if self._absolute_to_relative_idx is not None:
-                    relative_indices = [
-                        self._absolute_to_relative_idx[idx] for idx in query_indices[key]
-                    ]
-                    timestamps = self.hf_dataset[relative_indices]["timestamp"]
-                else:
-                    timestamps = self.hf_dataset[query_indices[key]]["timestamp"]
-                query_timestamps[key] = torch.stack(timestamps).tolist()
+                cache = self._get_frame_cache()
+                rows = cache.rows_of(query_indices[key])
+                query_timestamps[key] = cache.columns["timestamp"][rows].tolist()
             else:
                 query_timestamps[key] = [current_ts]
 
         return query_timestamps
 
-    def _query_hf_dataset(self, query_indices: dict[str, list[int]]) -> dict:
+    def _query_hf_dataset(self, query_indices: dict[str, np.ndarray]) -> dict:
         """
-        Query dataset for indices across keys, skipping video keys.
+        Query dataset for indices across keys, skipping video keys. Only used for the keys the
+        columnar frame cache does not hold, e.g. images stored in the parquet files.
 
         Tries column-first [key][indices] for speed, falls back to row-first.
 
         Args:
-            query_indices: Dict mapping keys to index lists to retrieve
+            query_indices: Dict mapping keys to absolute index arrays to retrieve
 
         Returns:
             Dict with stacked tensors of queried data (video keys excluded)
@@ -1008,12 +1133,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         for key, q_idx in query_indices.items():
             if key in self.meta.video_keys:
                 continue
-            # Map absolute indices to relative indices if needed
-            relative_indices = (
-                q_idx
-                if self._absolute_to_relative_idx is None
-                else [self._absolute_to_relative_idx[idx] for idx in q_idx]
-            )
+            relative_indices = self._get_frame_cache().rows_of(q_idx).tolist()
             try:
                 result[key] = torch.stack(self.hf_dataset[key][relative_indices])
             except (KeyError, TypeError, IndexError):
@@ -1028,22 +1148,59 @@ class LeRobotDataset(torch.utils.data.Dataset):
         Segmentation Fault. This probably happens because a memory reference to the video loader is created in
         the main process and a subprocess fails to access it.
         """
-        ep = self.meta.episodes[ep_idx]
-        item = {}
-        for vid_key, query_ts in query_timestamps.items():
-            # Episodes are stored sequentially on a single mp4 to reduce the number of files.
-            # Thus we load the start timestamp of the episode on this mp4 and,
-            # shift the query timestamp accordingly.
-            from_timestamp = ep[f"videos/{vid_key}/from_timestamp"]
-            shifted_query_ts = [from_timestamp + ts for ts in query_ts]
-
-            video_path = self.root / self.meta.get_video_file_path(ep_idx, vid_key)
-            frames = decode_video_frames(
-                video_path, shifted_query_ts, self.tolerance_s, self.video_backend
+        return self._query_videos_batch([(query_timestamps, ep_idx)])[0]
+
+    def _query_videos_batch(
+        self, queries: list[tuple[dict[str, list[float]], int]]
+    ) -> list[dict[str, torch.Tensor]]:
+        """
+        Decode the video frames of a batch of (query_timestamps, ep_idx). The timestamps that the
+        batch requests from one video file are decoded together, in one sorted pass over the file.
+        When the batch covers contiguous episodes, the decoders of the files of the following
+        episode are opened in the background.
+        """
+        # video_path -> [(query position, video key, timestamps on the file)]
+        requests = {}
+        for i, (query_timestamps, ep_idx) in enumerate(queries):
+            ep = self.meta.episodes[ep_idx]
+            for vid_key, query_ts in query_timestamps.items():
+                # Episodes are stored sequentially on a single mp4 to reduce the number of files.
+                # Thus we load the start timestamp of the episode on this mp4 and,
+                # shift the query timestamp accordingly.
+                from_timestamp = ep[f"videos/{vid_key}/from_timestamp"]
+                shifted_query_ts = [from_timestamp + ts for ts in query_ts]
+                video_path = self.root / self.meta.get_video_file_path(ep_idx, vid_key)
+                requests.setdefault(video_path, []).append((i, vid_key, shifted_query_ts))
+
+        # A batch of contiguous episodes comes from a sampler moving forward through them, whose
+        # next batch is likely to start on the following episode. Shuffled batches give no hint
+        episode_indices = sorted({ep_idx for _, ep_idx in queries})
+        next_ep_idx = episode_indices[-1] + 1
+        if (
+            episode_indices[-1] - episode_indices[0] + 1 == len(episode_indices)
+            and next_ep_idx < self.meta.total_episodes
+            and (self.episodes is None or next_ep_idx in self.episodes)
+        ):
+            prefetch_video_decoders(
+                [
+                    self.root / self.meta.get_video_file_path(next_ep_idx, vid_key)
+                    for vid_key in self.meta.video_keys
+                ],
+                self.video_backend,
             )
-            item[vid_key] = frames.squeeze(0)
 
-        return item
+        items = [{} for _ in queries]
+        for video_path, video_requests in requests.items():
+            frames = decode_video_frames_batch(
+                video_path,
+                [shifted_query_ts for _, _, shifted_query_ts in video_requests],
+                self.tolerance_s,
+                self.video_backend,
+            )
+            for (i, vid_key, _), query_frames in zip(video_requests, frames, strict=True):
+                items[i][vid_key] = query_frames.squeeze(0)
+
+        return items
 
     def _ensure_hf_dataset_loaded(self):
         """Lazy load the HF dataset only when needed for reading."""
@@ -1059,34 +1216,59 @@ class LeRobotDataset(torch.utils.data.Dataset):
         return self.num_frames
 
     def __getitem__(self, idx) -> dict:
+        return self.__getitems__([idx])[0]
+
+    def __getitems__(self, indices: list[int]) -> list[dict]:
+        """
+        Fetch a batch of frames. The DataLoader calls this with the indices of a whole batch,
+        whose delta-timestamp queries are then gathered at once from the columnar frame cache,
+        and whose video frames are decoded together per video file.
+        """
         # Ensure dataset is loaded when we actually need to read from it
         self._ensure_hf_dataset_loaded()
-        item = self.hf_dataset[idx]
-        ep_idx = item["episode_index"].item()
-
-        query_indices = None
+        batch_query = None
         if self.delta_indices is not None:
-            query_indices, padding = self._get_query_indices(idx, ep_idx)
-            query_result = self._query_hf_dataset(query_indices)
-            item = {**item, **padding}
-            for key, val in query_result.items():
-                item[key] = val
-
-        if len(self.meta.video_keys) > 0:
-            current_ts = item["timestamp"].item()
-            query_timestamps = self._get_query_timestamps(current_ts, query_indices)
-            video_frames = self._query_videos(query_timestamps, ep_idx)
-            item = {**video_frames, **item}
-
-        if self.image_transforms is not None:
-            image_keys = self.meta.camera_keys
-            for cam in image_keys:
-                item[cam] = self.image_transforms(item[cam])
-
-        # Add task as a string
-        task_idx = item["task_index"].item()
-        item["task"] = self.meta.tasks.iloc[task_idx].name
-        return item
+            batch_query = self._get_query_indices(indices)
+
+        items, video_queries = [], []
+        for i, idx in enumerate(indices):
+            item = self.hf_dataset[idx]
+            ep_idx = item["episode_index"].item()
+
+            query_indices = None
+            if batch_query is not None:
+                batch_indices, batch_padding, batch_values = batch_query
+                query_indices = {key: query[i] for key, query in batch_indices.items()}
+                padding = {key: torch.from_numpy(pad[i]) for key, pad in batch_padding.items()}
+                item = {**item, **padding}
+                for key, val in batch_values.items():
+                    item[key] = torch.from_numpy(val[i])
+                uncached = {
+                    key: query for key, query in query_indices.items() if key not in batch_values
+                }
+                if uncached:
+                    item.update(self._query_hf_dataset(uncached))
+
+            if len(self.meta.video_keys) > 0:
+                current_ts = item["timestamp"].item()
+                query_timestamps = self._get_query_timestamps(current_ts, query_indices)
+                video_queries.append((query_timestamps, ep_idx))
+            items.append(item)
+
+        if video_queries:
+            video_frames = self._query_videos_batch(video_queries)
+            items = [{**frames, **item} for frames, item in zip(video_frames, items, strict=True)]
+
+        for item in items:
+            if self.image_transforms is not None:
+                image_keys = self.meta.camera_keys
+                for cam in image_keys:
+                    item[cam] = self.image_transforms(item[cam])
+
+            # Add task as a string
+            task_idx = item["task_index"].item()
+            item["task"] = self.meta.tasks.iloc[task_idx].name
+        return items
 
     def __repr__(self):
         feature_keys = list(self.features)
@@ -1618,7 +1800,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         obj.image_transforms = None
         obj.delta_timestamps = None
         obj.delta_indices = None
-        obj._absolute_to_relative_idx = None
+        obj._frame_cache = None
         obj.video_backend = video_backend if video_backend is not None else get_safe_default_codec()
         obj.writer = None
         obj.latest_episode = None
@@ -1694,6 +1876,25 @@ class MultiLeRobotDataset(torch.utils.data.Dataset):
         # with multiple robots of different ranges. Instead we should have one normalization
         # per robot.
         self.stats = aggregate_stats([dataset.meta.stats for dataset in self._datasets])
+        # End index of each dataset in the concatenation
+        self._cumulative_sizes = list(itertools.accumulate(d.num_frames for d in self._datasets))
+
+    def mixture_sampler(
+        self, weights: dict[str, float] | None = None, temperature: float = 1.0, **kwargs
+    ) -> MixtureSampler:
+        """Sampler balancing the datasets, see `MixtureSampler`.
+
+        Args:
+            weights: Weight of each repo_id. Defaults to the dataset sizes.
+            temperature: Reweighting of the mixture, above 1 it tends to uniform over the datasets.
+            kwargs: Forwarded to `MixtureSampler`, e.g. num_samples, num_replicas, rank and seed.
+        """
+        return MixtureSampler(
+            [d.num_frames for d in self._datasets],
+            weights=[weights[repo_id] for repo_id in self.repo_ids] if weights else None,
+            temperature=temperature,
+            **kwargs,
+        )
 
     @property
     def repo_id_to_index(self):
@@ -1773,24 +1974,14 @@ class MultiLeRobotDataset(torch.utils.data.Dataset):
         return 1 / self.fps - 1e-4
 
     def __len__(self):
-        return self.num_frames
+        return self._cumulative_sizes[-1]
 
     def __getitem__(self, idx: int) -> dict[str, torch.Tensor]:
         if idx >= len(self):
             raise IndexError(f"Index {idx} out of bounds.")
         # Determine which dataset to get an item from based on the index.
-        start_idx = 0
-        dataset_idx = 0
-        for dataset in self._datasets:
-            if idx >= start_idx + dataset.num_frames:
-                start_idx += dataset.num_frames
-                dataset_idx += 1
-                continue
-            break
-        else:
-            raise AssertionError(
-                "We expect the loop to break out as long as the index is within bounds."
-            )
+        dataset_idx = bisect.bisect_right(self._cumulative_sizes, idx)
+        start_idx = self._cumulative_sizes[dataset_idx - 1] if dataset_idx > 0 else 0
         item = self._datasets[dataset_idx][idx - start_idx]
         item["dataset_index"] = torch.tensor(dataset_idx)
         for data_key in self.disabled_features:
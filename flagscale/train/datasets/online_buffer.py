@@ -117,6 +117,7 @@ class OnlineBuffer(torch.utils.data.Dataset):
                 mode="r+" if (Path(write_dir) / k).exists() else "w+",
                 shape=tuple(v["shape"]) if v is not None else None,
             )
+        self._build_episode_index()
 
     @property
     def delta_timestamps(self) -> dict[str, np.ndarray] | None:
@@ -171,6 +172,36 @@ class OnlineBuffer(torch.utils.data.Dataset):
             complete_data_spec[k] = {"dtype": v["dtype"], "shape": (buffer_capacity, *v["shape"])}
         return complete_data_spec
 
+    def _build_episode_index(self):
+        """Build the episode of every buffer slot, and the frame count, from the memmaps.
+
+        For every slot, `_episode_start` is the slot of the first frame of its episode and
+        `_episode_length` the number of frames of the episode in the buffer. The frames of an
+        episode are in consecutive slots, wrapping around the end of the buffer.
+        """
+        capacity = self._buffer_capacity
+        self._num_frames = np.count_nonzero(self._data[OnlineBuffer.OCCUPANCY_MASK_KEY])
+        self._episode_start = np.zeros(capacity, dtype=np.int64)
+        self._episode_length = np.zeros(capacity, dtype=np.int64)
+        slots = np.flatnonzero(self._data[OnlineBuffer.OCCUPANCY_MASK_KEY])
+        if len(slots) == 0:
+            return
+        # In the order the frames were added
+        slots = slots[np.argsort(self._data[OnlineBuffer.INDEX_KEY][slots], kind="stable")]
+        self._set_episodes(slots, self._data[OnlineBuffer.EPISODE_INDEX_KEY][slots])
+
+    def _set_episodes(self, slots: np.ndarray, episode_indices: np.ndarray):
+        """Index the episodes of frames in `slots`, given in the order they were added."""
+        run_starts = np.flatnonzero(np.diff(episode_indices, prepend=episode_indices[0] - 1))
+        run_lengths = np.diff(run_starts, append=len(slots))
+        self._episode_start[slots] = np.repeat(slots[run_starts], run_lengths)
+        self._episode_length[slots] = np.repeat(run_lengths, run_lengths)
+
+    def _episode_slots(self, slot: int) -> np.ndarray:
+        """Slots of the frames of the episode at `slot`, in order, without any scan of the buffer."""
+        start, length = self._episode_start[slot], self._episode_length[slot]
+        return (start + np.arange(length)) % self._buffer_capacity
+
     def add_data(self, data: dict[str, np.ndarray]):
         """Add new data to the buffer, which could potentially mean shifting old data out.
 
@@ -200,6 +231,18 @@ class OnlineBuffer(torch.utils.data.Dataset):
             data[OnlineBuffer.EPISODE_INDEX_KEY] += last_episode_index + 1
             data[OnlineBuffer.INDEX_KEY] += last_data_index + 1
 
+        # The oldest episode still in the buffer loses the frames that are overwritten
+        end_slot = (next_index + new_data_length) % self._buffer_capacity
+        if (
+            new_data_length < self._buffer_capacity
+            and self._data[OnlineBuffer.OCCUPANCY_MASK_KEY][end_slot]
+        ):
+            start = self._episode_start[end_slot]
+            length = self._episode_length[end_slot] - (end_slot - start) % self._buffer_capacity
+            remaining = (end_slot + np.arange(length)) % self._buffer_capacity
+            self._episode_start[remaining] = end_slot
+            self._episode_length[remaining] = length
+
         # Insert the new data starting from next_index. It may be necessary to wrap around to the start.
         n_surplus = max(0, new_data_length - (self._buffer_capacity - next_index))
         for k in self.data_keys:
@@ -216,6 +259,10 @@ class OnlineBuffer(torch.utils.data.Dataset):
         else:
             self._data[OnlineBuffer.NEXT_INDEX_KEY] = n_surplus
 
+        self._num_frames = np.count_nonzero(self._data[OnlineBuffer.OCCUPANCY_MASK_KEY])
+        new_slots = (next_index + np.arange(new_data_length)) % self._buffer_capacity
+        self._set_episodes(new_slots, np.asarray(data[OnlineBuffer.EPISODE_INDEX_KEY]))
+
     @property
     def data_keys(self) -> list[str]:
         keys = set(self._data)
@@ -239,7 +286,7 @@ class OnlineBuffer(torch.utils.data.Dataset):
 
     @property
     def num_frames(self) -> int:
-        return np.count_nonzero(self._data[OnlineBuffer.OCCUPANCY_MASK_KEY])
+        return self._num_frames
 
     def __len__(self):
         return self.num_frames
@@ -264,14 +311,8 @@ class OnlineBuffer(torch.utils.data.Dataset):
         if self.delta_timestamps is None:
             return self._item_to_tensors(item)
 
-        episode_index = item[OnlineBuffer.EPISODE_INDEX_KEY]
         current_ts = item[OnlineBuffer.TIMESTAMP_KEY]
-        episode_data_indices = np.where(
-            np.bitwise_and(
-                self._data[OnlineBuffer.EPISODE_INDEX_KEY] == episode_index,
-                self._data[OnlineBuffer.OCCUPANCY_MASK_KEY],
-            )
-        )[0]
+        episode_data_indices = self._episode_slots(idx % self._buffer_capacity)
         episode_timestamps = self._data[OnlineBuffer.TIMESTAMP_KEY][episode_data_indices]
 
         for data_key in self.delta_timestamps:
@@ -308,6 +349,15 @@ class OnlineBuffer(torch.utils.data.Dataset):
         return torch.from_numpy(self._data[key][self._data[OnlineBuffer.OCCUPANCY_MASK_KEY]])
 
 
+def _mask_of_ranges(length: int, starts: np.ndarray, ends: np.ndarray) -> torch.Tensor:
+    """Boolean mask of `length` elements, True in every [start, end) range."""
+    lengths = np.maximum(ends - starts, 0)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    mask = torch.zeros(length, dtype=torch.bool)
+    mask[torch.from_numpy(np.repeat(starts, lengths) + offsets)] = True
+    return mask
+
+
 def compute_sampler_weights(
     offline_dataset: LeRobotDataset,
     offline_drop_n_last_frames: int = 0,
@@ -349,17 +399,12 @@ def compute_sampler_weights(
     weights = []
 
     if len(offline_dataset) > 0:
-        offline_data_mask_indices = []
-        for start_index, end_index in zip(
-            offline_dataset.meta.episodes["dataset_from_index"],
-            offline_dataset.meta.episodes["dataset_to_index"],
-            strict=True,
-        ):
-            offline_data_mask_indices.extend(
-                range(start_index, end_index - offline_drop_n_last_frames)
-            )
-        offline_data_mask = torch.zeros(len(offline_dataset), dtype=torch.bool)
-        offline_data_mask[torch.tensor(offline_data_mask_indices)] = True
+        offline_data_mask = _mask_of_ranges(
+            len(offline_dataset),
+            np.asarray(offline_dataset.meta.episodes["dataset_from_index"]),
+            np.asarray(offline_dataset.meta.episodes["dataset_to_index"])
+            - offline_drop_n_last_frames,
+        )
         weights.append(
             torch.full(
                 size=(len(offline_dataset),),
@@ -369,17 +414,15 @@ def compute_sampler_weights(
         )
 
     if online_dataset is not None and len(online_dataset) > 0:
-        online_data_mask_indices = []
-        episode_indices = online_dataset.get_data_by_key("episode_index")
-        for episode_idx in torch.unique(episode_indices):
-            where_episode = torch.where(episode_indices == episode_idx)
-            start_index = where_episode[0][0]
-            end_index = where_episode[0][-1] + 1
-            online_data_mask_indices.extend(
-                range(start_index.item(), end_index.item() - online_drop_n_last_frames)
-            )
-        online_data_mask = torch.zeros(len(online_dataset), dtype=torch.bool)
-        online_data_mask[torch.tensor(online_data_mask_indices)] = True
+        episode_indices = online_dataset.get_data_by_key("episode_index").numpy()
+        # First and last frame of every episode
+        _, first = np.unique(episode_indices, return_index=True)
+        _, last_reversed = np.unique(episode_indices[::-1], return_index=True)
+        online_data_mask = _mask_of_ranges(
+            len(online_dataset),
+            first,
+            len(episode_indices) - last_reversed - online_drop_n_last_frames,
+        )
         weights.append(
             torch.full(
                 size=(len(online_dataset),),
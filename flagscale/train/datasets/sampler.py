@@ -15,9 +15,56 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import math
 from collections.abc import Iterator
 
-import torch
+import numpy as np
+import torch.distributed as dist
+
+# Indices generated at once by __iter__
+_CHUNK_SIZE = 1 << 16
+
+_MIX_1 = np.uint64(0x9E3779B97F4A7C15)
+_MIX_2 = np.uint64(0xBF58476D1CE4E5B9)
+
+
+def _mix(values: np.ndarray, key: np.uint64) -> np.ndarray:
+    """Hash of uint64 values, the round function of the permutation."""
+    values = (values ^ key) * _MIX_1
+    values ^= values >> np.uint64(29)
+    values *= _MIX_2
+    return values ^ (values >> np.uint64(32))
+
+
+def _permute(positions: np.ndarray, size: int, seed: list[int]) -> np.ndarray:
+    """Image of positions under a seeded pseudo-random permutation of range(size).
+
+    A balanced Feistel network on the smallest even number of bits covering `size`, cycle-walked
+    back into the range. Any position is permuted on its own, the permutation is never stored.
+    """
+    half_bits = max(1, math.ceil(math.log2(max(size, 2)) / 2))
+    shift, mask = np.uint64(half_bits), np.uint64((1 << half_bits) - 1)
+    keys = np.random.default_rng(seed).integers(0, 1 << 63, size=4, dtype=np.uint64)
+
+    values = positions.astype(np.uint64)
+    walking = np.ones(len(values), dtype=bool)
+    while walking.any():
+        left, right = values[walking] >> shift, values[walking] & mask
+        for key in keys:
+            left, right = right, left ^ (_mix(right, key) & mask)
+        values[walking] = (left << shift) | right
+        walking = values >= size
+    return values.astype(np.int64)
+
+
+def _data_parallel_rank(num_replicas: int | None, rank: int | None) -> tuple[int, int]:
+    if num_replicas is None:
+        num_replicas = dist.get_world_size() if dist.is_initialized() else 1
+    if rank is None:
+        rank = dist.get_rank() if dist.is_initialized() else 0
+    if not 0 <= rank < num_replicas:
+        raise ValueError(f"Invalid rank {rank}, rank should be in [0, {num_replicas - 1}]")
+    return num_replicas, rank
 
 
 class EpisodeAwareSampler:
@@ -29,9 +76,19 @@ class EpisodeAwareSampler:
         drop_n_first_frames: int = 0,
         drop_n_last_frames: int = 0,
         shuffle: bool = False,
+        num_replicas: int | None = None,
+        rank: int | None = None,
+        seed: int = 0,
+        drop_last: bool = False,
     ):
         """Sampler that optionally incorporates episode boundary information.
 
+        The valid frames are kept as ranges of the episodes, never as a list of indices, and
+        the shuffled order of an epoch is a pseudo-random permutation computed chunk by chunk.
+        Like `DistributedSampler`, each rank samples every `num_replicas`-th index of the
+        epoch, so ranks see disjoint frames in the same order for the same `seed` and epoch.
+        The position within the epoch is saved by `state_dict` for a mid-epoch resume.
+
         Args:
             dataset_from_indices: List of indices containing the start of each episode in the dataset.
             dataset_to_indices: List of indices containing the end of each episode in the dataset.
@@ -40,26 +97,236 @@ class EpisodeAwareSampler:
             drop_n_first_frames: Number of frames to drop from the start of each episode.
             drop_n_last_frames: Number of frames to drop from the end of each episode.
             shuffle: Whether to shuffle the indices.
+            num_replicas: Number of data parallel ranks. Defaults to the world size.
+            rank: Data parallel rank of this process. Defaults to the global rank.
+            seed: Seed of the shuffled order, it must be the same on all ranks.
+            drop_last: Whether to drop the tail of the epoch that can not be split evenly across
+                the ranks, instead of padding it with frames from the start of the epoch.
         """
-        indices = []
-        for episode_idx, (start_index, end_index) in enumerate(
-            zip(dataset_from_indices, dataset_to_indices, strict=True)
-        ):
-            if episode_indices_to_use is None or episode_idx in episode_indices_to_use:
-                indices.extend(
-                    range(start_index + drop_n_first_frames, end_index - drop_n_last_frames)
-                )
+        if len(dataset_from_indices) != len(dataset_to_indices):
+            raise ValueError("dataset_from_indices and dataset_to_indices differ in length.")
+        starts = np.asarray(dataset_from_indices, dtype=np.int64) + drop_n_first_frames
+        ends = np.asarray(dataset_to_indices, dtype=np.int64) - drop_n_last_frames
+        if episode_indices_to_use is not None:
+            episodes = np.asarray(list(episode_indices_to_use), dtype=np.int64)
+            use = np.zeros(len(starts), dtype=bool)
+            use[episodes[(episodes >= 0) & (episodes < len(starts))]] = True
+            starts, ends = starts[use], ends[use]
+        lengths = ends - starts
+        nonempty = lengths > 0
+        # Start frame of each episode, and its position among all valid frames
+        self._starts = starts[nonempty]
+        self._offsets = np.cumsum(lengths[nonempty]) - lengths[nonempty]
+        self.num_frames = int(lengths[nonempty].sum())
 
-        self.indices = indices
+        self.num_replicas, self.rank = _data_parallel_rank(num_replicas, rank)
         self.shuffle = shuffle
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+        # Indices of the current epoch already yielded by this rank
+        self._num_yielded = 0
+
+    @property
+    def indices(self) -> np.ndarray:
+        """All valid frame indices, in dataset order."""
+        return self._frames(np.arange(self.num_frames))
+
+    def _frames(self, positions: np.ndarray) -> np.ndarray:
+        """Frame index at each position of the valid frames."""
+        episodes = np.searchsorted(self._offsets, positions, side="right") - 1
+        return self._starts[episodes] + positions - self._offsets[episodes]
+
+    def __iter__(self) -> Iterator[int]:
+        epoch, num_samples = self.epoch, len(self)
+        for chunk_start in range(self._num_yielded, num_samples, _CHUNK_SIZE):
+            steps = np.arange(chunk_start, min(chunk_start + _CHUNK_SIZE, num_samples))
+            # Positions past the end pad the epoch with its first frames
+            positions = (self.rank + steps * self.num_replicas) % self.num_frames
+            if self.shuffle:
+                positions = _permute(positions, self.num_frames, [self.seed, epoch])
+            for frame in self._frames(positions).tolist():
+                self._num_yielded += 1
+                yield frame
+        # The next pass is the next epoch, unless set_epoch is called
+        self.epoch, self._num_yielded = epoch + 1, 0
+
+    def __len__(self) -> int:
+        """Number of indices of this rank in an epoch."""
+        if self.drop_last:
+            return self.num_frames // self.num_replicas
+        return math.ceil(self.num_frames / self.num_replicas)
+
+    def set_epoch(self, epoch: int) -> None:
+        """Set the epoch of the shuffled order, a new epoch starts from its beginning."""
+        if epoch != self.epoch:
+            self.epoch, self._num_yielded = epoch, 0
+
+    def state_dict(self, num_consumed: int | None = None) -> dict:
+        """Position of this rank, to save with the checkpoint.
+
+        Args:
+            num_consumed: Indices of the current epoch consumed by training on this rank. The
+                DataLoader draws indices ahead of training, so pass this to not skip the prefetched
+                ones. Defaults to the number of indices yielded so far.
+        """
+        return {
+            "epoch": self.epoch,
+            "num_yielded": self._num_yielded if num_consumed is None else num_consumed,
+            "seed": self.seed,
+        }
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        """Resume from `state_dict`: the next iteration continues the saved epoch."""
+        self.epoch = state_dict["epoch"]
+        self._num_yielded = state_dict["num_yielded"]
+        self.seed = state_dict["seed"]
+
+
+class MixtureSampler:
+    def __init__(
+        self,
+        dataset_sizes: list[int],
+        weights: list[float] | None = None,
+        temperature: float = 1.0,
+        num_samples: int | None = None,
+        num_replicas: int | None = None,
+        rank: int | None = None,
+        seed: int = 0,
+    ):
+        """Sampler of a concatenation of datasets, drawing each sample from a weighted mixture.
+
+        Every sample first draws its source dataset, with probability proportional to
+        `weights ** (1 / temperature)`, then the next frame of that source. The frames of a
+        source follow a shuffled order, restarted with a new order when exhausted, so small
+        sources are repeated and large ones subsampled without duplicating any data. Like
+        `EpisodeAwareSampler`, ranks take every `num_replicas`-th sample of the epoch, and
+        `state_dict` saves the position within the epoch.
+
+        Args:
+            dataset_sizes: Number of frames of each source, in the order of the concatenation.
+            weights: Weight of each source. Defaults to the sizes, i.e. uniform over all frames.
+            temperature: Above 1 flattens the mixture towards uniform over the sources, below 1
+                sharpens it.
+            num_samples: Samples of an epoch, on all ranks together. Defaults to the total number
+                of frames.
+            num_replicas: Number of data parallel ranks. Defaults to the world size.
+            rank: Data parallel rank of this process. Defaults to the global rank.
+            seed: Seed of the mixture, it must be the same on all ranks.
+        """
+        sizes = np.asarray(dataset_sizes, dtype=np.int64)
+        weights = sizes if weights is None else np.asarray(weights, dtype=np.float64)
+        if len(weights) != len(sizes):
+            raise ValueError("weights and dataset_sizes differ in length.")
+        if temperature <= 0:
+            raise ValueError(f"temperature must be positive, got {temperature}")
+        weights = np.where(sizes > 0, np.asarray(weights, dtype=np.float64), 0.0)
+        if np.any(weights < 0) or weights.sum() == 0:
+            raise ValueError(
+                "weights must be non-negative, with a positive weight on a non-empty source."
+            )
+        probabilities = weights ** (1 / temperature)
+        self.probabilities = probabilities / probabilities.sum()
+
+        self.sizes = sizes
+        self.offsets = np.cumsum(sizes) - sizes
+        self.num_samples = int(sizes.sum()) if num_samples is None else num_samples
+        self.num_replicas, self.rank = _data_parallel_rank(num_replicas, rank)
+        self.seed = seed
+        self.epoch = 0
+        self._num_yielded = 0
+        # Frames and tokens trained on by this rank, of each source, see record
+        self.source_frames = np.zeros(len(sizes), dtype=np.int64)
+        self.source_tokens = np.zeros(len(sizes), dtype=np.int64)
+
+    def _chunk(self, epoch: int, chunk: int, draws: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Source and frame index of each sample of a chunk of the epoch, on all ranks.
+
+        `draws` holds the number of frames drawn from each source before the chunk, and is
+        advanced past it.
+        """
+        num = min(_CHUNK_SIZE, self.num_samples - chunk * _CHUNK_SIZE)
+        rng = np.random.default_rng([self.seed, epoch, chunk])
+        sources = rng.choice(len(self.sizes), size=num, p=self.probabilities)
+
+        # The n-th sample of a source in the chunk is its draws[source] + n-th frame
+        order = np.argsort(sources, kind="stable")
+        counts = np.bincount(sources, minlength=len(self.sizes))
+        rank_in_source = np.empty(num, dtype=np.int64)
+        rank_in_source[order] = np.arange(num) - np.repeat(np.cumsum(counts) - counts, counts)
+        source_draws = draws[sources] + rank_in_source
+        draws += counts
+
+        # Every pass over a source has its own shuffled order
+        sizes = self.sizes[sources]
+        passes, positions = source_draws // sizes, source_draws % sizes
+        frames = np.empty(num, dtype=np.int64)
+        for source in np.flatnonzero(counts):
+            of_source = sources == source
+            for source_pass in np.unique(passes[of_source]):
+                selected = of_source & (passes == source_pass)
+                frames[selected] = _permute(
+                    positions[selected],
+                    int(self.sizes[source]),
+                    [self.seed, epoch, int(source), int(source_pass)],
+                )
+        return sources, self.offsets[sources] + frames
 
     def __iter__(self) -> Iterator[int]:
-        if self.shuffle:
-            for i in torch.randperm(len(self.indices)):
-                yield self.indices[i]
-        else:
-            for i in self.indices:
-                yield i
+        epoch, num_samples = self.epoch, len(self)
+        draws = np.zeros(len(self.sizes), dtype=np.int64)
+        start = self.rank + self._num_yielded * self.num_replicas
+        for chunk in range(math.ceil(self.num_samples / _CHUNK_SIZE)):
+            # Chunks are drawn from the start of the epoch, to know the draws of each source
+            sources, indices = self._chunk(epoch, chunk, draws)
+            steps = np.arange(chunk * _CHUNK_SIZE, chunk * _CHUNK_SIZE + len(indices))
+            mine = (steps % self.num_replicas == self.rank) & (steps >= start)
+            mine &= steps < self.rank + num_samples * self.num_replicas
+            for index in indices[mine].tolist():
+                self._num_yielded += 1
+                yield index
+        self.epoch, self._num_yielded = epoch + 1, 0
 
     def __len__(self) -> int:
-        return len(self.indices)
+        """Number of indices of this rank in an epoch."""
+        return self.num_samples // self.num_replicas
+
+    def source_of(self, indices: np.ndarray) -> np.ndarray:
+        """Source of each index of the concatenation."""
+        return np.searchsorted(self.offsets, indices, side="right") - 1
+
+    def record(self, dataset_indices, num_tokens=None) -> None:
+        """Account the samples of a step, by their source, e.g. the `dataset_index` of a batch of
+        `MultiLeRobotDataset`, and optionally the number of tokens of each sample."""
+        dataset_indices = np.asarray(dataset_indices, dtype=np.int64).reshape(-1)
+        self.source_frames += np.bincount(dataset_indices, minlength=len(self.sizes))
+        if num_tokens is not None:
+            np.add.at(self.source_tokens, dataset_indices, np.asarray(num_tokens).reshape(-1))
+
+    def set_epoch(self, epoch: int) -> None:
+        """Set the epoch of the mixture, a new epoch starts from its beginning."""
+        if epoch != self.epoch:
+            self.epoch, self._num_yielded = epoch, 0
+
+    def state_dict(self, num_consumed: int | None = None) -> dict:
+        """Position of this rank and the per-source accounting, to save with the checkpoint.
+
+        Args:
+            num_consumed: Indices of the current epoch consumed by training on this rank, see
+                `EpisodeAwareSampler.state_dict`. Defaults to the number of indices yielded so far.
+        """
+        return {
+            "epoch": self.epoch,
+            "num_yielded": self._num_yielded if num_consumed is None else num_consumed,
+            "seed": self.seed,
+            "source_frames": self.source_frames.tolist(),
+            "source_tokens": self.source_tokens.tolist(),
+        }
+
+    def load_state_dict(self, state_dict: dict) -> None:
+        """Resume from `state_dict`: the next iteration continues the saved epoch."""
+        self.epoch = state_dict["epoch"]
+        self._num_yielded = state_dict["num_yielded"]
+        self.seed = state_dict["seed"]
+        self.source_frames = np.asarray(state_dict["source_frames"], dtype=np.int64)
+        self.source_tokens = np.asarray(state_dict["source_tokens"], dtype=np.int64)
@@ -18,9 +18,12 @@
 import glob
 import importlib
 import logging
+import os
 import shutil
 import tempfile
 import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 from threading import Lock
@@ -72,6 +75,31 @@ def decode_video_frames(
         raise ValueError(f"Unsupported video backend: {backend}")
 
 
+def decode_video_frames_batch(
+    video_path: Path | str,
+    timestamps_list: list[list[float]],
+    tolerance_s: float,
+    backend: str | None = None,
+) -> list[torch.Tensor]:
+    """
+    Decodes the frames of several queries on the same video, e.g. the samples of a batch.
+
+    With torchcodec all queries are decoded in one sorted seek pass over the file, other backends
+    decode query after query.
+
+    Returns:
+        list[torch.Tensor]: The decoded frames of each query.
+    """
+    if backend is None:
+        backend = get_safe_default_codec()
+    if backend == "torchcodec":
+        return decode_video_frames_torchcodec_batch(video_path, timestamps_list, tolerance_s)
+    return [
+        decode_video_frames(video_path, timestamps, tolerance_s, backend)
+        for timestamps in timestamps_list
+    ]
+
+
 def decode_video_frames_torchvision(
     video_path: Path | str,
     timestamps: list[float],
@@ -171,31 +199,105 @@ def decode_video_frames_torchvision(
 
 
 class VideoDecoderCache:
-    """Thread-safe cache for video decoders to avoid expensive re-initialization."""
+    """
+    Thread-safe LRU cache of video decoders, to avoid expensive re-initialization.
 
-    def __init__(self):
-        self._cache: dict[str, tuple[Any, Any]] = {}
-        self._lock = Lock()
+    At most ``max_size`` decoders are kept open, the least recently used one is closed with its
+    file handle when another video is opened. The cache belongs to one process: a dataloader
+    worker forked with a populated cache starts from an empty one instead of sharing the
+    decoders and file offsets of its parent.
+    """
 
-    def get_decoder(self, video_path: str):
-        """Get a cached decoder or create a new one."""
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self._cache: OrderedDict[str, tuple[Any, Any]] = OrderedDict()
+        self._lock = Lock()
+        self._pid = os.getpid()
+        self._prefetcher: ThreadPoolExecutor | None = None
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            # Forked: the entries and the lock are copies of the parent's, drop both
+            self._cache = OrderedDict()
+            self._lock = Lock()
+            self._pid = os.getpid()
+            self._prefetcher = None
+
+    def _open(self, video_path: str) -> tuple[Any, Any]:
         if importlib.util.find_spec("torchcodec"):
             from torchcodec.decoders import VideoDecoder
         else:
             raise ImportError("torchcodec is required but not available.")
 
-        video_path = str(video_path)
+        file_handle = fsspec.open(video_path).__enter__()
+        try:
+            decoder = VideoDecoder(file_handle, seek_mode="approximate")
+        except Exception:
+            file_handle.close()
+            raise
+        return decoder, file_handle
 
-        with self._lock:
-            if video_path not in self._cache:
-                file_handle = fsspec.open(video_path).__enter__()
-                decoder = VideoDecoder(file_handle, seek_mode="approximate")
-                self._cache[video_path] = (decoder, file_handle)
+    def get_decoder(self, video_path: str):
+        """Get a cached decoder or create a new one."""
+        return self._get(str(video_path), evict=True)
 
-            return self._cache[video_path][0]
+    def _get(self, video_path: str, evict: bool):
+        self._check_process()
+
+        with self._lock:
+            entry = self._cache.get(video_path)
+            if entry is not None:
+                self._cache.move_to_end(video_path)
+                return entry[0]
+
+        # Opened outside of the lock, other videos stay available meanwhile
+        entry = self._open(video_path)
+        evicted = []
+        with self._lock:
+            if video_path in self._cache:
+                # Opened concurrently, keep the first one
+                evicted.append(entry)
+                entry = self._cache[video_path]
+                self._cache.move_to_end(video_path)
+            elif evict or len(self._cache) < self.max_size:
+                self._cache[video_path] = entry
+                while len(self._cache) > max(self.max_size, 1):
+                    evicted.append(self._cache.popitem(last=False)[1])
+            else:
+                # A prefetch must not close a decoder that may be in use
+                evicted.append(entry)
+                entry = (None, None)
+        for _, file_handle in evicted:
+            file_handle.close()
+        return entry[0]
+
+    def prefetch(self, video_paths: list[str]):
+        """
+        Open the decoders of videos needed soon in a background thread, e.g. the files of the
+        next episodes. Prefetching only fills free slots of the cache, it never evicts.
+        """
+        self._check_process()
+        with self._lock:
+            missing = [str(p) for p in dict.fromkeys(video_paths) if str(p) not in self._cache]
+            missing = missing[: self.max_size - len(self._cache)]
+            if not missing:
+                return
+            if self._prefetcher is None:
+                self._prefetcher = ThreadPoolExecutor(max_workers=1)
+            prefetcher = self._prefetcher
+        for video_path in missing:
+            prefetcher.submit(self._prefetch_one, video_path)
+
+    def _prefetch_one(self, video_path: str):
+        try:
+            self._get(video_path, evict=False)
+        except Exception as e:
+            # The error is raised again when the video is decoded
+            logging.debug(f"Failed to prefetch the decoder of {video_path}: {e}")
 
     def clear(self):
         """Clear the cache and close file handles."""
+        self._check_process()
         with self._lock:
             for _, file_handle in self._cache.values():
                 file_handle.close()
@@ -203,6 +305,7 @@ class VideoDecoderCache:
 
     def size(self) -> int:
         """Return the number of cached decoders."""
+        self._check_process()
         with self._lock:
             return len(self._cache)
 
@@ -216,6 +319,14 @@ class FrameTimestampError(ValueError):
 _default_decoder_cache = VideoDecoderCache()
 
 
+def prefetch_video_decoders(video_paths: list[Path | str], backend: str | None = None):
+    """Open the decoders of videos that are decoded soon in the background, only for torchcodec."""
+    if backend is None:
+        backend = get_safe_default_codec()
+    if backend == "torchcodec":
+        _default_decoder_cache.prefetch([str(video_path) for video_path in video_paths])
+
+
 def decode_video_frames_torchcodec(
     video_path: Path | str,
     timestamps: list[float],
@@ -240,35 +351,62 @@ def decode_video_frames_torchcodec(
     and all subsequent frames until reaching the requested frame. The number of key frames in a video
     can be adjusted during encoding to take into account decoding time and video size in bytes.
     """
+    return decode_video_frames_torchcodec_batch(
+        video_path, [timestamps], tolerance_s, log_loaded_timestamps, decoder_cache
+    )[0]
+
+
+def decode_video_frames_torchcodec_batch(
+    video_path: Path | str,
+    timestamps_list: list[list[float]],
+    tolerance_s: float,
+    log_loaded_timestamps: bool = False,
+    decoder_cache: VideoDecoderCache | None = None,
+) -> list[torch.Tensor]:
+    """Loads the frames of several queries on the same video, e.g. the samples of a batch, using torchcodec.
+
+    The frames of all queries are decoded in one pass: the requested frame indices are deduplicated
+    and sorted, so that every key frame is sought and decoded once.
+
+    Args:
+        video_path: Path to the video file.
+        timestamps_list: One list of timestamps per query.
+        tolerance_s: Allowed deviation in seconds for frame retrieval.
+        log_loaded_timestamps: Whether to log loaded timestamps.
+        decoder_cache: Optional decoder cache instance. Uses default if None.
+
+    Returns:
+        list[torch.Tensor]: The frames of each query, float32 in [0,1] range.
+    """
     if decoder_cache is None:
         decoder_cache = _default_decoder_cache
 
     # Use cached decoder instead of creating new one each time
     decoder = decoder_cache.get_decoder(str(video_path))
 
-    loaded_ts = []
-    loaded_frames = []
+    sizes = [len(timestamps) for timestamps in timestamps_list]
+    flat_timestamps = [ts for timestamps in timestamps_list for ts in timestamps]
 
     # get metadata for frame information
-    metadata = decoder.metadata
-    average_fps = metadata.average_fps
-    # convert timestamps to frame indices
-    frame_indices = [round(ts * average_fps) for ts in timestamps]
-    # retrieve frames based on indices
+    average_fps = decoder.metadata.average_fps
+    # convert timestamps to frame indices, and decode each frame once, in file order
+    frame_indices = sorted({round(ts * average_fps) for ts in flat_timestamps})
     frames_batch = decoder.get_frames_at(indices=frame_indices)
 
-    for frame, pts in zip(frames_batch.data, frames_batch.pts_seconds, strict=True):
-        loaded_frames.append(frame)
-        loaded_ts.append(pts.item())
-        if log_loaded_timestamps:
+    query_ts = torch.tensor(flat_timestamps)
+    loaded_ts = frames_batch.pts_seconds.to(torch.float32)
+    if log_loaded_timestamps:
+        for pts in loaded_ts.tolist():
             logging.info(f"Frame loaded at timestamp={pts:.4f}")
 
-    query_ts = torch.tensor(timestamps)
-    loaded_ts = torch.tensor(loaded_ts)
-
-    # compute distances between each query timestamp and loaded timestamps
-    dist = torch.cdist(query_ts[:, None], loaded_ts[:, None], p=1)
-    min_, argmin_ = dist.min(1)
+    # closest loaded frame of each query timestamp, by a binary search of the sorted timestamps
+    order = torch.argsort(loaded_ts)
+    sorted_ts = loaded_ts[order]
+    right = torch.searchsorted(sorted_ts, query_ts).clamp(max=len(sorted_ts) - 1)
+    left = (right - 1).clamp(min=0)
+    closer_left = (query_ts - sorted_ts[left]).abs() <= (sorted_ts[right] - query_ts).abs()
+    argmin_ = order[torch.where(closer_left, left, right)]
+    min_ = (loaded_ts[argmin_] - query_ts).abs()
 
     is_within_tol = min_ < tolerance_s
     assert is_within_tol.all(), (
@@ -282,7 +420,7 @@ def decode_video_frames_torchcodec(
     )
 
     # get closest frames to the query timestamps
-    closest_frames = torch.stack([loaded_frames[idx] for idx in argmin_])
+    closest_frames = frames_batch.data[argmin_]
     closest_ts = loaded_ts[argmin_]
 
     if log_loaded_timestamps:
@@ -291,12 +429,12 @@ def decode_video_frames_torchcodec(
     # convert to float32 in [0,1] range
     closest_frames = (closest_frames / 255.0).type(torch.float32)
 
-    if not len(timestamps) == len(closest_frames):
+    if not len(flat_timestamps) == len(closest_frames):
         raise FrameTimestampError(
-            f"Retrieved timestamps differ from queried {set(closest_frames) - set(timestamps)}"
+            f"Retrieved timestamps differ from queried {set(closest_frames) - set(flat_timestamps)}"
         )
 
-    return closest_frames
+    return list(torch.split(closest_frames, sizes))
 
 
 def encode_video_frames(
@@ -65,6 +65,8 @@ class DeviceProcessorStep(ProcessorStep):
                      If None, the dtype is not changed.
     """
 
+    elementwise = True
+
     device: str = "cpu"
     float_dtype: str | None = None
 
@@ -48,7 +48,7 @@ class _NormalizationMixin:
 
     This class manages normalization statistics (`stats`), converts them to tensors for
     efficient computation, handles device placement, and implements the logic for
-    applying normalization transformations (mean/std and min/max). It is designed to
+    applying normalization transformations (mean/std, min/max and quantiles). It is designed to
     be inherited by concrete `ProcessorStep` implementations and should not be used
     directly.
 
@@ -92,6 +92,9 @@ class _NormalizationMixin:
             PyTorch tensors.
         _stats_explicitly_provided: Internal flag tracking whether stats were explicitly
             provided during construction (used for override preservation).
+        _affine_cache: An internal cache of the stats compiled into `(scale, shift)`
+            tensors, per feature (or group of features), direction, device and dtype. It
+            is cleared whenever the stats or their placement change.
     """
 
     features: dict[str, PolicyFeature]
@@ -106,6 +109,9 @@ class _NormalizationMixin:
         default_factory=dict, init=False, repr=False
     )
     _stats_explicitly_provided: bool = field(default=False, init=False, repr=False)
+    _affine_cache: dict[tuple, tuple[Tensor, Tensor] | None] = field(
+        default_factory=dict, init=False, repr=False
+    )
 
     def __post_init__(self):
         """
@@ -159,6 +165,7 @@ class _NormalizationMixin:
         if dtype is not None:
             self.dtype = dtype
         self._tensor_stats = to_tensor(self.stats, device=self.device, dtype=self.dtype)
+        self._affine_cache.clear()
         return self
 
     def state_dict(self) -> dict[str, Tensor]:
@@ -208,10 +215,12 @@ class _NormalizationMixin:
             # Don't load from state_dict, keep the explicitly provided stats
             # But ensure _tensor_stats is properly initialized
             self._tensor_stats = to_tensor(self.stats, device=self.device, dtype=self.dtype)  # type: ignore[assignment]
+            self._affine_cache.clear()
             return
 
         # Normal behavior: load stats from state_dict
         self._tensor_stats.clear()
+        self._affine_cache.clear()
         for flat_key, tensor in state.items():
             key, stat_name = flat_key.rsplit(".", 1)
             # Load to the processor's configured device.
@@ -257,6 +266,11 @@ class _NormalizationMixin:
         """
         Applies (un)normalization to all relevant features in an observation dictionary.
 
+        On accelerators, vector features with the same batch shape, device and dtype are
+        concatenated and transformed with a single fused multiply-add, then split back into
+        their keys, which saves a kernel launch per key. On the CPU the concatenation costs as
+        much as it saves, so each key is transformed on its own.
+
         Args:
             observation: The observation dictionary to process.
             inverse: If `True`, applies unnormalization; otherwise, applies normalization.
@@ -265,22 +279,48 @@ class _NormalizationMixin:
             A new observation dictionary with the transformed tensor values.
         """
         new_observation = dict(observation)
+        groups: dict[tuple, list[tuple[str, Tensor, tuple[Tensor, Tensor]]]] = {}
         for key, feature in self.features.items():
             if (
                 self.normalize_observation_keys is not None
                 and key not in self.normalize_observation_keys
             ):
                 continue
-            if feature.type != FeatureType.ACTION and key in new_observation:
-                # Convert to tensor but preserve original dtype for adaptation logic
-                tensor = torch.as_tensor(new_observation[key])
-                new_observation[key] = self._apply_transform(
-                    tensor, key, feature.type, inverse=inverse
-                )
+            if feature.type == FeatureType.ACTION or key not in new_observation:
+                continue
+            tensor = torch.as_tensor(new_observation[key])
+            dtype = self._compute_dtype(tensor)
+            affine = self._get_affine(key, feature.type, inverse, tensor.device, dtype)
+            if affine is None:
+                new_observation[key] = tensor
+                continue
+            tensor = tensor.to(dtype=dtype)
+            scale, shift = affine
+            if (
+                tensor.device.type != "cpu"
+                and scale.ndim == 1
+                and tensor.ndim >= 1
+                and tensor.shape[-1] == scale.shape[0]
+            ):
+                group = (tuple(tensor.shape[:-1]), tensor.device, tensor.dtype)
+                groups.setdefault(group, []).append((key, tensor, affine))
+            else:
+                new_observation[key] = torch.addcmul(shift, tensor, scale)
+
+        for (_, device, dtype), members in groups.items():
+            if len(members) == 1:
+                key, tensor, (scale, shift) = members[0]
+                new_observation[key] = torch.addcmul(shift, tensor, scale)
+                continue
+            keys = tuple(key for key, _, _ in members)
+            scale, shift = self._get_group_affine(keys, inverse, device, dtype)
+            fused = torch.addcmul(shift, torch.cat([m[1] for m in members], dim=-1), scale)
+            sizes = [tensor.shape[-1] for _, tensor, _ in members]
+            for key, value in zip(keys, fused.split(sizes, dim=-1)):
+                new_observation[key] = value
         return new_observation
 
     def _normalize_action(self, action: Tensor, inverse: bool) -> Tensor:
-        # Convert to tensor but preserve original dtype for adaptation logic
         """
         Applies (un)normalization to an action tensor.
 
@@ -300,16 +340,10 @@ class _NormalizationMixin:
         self, tensor: Tensor, key: str, feature_type: FeatureType, *, inverse: bool = False
     ) -> Tensor:
         """
-        Core logic to apply a normalization or unnormalization transformation to a tensor.
-
-        This method selects the appropriate normalization mode based on the feature type
-        and applies the corresponding mathematical operation.
+        Applies a normalization or unnormalization transformation to a tensor.
 
-        Normalization Modes:
-          - MEAN_STD: Centers data around zero with unit variance.
-          - MIN_MAX: Scales data to [-1, 1] range using actual min/max values.
-          - QUANTILES: Scales data to [-1, 1] range using 1st and 99th percentiles (q01/q99).
-          - QUANTILE10: Scales data to [-1, 1] range using 10th and 90th percentiles (q10/q90).
+        Every supported mode is an affine map of the input, so the transformation is a single
+        fused `tensor * scale + shift` with the parameters from `_get_affine`.
 
         Args:
             tensor: The input tensor to transform.
@@ -323,25 +357,112 @@ class _NormalizationMixin:
         Raises:
             ValueError: If an unsupported normalization mode is encountered.
         """
-        norm_mode = self.norm_map.get(feature_type, NormalizationMode.IDENTITY)
-        if norm_mode == NormalizationMode.IDENTITY or key not in self._tensor_stats:
+        dtype = self._compute_dtype(tensor)
+        affine = self._get_affine(key, feature_type, inverse, tensor.device, dtype)
+        if affine is None:
             return tensor
+        scale, shift = affine
+        return torch.addcmul(shift, tensor.to(dtype=dtype), scale)
+
+    def _compute_dtype(self, tensor: Tensor) -> torch.dtype:
+        """Floating inputs are transformed in their own dtype, others in the processor dtype."""
+        return tensor.dtype if tensor.is_floating_point() else self.dtype
+
+    def _get_affine(
+        self,
+        key: str,
+        feature_type: FeatureType,
+        inverse: bool,
+        device: torch.device,
+        dtype: torch.dtype,
+    ) -> tuple[Tensor, Tensor] | None:
+        """
+        Returns the cached `(scale, shift)` of a feature on a device and dtype.
 
-        if norm_mode not in (
-            NormalizationMode.MEAN_STD,
-            NormalizationMode.MIN_MAX,
-            NormalizationMode.QUANTILES,
-            NormalizationMode.QUANTILE10,
-        ):
-            raise ValueError(f"Unsupported normalization mode: {norm_mode}")
+        The parameters are compiled from the stats on the first call for each
+        `(key, inverse, device, dtype)`, so stats are not moved or recomputed per batch.
+        Inputs on another device or in another dtype than the processor (e.g. under
+        Accelerate) get their own entry. Returns `None` for identity transforms.
+        """
+        cache_key = (key, inverse, device, dtype)
+        try:
+            return self._affine_cache[cache_key]
+        except KeyError:
+            pass
+        params = self._compile_affine(key, feature_type, inverse)
+        if params is not None:
+            params = tuple(p.to(device=device, dtype=dtype) for p in params)
+        self._affine_cache[cache_key] = params
+        return params
+
+    def _get_group_affine(
+        self, keys: tuple[str, ...], inverse: bool, device: torch.device, dtype: torch.dtype
+    ) -> tuple[Tensor, Tensor]:
+        """Returns the cached concatenated `(scale, shift)` of several vector features."""
+        cache_key = (keys, inverse, device, dtype)
+        params = self._affine_cache.get(cache_key)
+        if params is None:
+            members = [
+                self._get_affine(key, self.features[key].type, inverse, device, dtype)
+                for key in keys
+            ]
+            params = (
+                torch.cat([scale for scale, _ in members]),
+                torch.cat([shift for _, shift in members]),
+            )
+            self._affine_cache[cache_key] = params
+        return params
+
+    def _compile_affine(
+        self, key: str, feature_type: FeatureType, inverse: bool
+    ) -> tuple[Tensor, Tensor] | None:
+        """
+        Compiles the stats of a feature into the `scale` and `shift` of an affine transform.
+
+        The parameters are computed in float64 on the CPU and cast by `_get_affine`.
 
-        # For Accelerate compatibility: Ensure stats are on the same device and dtype as the input tensor
-        if self._tensor_stats and key in self._tensor_stats:
-            first_stat = next(iter(self._tensor_stats[key].values()))
-            if first_stat.device != tensor.device or first_stat.dtype != tensor.dtype:
-                self.to(device=tensor.device, dtype=tensor.dtype)
+        Normalization Modes:
+          - MEAN_STD: Centers data around zero with unit variance.
+          - MIN_MAX: Scales data to [-1, 1] range using actual min/max values.
+          - QUANTILES: Scales data to [-1, 1] range using 1st and 99th percentiles (q01/q99).
+          - QUANTILE10: Scales data to [-1, 1] range using 10th and 90th percentiles (q10/q90).
+
+        Args:
+            key: The feature key.
+            feature_type: The `FeatureType` of the feature.
+            inverse: If `True`, compiles the inverse transformation (unnormalization).
 
-        stats = self._tensor_stats[key]
+        Returns:
+            The `(scale, shift)` tensors, or `None` when the transform is the identity.
+
+        Raises:
+            ValueError: If an unsupported normalization mode is encountered or stats are
+                missing for the mode.
+        """
+        norm_mode = self.norm_map.get(feature_type, NormalizationMode.IDENTITY)
+        if norm_mode == NormalizationMode.IDENTITY or key not in self._tensor_stats:
+            return None
+
+        bounds = {
+            NormalizationMode.MIN_MAX: ("min", "max", ""),
+            NormalizationMode.QUANTILES: (
+                "q01",
+                "q99",
+                " using the `augment_dataset_quantile_stats.py` script",
+            ),
+            NormalizationMode.QUANTILE10: (
+                "q10",
+                "q90",
+                " using the `augment_dataset_quantile_stats.py` script",
+            ),
+        }
+        if norm_mode != NormalizationMode.MEAN_STD and norm_mode not in bounds:
+            raise ValueError(f"Unsupported normalization mode: {norm_mode}")
+
+        stats = {
+            name: stat.detach().to(device="cpu", dtype=torch.float64)
+            for name, stat in self._tensor_stats[key].items()
+        }
 
         if norm_mode == NormalizationMode.MEAN_STD:
             mean = stats.get("mean", None)
@@ -350,72 +471,29 @@ class _NormalizationMixin:
                 raise ValueError(
                     "MEAN_STD normalization mode requires mean and std stats, please update the dataset with the correct stats"
                 )
-
-            mean, std = stats["mean"], stats["std"]
-            # Avoid division by zero by adding a small epsilon.
-            denom = std + self.eps
             if inverse:
-                return tensor * std + mean
-            return (tensor - mean) / denom
-
-        if norm_mode == NormalizationMode.MIN_MAX:
-            min_val = stats.get("min", None)
-            max_val = stats.get("max", None)
-            if min_val is None or max_val is None:
-                raise ValueError(
-                    "MIN_MAX normalization mode requires min and max stats, please update the dataset with the correct stats"
-                )
-
-            min_val, max_val = stats["min"], stats["max"]
-            denom = max_val - min_val
-            # When min_val == max_val, substitute the denominator with a small epsilon
-            # to prevent division by zero. This consistently maps an input equal to
-            # min_val to -1, ensuring a stable transformation.
-            denom = torch.where(
-                denom == 0, torch.tensor(self.eps, device=tensor.device, dtype=tensor.dtype), denom
-            )
-            if inverse:
-                # Map from [-1, 1] back to [min, max]
-                return (tensor + 1) / 2 * denom + min_val
-            # Map from [min, max] to [-1, 1]
-            return 2 * (tensor - min_val) / denom - 1
-
-        if norm_mode == NormalizationMode.QUANTILES:
-            q01 = stats.get("q01", None)
-            q99 = stats.get("q99", None)
-            if q01 is None or q99 is None:
-                raise ValueError(
-                    "QUANTILES normalization mode requires q01 and q99 stats, please update the dataset with the correct stats using the `augment_dataset_quantile_stats.py` script"
-                )
-
-            denom = q99 - q01
-            # Avoid division by zero by adding epsilon when quantiles are identical
-            denom = torch.where(
-                denom == 0, torch.tensor(self.eps, device=tensor.device, dtype=tensor.dtype), denom
-            )
-            if inverse:
-                return (tensor + 1.0) * denom / 2.0 + q01
-            return 2.0 * (tensor - q01) / denom - 1.0
-
-        if norm_mode == NormalizationMode.QUANTILE10:
-            q10 = stats.get("q10", None)
-            q90 = stats.get("q90", None)
-            if q10 is None or q90 is None:
-                raise ValueError(
-                    "QUANTILE10 normalization mode requires q10 and q90 stats, please update the dataset with the correct stats using the `augment_dataset_quantile_stats.py` script"
-                )
-
-            denom = q90 - q10
-            # Avoid division by zero by adding epsilon when quantiles are identical
-            denom = torch.where(
-                denom == 0, torch.tensor(self.eps, device=tensor.device, dtype=tensor.dtype), denom
+                return std, mean
+            # Avoid division by zero by adding a small epsilon.
+            scale = 1.0 / (std + self.eps)
+            return scale, -mean * scale
+
+        low_name, high_name, hint = bounds[norm_mode]
+        low = stats.get(low_name, None)
+        high = stats.get(high_name, None)
+        if low is None or high is None:
+            raise ValueError(
+                f"{norm_mode.value} normalization mode requires {low_name} and {high_name} stats, please update the dataset with the correct stats{hint}"
             )
-            if inverse:
-                return (tensor + 1.0) * denom / 2.0 + q10
-            return 2.0 * (tensor - q10) / denom - 1.0
-
-        # If necessary stats are missing, return input unchanged.
-        return tensor
+        denom = high - low
+        # When low == high, substitute the denominator with a small epsilon to prevent
+        # division by zero. This consistently maps an input equal to low to -1.
+        denom = torch.where(denom == 0, torch.full_like(denom, self.eps), denom)
+        if inverse:
+            # Map from [-1, 1] back to [low, high]
+            return denom / 2.0, denom / 2.0 + low
+        # Map from [low, high] to [-1, 1]
+        scale = 2.0 / denom
+        return scale, -low * scale - 1.0
 
 
 @dataclass
@@ -429,6 +507,8 @@ class NormalizerProcessorStep(_NormalizationMixin, ProcessorStep):
     It is typically used in the pre-processing pipeline before feeding data to a policy.
     """
 
+    elementwise = True
+
     @classmethod
     def from_lerobot_dataset(
         cls,
@@ -504,6 +584,8 @@ class UnnormalizerProcessorStep(_NormalizationMixin, ProcessorStep):
     environment.
     """
 
+    elementwise = True
+
     @classmethod
     def from_lerobot_dataset(
         cls,
@@ -580,4 +662,5 @@ def hotswap_stats(
             step.stats = stats
             # Re-initialize tensor_stats on the correct device.
             step._tensor_stats = to_tensor(stats, device=step.device, dtype=step.dtype)  # type: ignore[assignment]
+            step._affine_cache.clear()
     return rp
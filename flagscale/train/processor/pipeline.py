@@ -40,13 +40,14 @@ from abc import ABC, abstractmethod
 from copy import deepcopy
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Generic, TypeAlias, TypedDict, TypeVar, cast
+from typing import TYPE_CHECKING, Any, ClassVar, Generic, TypeAlias, TypedDict, TypeVar, cast
+
+import numpy as np
+import torch
 
 if TYPE_CHECKING:
     from collections.abc import Callable, Iterable, Sequence
 
-    import torch
-
 from huggingface_hub import hf_hub_download
 from safetensors.torch import load_file, save_file
 
@@ -155,8 +156,15 @@ class ProcessorStep(ABC):
     alters the shape or type of data features.
 
     Subclasses can optionally be stateful by implementing `state_dict` and `load_state_dict`.
+
+    Steps that set `elementwise = True` declare that they transform every sample of a
+    batch independently with tensor operations along the leading batch dimension, and leave
+    non-tensor values untouched. Such steps can be applied to a whole batch of transitions by
+    `DataProcessorPipeline.process_batch` and fused by `DataProcessorPipeline.compile`.
     """
 
+    elementwise: ClassVar[bool] = False
+
     _current_transition: EnvTransition | None = None
 
     @property
@@ -259,6 +267,95 @@ class ProcessorMigrationError(Exception):
         )
 
 
+class _SampleList(list):
+    """Per-sample values of a batched transition that could not be stacked into an array."""
+
+
+def _stack_values(values: list[Any]) -> Any:
+    """Stacks the values of several transitions along a new leading batch dimension.
+
+    Dictionaries are stacked key by key, tensors and arrays with matching shapes, dtypes and
+    devices are stacked, and every other value is kept as a per-sample list.
+
+    Raises:
+        ValueError: If the samples have different dictionary keys or arrays that cannot be
+            stacked, in which case they cannot be processed as one batch.
+    """
+    first = values[0]
+    if isinstance(first, dict):
+        if any(not isinstance(value, dict) or value.keys() != first.keys() for value in values):
+            raise ValueError("Samples have different keys")
+        return {key: _stack_values([value[key] for value in values]) for key in first}
+    if isinstance(first, torch.Tensor):
+        if any(
+            not isinstance(value, torch.Tensor)
+            or value.shape != first.shape
+            or value.dtype != first.dtype
+            or value.device != first.device
+            for value in values
+        ):
+            raise ValueError("Sample tensors have different shapes, dtypes or devices")
+        return torch.stack(values)
+    if isinstance(first, np.ndarray):
+        if any(
+            not isinstance(value, np.ndarray)
+            or value.shape != first.shape
+            or value.dtype != first.dtype
+            for value in values
+        ):
+            raise ValueError("Sample arrays have different shapes or dtypes")
+        return np.stack(values)
+    if any(isinstance(value, (dict, torch.Tensor, np.ndarray)) for value in values):
+        raise ValueError("Samples mix arrays or dictionaries with other values")
+    if all(value is None for value in values):
+        return None
+    return _SampleList(values)
+
+
+def _unstack_values(value: Any, batch_size: int) -> list[Any]:
+    """Splits a value stacked by `_stack_values` back into its samples."""
+    if isinstance(value, dict):
+        columns = {key: _unstack_values(column, batch_size) for key, column in value.items()}
+        return [{key: column[i] for key, column in columns.items()} for i in range(batch_size)]
+    if isinstance(value, _SampleList):
+        return list(value)
+    if isinstance(value, torch.Tensor):
+        return list(value.unbind(0))
+    if isinstance(value, np.ndarray):
+        return list(value)
+    return [value] * batch_size
+
+
+class _FusedProcessorSteps:
+    """Consecutive elementwise steps of a compiled pipeline, run as a single stage.
+
+    With `torch.compile` options, the steps are traced together so that their tensor
+    operations can be fused into fewer kernels.
+    """
+
+    def __init__(self, steps: list[ProcessorStep], compile_kwargs: dict[str, Any] | None):
+        self.steps = steps
+        self.compile_kwargs = compile_kwargs
+        self._run = self._forward
+        if compile_kwargs is not None:
+            self._run = torch.compile(self._forward, **compile_kwargs)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The compiled function is bound to these steps, rebuild it for copies of the steps.
+        return {"steps": self.steps, "compile_kwargs": self.compile_kwargs}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["steps"], state["compile_kwargs"])
+
+    def _forward(self, transition: EnvTransition) -> EnvTransition:
+        for step in self.steps:
+            transition = step(transition)
+        return transition
+
+    def __call__(self, transition: EnvTransition) -> EnvTransition:
+        return self._run(transition)
+
+
 @dataclass
 class DataProcessorPipeline(HubMixin, Generic[TInput, TOutput]):
     """A sequential pipeline for processing data, integrated with the Hugging Face Hub.
@@ -274,6 +371,8 @@ class DataProcessorPipeline(HubMixin, Generic[TInput, TOutput]):
         to_output: A function to convert the final `EnvTransition` into the desired output format.
         before_step_hooks: A list of functions to be called before each step is executed.
         after_step_hooks: A list of functions to be called after each step is executed.
+        _stages: The stages built by `compile`, consecutive elementwise steps fused into one
+            stage, or `None` when the pipeline is not compiled.
     """
 
     steps: Sequence[ProcessorStep] = field(default_factory=list)
@@ -295,6 +394,10 @@ class DataProcessorPipeline(HubMixin, Generic[TInput, TOutput]):
         default_factory=list, repr=False
     )
 
+    _stages: list[Callable[[EnvTransition], EnvTransition]] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
     def __call__(self, data: TInput) -> TOutput:
         """Processes input data through the full pipeline.
 
@@ -311,12 +414,20 @@ class DataProcessorPipeline(HubMixin, Generic[TInput, TOutput]):
     def _forward(self, transition: EnvTransition) -> EnvTransition:
         """Executes all processing steps and hooks in sequence.
 
+        Without hooks, the steps (or the stages of a compiled pipeline) are called directly.
+        With hooks, every step is called on its own so that hooks see each step index.
+
         Args:
             transition: The initial `EnvTransition` object.
 
         Returns:
             The final `EnvTransition` after all steps have been applied.
         """
+        if not self.before_step_hooks and not self.after_step_hooks:
+            for stage in self.steps if self._stages is None else self._stages:
+                transition = stage(transition)
+            return transition
+
         for idx, processor_step in enumerate(self.steps):
             # Execute pre-hooks
             for hook in self.before_step_hooks:
@@ -329,6 +440,119 @@ class DataProcessorPipeline(HubMixin, Generic[TInput, TOutput]):
                 hook(idx, transition)
         return transition
 
+    def compile(
+        self,
+        features: dict[PipelineFeatureType, dict[str, PolicyFeature]] | None = None,
+        *,
+        use_torch_compile: bool = False,
+        **compile_kwargs: Any,
+    ) -> DataProcessorPipeline[TInput, TOutput]:
+        """Validates the pipeline once and fuses its consecutive elementwise steps.
+
+        The outputs of the compiled pipeline are the same as those of the step-by-step
+        pipeline. Runs of consecutive steps with `elementwise = True` become a single stage,
+        traced with `torch.compile` when `use_torch_compile` is set. Registered hooks still
+        see every step: while hooks are present, the pipeline runs step by step. The
+        pipeline must be compiled again after its steps are changed.
+
+        Args:
+            features: An optional description of the input features. When given, it is
+                propagated through `transform_features` of every step so that a step whose
+                feature contract does not hold fails here rather than on the first sample.
+            use_torch_compile: If `True`, each fused stage is wrapped with `torch.compile`.
+            **compile_kwargs: Keyword arguments for `torch.compile` (e.g. `mode`, `backend`).
+
+        Returns:
+            The pipeline itself, allowing for method chaining.
+
+        Raises:
+            ValueError: If a step fails to transform the features.
+        """
+        if features is not None:
+            features = deepcopy(features)
+            for idx, step in enumerate(self.steps):
+                try:
+                    features = step.transform_features(features)
+                except Exception as e:
+                    raise ValueError(
+                        f"Step {idx} ({type(step).__name__}) failed to transform features: "
+                        f"{type(e).__name__}: {e}"
+                    ) from e
+                if not isinstance(features, dict):
+                    raise ValueError(
+                        f"Step {idx} ({type(step).__name__}) returned {type(features).__name__} "
+                        "from transform_features, expected a dict"
+                    )
+
+        stages: list[Callable[[EnvTransition], EnvTransition]] = []
+        run: list[ProcessorStep] = []
+        for step in [*self.steps, None]:
+            if step is not None and step.elementwise:
+                run.append(step)
+                continue
+            if len(run) > 1 or (run and use_torch_compile):
+                stages.append(
+                    _FusedProcessorSteps(run, compile_kwargs if use_torch_compile else None)
+                )
+            else:
+                stages.extend(run)
+            run = []
+            if step is not None:
+                stages.append(step)
+        self._stages = stages
+        return self
+
+    def process_batch(self, samples: Sequence[TInput]) -> list[TOutput]:
+        """Processes several samples, applying the leading elementwise steps to all at once.
+
+        The transitions of the samples are stacked along a new leading dimension and the
+        longest prefix of elementwise steps is applied to the whole batch. The batch is then
+        split back and the remaining steps are applied to each sample. The outputs are the
+        same as `[pipeline(sample) for sample in samples]`, which is also what runs when
+        the samples cannot be stacked or when hooks are registered.
+
+        Stacking copies every tensor of the samples, so batching pays off when the per-step
+        overhead dominates, e.g. for the small observation and action tensors of a policy
+        server, rather than for large images that the steps only pass through.
+
+        Args:
+            samples: The input samples to process.
+
+        Returns:
+            The processed samples, in the same order.
+        """
+        transitions = [self.to_transition(sample) for sample in samples]
+        num_batched = 0
+        while num_batched < len(self.steps) and self.steps[num_batched].elementwise:
+            num_batched += 1
+        if (
+            len(transitions) < 2
+            or num_batched == 0
+            or self.before_step_hooks
+            or self.after_step_hooks
+        ):
+            return [self.to_output(self._forward(transition)) for transition in transitions]
+        try:
+            batch = _stack_values(transitions)
+        except ValueError:
+            return [self.to_output(self._forward(transition)) for transition in transitions]
+
+        if self._stages is not None and isinstance(self._stages[0], _FusedProcessorSteps):
+            head, tail = self._stages[:1], self._stages[1:]
+        elif self._stages is not None:
+            head, tail = self._stages[:num_batched], self._stages[num_batched:]
+        else:
+            head, tail = self.steps[:num_batched], self.steps[num_batched:]
+        for stage in head:
+            batch = stage(batch)
+
+        outputs = []
+        for transition in _unstack_values(batch, len(transitions)):
+            for stage in tail:
+                transition = stage(transition)
+            outputs.append(self.to_output(transition))
+        return outputs
+
     def step_through(self, data: TInput) -> Iterable[EnvTransition]:
         """Processes data step-by-step, yielding the transition at each stage.
 
@@ -1726,6 +1950,8 @@ class IdentityProcessorStep(ProcessorStep):
     This can be useful as a placeholder or for debugging purposes.
     """
 
+    elementwise = True
+
     def __call__(self, transition: EnvTransition) -> EnvTransition:
         """Returns the transition without modification."""
         return transition
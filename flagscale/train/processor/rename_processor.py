@@ -39,6 +39,8 @@ class RenameObservationsProcessorStep(ObservationProcessorStep):
                     be kept with their original names.
     """
 
+    elementwise = True
+
     rename_map: dict[str, str] = field(default_factory=dict)
 
     def observation(self, observation):
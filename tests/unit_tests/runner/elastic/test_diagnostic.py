@@ -3,8 +3,17 @@ import tempfile
 from unittest.mock import MagicMock, patch
 
 import pytest
+from omegaconf import OmegaConf
 
-from flagscale.runner.elastic.diagnostic import error_types, generate_diagnostic_report
+from flagscale.runner.elastic import diagnostic
+from flagscale.runner.elastic.diagnostic import (
+    LogScanner,
+    error_types,
+    find_error_lines,
+    generate_diagnostic_report,
+)
+from flagscale.runner.elastic.monitor_service import MonitorService
+from flagscale.runner.utils import JobStatus
 
 
 class TestDiagnostic:
@@ -134,3 +143,122 @@ class TestDiagnostic:
             )
 
             assert "Error reading log file" in report or "" in report
+
+
+class TestLogScanner:
+    """Test cases for the incremental log scanner"""
+
+    @pytest.fixture
+    def log_lines(self):
+        lines = [f"[INFO] iteration {i} loss 1.0" for i in range(200)]
+        lines[10] = "[ERROR] CUDA out of memory. Tried to allocate 2.00 GiB"
+        lines[11] = "torch.OutOfMemoryError: CUDA out of memory"
+        lines[120] = "Traceback (most recent call last):"
+        lines[199] = "RendezvousConnectionError: Connection refused"
+        return lines
+
+    def test_matches_per_key_search(self, log_lines):
+        """Test that one pass finds the same lines as searching each key"""
+        scanner = LogScanner(chunk_size=97)
+        data = ("\n".join(log_lines) + "\n").encode()
+        # Feed in uneven pieces to split lines across reads
+        for start in range(0, len(data), 333):
+            scanner.feed(data[start : start + 333])
+        new_matches = scanner.pop_new_matches()
+
+        for key in error_types:
+            expected = find_error_lines(log_lines, key)
+            assert scanner.counts[key] == len(expected)
+            if expected:
+                assert new_matches[key] == (expected[0], expected[-1], len(expected))
+            else:
+                assert key not in new_matches
+        assert scanner.line_count == len(log_lines)
+
+    def test_context_windows_are_bounded(self, log_lines):
+        """Test that context windows include surrounding lines across reads"""
+        scanner = LogScanner(context_lines=2, max_contexts=1)
+        data = ("\n".join(log_lines) + "\n").encode()
+        scanner.feed(data[: data.index(b"OutOfMemoryError")])
+        scanner.feed(data[data.index(b"OutOfMemoryError") :])
+
+        # Only the last match of a key is kept
+        assert scanner.counts["out of memory"] == 2
+        (window,) = scanner.contexts["out of memory"]
+        assert window["line"] == 12
+        assert window["context"] == log_lines[9:14]
+
+    def test_scan_file_is_incremental(self, tmp_path, log_lines):
+        """Test that only appended bytes are scanned and a replaced file is rescanned"""
+        log_file = tmp_path / "host_0_localhost_current.log"
+        log_file.write_text("\n".join(log_lines[:100]) + "\n")
+        scanner = LogScanner()
+        assert set(scanner.scan_file(str(log_file))) == {
+            "out of memory",
+            "cuda out of memory",
+            "outofmemoryerror",
+        }
+        assert scanner.scan_file(str(log_file)) == {}
+
+        with open(log_file, "a") as f:
+            f.write("\n".join(log_lines[100:]))
+        new_matches = scanner.scan_file(str(log_file))
+        assert new_matches["traceback (most recent call last)"] == (121, 121, 1)
+        # The last line is incomplete until flushed
+        assert "rendezvousconnectionerror" not in new_matches
+        scanner.flush()
+        assert scanner.pop_new_matches()["rendezvousconnectionerror"] == (200, 200, 1)
+
+        log_file.write_text(log_lines[120] + "\n")
+        assert scanner.scan_file(str(log_file))["traceback (most recent call last)"] == (1, 1, 1)
+
+
+def make_config(tmp_path):
+    return OmegaConf.create(
+        {
+            "train": {"system": {"logging": {"log_dir": str(tmp_path)}}},
+            "experiment": {"runner": {"no_shared_fs": False}},
+        }
+    )
+
+
+def test_final_report_includes_unterminated_last_line(tmp_path, monkeypatch):
+    """Test that the error on the last line of an exited job is reported"""
+    monkeypatch.setattr(diagnostic, "_log_scanners", {})
+    config = make_config(tmp_path)
+    log_file = tmp_path / "host_0_localhost.output"
+    log_file.write_text("[INFO] iteration 1\nRendezvousConnectionError: Connection refused")
+
+    report = generate_diagnostic_report(config, "localhost", 0, str(log_file), return_content=True)
+    assert "RendezvousConnectionError" not in report
+    report = generate_diagnostic_report(
+        config, "localhost", 0, str(log_file), return_content=True, final=True
+    )
+    assert "RendezvousConnectionError" in report and "line:2" in report
+    # The flushed line is reported once
+    report = generate_diagnostic_report(
+        config, "localhost", 0, str(log_file), return_content=True, final=True
+    )
+    assert report == ""
+
+
+def test_monitor_reports_last_line_when_job_stops(tmp_path, monkeypatch):
+    """Test that the monitor runs a final report once the job is no longer running"""
+    monkeypatch.setattr(diagnostic, "_log_scanners", {})
+    log_file = tmp_path / "host_0_localhost.output"
+    log_file.write_text("[INFO] iteration 1\ntorch.OutOfMemoryError: CUDA out of memory")
+
+    class Runner:
+        resources = None
+
+        def _query_status(self):
+            return JobStatus.COMPLETED_OR_IDLE
+
+    with patch("signal.signal"):
+        monitor = MonitorService(make_config(tmp_path), Runner(), interval=0)
+    monitor.is_running = True
+    with patch("flagscale.runner.elastic.monitor_service.collect_logs"):
+        monitor._monitor_loop()
+
+    report = (tmp_path / "monitor" / "host_0_localhost_diagnostic.txt").read_text()
+    assert "OutOfMemoryError" in report and "line:2" in report
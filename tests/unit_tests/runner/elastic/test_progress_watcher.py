@@ -0,0 +1,140 @@
+import time
+from unittest.mock import patch
+
+from omegaconf import OmegaConf
+
+from flagscale.runner.elastic.monitor_service import MonitorService
+from flagscale.runner.elastic.progress_watcher import LogProgressWatcher
+
+
+def iteration_line(iteration, rank=None):
+    prefix = f"[default{rank}]:" if rank is not None else ""
+    return (
+        f"{prefix} [2025-01-01 00:00:00] iteration {iteration:>8}/    1000 | "
+        "elapsed time per iteration (ms): 1000.0 | lm loss: 2.0\n"
+    ).encode()
+
+
+class TestLogProgressWatcher:
+    """Test cases for hang detection from iteration progress"""
+
+    def test_hang_detected_from_iteration_time(self):
+        """Test that a rank stops progressing for many iteration times"""
+        watcher = LogProgressWatcher(timeout=1800, min_timeout=10, iteration_factor=5)
+        watcher.add_local(("node0", 0), "/nonexistent/host_0_node0.output")
+        for i in range(1, 6):
+            watcher.feed(("node0", 0), iteration_line(i, rank=0) + iteration_line(i, rank=1), i)
+        # Rank 1 keeps going, rank 0 stops at iteration 5
+        for i in range(6, 20):
+            watcher.feed(("node0", 0), iteration_line(i, rank=1), i)
+
+        assert watcher.check(now=14) == []
+        hangs = watcher.check(now=16)
+        assert hangs == [(("node0", 0), "rank 0 stuck at iteration 5 for 11 seconds")]
+        # A stall is reported once, and again after progress resumes
+        assert watcher.check(now=17) == []
+        watcher.feed(("node0", 0), iteration_line(6, rank=0), 18)
+        assert watcher.check(now=30) != []
+
+    def test_checkpoint_and_evaluation_get_the_full_timeout(self):
+        """Test that a long checkpoint save or evaluation is not reported as a hang"""
+        watcher = LogProgressWatcher(timeout=1800, min_timeout=10, iteration_factor=5)
+        watcher.add_local(("node0", 0), "/nonexistent/host_0_node0.output")
+        watcher.add_local(("node1", 1), "/nonexistent/host_1_node1.output")
+        for i in range(1, 6):
+            watcher.feed(("node0", 0), iteration_line(i, rank=0), i)
+            watcher.feed(("node1", 1), iteration_line(i, rank=0), i)
+        # Only the first host logs the checkpoint save, all ranks take part in it
+        watcher.feed(("node0", 0), b"[default0]: saving checkpoint at iteration 5 to /ckpt\n", 6)
+        assert watcher.check(now=600) == []
+        assert len(watcher.check(now=1810)) == 2
+
+        watcher.feed(("node0", 0), iteration_line(6, rank=0), 1900)
+        watcher.feed(("node0", 0), b" validation loss at iteration 6 | lm loss: 2.0\n", 1901)
+        assert watcher.check(now=2000) == []
+        # Iterations resume, the adaptive timeout applies again
+        watcher.feed(("node0", 0), iteration_line(7, rank=0), 2500)
+        assert watcher.check(now=2505) == []
+        assert len(watcher.check(now=2520)) == 1
+
+    def test_log_without_iterations_falls_back_to_activity(self, tmp_path):
+        """Test that a quiet log without iteration lines hangs after the timeout"""
+        log_file = tmp_path / "host_0_localhost.output"
+        watcher = LogProgressWatcher(timeout=100)
+        watcher.add_local(("localhost", 0), str(log_file))
+        log_file.write_bytes(b"loading checkpoint\n")
+        watcher.poll()
+        now = time.time()
+        assert watcher.check(now=now + 50) == []
+        assert len(watcher.check(now=now + 150)) == 1
+
+    def test_local_log_is_followed_incrementally(self, tmp_path):
+        """Test that appended bytes, split lines and replaced logs are parsed"""
+        log_file = tmp_path / "host_0_localhost.output"
+        log_file.write_bytes(iteration_line(1))
+        watcher = LogProgressWatcher()
+        watcher.add_local(("localhost", 0), str(log_file))
+        line = iteration_line(2)
+        with open(log_file, "ab") as f:
+            f.write(line[:20])
+        watcher.poll()
+        assert watcher._streams[("localhost", 0)].ranks == {}
+        with open(log_file, "ab") as f:
+            f.write(line[20:])
+        watcher.poll()
+        assert watcher._streams[("localhost", 0)].ranks["0"].iteration == 2
+
+        log_file.unlink()
+        log_file.write_bytes(iteration_line(7))
+        watcher.poll()
+        assert watcher._streams[("localhost", 0)].ranks["0"].iteration == 7
+
+    def test_remote_log_is_streamed(self, tmp_path):
+        """Test that a remote log is streamed through one ssh process"""
+        fake_ssh = tmp_path / "fake_ssh"
+        # Drop the ssh options and the host, run the command locally
+        fake_ssh.write_text('#!/bin/bash\nshift 4\nexec bash -c "$2"\n')
+        fake_ssh.chmod(0o755)
+        log_file = tmp_path / "host.output"
+        log_file.write_bytes(b"")
+        watcher = LogProgressWatcher(ssh_command=str(fake_ssh))
+        watcher.add_remote(("node1", 1), "node1", str(log_file))
+        try:
+            time.sleep(0.5)
+            with open(log_file, "ab") as f:
+                f.write(iteration_line(3))
+            stream = watcher._streams[("node1", 1)]
+            deadline = time.time() + 5
+            while "0" not in stream.ranks and time.time() < deadline:
+                time.sleep(0.05)
+            assert stream.ranks["0"].iteration == 3
+        finally:
+            watcher.stop()
+
+
+def test_monitor_service_probes_hosts_concurrently(tmp_path):
+    config = OmegaConf.create(
+        {
+            "train": {"system": {"logging": {"log_dir": str(tmp_path)}}},
+            "experiment": {"runner": {"no_shared_fs": False}},
+        }
+    )
+
+    class Runner:
+        resources = {f"node{i}": {"slots": 8} for i in range(16)}
+
+    with patch("signal.signal"):
+        monitor = MonitorService(config, Runner(), interval=1)
+
+    def slow_collect(config, host, node_rank, destination_dir, dryrun=False):
+        time.sleep(0.2)
+
+    with patch("flagscale.runner.elastic.monitor_service.collect_logs", side_effect=slow_collect):
+        start = time.time()
+        monitor._collect_logs()
+        # Serially, 16 hosts would take 3.2s
+        assert time.time() - start < 1.5
+
+    monitor._generate_hang_diagnostic("node3", 3, detail="rank 0 stuck at iteration 5")
+    report = (tmp_path / "monitor" / "host_3_node3_diagnostic.txt").read_text()
+    assert "HangError: Process appears to be hanging - rank 0 stuck at iteration 5" in report
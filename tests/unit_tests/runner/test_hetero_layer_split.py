@@ -0,0 +1,72 @@
+import itertools
+import time
+
+from flagscale.runner.auto_tuner.hetero.hetero_searcher import _generate_layer_splits_best_first
+
+
+def enumerate_splits(total_layers, pp_sizes, inter_diff, intra_diff, max_layers_per_stage):
+    splits = []
+    for split in itertools.product(range(1, total_layers + 1), repeat=sum(pp_sizes)):
+        if sum(split) != total_layers:
+            continue
+        start, totals, valid = 0, [], True
+        for pp, cap in zip(pp_sizes, max_layers_per_stage):
+            stages = split[start : start + pp]
+            start += pp
+            totals.append(sum(stages))
+            valid &= max(stages) - min(stages) <= intra_diff and (cap is None or max(stages) <= cap)
+        if valid and max(totals) - min(totals) <= inter_diff:
+            splits.append(list(split))
+    return splits
+
+
+def step_time(split, pp_sizes, stage_speeds):
+    speeds = [speed for pp, speed in zip(pp_sizes, stage_speeds) for _ in range(pp)]
+    return max(layers / speed for layers, speed in zip(split, speeds))
+
+
+def test_layer_splits_match_constraints_best_first():
+    for total_layers, pp_sizes, stage_speeds, inter_diff, intra_diff, caps in [
+        (10, [2, 2], [1.0, 0.5], 10, 10, [None, None]),
+        (12, [1, 3], [2.0, 1.0], 4, 1, [None, None]),
+        (9, [2, 1, 1], [1.0, 1.0, 3.0], 9, 2, [3, None, None]),
+    ]:
+        splits = list(
+            _generate_layer_splits_best_first(
+                total_layers, pp_sizes, stage_speeds, inter_diff, intra_diff, caps
+            )
+        )
+        expected = enumerate_splits(total_layers, pp_sizes, inter_diff, intra_diff, caps)
+        assert sorted(splits) == sorted(expected)
+        times = [step_time(split, pp_sizes, stage_speeds) for split in splits]
+        assert times == sorted(times)
+
+
+def test_layer_splits_of_deep_model_are_lazy():
+    splits = _generate_layer_splits_best_first(96, [4, 4], [1.0, 0.6], 96, 96)
+    best = list(itertools.islice(splits, 50))
+    # The faster mesh gets more layers
+    assert best[0] == [15, 15, 15, 15, 9, 9, 9, 9]
+    assert len({tuple(split) for split in best}) == 50
+
+
+def test_layer_splits_with_tight_inter_mesh_limit_are_fast():
+    for total_layers, pp_sizes, stage_speeds, inter_diff, intra_diff in [
+        (48, [4, 4], [1.0, 0.3], 12, 48),
+        (80, [8, 8], [1.0, 0.5], 0, 80),
+        (80, [8, 8], [1.0, 0.3], 4, 2),
+    ]:
+        start = time.perf_counter()
+        splits = _generate_layer_splits_best_first(
+            total_layers, pp_sizes, stage_speeds, inter_diff, intra_diff
+        )
+        best = list(itertools.islice(splits, 100))
+        # Partial splits that break the inter-mesh limit are never expanded
+        assert time.perf_counter() - start < 10
+        assert len(best) == 100
+        for split in best:
+            totals = [sum(split[: pp_sizes[0]]), sum(split[pp_sizes[0] :])]
+            assert sum(split) == total_layers
+            assert max(totals) - min(totals) <= inter_diff
+        times = [step_time(split, pp_sizes, stage_speeds) for split in best]
+        assert times == sorted(times)
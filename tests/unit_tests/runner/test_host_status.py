@@ -0,0 +1,113 @@
+import os
+import time
+from types import SimpleNamespace
+
+from omegaconf import OmegaConf
+
+from flagscale.runner.launcher.host_status import HostStatusPoller
+from flagscale.runner.launcher.launcher_ssh import SshLauncher
+from flagscale.runner.utils import JobStatus
+
+# Stand-in for ssh: logs its arguments, fails for host "down", runs the command locally
+FAKE_SSH = """#!/bin/bash
+echo "$*" >> {log}
+while [ $# -gt 0 ]; do
+  case "$1" in -o|-p) shift 2;; -O) exit 0;; -*) shift;; *) break;; esac
+done
+[ "$1" = down ] && exit 255
+shift
+[ $# -eq 0 ] && exit 0
+sleep {delay}
+exec bash -c "$*"
+"""
+
+
+def make_fake_ssh(tmp_path, delay=0.0):
+    path = tmp_path / "fake_ssh"
+    log = tmp_path / "ssh.log"
+    path.write_text(FAKE_SSH.format(log=log, delay=delay))
+    path.chmod(0o755)
+    return str(path), log
+
+
+def test_poller_queries_hosts_concurrently_over_one_master(tmp_path):
+    ssh, log = make_fake_ssh(tmp_path, delay=0.3)
+    poller = HostStatusPoller(ssh_command=ssh, max_workers=16)
+    queries = [(f"node{i}", f"echo {i}") for i in range(16)]
+
+    for _ in range(2):
+        start = time.monotonic()
+        assert poller.query_all(queries) == [str(i) for i in range(16)]
+        # Serially, one sweep would take 16 * 0.3s
+        assert time.monotonic() - start < 2.4
+    assert poller.last_sweep_seconds < 2.4
+
+    calls = log.read_text().splitlines()
+    masters = [c for c in calls if "-N" in c.split()]
+    assert len(masters) == 16
+    assert all("ControlMaster=auto" in c for c in calls)
+    assert len(calls) == 16 + 32
+
+    poller.close([host for host, _ in queries])
+    assert sum("-O exit" in c for c in log.read_text().splitlines()) == 16
+
+
+def test_poller_cache_and_failures(tmp_path):
+    ssh, log = make_fake_ssh(tmp_path)
+    counter = tmp_path / "counter"
+    script = f"echo x >> {counter}; wc -l < {counter}"
+    poller = HostStatusPoller(ssh_command=ssh, ttl=60)
+
+    assert poller.query("node0", script) == "1"
+    assert poller.query("node0", script) == "1"
+    poller.invalidate()
+    assert poller.query("node0", script) == "2"
+
+    # A connection failure reads as no process and reconnects on the next query
+    assert poller.query_all([("down", "echo 1"), ("localhost", "echo 2")]) == ["", "2"]
+    poller.query("down", "echo 3")
+    masters = [c for c in log.read_text().splitlines() if c.split()[-1] == "down"]
+    assert len(masters) == 2
+
+
+def make_launcher(tmp_path, hosts):
+    ssh, _ = make_fake_ssh(tmp_path)
+    config = OmegaConf.create(
+        {
+            "experiment": {
+                "task": {"type": "train"},
+                "runner": {"ssh_command": ssh, "query_cache_ttl": 0},
+            },
+            "train": {
+                "system": {
+                    "logging": {
+                        "scripts_dir": str(tmp_path / "scripts"),
+                        "pids_dir": str(tmp_path / "pids"),
+                    }
+                }
+            },
+        }
+    )
+    backend = SimpleNamespace(user_args=[], user_envs={}, user_script=None)
+    launcher = SshLauncher(config, backend)
+    launcher.resources = {host: {"slots": 8, "type": None} for host in hosts}
+    os.makedirs(tmp_path / "pids")
+    return launcher
+
+
+def test_ssh_launcher_status_sweep(tmp_path):
+    hosts = [f"node{i}" for i in range(4)]
+    launcher = make_launcher(tmp_path, hosts)
+
+    def write_pid(node_rank, pid):
+        pid_file = tmp_path / "pids" / f"host_{node_rank}_{hosts[node_rank]}.pid"
+        pid_file.write_text(str(pid))
+
+    for node_rank in range(4):
+        write_pid(node_rank, os.getpid())
+    assert launcher._query_status() == JobStatus.RUNNING
+
+    # A pid that does not exist anymore
+    write_pid(2, 2**22 + 1)
+    assert launcher._query_status() == JobStatus.TRANSITIONAL
+    assert launcher._query_each(hosts[2], 2) == ""
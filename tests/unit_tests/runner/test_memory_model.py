@@ -0,0 +1,82 @@
+import itertools
+
+import pytest
+from omegaconf import OmegaConf
+
+from flagscale.runner.auto_tuner.memory_model import FactoredMemoryModel, default_model
+
+pytest.importorskip("megatron.core")
+
+
+def make_config(**model):
+    return OmegaConf.create(
+        {
+            "train": {
+                "model": {
+                    "num_layers": 8,
+                    "hidden_size": 1024,
+                    "num_attention_heads": 16,
+                    "seq_length": 2048,
+                    "global_batch_size": 64,
+                    "swiglu": True,
+                    "multiple_of": 256,
+                    **model,
+                },
+                "system": {},
+                "data": {"tokenizer": {"vocab_size": 50000}},
+            }
+        }
+    )
+
+
+def make_strategies(cards=8):
+    strategies = []
+    for tp, pp, cp, mbs, sp, dist, vpp, recompute in itertools.product(
+        [1, 2, 4],
+        [1, 2, 4],
+        [1, 2],
+        [1, 2, 4],
+        [False, True],
+        [False, True],
+        [None, 1],
+        [None, ("full", "uniform", 1), ("full", "block", 2), ("selective", None, None)],
+    ):
+        if cards % (tp * pp * cp) or (vpp is not None and pp == 1):
+            continue
+        granularity, method, num_layers = recompute or (None, None, None)
+        strategies.append(
+            {
+                "data_parallel_size": cards // (tp * pp * cp),
+                "tensor_model_parallel_size": tp,
+                "pipeline_model_parallel_size": pp,
+                "context_parallel_size": cp,
+                "expert_model_parallel_size": 1,
+                "micro_batch_size": mbs,
+                "sequence_parallel": sp,
+                "use_distributed_optimizer": dist,
+                "num_layers_per_virtual_pipeline_stage": vpp,
+                "use_recompute": recompute is not None,
+                "recompute_granularity": granularity,
+                "recompute_method": method,
+                "recompute_num_layers": num_layers,
+            }
+        )
+    return strategies
+
+
+@pytest.mark.parametrize(
+    "model",
+    [
+        {},
+        {"num_experts": 8, "moe_ffn_hidden_size": 512, "moe_router_topk": 2},
+    ],
+)
+def test_factored_memory_model_equals_default_model(model):
+    config = make_config(**model)
+    strategies = make_strategies()
+    memory_model = FactoredMemoryModel(config)
+    estimated = memory_model.estimate(strategies)
+    assert estimated.tolist() == [default_model(strategy, config) for strategy in strategies]
+    # Terms are shared between strategies
+    assert len(memory_model._activation_terms) < len(strategies)
+    assert len(memory_model._weight_terms) < len(strategies) // 10
@@ -0,0 +1,115 @@
+import os
+
+from omegaconf import OmegaConf
+
+from flagscale.runner.auto_tuner.record.recorder import Recorder
+from flagscale.runner.auto_tuner.tuner_train import TrainAutoTuner
+
+
+def iteration_line(iteration, elapsed, loss=2.5):
+    return (
+        f" [2025-01-01 00:00:00] iteration {iteration:>8}/     100 | consumed samples: "
+        f"{iteration * 8} | elapsed time per iteration (ms): {elapsed:.1f} | "
+        f"throughput per GPU (TFLOP/s/GPU): {1000 / elapsed:.1f} | lm loss: {loss:.6E} |\n"
+    )
+
+
+def make_task(tmp_path):
+    exp_dir = tmp_path / "task_1"
+    rank_dir = exp_dir / "logs" / "details" / "host_0_localhost" / "0" / "default_0" / "attempt_0"
+    (rank_dir / "0").mkdir(parents=True)
+    task = OmegaConf.create({"experiment": {"exp_dir": str(exp_dir)}})
+    return task, str(rank_dir / "0" / "stdout.log"), str(exp_dir / "logs" / "host_0.output")
+
+
+def make_recorder(tmp_path):
+    recorder = Recorder(OmegaConf.create({"experiment": {"exp_dir": str(tmp_path)}}))
+    recorder.cur_strategy = {"idx": 1}
+    return recorder
+
+
+def test_incremental_grep_matches_full_scan(tmp_path):
+    task, rank_log, host_log = make_task(tmp_path)
+    recorder = make_recorder(tmp_path)
+    lines = [iteration_line(i, 100.0 + i) for i in range(1, 9)]
+    host_lines = ["max reserved: 1024.0\n", "RuntimeError: CUDA out of memory\n"]
+
+    with open(rank_log, "w") as f, open(host_log, "w") as g:
+        for i, line in enumerate(lines):
+            # Lines are written in pieces, as a running job flushes its output
+            f.write(line[:20])
+            f.flush()
+            recorder.grep_performance([rank_log], recorder.metric)
+            f.write(line[20:])
+            f.flush()
+            if i < len(host_lines):
+                g.write(host_lines[i])
+                g.flush()
+            recorder.grep_performance([rank_log], recorder.metric)
+            recorder.grep_max_memory(os.path.dirname(host_log))
+            recorder.grep_error(os.path.dirname(host_log))
+
+    incremental = (
+        recorder.grep_performance([rank_log], recorder.metric, final=True),
+        recorder.grep_max_memory(os.path.dirname(host_log), final=True),
+        recorder.grep_error(os.path.dirname(host_log), final=True),
+    )
+    fresh = make_recorder(tmp_path)
+    full = (
+        fresh.grep_performance([rank_log], fresh.metric, final=True),
+        fresh.grep_max_memory(os.path.dirname(host_log), final=True),
+        fresh.grep_error(os.path.dirname(host_log), final=True),
+    )
+    assert incremental == full
+    assert full[0] == round(sum(100.0 + i for i in range(2, 9)) / 7, 3)
+    assert full[1] == 1024.0 and "OOM" in full[2]
+
+    # A restarted job truncates the log, it is parsed again from the start
+    with open(rank_log, "w") as f:
+        f.write(iteration_line(1, 50.0))
+    assert recorder.grep_performance([rank_log], recorder.metric) == 50.0
+    recorder.release(task)
+    assert not recorder._tails
+
+
+def test_metrics_table(tmp_path):
+    task, rank_log, _ = make_task(tmp_path)
+    recorder = make_recorder(tmp_path)
+    with open(rank_log, "w") as f:
+        f.write(iteration_line(1, 400.0, loss=10.0))
+        f.write(
+            "[Rank 0] (after 1 iterations) memory (MB) | allocated: 10 | max reserved: 2048.0\n"
+        )
+    rows = recorder.metrics_table(task)
+    assert rows == [
+        {"iteration": 1, "performance": 400.0, "tflops": 2.5, "loss": 10.0, "max_memory": 2048.0}
+    ]
+    with open(rank_log, "a") as f:
+        f.write(iteration_line(2, 200.0))
+    rows = recorder.metrics_table(task)
+    assert [row["iteration"] for row in rows] == [1, 2]
+    assert rows[1]["performance"] == 200.0 and rows[1]["max_memory"] is None
+
+
+def test_early_stop_hopeless_trial(tmp_path, mocker):
+    task, rank_log, _ = make_task(tmp_path)
+    tuner = TrainAutoTuner.__new__(TrainAutoTuner)
+    tuner.logger = mocker.MagicMock()
+    tuner.recorder = make_recorder(tmp_path)
+    tuner.history = [{"idx": 1, "performance": 100.0}]
+    tuner.early_stop = {"min_iterations": 3, "threshold": 1.2, "max_variation": 0.1}
+    trial = mocker.MagicMock(task=task, strategy={"idx": 2})
+
+    with open(rank_log, "w") as f:
+        # The first iteration is slow and excluded, the others are not stable yet
+        f.write(iteration_line(1, 1000.0) + iteration_line(2, 150.0) + iteration_line(3, 300.0))
+    assert not tuner._should_stop_early(trial)
+    with open(rank_log, "a") as f:
+        f.write(iteration_line(4, 150.0) + iteration_line(5, 152.0) + iteration_line(6, 151.0))
+    assert tuner._should_stop_early(trial)
+
+    tuner.history = [{"idx": 1, "performance": 140.0}]
+    assert not tuner._should_stop_early(trial)
+    tuner.early_stop = None
+    tuner.history = [{"idx": 1, "performance": 100.0}]
+    assert not tuner._should_stop_early(trial)
@@ -0,0 +1,106 @@
+import itertools
+
+from omegaconf import OmegaConf
+
+from flagscale.runner.auto_tuner.search.algorithm import ModelAlgo
+
+
+def make_strategies():
+    strategies = []
+    for tp, pp, mbs, recompute in itertools.product([1, 2, 4, 8], [1, 2, 4], [1, 2, 4, 8], [0, 1]):
+        strategies.append(
+            {
+                "data_parallel_size": 64 // (tp * pp),
+                "use_distributed_optimizer": True,
+                "tensor_model_parallel_size": tp,
+                "sequence_parallel": tp > 1,
+                "pipeline_model_parallel_size": pp,
+                "num_layers_per_virtual_pipeline_stage": None,
+                "use_recompute": bool(recompute),
+                "recompute_method": "uniform" if recompute else None,
+                "recompute_granularity": "full" if recompute else None,
+                "recompute_num_layers": 1 if recompute else None,
+                "micro_batch_size": mbs,
+                "context_parallel_size": 1,
+                "expert_model_parallel_size": 1,
+                # Activation memory shrinks with tp/pp and recompute, grows with mbs
+                "memory_model": 20000 + 60000 * mbs / (tp * pp) / (4 if recompute else 1),
+            }
+        )
+    return strategies
+
+
+def simulate(strategy):
+    """Synthetic iteration time (ms) with an optimum at tp=2, pp=2, mbs=4, no recompute."""
+    if strategy["memory_model"] > 80000:
+        return None
+    tp, pp = strategy["tensor_model_parallel_size"], strategy["pipeline_model_parallel_size"]
+    mbs = strategy["micro_batch_size"]
+    time = 1000 * (1 + 0.3 * abs(tp - 2) + 0.2 * abs(pp - 2) + 0.15 * abs(mbs - 4))
+    return time * (1.3 if strategy["use_recompute"] else 1.0)
+
+
+def make_config(**algo):
+    return OmegaConf.create(
+        {
+            "experiment": {
+                "auto_tuner": {
+                    "algo": {"name": "model", **algo},
+                    "memory_model": {"gpu_memory": 80000},
+                }
+            }
+        }
+    )
+
+
+def run_search(algo, history, trials):
+    for _ in range(trials):
+        strategy = algo.search()
+        if strategy is None:
+            break
+        performance = simulate(strategy)
+        strategy["performance"] = performance
+        strategy["max_mem"] = "OOM" if performance is None else 1.0
+        history.append(strategy)
+    return history
+
+
+def test_model_algo_finds_near_best_in_few_trials():
+    strategies = make_strategies()
+    best = min(p for p in map(simulate, strategies) if p is not None)
+    algo = ModelAlgo(strategies, make_config())
+    history = []
+    algo.bind_history(history)
+    run_search(algo, history, trials=len(strategies) // 5)
+
+    found = min(s["performance"] for s in history if s["performance"])
+    assert found <= best * 1.05
+    # The memory prior keeps most trials away from OOM
+    assert sum(s["performance"] is None for s in history) <= len(history) // 4
+
+
+def test_model_algo_respects_max_trials_and_history():
+    strategies = make_strategies()
+    algo = ModelAlgo(strategies, make_config(max_trials=5))
+    history = [dict(strategies[0], performance=1234.0)]
+    algo.bind_history(history)
+    run_search(algo, history, trials=100)
+    assert algo.has_done()
+    assert len(history) == 5
+    keys = [algo._key(s) for s in history]
+    assert len(set(keys)) == len(keys)
+
+
+def test_model_algo_warm_start_skips_exploration():
+    strategies = make_strategies()
+    previous = [dict(s) for s in strategies[::4]]
+    for strategy in previous:
+        strategy["performance"] = simulate(strategy)
+    best = min(p for p in map(simulate, strategies) if p is not None)
+
+    algo = ModelAlgo([dict(s) for s in strategies], make_config())
+    history = []
+    algo.bind_history(history)
+    algo.warm_start(previous)
+    run_search(algo, history, trials=5)
+    assert min(s["performance"] for s in history if s["performance"]) <= best * 1.05
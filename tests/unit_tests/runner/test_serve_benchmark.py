@@ -0,0 +1,172 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+from aiohttp import web
+
+from flagscale.runner.utils import (
+    RequestFuncOutput,
+    find_saturation_knee,
+    get_request,
+    make_warmup_requests,
+    sweep_request_rates,
+)
+from flagscale.serve.metric import calculate_metrics
+
+
+async def collect_arrivals(requests, request_rate, burstiness=1.0):
+    start = time.perf_counter()
+    arrivals = []
+    async for request in get_request(requests, request_rate, burstiness):
+        arrivals.append((request, time.perf_counter() - start))
+    return arrivals
+
+
+def test_get_request_infinite_rate_sends_everything_at_once():
+    arrivals = asyncio.run(collect_arrivals(list(range(50)), float("inf")))
+    assert [r for r, _ in arrivals] == list(range(50))
+    assert arrivals[-1][1] < 0.05
+
+
+def test_get_request_follows_request_rate():
+    np.random.seed(0)
+    arrivals = asyncio.run(collect_arrivals(list(range(40)), request_rate=200.0))
+    # 39 gaps with mean 5ms; allow for timer slack
+    assert 0.1 < arrivals[-1][1] < 0.6
+
+
+def test_get_request_rejects_non_positive_burstiness():
+    with pytest.raises(AssertionError):
+        asyncio.run(collect_arrivals([1], request_rate=1.0, burstiness=0))
+
+
+def make_result(rate, throughput, goodput=None):
+    return {"request_rate": rate, "request_throughput": throughput, "request_goodput": goodput}
+
+
+def test_find_saturation_knee_on_throughput():
+    sweep = [make_result(1, 1.0), make_result(2, 1.95), make_result(4, 2.5), make_result(8, 2.6)]
+    assert find_saturation_knee(sweep)["request_rate"] == 2
+
+
+def test_find_saturation_knee_on_goodput():
+    sweep = [make_result(1, 1.0, 1.0), make_result(2, 2.0, 1.0), make_result(4, 4.0, 1.0)]
+    assert find_saturation_knee(sweep)["request_rate"] == 1
+
+
+def test_find_saturation_knee_none_when_lowest_rate_saturates():
+    assert find_saturation_knee([make_result(4, 1.0)]) is None
+
+
+def test_calculate_metrics_goodput():
+    outputs = [
+        RequestFuncOutput(success=True, latency=1.0, output_tokens=11, ttft=0.1),
+        RequestFuncOutput(success=True, latency=2.0, output_tokens=11, ttft=0.8),
+        RequestFuncOutput(success=True, latency=3.0, output_tokens=11, ttft=0.1),
+        RequestFuncOutput(success=False),
+    ]
+    input_requests = [("prompt", 8, 11, None)] * len(outputs)
+    metrics, _ = calculate_metrics(
+        input_requests,
+        outputs,
+        dur_s=2.0,
+        tokenizer=None,
+        selected_percentile_metrics=["ttft"],
+        selected_percentiles=[99.0],
+        goodput_config={"ttft": 500, "tpot": 200},
+    )
+    # The second request misses the TTFT SLO, the third misses the TPOT SLO
+    assert metrics.completed == 3
+    assert metrics.request_goodput == pytest.approx(0.5)
+
+
+def test_calculate_metrics_rejects_unknown_slo():
+    with pytest.raises(ValueError, match="Unknown goodput"):
+        calculate_metrics([], [], 1.0, None, [], [], goodput_config={"latency": 1})
+
+
+def test_warmup_requests_share_no_prefix_with_measured_requests():
+    requests = [("shared prefix a", 3, 8, None), ("shared prefix b", 3, 4, None)]
+    warmup = make_warmup_requests(requests, 3)
+    assert len(warmup) == 3
+    prompts = [request[0] for request in requests + warmup]
+    assert len(set(prompts)) == len(prompts)
+    # No warmup prompt starts like a measured one, and the rest of each request is kept
+    for i, (prompt, prompt_len, output_len, mm_content) in enumerate(warmup):
+        source = requests[i % len(requests)]
+        assert not prompt.startswith("shared") and prompt.endswith(source[0])
+        assert (prompt_len, output_len, mm_content) == source[1:]
+
+
+async def serve_chat_completions(num_tokens, token_seconds, max_running=None):
+    """A streaming chat completions server, running at most ``max_running`` requests at once."""
+    semaphore = asyncio.Semaphore(max_running) if max_running else None
+
+    async def generate(response):
+        for i in range(num_tokens):
+            await asyncio.sleep(token_seconds)
+            chunk = {"choices": [{"delta": {"content": f"t{i} "}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        usage = {"choices": [], "usage": {"completion_tokens": num_tokens}}
+        await response.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+
+    async def handle(request):
+        await request.json()
+        response = web.StreamResponse()
+        await response.prepare(request)
+        if semaphore is None:
+            await generate(response)
+        else:
+            async with semaphore:
+                await generate(response)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+async def sweep_mock_server(request_rates, num_prompts, max_running=None):
+    # Each request streams for 0.5s, longer than the mean gap between arrivals
+    runner, api_url = await serve_chat_completions(10, 0.05, max_running)
+    try:
+        return await sweep_request_rates(
+            request_rates,
+            api_url=api_url,
+            model="mock",
+            served_model_name=None,
+            tokenizer=None,
+            input_requests=[("prompt", 4, 10, None)] * num_prompts,
+            selected_percentile_metrics=["ttft"],
+            selected_percentiles=[99.0],
+        )
+    finally:
+        await runner.cleanup()
+
+
+def test_sweep_of_an_unloaded_server_is_not_saturated():
+    np.random.seed(0)
+    results, knee = asyncio.run(sweep_mock_server([10, 20], num_prompts=12))
+    assert [result["request_rate"] for result in results] == [10.0, 20.0]
+    for result in results:
+        assert result["completed"] == 12
+        # Draining the last responses keeps the throughput well below the offered rate
+        assert result["request_throughput"] < 0.9 * result["request_rate"]
+    assert knee is results[-1]
+
+
+def test_sweep_stops_at_the_saturated_rate():
+    np.random.seed(0)
+    # One request at a time serves 2 requests/s
+    results, knee = asyncio.run(sweep_mock_server([1, 20, 40], num_prompts=6, max_running=1))
+    assert [result["request_rate"] for result in results] == [1.0, 20.0]
+    assert results[-1]["completion_rate"] < 0.9 * results[-1]["arrival_rate"]
+    assert knee is results[0]
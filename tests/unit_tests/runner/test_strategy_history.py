@@ -0,0 +1,76 @@
+import itertools
+import random
+
+from omegaconf import OmegaConf
+
+from flagscale.runner.auto_tuner.prune.pruner import Pruner
+from flagscale.runner.auto_tuner.utils import StrategyHistory, beside, select
+
+
+def make_strategies(seed=0):
+    rng = random.Random(seed)
+    strategies = []
+    for tp, pp, mbs, recompute, sp in itertools.product(
+        [1, 2, 4], [1, 2, 4], [1, 2, 4], [False, True], [False, True]
+    ):
+        strategies.append(
+            {
+                "data_parallel_size": 16 // (tp * pp),
+                "use_distributed_optimizer": True,
+                "tensor_model_parallel_size": tp,
+                "sequence_parallel": sp,
+                "pipeline_model_parallel_size": pp,
+                "num_layers_per_virtual_pipeline_stage": None,
+                "use_recompute": recompute,
+                "recompute_method": "uniform" if recompute else None,
+                "recompute_granularity": "full" if recompute else None,
+                "recompute_num_layers": 1 if recompute else None,
+                "micro_batch_size": mbs,
+                "context_parallel_size": 1,
+                "expert_model_parallel_size": 1,
+                "acc_step": 16 // mbs,
+                "hetero_process_meshes": [[tp, 1, 1, 1, pp]],
+                "performance": rng.choice([None, rng.uniform(1, 10)]),
+                "max_mem": rng.choice(["OOM", 1000]),
+            }
+        )
+    rng.shuffle(strategies)
+    return strategies
+
+
+def test_indexed_lookups_match_linear_scan():
+    strategies = make_strategies()
+    # A strategy read back without some dims compares only on the dims it has
+    partial = dict(strategies[0])
+    del partial["micro_batch_size"], partial["use_recompute"]
+    history = [*strategies[:100], partial]
+    indexed = StrategyHistory(history[:50])
+
+    for keys in (["micro_batch_size", "acc_step"], ["sequence_parallel"], []):
+        indexed.beside(keys, strategies[0])
+    indexed.extend(history[50:])
+
+    for strategy in strategies:
+        for keys in (
+            ["micro_batch_size", "acc_step"],
+            ["sequence_parallel"],
+            ["use_recompute", "recompute_method", "recompute_granularity"],
+            [],
+        ):
+            assert beside(keys, strategy, indexed) == beside(keys, strategy, history)
+        dims = ["hetero_process_meshes", "micro_batch_size"]
+        assert select(dims, strategy, indexed) == select(dims, strategy, history)
+
+    # Mutations other than append rebuild the indexes
+    indexed.pop(0)
+    assert beside([], history[0], indexed) == beside([], history[0], history[1:])
+
+
+def test_pruner_decisions_unchanged_with_index():
+    config = OmegaConf.create({"experiment": {"auto_tuner": {}}})
+    linear, indexed = [], StrategyHistory()
+    for strategy in make_strategies(seed=1):
+        a, b = dict(strategy), dict(strategy)
+        assert Pruner(config).prune(a, linear) == Pruner(config).prune(b, indexed)
+        assert a == b
+    assert linear == list(indexed)
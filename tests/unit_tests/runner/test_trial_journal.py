@@ -0,0 +1,102 @@
+import subprocess
+
+from omegaconf import OmegaConf
+
+from flagscale.runner.auto_tuner.prune.pruner import Pruner
+from flagscale.runner.auto_tuner.record.journal import TrialJournal, strategy_key
+from flagscale.runner.auto_tuner.search.algorithm import GridAlgo
+from flagscale.runner.auto_tuner.search.searcher import Searcher
+from flagscale.runner.auto_tuner.tuner_train import TrainAutoTuner
+
+
+class OddPruner(Pruner):
+    """Prunes the strategies with an odd micro batch size."""
+
+    def prune(self, strategy, history=[]):
+        history.append(strategy)
+        if strategy["micro_batch_size"] % 2:
+            strategy["pruned"] = True
+            strategy["prune_reason"] = "odd"
+            self.pruned_count += 1
+            return True
+        return False
+
+
+def make_tuner(journal, mocker):
+    config = OmegaConf.create({"experiment": {"auto_tuner": {}}})
+    searcher = Searcher.__new__(Searcher)
+    searcher.strategies = [{"micro_batch_size": mbs, "data_parallel_size": 2} for mbs in range(6)]
+    searcher.algo = GridAlgo(searcher.strategies, config)
+    searcher.journal = None
+    tuner = TrainAutoTuner.__new__(TrainAutoTuner)
+    tuner.config = config
+    tuner.logger = mocker.MagicMock()
+    tuner.generator = mocker.MagicMock()
+    tuner.searcher = searcher
+    tuner.pruner = OddPruner(config)
+    tuner.history = []
+    tuner.idx = 0
+    tuner.journal = journal
+    searcher.restore(journal)
+    tuner.pruner.restore(journal)
+    tuner.idx = journal.max_idx()
+    return tuner
+
+
+def dead_pid():
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def test_strategy_key_ignores_results():
+    strategy = {"micro_batch_size": 1, "data_parallel_size": 2}
+    key = strategy_key(strategy)
+    strategy.update(idx=3, performance=1.5, max_mem="OOM", error=None)
+    assert strategy_key(strategy) == key
+    assert strategy_key({"data_parallel_size": 2, "micro_batch_size": 1}) == key
+
+
+def test_resume_after_crash(tmp_path, mocker):
+    path = str(tmp_path / "journal.jsonl")
+    tuner = make_tuner(TrialJournal(path), mocker)
+    tuner.gen()
+    assert tuner.cur_strategy["micro_batch_size"] == 0 and tuner.idx == 1
+    tuner.cur_strategy["performance"] = 10.0
+    tuner.journal.append("finished", tuner.cur_strategy, idx=tuner.idx)
+
+    # The tuner process dies while it runs the next trial, in the middle of a write
+    mocker.patch("os.getpid", return_value=dead_pid())
+    tuner.gen()
+    assert tuner.cur_strategy["micro_batch_size"] == 2 and tuner.idx == 2
+    mocker.stopall()
+    with open(path, "ab") as f:
+        f.write(b'{"key": "cut')
+
+    journal = TrialJournal(path)
+    assert [r["idx"] for r in journal.interrupted()] == [2]
+    assert [s["micro_batch_size"] for s in journal.history()] == [0, 1]
+    assert journal.history()[1]["prune_reason"] == "odd"
+
+    resumed = make_tuner(journal, mocker)
+    assert resumed.pruner.pruned_count == 1
+    resumed.gen()
+    # The interrupted trial runs again, under a new task idx, the finished one does not
+    assert resumed.cur_strategy["micro_batch_size"] == 2 and resumed.idx == 3
+    resumed.gen()
+    assert resumed.cur_strategy["micro_batch_size"] == 4 and resumed.idx == 4
+    assert resumed.pruner.pruned_count == 2
+    # Records written after the cut line are intact
+    assert TrialJournal(path).max_idx() == 4
+
+
+def test_shared_journal_claims_each_strategy_once(tmp_path, mocker):
+    path = str(tmp_path / "journal.jsonl")
+    first = make_tuner(TrialJournal(path), mocker)
+    second = make_tuner(TrialJournal(path), mocker)
+    first.gen()
+    second.gen()
+    first.gen()
+    assert first.cur_strategy["micro_batch_size"] == 4
+    assert second.cur_strategy["micro_batch_size"] == 2 and second.idx == 2
+    assert first.idx == 3
@@ -0,0 +1,152 @@
+import collections
+
+from omegaconf import OmegaConf
+
+from flagscale.runner.auto_tuner.scheduler import (
+    TrialScheduler,
+    apply_allocation,
+    strategy_world_size,
+)
+from flagscale.runner.auto_tuner.tuner_train import TrainAutoTuner
+from flagscale.runner.utils import JobStatus, parse_hostfile
+
+
+def make_resources(num_nodes, slots=8):
+    return collections.OrderedDict(
+        (f"node{i}", {"slots": slots, "type": "A100"}) for i in range(num_nodes)
+    )
+
+
+def test_strategy_world_size():
+    strategy = {
+        "data_parallel_size": 2,
+        "tensor_model_parallel_size": 2,
+        "pipeline_model_parallel_size": 2,
+        "context_parallel_size": None,
+    }
+    assert strategy_world_size(strategy) == 8
+
+
+def test_best_fit_packs_partial_nodes_first():
+    scheduler = TrialScheduler(make_resources(2))
+    first = scheduler.allocate(4)
+    second = scheduler.allocate(2)
+    # The second trial goes to the partially used node, keeping node1 free
+    assert list(first) == list(second) == ["node0"]
+    assert first["node0"] == [0, 1, 2, 3] and second["node0"] == [4, 5]
+    assert scheduler.allocate(8) == {"node1": list(range(8))}
+    assert scheduler.allocate(4) is None
+
+    scheduler.release(first)
+    assert scheduler.allocate(4) == {"node0": [0, 1, 2, 3]}
+
+
+def test_multi_node_trials_need_whole_free_nodes():
+    scheduler = TrialScheduler(make_resources(4))
+    assert scheduler.fits(32) and not scheduler.fits(40) and not scheduler.fits(12)
+    small = scheduler.allocate(2)
+    big = scheduler.allocate(24)
+    assert list(big) == ["node1", "node2", "node3"]
+    assert scheduler.allocate(16) is None
+    scheduler.release(big)
+    scheduler.release(small)
+    assert scheduler.is_idle()
+
+
+def test_apply_allocation_restricts_trial(tmp_path):
+    resources = make_resources(2)
+    config = OmegaConf.create(
+        {
+            "experiment": {
+                "exp_dir": str(tmp_path / "task_1"),
+                "runner": {"nnodes": 2, "nproc_per_node": 8, "master_port": 29500},
+                "envs": {"CUDA_VISIBLE_DEVICES": "7,6,5,4,3,2,1,0"},
+            }
+        }
+    )
+    apply_allocation(config, {"node1": [2, 3]}, resources)
+    runner = config.experiment.runner
+    assert runner.nnodes == 1 and runner.nproc_per_node == 2
+    assert "master_port" not in runner
+    assert config.experiment.envs.CUDA_VISIBLE_DEVICES == "5,4"
+    assert parse_hostfile(runner.hostfile) == {"node1": {"slots": 2, "type": "A100"}}
+
+
+class FakeLauncher:
+    def __init__(self, polls):
+        self.polls = polls
+
+    def _query_status(self):
+        self.polls -= 1
+        return JobStatus.RUNNING if self.polls > 0 else JobStatus.COMPLETED_OR_IDLE
+
+    def _query_sub_process_status(self):
+        return self.polls > 0
+
+
+class FakeRunner:
+    def __init__(self, polls):
+        self.launcher = FakeLauncher(polls)
+
+    def stop(self):
+        pass
+
+
+def test_tune_concurrent_runs_trials_in_parallel(mocker):
+    strategies = [
+        {
+            "idx": None,
+            "data_parallel_size": dp,
+            "tensor_model_parallel_size": 1,
+            "pipeline_model_parallel_size": 1,
+        }
+        for dp in (4, 4, 8, 2)
+    ]
+    tuner = TrainAutoTuner.__new__(TrainAutoTuner)
+    tuner.logger = mocker.MagicMock()
+    tuner.interval = 0
+    tuner.max_time_per_task = 100
+    tuner.max_concurrent_trials = 4
+    tuner.resources = make_resources(1)
+    tuner.use_hostfile = False
+    tuner.history = []
+    tuner.idx = 0
+
+    remaining = list(strategies)
+
+    def gen():
+        tuner.cur_strategy = remaining.pop(0) if remaining else None
+        if tuner.cur_strategy:
+            tuner.idx += 1
+            tuner.cur_strategy["idx"] = tuner.idx
+            tuner.history.append(tuner.cur_strategy)
+            tuner.cur_task = OmegaConf.create(
+                {"experiment": {"exp_dir": "unused", "runner": {}, "envs": {}}}
+            )
+
+    tuner.gen = gen
+    tuner.need_stop = lambda: False
+
+    launched, concurrency = [], []
+
+    def run(task):
+        launched.append(task)
+        tuner.runner = FakeRunner(polls=2)
+        tuner.task_start_time = 0
+        concurrency.append(sum(s.get("running", False) for s in tuner.history))
+        return tuner.runner
+
+    tuner.run = run
+    recorded = []
+    tuner.record = lambda task, strategy: recorded.append(strategy["idx"])
+    tuner.log_best = lambda: None
+    mocker.patch("time.time", return_value=1)
+
+    tuner.tune_concurrent()
+
+    assert sorted(recorded) == [1, 2, 3, 4]
+    # Two 4-card trials share the node, the 8-card one waits for both
+    assert concurrency[:2] == [1, 2]
+    assert launched[2].experiment.runner.nproc_per_node == 8
+    assert launched[0].experiment.envs.CUDA_VISIBLE_DEVICES == "0,1,2,3"
+    assert not any(s.get("running") for s in tuner.history)
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import pytest
+
+from flagscale.serve.dag_utils import (
+    ChunkStream,
+    execute_dag,
+    is_streaming_forward,
+    normalize_depends,
+    topological_order,
+)
+
+
+class TestTopologicalOrder:
+    """Test cases for DAG ordering helpers"""
+
+    def test_normalize_depends(self):
+        assert normalize_depends(None) == []
+        assert normalize_depends("A") == ["A"]
+        assert normalize_depends(("A", "B")) == ["A", "B"]
+
+    def test_dependencies_come_first(self):
+        deps = {"A": [], "B": ["A"], "C": ["A"], "D": ["B", "C"]}
+        order = topological_order(deps, "D")
+        assert order[-1] == "D"
+        for node, node_deps in deps.items():
+            for dep in node_deps:
+                assert order.index(dep) < order.index(node)
+
+    def test_root_restricts_to_ancestors(self):
+        deps = {"A": [], "B": ["A"], "X": []}
+        assert topological_order(deps, "B") == ["A", "B"]
+
+    def test_cycle_raises(self):
+        with pytest.raises(ValueError, match="cycle"):
+            topological_order({"A": ["B"], "B": ["A"]})
+
+    def test_unknown_node_raises(self):
+        with pytest.raises(ValueError, match="Unknown node"):
+            topological_order({"A": ["missing"]})
+
+
+class TestExecuteDag:
+    """Test cases for the concurrent DAG executor"""
+
+    def test_branches_run_concurrently_and_shared_ancestor_once(self):
+        deps = {"A": [], "B": ["A"], "C": ["A"], "D": ["B", "C"]}
+        calls = []
+
+        async def call_node(name, dep_results):
+            calls.append(name)
+            if name in ("B", "C"):
+                await asyncio.sleep(0.2)
+            return "+".join(dep_results) + name if dep_results else name
+
+        start = time.perf_counter()
+        result = asyncio.run(execute_dag(deps, "D", call_node))
+        elapsed = time.perf_counter() - start
+
+        assert result == "AB+ACD"
+        assert sorted(calls) == ["A", "B", "C", "D"]
+        # B and C overlap, so the total is close to one branch rather than the sum.
+        assert elapsed < 0.35
+
+    def test_failure_propagates_and_cancels_pending(self):
+        deps = {"A": [], "slow": [], "B": ["A", "slow"]}
+        cancelled = []
+
+        async def call_node(name, dep_results):
+            if name == "A":
+                raise RuntimeError("boom")
+            if name == "slow":
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(name)
+                    raise
+            return name
+
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(execute_dag(deps, "B", call_node))
+        assert cancelled == ["slow"]
+
+
+async def _chunks(items, fail_after=None):
+    for i, item in enumerate(items):
+        if fail_after is not None and i == fail_after:
+            raise RuntimeError("stream broke")
+        await asyncio.sleep(0)
+        yield item
+
+
+class TestChunkStream:
+    """Test cases for streaming node outputs"""
+
+    def test_is_streaming_forward(self):
+        class Plain:
+            def forward(self, x):
+                return x
+
+        class Sync:
+            def forward(self, x):
+                yield x
+
+        class Async:
+            async def forward(self, x):
+                yield x
+
+        assert not is_streaming_forward(Plain.forward)
+        assert is_streaming_forward(Sync.forward)
+        assert is_streaming_forward(Async.forward)
+
+    def test_multiple_consumers_pull_source_once(self):
+        pulled = []
+
+        async def source():
+            for item in ["a", "b", "c"]:
+                pulled.append(item)
+                await asyncio.sleep(0)
+                yield item
+
+        async def main():
+            stream = ChunkStream(source())
+            first, second = await asyncio.gather(stream.collect(), stream.collect())
+            return first, second, await stream.collect()
+
+        first, second, third = asyncio.run(main())
+        assert first == second == third == ["a", "b", "c"]
+        assert pulled == ["a", "b", "c"]
+
+    def test_error_reaches_every_consumer(self):
+        async def main():
+            stream = ChunkStream(_chunks(["a", "b"], fail_after=1))
+            seen = []
+            with pytest.raises(RuntimeError, match="stream broke"):
+                async for chunk in stream:
+                    seen.append(chunk)
+            with pytest.raises(RuntimeError, match="stream broke"):
+                await stream.collect()
+            return seen
+
+        assert asyncio.run(main()) == ["a"]
+
+    def test_streaming_root_through_dag(self):
+        deps = {"A": [], "B": ["A"]}
+
+        async def call_node(name, dep_results):
+            if name == "A":
+                return ChunkStream(_chunks(["x", "y"]))
+            return ChunkStream(_chunks([c + "!" async for c in dep_results[0]]))
+
+        async def main():
+            result = await execute_dag(deps, "B", call_node)
+            return await result.collect()
+
+        assert asyncio.run(main()) == ["x!", "y!"]
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from flagscale.serve.disagg_utils import (
+    AsyncTokenCounter,
+    InstanceHealth,
+    InstanceSessionPool,
+    PrefixCacheIndex,
+    StreamedTokenCounter,
+    compute_ratios,
+    count_streamed_tokens,
+    prompt_hash,
+    prompt_text,
+)
+
+
+class TestPromptHash:
+    """Test cases for prompt hashing"""
+
+    def test_chat_messages_are_order_insensitive_on_keys(self):
+        a = [{"role": "user", "content": "hi"}]
+        b = [{"content": "hi", "role": "user"}]
+        assert prompt_hash(a) == prompt_hash(b)
+        assert prompt_hash("hi") != prompt_hash("hello")
+
+
+class TestAsyncTokenCounter:
+    """Test cases for off-loop token counting"""
+
+    def _make_counter(self, calls, delay=0.0, **kwargs):
+        def count_text(prompt):
+            calls.append((prompt, threading.current_thread().name))
+            time.sleep(delay)
+            return len(prompt.split())
+
+        def count_chat(messages):
+            return sum(len(m["content"].split()) for m in messages)
+
+        return AsyncTokenCounter(count_chat, count_text, **kwargs)
+
+    def test_counts_off_loop_and_caches(self):
+        calls = []
+        counter = self._make_counter(calls)
+
+        async def main():
+            first = await counter.count_text("a b c")
+            second = await counter.count_text("a b c")
+            chat = await counter.count_chat([{"role": "user", "content": "x y"}])
+            return first, second, chat
+
+        assert asyncio.run(main()) == (3, 3, 2)
+        assert len(calls) == 1
+        assert calls[0][1].startswith("tokenize")
+        counter.shutdown()
+
+    def test_concurrent_requests_share_tokenization(self):
+        calls = []
+        counter = self._make_counter(calls, delay=0.05)
+
+        async def main():
+            return await asyncio.gather(*(counter.count_text("same prompt") for _ in range(8)))
+
+        assert asyncio.run(main()) == [2] * 8
+        assert len(calls) == 1
+        counter.shutdown()
+
+    def test_lru_eviction(self):
+        calls = []
+        counter = self._make_counter(calls, cache_size=2)
+
+        async def main():
+            for prompt in ["a", "b", "c", "a"]:
+                await counter.count_text(prompt)
+
+        asyncio.run(main())
+        assert [prompt for prompt, _ in calls] == ["a", "b", "c", "a"]
+        counter.shutdown()
+
+
+class TestInstanceSessionPool:
+    """Test cases for per-instance keep-alive sessions"""
+
+    def test_reuses_session_per_instance(self):
+        async def main():
+            pool = InstanceSessionPool(limit_per_instance=8)
+            first = pool.get("10.0.0.1:8000")
+            assert pool.get("10.0.0.1:8000") is first
+            other = pool.get("10.0.0.2:8000")
+            assert other is not first
+            assert first.connector.limit == 8
+            await pool.close("10.0.0.1:8000")
+            assert first.closed
+            assert pool.get("10.0.0.1:8000") is not first
+            await pool.close_all()
+            assert other.closed
+
+        asyncio.run(main())
+
+
+class TestPrefixCacheIndex:
+    """Test cases for the router-side prefix cache index"""
+
+    def test_prompt_text_keeps_roles(self):
+        chat = {
+            "messages": [
+                {"role": "system", "content": "sys"},
+                {"role": "user", "content": [{"type": "text", "text": "hi"}]},
+            ]
+        }
+        assert prompt_text(chat) == "<|system|>sys<|user|>hi"
+        assert prompt_text({"prompt": "plain"}) == "plain"
+
+    def test_block_hashes_share_prefix(self):
+        index = PrefixCacheIndex(block_size=4)
+        a = index.block_hashes("aaaabbbbcccc")
+        b = index.block_hashes("aaaabbbbdddd")
+        assert len(a) == 3
+        assert a[:2] == b[:2]
+        assert a[2] != b[2]
+        # A trailing partial block is ignored.
+        assert index.block_hashes("aaaab") == a[:1]
+
+    def test_match_longest_prefix_per_instance(self):
+        index = PrefixCacheIndex(block_size=4)
+        system = "sys_" * 4
+        index.insert("p0", index.block_hashes(system + "turn"))
+        index.insert("p1", index.block_hashes(system[:8]))
+        matched = index.match(index.block_hashes(system + "next"))
+        assert matched == {"p0": 4, "p1": 2}
+        assert index.match(index.block_hashes("zzzzzzzz")) == {}
+
+    def test_eviction_and_removal_bound_memory(self):
+        index = PrefixCacheIndex(block_size=2, max_blocks_per_instance=3)
+        index.insert("p0", index.block_hashes("aabbccdd"))
+        assert len(index._blocks["p0"]) == 3
+        index.remove_instance("p0")
+        assert index._owners == {}
+        assert index.match(index.block_hashes("aabb")) == {}
+
+
+class TestInstanceHealth:
+    """Test cases for instance liveness and throughput tracking"""
+
+    def test_heartbeat_liveness(self):
+        health = InstanceHealth(now=0.0)
+        assert health.is_alive(timeout=30, now=29.0)
+        assert not health.is_alive(timeout=30, now=31.0)
+        health.heartbeat(now=31.0)
+        assert health.is_alive(timeout=30, now=31.0)
+        # A non-positive timeout disables eviction.
+        assert health.is_alive(timeout=0, now=1e9)
+
+    def test_failure_backoff_and_recovery(self):
+        health = InstanceHealth(backoff=1.0, max_backoff=3.0, now=0.0)
+        health.record_failure(now=0.0)
+        assert not health.is_available(now=0.5)
+        assert health.is_available(now=1.0)
+        health.record_failure(now=10.0)
+        health.record_failure(now=10.0)
+        assert health.down_until == 13.0
+        health.record_success()
+        assert health.failures == 0
+        assert health.is_available(now=10.0)
+
+    def test_ewma_and_compute_ratios(self):
+        fast = InstanceHealth(alpha=0.5)
+        slow = InstanceHealth(alpha=0.5)
+        unknown = InstanceHealth()
+        fast.record_success(tokens=300, seconds=1.0)
+        fast.record_success(tokens=100, seconds=1.0)
+        assert fast.tokens_per_sec == 200.0
+        slow.record_success(tokens=100, seconds=1.0)
+        ratios = compute_ratios({"fast": fast, "slow": slow, "unknown": unknown})
+        assert ratios["fast"] == pytest.approx(200 / 150)
+        assert ratios["slow"] == pytest.approx(100 / 150)
+        assert ratios["unknown"] == 1.0
+        assert compute_ratios({"a": InstanceHealth()}) == {"a": 1.0}
+
+    def test_count_streamed_tokens(self):
+        chunk = b'data: {"a": 1}\n\ndata: {"a": 2}\n\ndata: [DONE]\n\n'
+        assert count_streamed_tokens(chunk) == 2
+
+    def test_streamed_token_counter_carries_split_events(self):
+        stream = b'data: {"a": 1}\n\ndata: {"a": 2}\n\ndata: {"a": 3}\n\ndata: [DONE]\n\n'
+        for size in (1, 3, 7, 16, len(stream)):
+            counter = StreamedTokenCounter()
+            for start in range(0, len(stream), size):
+                counter.feed(stream[start : start + size])
+            assert counter.finish() == 3
+        # A last event without the terminating blank line is counted on finish
+        counter = StreamedTokenCounter()
+        assert counter.feed(b'data: {"a": 1}\n\ndata: {"a"') == 1
+        assert counter.finish() == 2
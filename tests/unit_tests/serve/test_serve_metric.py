@@ -0,0 +1,130 @@
+import asyncio
+import csv
+import json
+
+import numpy as np
+import pytest
+from aiohttp import web
+
+from flagscale.runner.utils import RequestFuncOutput, benchmark
+from flagscale.serve.metric import LatencyHistogram, StreamingMetrics, calculate_metrics
+
+
+def test_histogram_percentiles_within_relative_error():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=-3, sigma=1, size=20000)
+    hist = LatencyHistogram(relative_error=0.001)
+    hist.extend(values)
+    for p in (1, 25, 50, 90, 99, 99.9):
+        expected = np.percentile(values, p, method="lower")
+        assert hist.percentile(p) == pytest.approx(expected, rel=0.005)
+    assert hist.mean() == pytest.approx(values.mean())
+    assert hist.std() == pytest.approx(values.std())
+    # Memory is bounded by the number of buckets, not by the number of samples
+    assert len(hist._counts) < 10000
+
+
+def test_histogram_edge_values_and_merge():
+    hist = LatencyHistogram()
+    assert hist.percentiles([50, 99]) == [0.0, 0.0]
+    hist.extend([0.0, 0.0])
+    assert hist.median() == 0.0
+    other = LatencyHistogram()
+    other.add(2.0)
+    hist.merge(other)
+    assert hist.count == 3
+    assert hist.percentile(100) == 2.0
+
+
+def make_output(ttft, latency, itl, output_tokens, success=True):
+    return RequestFuncOutput(
+        success=success, ttft=ttft, latency=latency, itl=itl, output_tokens=output_tokens
+    )
+
+
+def test_streaming_metrics_series_and_progress(tmp_path):
+    aggregator = StreamingMetrics(bucket_seconds=1.0, goodput_config={"e2el": 1500})
+    assert aggregator.add(make_output(0.1, 1.0, [0.1] * 9, 10), 5, 10, 0.2) is None
+    assert aggregator.add(make_output(0.2, 2.0, [0.2] * 9, 10), 5, 10, 0.7) is None
+    assert aggregator.add(make_output(0, 0, [], 0, success=False), 5, 0, 0.9) is None
+    row = aggregator.add(make_output(0.3, 1.2, [0.1] * 9, 10), 5, 10, 2.5)
+    assert row["start_s"] == 0 and row["completed"] == 2 and row["failed"] == 1
+    assert row["output_throughput"] == 20
+
+    series = aggregator.series()
+    assert [r["completed"] for r in series] == [2, 0, 1]
+    assert series[2]["p50_ttft_ms"] == pytest.approx(300, rel=0.002)
+
+    metrics = aggregator.summary(dur_s=3.0, selected_percentiles=[99.0])
+    assert metrics.completed == 3
+    assert metrics.total_output == 30
+    assert metrics.request_goodput == pytest.approx(2 / 3)
+    assert metrics.mean_ttft_ms == pytest.approx(200)
+
+    aggregator.export(tmp_path / "series.csv")
+    with open(tmp_path / "series.csv") as f:
+        assert len(list(csv.DictReader(f))) == 3
+    aggregator.export(tmp_path / "series.json", dur_s=3.0)
+    with open(tmp_path / "series.json") as f:
+        data = json.load(f)
+    assert len(data["series"]) == 3 and data["summary"]["completed"] == 3
+
+
+def test_calculate_metrics_matches_numpy():
+    outputs = [make_output(0.01 * i, 0.1 * i, [0.01] * 4, 5) for i in range(1, 101)]
+    input_requests = [("prompt", 8, 5, None)] * len(outputs)
+    metrics, output_lens = calculate_metrics(input_requests, outputs, 10.0, None, [], [50, 99])
+    ttfts = np.array([o.ttft for o in outputs])
+    assert output_lens == [5] * 100
+    assert metrics.mean_ttft_ms == pytest.approx(ttfts.mean() * 1000)
+    assert metrics.std_ttft_ms == pytest.approx(ttfts.std() * 1000)
+    for p, value in metrics.percentiles_ttft_ms:
+        assert value == pytest.approx(np.percentile(ttfts, p, method="lower") * 1000, rel=0.002)
+
+
+def make_chat_app(num_tokens):
+    async def handle(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(num_tokens):
+            chunk = {"choices": [{"delta": {"content": "a"}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        usage = {"choices": [], "usage": {"completion_tokens": num_tokens}}
+        await response.write(f"data: {json.dumps(usage)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", handle)
+    return app
+
+
+def test_benchmark_streams_metrics_and_exports(tmp_path, unused_tcp_port):
+    async def run():
+        runner = web.AppRunner(make_chat_app(num_tokens=4))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", unused_tcp_port).start()
+        try:
+            return await benchmark(
+                api_url=f"http://127.0.0.1:{unused_tcp_port}/v1/chat/completions",
+                model="mock",
+                served_model_name=None,
+                tokenizer=None,
+                input_requests=[("hello", 1, 4, None)] * 20,
+                selected_percentile_metrics=["ttft", "itl"],
+                selected_percentiles=[99.0],
+                request_rate=200.0,
+                max_concurrency=4,
+                warmup_requests=2,
+                bucket_seconds=0.05,
+                metrics_export_path=str(tmp_path / "series.csv"),
+            )
+        finally:
+            await runner.cleanup()
+
+    result = asyncio.run(run())
+    assert result["completed"] == 20
+    assert result["total_output_tokens"] == 80
+    with open(tmp_path / "series.csv") as f:
+        rows = list(csv.DictReader(f))
+    assert sum(int(row["completed"]) for row in rows) == 20
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("datasets")
+
+from flagscale.train.datasets.compute_stats import (
+    RunningQuantileStats,
+    compute_episode_stats,
+    compute_episodes_stats,
+)
+
+
+def reference_stats(batches, num_bins):
+    """Histograms and quantiles of each feature, computed with a loop over the features."""
+    edges, histograms = None, None
+    low, high = None, None
+    for batch in batches:
+        if edges is None:
+            low, high = batch.min(axis=0), batch.max(axis=0)
+            edges = [np.linspace(lo - 1e-10, hi + 1e-10, num_bins + 1) for lo, hi in zip(low, high)]
+            histograms = [np.zeros(num_bins) for _ in edges]
+        elif np.any(batch.max(axis=0) > high) or np.any(batch.min(axis=0) < low):
+            low, high = np.minimum(low, batch.min(axis=0)), np.maximum(high, batch.max(axis=0))
+            for i in range(len(edges)):
+                padding = (high[i] - low[i]) * 1e-10
+                new_edges = np.linspace(low[i] - padding, high[i] + padding, num_bins + 1)
+                centers = (edges[i][:-1] + edges[i][1:]) / 2
+                bins = np.clip(np.searchsorted(new_edges, centers) - 1, 0, num_bins - 1)
+                new_hist = np.zeros(num_bins)
+                np.add.at(new_hist, bins, histograms[i])
+                edges[i], histograms[i] = new_edges, new_hist
+        for i in range(len(edges)):
+            histograms[i] += np.histogram(batch[:, i], bins=edges[i])[0]
+    return np.stack(histograms)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_histograms_match_per_feature_loop(dtype):
+    rng = np.random.default_rng(0)
+    batches = [
+        (rng.normal(size=(100, 6)) * rng.uniform(0.1, 10, size=6) + shift).astype(dtype)
+        for shift in (0, 3, -5)
+    ]
+    # Integer values fall on bin edges, and a constant feature has a zero-width range
+    batches[1] = np.round(batches[1])
+    for batch in batches:
+        batch[:, 0] = 2.0
+
+    stats = RunningQuantileStats(num_quantile_bins=64)
+    for batch in batches:
+        stats.update(batch)
+    np.testing.assert_array_equal(stats._histograms, reference_stats(batches, 64))
+
+    result = stats.get_statistics()
+    data = np.concatenate(batches)
+    np.testing.assert_allclose(result["q50"], np.quantile(data, 0.5, axis=0), atol=0.5)
+    assert np.all(result["q01"] <= result["q50"]) and np.all(result["q50"] <= result["q99"])
+
+
+def test_parallel_episodes_match_serial():
+    rng = np.random.default_rng(1)
+    episodes = [{"state": rng.normal(i, 1 + i, size=(200, 3))} for i in range(3)]
+    features = {"state": {"dtype": "float32", "shape": (3,)}}
+
+    serial = [compute_episode_stats(episode, features) for episode in episodes]
+    parallel = compute_episodes_stats(episodes, features, num_workers=2)
+    for expected, actual in zip(serial, parallel):
+        for key, value in expected["state"].items():
+            np.testing.assert_array_equal(actual["state"][key], value)
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("datasets")
+
+from flagscale.train.datasets.lerobot_dataset import LeRobotDataset
+
+EPISODE_LENGTHS = [5, 3, 7, 4]
+FEATURES = {
+    "observation.state": {"dtype": "float32", "shape": (3,), "names": None},
+    "action": {"dtype": "float32", "shape": (2,), "names": None},
+    "reward": {"dtype": "float64", "shape": (1,), "names": None},
+}
+DELTA_TIMESTAMPS = {
+    "action": [-0.2, 0.0, 0.3],
+    "observation.state": [-0.1, 0.0],
+    "reward": [0.0, 0.1, 0.5],
+}
+
+
+@pytest.fixture(scope="module")
+def dataset_root(tmp_path_factory):
+    root = tmp_path_factory.mktemp("lerobot") / "dataset"
+    dataset = LeRobotDataset.create(
+        "local/test", fps=10, features=FEATURES, root=root, use_videos=False
+    )
+    rng = np.random.default_rng(0)
+    for ep_idx, length in enumerate(EPISODE_LENGTHS):
+        for i in range(length):
+            dataset.add_frame(
+                {
+                    "observation.state": rng.normal(size=3).astype(np.float32),
+                    "action": rng.normal(size=2).astype(np.float32),
+                    "reward": np.array([i + 0.5], dtype=np.float64),
+                    "task": f"task {ep_idx % 2}",
+                }
+            )
+        dataset.save_episode()
+    dataset.finalize()
+    return root
+
+
+def reference_item(dataset, idx):
+    """Delta-timestamp queries of one frame, one clamped list comprehension per key."""
+    item = dataset.hf_dataset[idx]
+    ep = dataset.meta.episodes[item["episode_index"].item()]
+    ep_start, ep_end = ep["dataset_from_index"], ep["dataset_to_index"]
+    index = item["index"].item()
+    rows = {absolute.item(): row for row, absolute in enumerate(dataset.hf_dataset["index"])}
+    for key, delta_idx in dataset.delta_indices.items():
+        query = [max(ep_start, min(ep_end - 1, index + delta)) for delta in delta_idx]
+        item[f"{key}_is_pad"] = torch.BoolTensor(
+            [(index + delta < ep_start) | (index + delta >= ep_end) for delta in delta_idx]
+        )
+        item[key] = torch.stack(dataset.hf_dataset[[rows[q] for q in query]][key])
+    return item
+
+
+@pytest.mark.parametrize("episodes", [None, [1, 3], [3, 0]])
+def test_delta_queries_match_per_key_lookup(dataset_root, episodes):
+    dataset = LeRobotDataset(dataset_root, episodes=episodes, delta_timestamps=DELTA_TIMESTAMPS)
+    expected_len = sum(
+        length
+        for ep_idx, length in enumerate(EPISODE_LENGTHS)
+        if episodes is None or ep_idx in episodes
+    )
+    assert len(dataset) == expected_len
+
+    items = dataset.__getitems__(list(range(len(dataset))))
+    for idx, item in enumerate(items):
+        expected = reference_item(dataset, idx)
+        assert item.keys() - {"task"} == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, torch.Tensor):
+                assert item[key].dtype == value.dtype, key
+                torch.testing.assert_close(item[key], value, rtol=0, atol=0)
+            else:
+                assert item[key] == value
+
+
+def test_delta_queries_clamp_to_episode_bounds(dataset_root):
+    dataset = LeRobotDataset(dataset_root, episodes=[1, 3], delta_timestamps=DELTA_TIMESTAMPS)
+    # Episode 1 holds the absolute indices [5, 8), episode 3 holds [15, 19)
+    first, last = dataset[0], dataset[2]
+    assert first["index"].item() == 5 and last["index"].item() == 7
+    assert first["action_is_pad"].tolist() == [True, False, True]
+    assert last["action_is_pad"].tolist() == [False, False, True]
+    assert first["reward_is_pad"].tolist() == [False, False, True]
+    # Padded queries repeat the first and last frame of the episode
+    torch.testing.assert_close(first["action"][0], first["action"][1])
+    torch.testing.assert_close(first["action"][2], last["action"][1])
+    torch.testing.assert_close(last["action"][2], last["action"][1])
+    torch.testing.assert_close(first["reward"], torch.tensor([0.5, 1.5, 2.5]))
+
+    start = dataset[3]
+    assert start["index"].item() == 15
+    assert start["observation.state_is_pad"].tolist() == [True, False]
+    torch.testing.assert_close(start["observation.state"][0], start["observation.state"][1])
+
+
+def test_frame_cache_holds_only_queried_columns(dataset_root):
+    dataset = LeRobotDataset(dataset_root, delta_timestamps={"action": [0.0, 0.1]})
+    cache = dataset._frame_cache
+    assert cache is not None
+    assert set(cache.keys) == {"action", "index", "episode_index", "timestamp"}
+    assert cache.columns["action"].dtype == np.float32
+    assert cache.columns["index"].dtype == np.int64
+    # float32 and int64 columns are views of the Arrow buffers
+    assert not cache.columns["action"].flags.owndata
+
+    dataset.delta_indices = {"reward": [0, 1]}
+    assert set(dataset._get_frame_cache().keys) == {"reward", "index", "episode_index", "timestamp"}
+
+
+def test_delta_queries_of_shuffled_rows(dataset_root):
+    dataset = LeRobotDataset(dataset_root, episodes=[0, 2], delta_timestamps=DELTA_TIMESTAMPS)
+    # An indices mapping over the rows, the absolute index column is no longer sorted
+    dataset.hf_dataset = dataset.hf_dataset.shuffle(seed=0)
+    items = dataset.__getitems__(list(range(len(dataset))))
+    for idx, item in enumerate(items):
+        expected = reference_item(dataset, idx)
+        for key in DELTA_TIMESTAMPS:
+            torch.testing.assert_close(item[key], expected[key], rtol=0, atol=0)
+            assert torch.equal(item[f"{key}_is_pad"], expected[f"{key}_is_pad"])
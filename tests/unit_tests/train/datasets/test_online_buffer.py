@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("datasets")
+
+from flagscale.train.datasets.online_buffer import OnlineBuffer, compute_sampler_weights
+
+FPS = 10
+DATA_SPEC = {"action": {"shape": (2,), "dtype": np.dtype("float32")}}
+DELTA_TIMESTAMPS = {"action": [-0.2, -0.1, 0.0, 0.3]}
+
+
+def make_episodes(rng, lengths):
+    """Frames of consecutive episodes, with indices starting from 0 as add_data expects."""
+    episode_index = np.repeat(np.arange(len(lengths)), lengths)
+    frame_index = np.concatenate([np.arange(length) for length in lengths])
+    return {
+        OnlineBuffer.INDEX_KEY: np.arange(len(episode_index)),
+        OnlineBuffer.EPISODE_INDEX_KEY: episode_index,
+        OnlineBuffer.FRAME_INDEX_KEY: frame_index,
+        OnlineBuffer.TIMESTAMP_KEY: frame_index / FPS,
+        "action": rng.normal(size=(len(episode_index), 2)).astype(np.float32),
+    }
+
+
+def reference_episode_slots(buffer, slot):
+    """Slots of the episode at `slot`, by a scan of the whole buffer, in the order they were added."""
+    data = buffer._data
+    slots = np.where(
+        np.bitwise_and(
+            data[OnlineBuffer.EPISODE_INDEX_KEY] == data[OnlineBuffer.EPISODE_INDEX_KEY][slot],
+            data[OnlineBuffer.OCCUPANCY_MASK_KEY],
+        )
+    )[0]
+    return slots[np.argsort(data[OnlineBuffer.INDEX_KEY][slots])]
+
+
+def reference_item(buffer, idx):
+    item = {k: torch.from_numpy(np.asarray(v[idx])) for k, v in buffer._data.items() if k[0] != "_"}
+    slots = reference_episode_slots(buffer, idx)
+    episode_timestamps = buffer._data[OnlineBuffer.TIMESTAMP_KEY][slots]
+    for key, delta_ts in buffer.delta_timestamps.items():
+        query_ts = item[OnlineBuffer.TIMESTAMP_KEY].numpy() + delta_ts
+        dist = np.abs(query_ts[:, None] - episode_timestamps[None, :])
+        argmin_ = np.argmin(dist, axis=1)
+        item[key] = torch.from_numpy(buffer._data[key][slots[argmin_]])
+        item[f"{key}_is_pad"] = torch.from_numpy(dist.min(axis=1) > buffer.tolerance_s)
+    return item
+
+
+def check_episode_index(buffer):
+    occupied = np.flatnonzero(buffer._data[OnlineBuffer.OCCUPANCY_MASK_KEY])
+    assert buffer.num_frames == len(occupied)
+    for slot in occupied:
+        np.testing.assert_array_equal(
+            buffer._episode_slots(slot), reference_episode_slots(buffer, slot)
+        )
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_episode_index_matches_buffer_scan(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    capacity = 37
+    buffer = OnlineBuffer(tmp_path, DATA_SPEC, capacity, FPS, DELTA_TIMESTAMPS)
+    for _ in range(12):
+        # Rollouts of up to a few episodes, some longer than what is left before wrapping around
+        lengths = rng.integers(1, 12, size=rng.integers(1, 4))
+        buffer.add_data(make_episodes(rng, lengths))
+        check_episode_index(buffer)
+        for idx in range(len(buffer)):
+            expected = reference_item(buffer, idx)
+            item = buffer[idx]
+            assert item.keys() == expected.keys()
+            for key, value in expected.items():
+                torch.testing.assert_close(item[key], value, rtol=0, atol=0)
+
+    # Reopening the memmaps rebuilds the same index
+    reopened = OnlineBuffer(tmp_path, DATA_SPEC, capacity, FPS, DELTA_TIMESTAMPS)
+    assert reopened.num_frames == buffer.num_frames
+    check_episode_index(reopened)
+    occupied = buffer._data[OnlineBuffer.OCCUPANCY_MASK_KEY]
+    np.testing.assert_array_equal(
+        reopened._episode_start[occupied], buffer._episode_start[occupied]
+    )
+    np.testing.assert_array_equal(
+        reopened._episode_length[occupied], buffer._episode_length[occupied]
+    )
+
+
+def test_add_data_of_whole_capacity(tmp_path):
+    rng = np.random.default_rng(0)
+    buffer = OnlineBuffer(tmp_path, DATA_SPEC, 10, FPS, DELTA_TIMESTAMPS)
+    buffer.add_data(make_episodes(rng, [4, 3]))
+    # Overwrites every frame, starting in the middle of the buffer
+    buffer.add_data(make_episodes(rng, [6, 4]))
+    assert buffer.num_frames == 10
+    check_episode_index(buffer)
+
+
+class OfflineDataset:
+    def __init__(self, lengths):
+        ends = np.cumsum(lengths)
+        self.meta = type("Meta", (), {})()
+        self.meta.episodes = {
+            "dataset_from_index": (ends - lengths).tolist(),
+            "dataset_to_index": ends.tolist(),
+        }
+        self._len = int(ends[-1]) if len(lengths) else 0
+
+    def __len__(self):
+        return self._len
+
+
+def reference_sampler_weights(
+    offline_dataset, offline_drop_n_last_frames, online_dataset, online_sampling_ratio, online_drop
+):
+    """The sampler weights, with a loop over the episodes of each dataset."""
+    weights = []
+    offline_indices = []
+    for start_index, end_index in zip(
+        offline_dataset.meta.episodes["dataset_from_index"],
+        offline_dataset.meta.episodes["dataset_to_index"],
+        strict=True,
+    ):
+        offline_indices.extend(range(start_index, end_index - offline_drop_n_last_frames))
+    offline_mask = torch.zeros(len(offline_dataset), dtype=torch.bool)
+    offline_mask[torch.tensor(offline_indices, dtype=torch.long)] = True
+    weights.append(
+        torch.full((len(offline_dataset),), (1 - online_sampling_ratio) / offline_mask.sum())
+        * offline_mask
+    )
+
+    online_indices = []
+    episode_indices = online_dataset.get_data_by_key("episode_index")
+    for episode_idx in torch.unique(episode_indices):
+        where_episode = torch.where(episode_indices == episode_idx)
+        start_index = where_episode[0][0]
+        end_index = where_episode[0][-1] + 1
+        online_indices.extend(range(start_index.item(), end_index.item() - online_drop))
+    online_mask = torch.zeros(len(online_dataset), dtype=torch.bool)
+    online_mask[torch.tensor(online_indices, dtype=torch.long)] = True
+    weights.append(
+        torch.full((len(online_dataset),), online_sampling_ratio / online_mask.sum()) * online_mask
+    )
+
+    weights = torch.cat(weights)
+    if weights.sum() == 0:
+        weights += 1 / len(weights)
+    else:
+        weights /= weights.sum()
+    return weights
+
+
+@pytest.mark.parametrize("drop_n_last_frames", [0, 1, 3])
+def test_sampler_weights_match_episode_loop(tmp_path, drop_n_last_frames):
+    rng = np.random.default_rng(drop_n_last_frames)
+    offline_dataset = OfflineDataset(rng.integers(1, 10, size=6))
+    online_dataset = OnlineBuffer(tmp_path, DATA_SPEC, 29, FPS)
+    for _ in range(5):
+        online_dataset.add_data(make_episodes(rng, rng.integers(1, 8, size=3)))
+        weights = compute_sampler_weights(
+            offline_dataset,
+            offline_drop_n_last_frames=drop_n_last_frames,
+            online_dataset=online_dataset,
+            online_sampling_ratio=0.3,
+            online_drop_n_last_frames=drop_n_last_frames,
+        )
+        expected = reference_sampler_weights(
+            offline_dataset, drop_n_last_frames, online_dataset, 0.3, drop_n_last_frames
+        )
+        torch.testing.assert_close(weights, expected)
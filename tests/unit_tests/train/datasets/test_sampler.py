@@ -0,0 +1,111 @@
+import itertools
+
+import numpy as np
+
+from flagscale.train.datasets.sampler import EpisodeAwareSampler, MixtureSampler
+
+FROM_INDICES = [0, 10, 15, 40]
+TO_INDICES = [10, 15, 40, 41]
+
+
+def expected_indices(episodes, drop_first, drop_last):
+    indices = []
+    for episode, (start, end) in enumerate(zip(FROM_INDICES, TO_INDICES)):
+        if episodes is None or episode in episodes:
+            indices.extend(range(start + drop_first, end - drop_last))
+    return indices
+
+
+def test_episode_ranges():
+    for episodes, drop_first, drop_last in [(None, 0, 0), ([0, 2, 3], 1, 2), ([1], 3, 3)]:
+        sampler = EpisodeAwareSampler(
+            FROM_INDICES, TO_INDICES, episodes, drop_first, drop_last, num_replicas=1, rank=0
+        )
+        expected = expected_indices(episodes, drop_first, drop_last)
+        assert list(sampler) == expected and len(sampler) == len(expected)
+
+        sampler.shuffle = True
+        shuffled = list(sampler)
+        assert sorted(shuffled) == expected
+
+
+def test_shards_and_epochs():
+    expected = expected_indices(None, 0, 0)
+    shards = [
+        list(EpisodeAwareSampler(FROM_INDICES, TO_INDICES, shuffle=True, num_replicas=4, rank=r))
+        for r in range(4)
+    ]
+    assert all(len(shard) == 11 for shard in shards)
+    # Disjoint apart from the padding, which repeats the first indices of the epoch
+    merged = list(itertools.chain(*zip(*shards)))
+    assert sorted(merged[: len(expected)]) == expected
+    assert merged[len(expected) :] == merged[: 44 - len(expected)]
+
+    sampler = EpisodeAwareSampler(FROM_INDICES, TO_INDICES, shuffle=True, num_replicas=1, rank=0)
+    first, second = list(sampler), list(sampler)
+    assert first != second and sampler.epoch == 2
+    sampler.set_epoch(0)
+    assert list(sampler) == first
+
+    dropped = EpisodeAwareSampler(FROM_INDICES, TO_INDICES, num_replicas=4, rank=3, drop_last=True)
+    assert len(dropped) == len(list(dropped)) == 10
+
+
+def test_resume_mid_epoch():
+    def make():
+        return EpisodeAwareSampler(
+            FROM_INDICES, TO_INDICES, shuffle=True, num_replicas=2, rank=1, seed=7
+        )
+
+    sampler = make()
+    sampler.set_epoch(3)
+    full = list(sampler)
+    sampler.set_epoch(3)
+    iterator = iter(sampler)
+    consumed = [next(iterator) for _ in range(8)]
+    # Two more indices were prefetched by the DataLoader but not consumed
+    next(iterator), next(iterator)
+    state = sampler.state_dict(num_consumed=len(consumed))
+
+    resumed = make()
+    resumed.load_state_dict(state)
+    resumed.set_epoch(3)
+    assert consumed + list(resumed) == full
+    assert resumed.epoch == 4 and resumed.state_dict()["num_yielded"] == 0
+
+
+def test_mixture_weights_and_temperature():
+    sizes = [1000, 50, 0, 200]
+    sampler = MixtureSampler(sizes, weights=[1, 1, 5, 2], num_samples=20000, num_replicas=1, rank=0)
+    indices = np.array(list(sampler))
+    counts = np.bincount(sampler.source_of(indices), minlength=4)
+    # The empty source is never drawn, the others follow their weights
+    assert counts[2] == 0
+    np.testing.assert_allclose(counts / len(indices), [0.25, 0.25, 0, 0.5], atol=0.02)
+    # The small source cycles through all of its frames before repeating any
+    small = indices[sampler.source_of(indices) == 1][:50]
+    assert sorted(small.tolist()) == list(range(1000, 1050))
+
+    assert np.allclose(
+        MixtureSampler(sizes, temperature=1e9, rank=0).probabilities[[0, 1, 3]], 1 / 3
+    )
+    sampler.record([0, 0, 3], num_tokens=[10, 20, 5])
+    assert sampler.source_frames.tolist() == [2, 0, 0, 1]
+    assert sampler.source_tokens.tolist() == [30, 0, 0, 5]
+
+
+def test_mixture_shards_and_resume():
+    def make(rank):
+        return MixtureSampler([30, 7, 12], num_samples=100, num_replicas=3, rank=rank, seed=1)
+
+    shards = [list(make(rank)) for rank in range(3)]
+    assert [len(shard) for shard in shards] == [33, 33, 33]
+    single = MixtureSampler([30, 7, 12], num_samples=100, num_replicas=1, rank=0, seed=1)
+    assert list(itertools.chain(*zip(*shards))) == list(single)[:99]
+
+    sampler = make(2)
+    iterator = iter(sampler)
+    consumed = [next(iterator) for _ in range(20)]
+    resumed = make(2)
+    resumed.load_state_dict(sampler.state_dict())
+    assert consumed + list(resumed) == shards[2]
@@ -0,0 +1,182 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+pytest.importorskip("datasets")
+
+from flagscale.train.datasets import lerobot_dataset
+from flagscale.train.datasets.lerobot_dataset import LeRobotDataset
+from flagscale.train.datasets.video_utils import (
+    VideoDecoderCache,
+    decode_video_frames_torchcodec,
+    decode_video_frames_torchcodec_batch,
+)
+
+FPS = 10
+NUM_FRAMES = 40
+
+
+class FakeFileHandle:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDecoder:
+    """Frames of a constant color equal to their index, timestamped at a fixed frame rate."""
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.metadata = SimpleNamespace(average_fps=FPS)
+        self.data = torch.arange(NUM_FRAMES, dtype=torch.uint8)[:, None, None, None].expand(
+            NUM_FRAMES, 3, 2, 2
+        )
+        self.pts_seconds = torch.arange(NUM_FRAMES, dtype=torch.float64) / FPS
+
+    def get_frames_at(self, indices):
+        indices = torch.as_tensor(indices, dtype=torch.long)
+        return SimpleNamespace(data=self.data[indices], pts_seconds=self.pts_seconds[indices])
+
+
+class FakeDecoderCache(VideoDecoderCache):
+    def __init__(self, max_size=16):
+        super().__init__(max_size)
+        self.handles = {}
+
+    def _open(self, video_path):
+        handle = FakeFileHandle()
+        self.handles.setdefault(video_path, []).append(handle)
+        return FakeDecoder(video_path), handle
+
+    def wait_for_prefetch(self):
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown(wait=True)
+            self._prefetcher = None
+
+
+def reference_decode(decoder, timestamps, tolerance_s):
+    """Frames of one query, the closest of the decoded frames by pairwise distances."""
+    frames_batch = decoder.get_frames_at(indices=[round(ts * FPS) for ts in timestamps])
+    query_ts = torch.tensor(timestamps)
+    loaded_ts = frames_batch.pts_seconds.to(torch.float32)
+    dist = torch.cdist(query_ts[:, None], loaded_ts[:, None], p=1)
+    min_, argmin_ = dist.min(1)
+    assert (min_ < tolerance_s).all()
+    return (frames_batch.data[argmin_] / 255.0).type(torch.float32)
+
+
+def test_cache_holds_at_most_max_size_decoders():
+    cache = FakeDecoderCache(max_size=2)
+    first = cache.get_decoder("a.mp4")
+    cache.get_decoder("b.mp4")
+    assert cache.get_decoder("a.mp4") is first
+    cache.get_decoder("c.mp4")
+    assert cache.size() == 2
+    # b.mp4 is the least recently used and closed with its file handle
+    assert cache.handles["b.mp4"][0].closed
+    assert not cache.handles["a.mp4"][0].closed
+    assert not cache.handles["c.mp4"][0].closed
+
+    cache.get_decoder("b.mp4")
+    assert cache.size() == 2
+    assert cache.handles["a.mp4"][0].closed
+    assert len(cache.handles["b.mp4"]) == 2
+
+    cache.clear()
+    assert cache.size() == 0
+    assert all(handle.closed for handles in cache.handles.values() for handle in handles)
+
+
+def test_prefetch_never_evicts():
+    cache = FakeDecoderCache(max_size=3)
+    cache.get_decoder("a.mp4")
+    cache.get_decoder("b.mp4")
+    cache.prefetch(["c.mp4", "d.mp4", "e.mp4"])
+    cache.wait_for_prefetch()
+    assert cache.size() == 3
+    # Only the free slot is filled, the decoders in use stay open
+    assert set(cache.handles) == {"a.mp4", "b.mp4", "c.mp4"}
+    assert not any(handle.closed for handles in cache.handles.values() for handle in handles)
+
+    # A prefetched decoder is reused, not reopened
+    cache.get_decoder("c.mp4")
+    assert len(cache.handles["c.mp4"]) == 1
+
+    cache.prefetch(["f.mp4"])
+    cache.wait_for_prefetch()
+    assert "f.mp4" not in cache.handles
+
+
+def test_batch_decode_matches_per_query_decode():
+    cache = FakeDecoderCache()
+    decoder = cache.get_decoder("a.mp4")
+    tolerance_s = 1e-4
+    timestamps_list = [[0.0, 0.1, 0.2], [0.3], [2.0, 0.5, 0.5, 0.1], [3.9]]
+
+    frames = decode_video_frames_torchcodec_batch(
+        "a.mp4", timestamps_list, tolerance_s, decoder_cache=cache
+    )
+    assert len(frames) == len(timestamps_list)
+    for timestamps, query_frames in zip(timestamps_list, frames):
+        expected = reference_decode(decoder, timestamps, tolerance_s)
+        assert query_frames.dtype == torch.float32
+        torch.testing.assert_close(query_frames, expected, rtol=0, atol=0)
+        torch.testing.assert_close(
+            decode_video_frames_torchcodec("a.mp4", timestamps, tolerance_s, decoder_cache=cache),
+            expected,
+            rtol=0,
+            atol=0,
+        )
+
+
+def test_batch_decode_checks_tolerance():
+    cache = FakeDecoderCache()
+    with pytest.raises(AssertionError):
+        decode_video_frames_torchcodec_batch("a.mp4", [[0.0], [0.125]], 1e-4, decoder_cache=cache)
+
+
+@pytest.mark.parametrize(
+    "episode_indices, episodes, prefetched",
+    [
+        ([2, 2, 3], None, 4),
+        ([5, 4, 3], None, 6),
+        ([1, 3], None, None),
+        ([7, 0], None, None),
+        ([9], None, None),
+        ([1, 2], [1, 2, 5], None),
+        ([1, 2], [1, 2, 3], 3),
+    ],
+)
+def test_query_videos_prefetches_only_after_contiguous_episodes(
+    monkeypatch, episode_indices, episodes, prefetched
+):
+    meta = SimpleNamespace(
+        episodes=[{"videos/cam/from_timestamp": 0.0} for _ in range(10)],
+        total_episodes=10,
+        video_keys=["cam"],
+        get_video_file_path=lambda ep_idx, vid_key: f"{vid_key}/{ep_idx}.mp4",
+    )
+    dataset = SimpleNamespace(
+        meta=meta, root=Path("/data"), episodes=episodes, video_backend="torchcodec", tolerance_s=1
+    )
+    calls = []
+    monkeypatch.setattr(
+        lerobot_dataset, "prefetch_video_decoders", lambda paths, backend: calls.append(paths)
+    )
+    monkeypatch.setattr(
+        lerobot_dataset,
+        "decode_video_frames_batch",
+        lambda path, timestamps_list, tolerance_s, backend: [
+            torch.zeros(1, len(timestamps)) for timestamps in timestamps_list
+        ],
+    )
+
+    queries = [({"cam": [0.0]}, ep_idx) for ep_idx in episode_indices]
+    items = LeRobotDataset._query_videos_batch(dataset, queries)
+    assert len(items) == len(queries)
+    expected = [] if prefetched is None else [[Path("/data") / f"cam/{prefetched}.mp4"]]
+    assert calls == expected
@@ -0,0 +1,207 @@
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("einops")
+
+from flagscale.models.configs.types import FeatureType, NormalizationMode, PolicyFeature
+from flagscale.train.processor import (
+    DataProcessorPipeline,
+    NormalizerProcessorStep,
+    UnnormalizerProcessorStep,
+)
+from flagscale.train.processor.core import TransitionKey
+from flagscale.train.processor.normalize_processor import hotswap_stats
+
+EPS = 1e-8
+BOUNDS = {
+    NormalizationMode.MIN_MAX: ("min", "max"),
+    NormalizationMode.QUANTILES: ("q01", "q99"),
+    NormalizationMode.QUANTILE10: ("q10", "q90"),
+}
+FEATURES = {
+    "observation.state": PolicyFeature(type=FeatureType.STATE, shape=(4,)),
+    "action": PolicyFeature(type=FeatureType.ACTION, shape=(4,)),
+}
+
+
+def make_stats(seed=0):
+    rng = np.random.default_rng(seed)
+    stats = {}
+    for key in FEATURES:
+        data = rng.normal(size=(64, 4))
+        stats[key] = {"mean": data.mean(0), "std": data.std(0)}
+        stats[key].update(zip(("min", "max"), (data.min(0), data.max(0))))
+        for name, q in (("q01", 0.01), ("q99", 0.99), ("q10", 0.1), ("q90", 0.9)):
+            stats[key][name] = np.quantile(data, q, axis=0)
+    return stats
+
+
+def make_step(cls, mode, stats=None, **kwargs):
+    norm_map = {FeatureType.STATE: mode, FeatureType.ACTION: mode}
+    return cls(features=FEATURES, norm_map=norm_map, stats=stats or make_stats(), **kwargs)
+
+
+def closed_form(x, stats, mode, inverse):
+    """The normalization formulas, in float64."""
+    stats = {name: torch.as_tensor(value, dtype=torch.float64) for name, value in stats.items()}
+    x = x.to(torch.float64)
+    if mode == NormalizationMode.MEAN_STD:
+        if inverse:
+            return x * stats["std"] + stats["mean"]
+        return (x - stats["mean"]) / (stats["std"] + EPS)
+    low, high = (stats[name] for name in BOUNDS[mode])
+    denom = high - low
+    denom = torch.where(denom == 0, torch.full_like(denom, EPS), denom)
+    if inverse:
+        return (x + 1.0) * denom / 2.0 + low
+    return 2.0 * (x - low) / denom - 1.0
+
+
+def run(step, observation, action):
+    transition = {
+        TransitionKey.OBSERVATION: {"observation.state": observation},
+        TransitionKey.ACTION: action,
+    }
+    output = step(transition)
+    return output[TransitionKey.OBSERVATION]["observation.state"], output[TransitionKey.ACTION]
+
+
+@pytest.mark.parametrize(
+    "mode",
+    [
+        NormalizationMode.MEAN_STD,
+        NormalizationMode.MIN_MAX,
+        NormalizationMode.QUANTILES,
+        NormalizationMode.QUANTILE10,
+    ],
+)
+@pytest.mark.parametrize(
+    "cls, inverse", [(NormalizerProcessorStep, False), (UnnormalizerProcessorStep, True)]
+)
+def test_affine_matches_closed_form(mode, cls, inverse):
+    stats = make_stats()
+    step = make_step(cls, mode, stats)
+    observation = torch.randn(8, 4)
+    action = torch.randn(8, 3, 4)
+
+    scale, shift = step._get_affine(
+        "action", FeatureType.ACTION, inverse, torch.device("cpu"), torch.float64
+    )
+    torch.testing.assert_close(
+        torch.addcmul(shift, action.double(), scale),
+        closed_form(action, stats["action"], mode, inverse),
+    )
+
+    state, normalized_action = run(step, observation, action)
+    assert state.dtype == torch.float32 and normalized_action.dtype == torch.float32
+    torch.testing.assert_close(
+        state, closed_form(observation, stats["observation.state"], mode, inverse).float()
+    )
+    torch.testing.assert_close(
+        normalized_action, closed_form(action, stats["action"], mode, inverse).float()
+    )
+
+
+@pytest.mark.parametrize("inverse", [False, True])
+def test_min_equal_to_max_uses_eps(inverse):
+    stats = make_stats()
+    stats["action"]["min"][1] = stats["action"]["max"][1] = 0.5
+    cls = UnnormalizerProcessorStep if inverse else NormalizerProcessorStep
+    step = make_step(cls, NormalizationMode.MIN_MAX, stats)
+    action = torch.randn(5, 4).double()
+    action[:, 1] = 0.5
+
+    scale, shift = step._get_affine(
+        "action", FeatureType.ACTION, inverse, torch.device("cpu"), torch.float64
+    )
+    torch.testing.assert_close(
+        torch.addcmul(shift, action, scale),
+        closed_form(action, stats["action"], NormalizationMode.MIN_MAX, inverse),
+    )
+    if not inverse:
+        # An input equal to the constant bound maps to -1
+        assert torch.isfinite(scale).all()
+        torch.testing.assert_close(
+            torch.addcmul(shift, action, scale)[:, 1], torch.full((5,), -1.0, dtype=torch.float64)
+        )
+
+
+def test_integer_inputs_use_processor_dtype():
+    stats = make_stats()
+    step = make_step(NormalizerProcessorStep, NormalizationMode.MEAN_STD, stats)
+    observation = torch.randint(-3, 4, (6, 4))
+    action = torch.randint(-3, 4, (6, 4), dtype=torch.int32)
+    state, normalized_action = run(step, observation, action)
+    assert state.dtype == torch.float32 and normalized_action.dtype == torch.float32
+    torch.testing.assert_close(
+        state,
+        closed_form(
+            observation, stats["observation.state"], NormalizationMode.MEAN_STD, False
+        ).float(),
+    )
+    torch.testing.assert_close(
+        normalized_action,
+        closed_form(action, stats["action"], NormalizationMode.MEAN_STD, False).float(),
+    )
+
+
+@pytest.mark.parametrize("mode", [NormalizationMode.MEAN_STD, NormalizationMode.QUANTILES])
+def test_bf16_inputs_stay_bf16(mode):
+    stats = make_stats()
+    step = make_step(NormalizerProcessorStep, mode, stats)
+    observation = torch.randn(8, 4).bfloat16()
+    action = torch.randn(8, 4).bfloat16()
+    state, normalized_action = run(step, observation, action)
+    assert state.dtype == torch.bfloat16 and normalized_action.dtype == torch.bfloat16
+    # The scale and shift are rounded to bf16 once, the reference works in float64
+    torch.testing.assert_close(
+        normalized_action.float(),
+        closed_form(action, stats["action"], mode, False).float(),
+        rtol=2e-2,
+        atol=5e-2,
+    )
+    assert ("action", False, torch.device("cpu"), torch.bfloat16) in step._affine_cache
+
+
+def test_cache_cleared_when_stats_or_placement_change():
+    stats = make_stats()
+    step = make_step(NormalizerProcessorStep, NormalizationMode.MEAN_STD, stats)
+    action = torch.randn(4, 4)
+    observation = torch.randn(4, 4)
+
+    run(step, observation, action)
+    assert step._affine_cache
+    step.to(dtype=torch.float64)
+    assert not step._affine_cache
+
+    # Loading a state dict of other stats takes effect on the next call
+    new_stats = make_stats(seed=1)
+    other = make_step(NormalizerProcessorStep, NormalizationMode.MEAN_STD, new_stats)
+    step._stats_explicitly_provided = False
+    run(step, observation, action)
+    step.load_state_dict(other.state_dict())
+    assert not step._affine_cache
+    _, normalized_action = run(step, observation, action)
+    torch.testing.assert_close(
+        normalized_action,
+        closed_form(action, new_stats["action"], NormalizationMode.MEAN_STD, False).float(),
+    )
+
+    # Stats provided explicitly are kept, but the cache is still rebuilt
+    explicit = make_step(NormalizerProcessorStep, NormalizationMode.MEAN_STD, stats)
+    run(explicit, observation, action)
+    explicit.load_state_dict(other.state_dict())
+    assert not explicit._affine_cache
+
+    pipeline = DataProcessorPipeline(
+        steps=[make_step(NormalizerProcessorStep, NormalizationMode.MEAN_STD, stats)]
+    )
+    run(pipeline.steps[0], observation, action)
+    swapped = hotswap_stats(pipeline, new_stats)
+    assert not swapped.steps[0]._affine_cache
+    _, normalized_action = run(swapped.steps[0], observation, action)
+    torch.testing.assert_close(
+        normalized_action,
+        closed_form(action, new_stats["action"], NormalizationMode.MEAN_STD, False).float(),
+    )
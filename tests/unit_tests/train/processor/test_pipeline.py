@@ -0,0 +1,179 @@
+import numpy as np
+import pytest
+import torch
+
+pytest.importorskip("einops")
+
+from flagscale.models.configs.types import FeatureType, NormalizationMode, PolicyFeature
+from flagscale.train.processor import (
+    AddBatchDimensionProcessorStep,
+    DataProcessorPipeline,
+    DeviceProcessorStep,
+    NormalizerProcessorStep,
+    RenameObservationsProcessorStep,
+    UnnormalizerProcessorStep,
+    pipeline as pipeline_module,
+)
+from flagscale.train.processor.pipeline import _FusedProcessorSteps
+
+FEATURES = {
+    "observation.state": PolicyFeature(type=FeatureType.STATE, shape=(6,)),
+    "action": PolicyFeature(type=FeatureType.ACTION, shape=(5,)),
+}
+STATS = {
+    "observation.state": {"mean": np.arange(6.0), "std": np.full(6, 2.0)},
+    "action": {"min": -np.ones(5), "max": np.full(5, 3.0)},
+}
+NORM_MAP = {
+    FeatureType.STATE: NormalizationMode.MEAN_STD,
+    FeatureType.ACTION: NormalizationMode.MIN_MAX,
+}
+
+
+def make_pipeline(*extra_steps):
+    return DataProcessorPipeline(
+        steps=[
+            RenameObservationsProcessorStep(rename_map={"observation.raw": "observation.state"}),
+            NormalizerProcessorStep(features=FEATURES, norm_map=NORM_MAP, stats=STATS),
+            DeviceProcessorStep(device="cpu"),
+            *extra_steps,
+        ]
+    )
+
+
+def make_samples(num_samples, with_action=True, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return [
+        {
+            "observation.raw": torch.randn(6, generator=generator),
+            "action": torch.randn(3, 5, generator=generator) if with_action else None,
+            "next.reward": float(i) / 2,
+            "task": f"task {i}",
+        }
+        for i in range(num_samples)
+    ]
+
+
+def assert_same(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, torch.Tensor):
+            assert actual[key].shape == value.shape, key
+            torch.testing.assert_close(actual[key], value, rtol=0, atol=1e-6)
+        elif isinstance(value, dict):
+            assert_same(actual[key], value)
+        else:
+            assert actual[key] == value, key
+
+
+@pytest.fixture
+def stack_calls(monkeypatch):
+    """Records the size of the batches that process_batch stacks."""
+    calls = []
+    stack_values = pipeline_module._stack_values
+    depth = 0
+
+    def spy(values):
+        # Stacking recurses into the transition dictionaries, record the outer call only
+        nonlocal depth
+        if depth == 0:
+            calls.append(len(values))
+        depth += 1
+        try:
+            return stack_values(values)
+        finally:
+            depth -= 1
+
+    monkeypatch.setattr(pipeline_module, "_stack_values", spy)
+    return calls
+
+
+@pytest.mark.parametrize("with_action", [True, False])
+@pytest.mark.parametrize("compiled", [False, True])
+def test_process_batch_matches_per_sample(stack_calls, with_action, compiled):
+    samples = make_samples(5, with_action)
+    reference = [make_pipeline()(sample) for sample in samples]
+    pipeline = make_pipeline()
+    if compiled:
+        pipeline.compile()
+        assert len(pipeline._stages) == 1
+        assert isinstance(pipeline._stages[0], _FusedProcessorSteps)
+
+    outputs = pipeline.process_batch(samples)
+    assert stack_calls == [len(samples)]
+    assert len(outputs) == len(samples)
+    for output, expected in zip(outputs, reference):
+        assert_same(output, expected)
+    # The compiled pipeline also agrees sample by sample
+    for sample, expected in zip(samples, reference):
+        assert_same(pipeline(sample), expected)
+
+
+def test_torch_compiled_pipeline_matches_per_sample():
+    samples = make_samples(4)
+    reference = [make_pipeline()(sample) for sample in samples]
+    pipeline = make_pipeline().compile(use_torch_compile=True, backend="eager")
+    for output, expected in zip(pipeline.process_batch(samples), reference):
+        assert_same(output, expected)
+
+
+def test_tail_steps_run_per_sample():
+    unnormalizer = UnnormalizerProcessorStep(features=FEATURES, norm_map=NORM_MAP, stats=STATS)
+    samples = make_samples(4)
+    reference = [
+        make_pipeline(AddBatchDimensionProcessorStep(), unnormalizer)(sample) for sample in samples
+    ]
+    for compiled in (False, True):
+        pipeline = make_pipeline(AddBatchDimensionProcessorStep(), unnormalizer)
+        if compiled:
+            pipeline.compile()
+        for output, expected in zip(pipeline.process_batch(samples), reference):
+            assert_same(output, expected)
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_unstackable_samples_fall_back_to_per_sample(stack_calls, compiled):
+    samples = make_samples(3)
+    # One action chunk of another length, and one sample without action
+    samples.append({**make_samples(1, seed=1)[0], "action": torch.randn(7, 5)})
+    samples.append({**make_samples(1, seed=2)[0], "action": None})
+    pipeline = make_pipeline()
+    if compiled:
+        pipeline.compile()
+    outputs = pipeline.process_batch(samples)
+    assert stack_calls
+    for output, sample in zip(outputs, samples):
+        assert_same(output, make_pipeline()(sample))
+
+
+def test_non_elementwise_first_step_runs_per_sample(stack_calls):
+    steps = [AddBatchDimensionProcessorStep(), *make_pipeline().steps]
+    samples = make_samples(3)
+    reference = [DataProcessorPipeline(steps=list(steps))(sample) for sample in samples]
+    for compiled in (False, True):
+        pipeline = DataProcessorPipeline(steps=list(steps))
+        if compiled:
+            pipeline.compile()
+        for output, expected in zip(pipeline.process_batch(samples), reference):
+            assert_same(output, expected)
+    assert stack_calls == []
+
+
+def test_hooks_see_every_step_of_a_compiled_pipeline(stack_calls):
+    pipeline = make_pipeline().compile()
+    before, after = [], []
+    pipeline.register_before_step_hook(lambda idx, transition: before.append(idx))
+    pipeline.register_after_step_hook(lambda idx, transition: after.append(idx))
+    samples = make_samples(2)
+
+    for sample in samples:
+        assert_same(pipeline(sample), make_pipeline()(sample))
+    assert before == after == [0, 1, 2] * 2
+
+    before.clear()
+    after.clear()
+    outputs = pipeline.process_batch(samples)
+    assert stack_calls == []
+    assert before == after == [0, 1, 2] * 2
+    for output, sample in zip(outputs, samples):
+        assert_same(output, make_pipeline()(sample))
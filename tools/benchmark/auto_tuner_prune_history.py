@@ -0,0 +1,102 @@
+"""
+Measure auto-tuner pruning time against the size of the strategy history.
+
+Synthetic strategies are pruned one after another with every history based prune rule, once
+with the plain list history and once with the indexed ``StrategyHistory``. Both runs must
+make the same pruning decisions; the linear run is skipped above ``--linear-limit``.
+
+Example:
+    python tools/benchmark/auto_tuner_prune_history.py --num-strategies 10000 100000
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+
+from omegaconf import OmegaConf
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flagscale.runner.auto_tuner.prune.pruner import Pruner
+from flagscale.runner.auto_tuner.utils import StrategyHistory
+
+
+def make_strategies(num, seed=0):
+    rng = random.Random(seed)
+    space = list(
+        itertools.product(
+            [1, 2, 4, 8],  # tp
+            [1, 2, 4, 8, 16],  # pp
+            [1, 2, 4, 8, 16],  # mbs
+            [1, 2, 4, 8],  # cp
+            [1, 2, 4, 8],  # ep
+            [None, ("block", 1), ("block", 2), ("block", 4), ("uniform", 1), ("uniform", 2)],
+            [False, True],  # sp
+            [None, 2, 4],  # vpp layers
+            [False, True],  # distributed optimizer
+        )
+    )
+    rng.shuffle(space)
+    strategies = []
+    for tp, pp, mbs, cp, ep, recompute, sp, vpp, dist_opt in space[:num]:
+        method, layers = recompute or (None, None)
+        strategies.append(
+            {
+                "data_parallel_size": max(1, 1024 // (tp * pp * cp)),
+                "use_distributed_optimizer": dist_opt,
+                "tensor_model_parallel_size": tp,
+                "sequence_parallel": sp,
+                "pipeline_model_parallel_size": pp,
+                "num_layers_per_virtual_pipeline_stage": vpp,
+                "use_recompute": bool(recompute),
+                "recompute_method": method,
+                "recompute_granularity": "full" if recompute else None,
+                "recompute_num_layers": layers,
+                "micro_batch_size": mbs,
+                "context_parallel_size": cp,
+                "expert_model_parallel_size": ep,
+                "acc_step": 64 // mbs,
+                # Tried strategies: a mix of results and OOMs
+                "performance": rng.choice([None, rng.uniform(100, 1000)]),
+                "max_mem": rng.choice(["OOM", rng.uniform(1000, 80000)]),
+            }
+        )
+    return strategies
+
+
+def run(strategies, history):
+    config = OmegaConf.create({"experiment": {"auto_tuner": {}}})
+    pruner = Pruner(config)
+    decisions = []
+    start = time.perf_counter()
+    for strategy in strategies:
+        decisions.append(pruner.prune(dict(strategy), history))
+    return time.perf_counter() - start, decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--num-strategies", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--linear-limit", type=int, default=10000)
+    args = parser.parse_args()
+    logging.getLogger("FlagScale-AutoTuner").setLevel(logging.WARNING)
+
+    print(f"{'strategies':>10} {'linear (s)':>12} {'indexed (s)':>12} {'speedup':>8}")
+    for num in args.num_strategies:
+        strategies = make_strategies(num)
+        indexed_time, indexed = run(strategies, StrategyHistory())
+        if num <= args.linear_limit:
+            linear_time, linear = run(strategies, [])
+            assert linear == indexed, "indexed history changed pruning decisions"
+            speedup = f"{linear_time / indexed_time:.1f}x"
+        else:
+            linear_time, speedup = float("nan"), "-"
+        print(f"{len(strategies):>10} {linear_time:>12.2f} {indexed_time:>12.2f} {speedup:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Measure the per-request overhead of the xPyD disaggregated router.
+
+Mock prefill/decode servers are started locally and registered with a real router process
+through the ZMQ service-discovery port. The same workload is then sent once directly to a
+mock decode server and once through the router; the difference is the proxy overhead.
+
+Example:
+    python tools/benchmark/disagg_router_overhead.py --num-requests 2000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import msgpack
+import yaml
+import zmq
+from aiohttp import web
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+ROUTER_SCRIPT = os.path.join(ROOT, "flagscale", "serve", "run_disagg_xpyd_router.py")
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_mock_app(decode_chunks, chunk_delay):
+    async def handle(request):
+        data = await request.json()
+        response = web.StreamResponse()
+        await response.prepare(request)
+        num_chunks = 1 if data.get("max_tokens") == 1 else decode_chunks
+        for i in range(num_chunks):
+            if chunk_delay:
+                await asyncio.sleep(chunk_delay)
+            await response.write(f'data: {{"index": {i}, "text": "tok"}}\n\n'.encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/completions", handle)
+    app.router.add_post("/v1/chat/completions", handle)
+    return app
+
+
+async def start_mock_servers(num, decode_chunks, chunk_delay):
+    runners, addrs = [], []
+    for _ in range(num):
+        port = get_free_port()
+        runner = web.AppRunner(make_mock_app(decode_chunks, chunk_delay))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        runners.append(runner)
+        addrs.append(f"127.0.0.1:{port}")
+    return runners, addrs
+
+
+def register_instances(pd_proxy_port, prefill_addrs, decode_addrs):
+    context = zmq.Context()
+    sock = context.socket(zmq.DEALER)
+    sock.connect(f"tcp://127.0.0.1:{pd_proxy_port}")
+    send_registrations(sock, prefill_addrs, decode_addrs)
+    return context, sock
+
+
+def send_registrations(sock, prefill_addrs, decode_addrs):
+    for rtype, addrs in (("P", prefill_addrs), ("D", decode_addrs)):
+        for addr in addrs:
+            message = {"type": rtype, "http_address": addr, "zmq_address": f"zmq-{addr}"}
+            sock.send(msgpack.dumps(message))
+
+
+async def send_heartbeats(sock, prefill_addrs, decode_addrs, interval=3.0):
+    # Real instances re-register periodically; the router evicts silent ones
+    while True:
+        await asyncio.sleep(interval)
+        send_registrations(sock, prefill_addrs, decode_addrs)
+
+
+def start_router(args, serve_port, pd_proxy_port, log_file):
+    config = {
+        "serve": [{"serve_id": "vllm_model", "engine_args": {"model": args.model}}],
+        "experiment": {
+            "runner": {
+                "deploy": {
+                    "port": serve_port,
+                    "pd_proxy_port": pd_proxy_port,
+                    "prefill_decode_strategy": args.strategy,
+                }
+            }
+        },
+    }
+    config_file = tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False)
+    yaml.safe_dump(config, config_file)
+    config_file.close()
+    env = dict(os.environ, PYTHONPATH=f"{ROOT}:{os.environ.get('PYTHONPATH', '')}")
+    return subprocess.Popen(
+        [sys.executable, ROUTER_SCRIPT, "--config-path", config_file.name],
+        stdout=log_file,
+        stderr=subprocess.STDOUT,
+        env=env,
+    )
+
+
+async def wait_until_ready(url, timeout=120):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.post(url, json={"prompt": "ping", "max_tokens": 1}) as resp:
+                    await resp.read()
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"Router at {url} did not become ready")
+
+
+async def run_workload(url, num_requests, concurrency, prompt):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    payload = {"prompt": prompt, "max_tokens": 16, "stream": True}
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(url, json=payload) as resp:
+                    async for _ in resp.content.iter_chunked(1024):
+                        pass
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(num_requests)))
+        duration = time.perf_counter() - start
+    return latencies, duration
+
+
+def summarize(name, latencies, duration):
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f"{name:<8} qps={len(latencies) / duration:9.1f}  "
+        f"mean={statistics.mean(latencies) * 1000:8.3f}ms  "
+        f"p50={statistics.median(latencies) * 1000:8.3f}ms  p99={p99 * 1000:8.3f}ms"
+    )
+    return statistics.mean(latencies)
+
+
+async def main(args):
+    runners, addrs = await start_mock_servers(
+        args.prefill_num + args.decode_num, args.decode_chunks, args.chunk_delay
+    )
+    prefill_addrs, decode_addrs = addrs[: args.prefill_num], addrs[args.prefill_num :]
+    serve_port, pd_proxy_port = get_free_port(), get_free_port()
+    log_file = open(args.router_log, "w")
+    router = start_router(args, serve_port, pd_proxy_port, log_file)
+    context = sock = heartbeat = None
+    try:
+        await asyncio.sleep(1)
+        context, sock = register_instances(pd_proxy_port, prefill_addrs, decode_addrs)
+        heartbeat = asyncio.ensure_future(send_heartbeats(sock, prefill_addrs, decode_addrs))
+        proxy_url = f"http://127.0.0.1:{serve_port}/v1/completions"
+        await wait_until_ready(proxy_url)
+
+        prompt = " ".join(["hello"] * args.prompt_words)
+        direct_url = f"http://{decode_addrs[0]}/v1/completions"
+        direct = summarize(
+            "direct", *await run_workload(direct_url, args.num_requests, args.concurrency, prompt)
+        )
+        proxied = summarize(
+            "proxy", *await run_workload(proxy_url, args.num_requests, args.concurrency, prompt)
+        )
+        print(f"proxy overhead per request: {(proxied - direct) * 1000:.3f}ms")
+    finally:
+        router.terminate()
+        try:
+            router.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            router.kill()
+        log_file.close()
+        if heartbeat is not None:
+            heartbeat.cancel()
+        if sock is not None:
+            sock.close()
+            context.term()
+        for runner in runners:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--num-requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--prefill-num", type=int, default=2)
+    parser.add_argument("--decode-num", type=int, default=2)
+    parser.add_argument("--decode-chunks", type=int, default=16)
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds per chunk")
+    parser.add_argument("--prompt-words", type=int, default=256)
+    parser.add_argument(
+        "--strategy", default="robin", help="Router strategy; 'slo' also needs --model"
+    )
+    parser.add_argument("--model", default=None, help="Tokenizer path for the 'slo' strategy")
+    parser.add_argument("--router-log", default="router_benchmark.log")
+    asyncio.run(main(parser.parse_args()))
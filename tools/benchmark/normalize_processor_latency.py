@@ -0,0 +1,182 @@
+"""
+Measure the latency of the normalizer and unnormalizer processor steps on small batches.
+
+A policy with several vector observations, an image and an action chunk is normalized with
+synthetic stats. Three implementations are compared per call:
+    reference: stats checked and denominators recomputed per key and call (the old behavior)
+    per-key:   one fused multiply-add per key with the compiled scale/shift
+    step:      the full processor step call, which on accelerators also concatenates the
+               vector keys into one multiply-add
+Outputs of the three are checked to agree before timing.
+
+Example:
+    python tools/benchmark/normalize_processor_latency.py --batch-size 1 8 64 --device cuda
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flagscale.models.configs.types import FeatureType, NormalizationMode, PolicyFeature
+from flagscale.train.processor import NormalizerProcessorStep, UnnormalizerProcessorStep
+from flagscale.train.processor.core import TransitionKey
+
+BOUNDS = {
+    NormalizationMode.MIN_MAX: ("min", "max"),
+    NormalizationMode.QUANTILES: ("q01", "q99"),
+    NormalizationMode.QUANTILE10: ("q10", "q90"),
+}
+
+
+def reference_transform(step, tensor, key, feature_type, inverse):
+    """The per-call transform of the processor before the stats were compiled."""
+    norm_mode = step.norm_map.get(feature_type, NormalizationMode.IDENTITY)
+    if norm_mode == NormalizationMode.IDENTITY or key not in step._tensor_stats:
+        return tensor
+    first_stat = next(iter(step._tensor_stats[key].values()))
+    if first_stat.device != tensor.device or first_stat.dtype != tensor.dtype:
+        step.to(device=tensor.device, dtype=tensor.dtype)
+    stats = step._tensor_stats[key]
+    if norm_mode == NormalizationMode.MEAN_STD:
+        if inverse:
+            return tensor * stats["std"] + stats["mean"]
+        return (tensor - stats["mean"]) / (stats["std"] + step.eps)
+    low, high = (stats[name] for name in BOUNDS[norm_mode])
+    denom = high - low
+    denom = torch.where(
+        denom == 0, torch.tensor(step.eps, device=tensor.device, dtype=tensor.dtype), denom
+    )
+    if inverse:
+        return (tensor + 1.0) * denom / 2.0 + low
+    return 2.0 * (tensor - low) / denom - 1.0
+
+
+def make_features(num_vectors, vector_dim, action_dim, image_size):
+    features = {
+        f"observation.state_{i}": PolicyFeature(type=FeatureType.STATE, shape=(vector_dim,))
+        for i in range(num_vectors)
+    }
+    features["observation.image"] = PolicyFeature(
+        type=FeatureType.VISUAL, shape=(3, image_size, image_size)
+    )
+    features["action"] = PolicyFeature(type=FeatureType.ACTION, shape=(action_dim,))
+    return features
+
+
+def make_stats(features, rng):
+    stats = {}
+    for key, feature in features.items():
+        data = rng.normal(size=(256, *feature.shape))
+        stats[key] = {"mean": data.mean(0), "std": data.std(0)}
+        stats[key].update(zip(("min", "max"), (data.min(0), data.max(0))))
+        for name, q in (("q01", 0.01), ("q99", 0.99), ("q10", 0.1), ("q90", 0.9)):
+            stats[key][name] = np.quantile(data, q, axis=0)
+    return stats
+
+
+def run_reference(step, transition, inverse):
+    observation = {
+        key: reference_transform(step, value, key, step.features[key].type, inverse)
+        for key, value in transition[TransitionKey.OBSERVATION].items()
+    }
+    action = reference_transform(
+        step, transition[TransitionKey.ACTION], "action", FeatureType.ACTION, inverse
+    )
+    return {TransitionKey.OBSERVATION: observation, TransitionKey.ACTION: action}
+
+
+def run_per_key(step, transition, inverse):
+    observation = {
+        key: step._apply_transform(value, key, step.features[key].type, inverse=inverse)
+        for key, value in transition[TransitionKey.OBSERVATION].items()
+    }
+    action = step._apply_transform(
+        transition[TransitionKey.ACTION], "action", FeatureType.ACTION, inverse=inverse
+    )
+    return {TransitionKey.OBSERVATION: observation, TransitionKey.ACTION: action}
+
+
+def run_step(step, transition, inverse):
+    return step(transition)
+
+
+def measure(fn, step, transition, inverse, iters, device):
+    for _ in range(10):
+        fn(step, transition, inverse)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn(step, transition, inverse)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / iters * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--num-vectors", type=int, default=4, help="vector observation keys")
+    parser.add_argument("--vector-dim", type=int, default=14)
+    parser.add_argument("--action-dim", type=int, default=14)
+    parser.add_argument("--chunk", type=int, default=50, help="action chunk length")
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument(
+        "--mode", default="MEAN_STD", choices=[mode.value for mode in NormalizationMode]
+    )
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--iters", type=int, default=500)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    mode = NormalizationMode(args.mode)
+    norm_map = {
+        FeatureType.STATE: mode,
+        FeatureType.ACTION: mode,
+        FeatureType.VISUAL: NormalizationMode.IDENTITY,
+    }
+    features = make_features(args.num_vectors, args.vector_dim, args.action_dim, args.image_size)
+    stats = make_stats(features, np.random.default_rng(0))
+
+    print(
+        f"{'processor':>12} {'batch':>6} {'reference (us)':>15} {'per-key (us)':>13} {'step (us)':>10}"
+    )
+    for cls, inverse in ((NormalizerProcessorStep, False), (UnnormalizerProcessorStep, True)):
+        step = cls(features=features, norm_map=norm_map, stats=stats, device=device)
+        for batch_size in args.batch_size:
+            observation = {
+                key: torch.randn(batch_size, *feature.shape, device=device)
+                for key, feature in features.items()
+                if feature.type != FeatureType.ACTION
+            }
+            action = torch.randn(batch_size, args.chunk, args.action_dim, device=device)
+            transition = {TransitionKey.OBSERVATION: observation, TransitionKey.ACTION: action}
+
+            outputs = [
+                fn(step, transition, inverse) for fn in (run_reference, run_per_key, run_step)
+            ]
+            for output in outputs[1:]:
+                torch.testing.assert_close(
+                    output[TransitionKey.ACTION], outputs[0][TransitionKey.ACTION]
+                )
+                for key, value in output[TransitionKey.OBSERVATION].items():
+                    torch.testing.assert_close(value, outputs[0][TransitionKey.OBSERVATION][key])
+
+            latencies = [
+                measure(fn, step, transition, inverse, args.iters, device)
+                for fn in (run_reference, run_per_key, run_step)
+            ]
+            print(
+                f"{cls.__name__[:12]:>12} {batch_size:>6} {latencies[0]:>15.1f} "
+                f"{latencies[1]:>13.1f} {latencies[2]:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
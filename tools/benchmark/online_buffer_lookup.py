@@ -0,0 +1,92 @@
+"""
+Measure the per-item cost of OnlineBuffer.__getitem__ and of the sampler weights against the
+number of frames in the buffer.
+
+Buffers are filled with synthetic episodes and read with delta timestamps. The episode frames
+of an item come from the episode index of the buffer, so the per-item cost does not grow with
+the buffer. For comparison, ``scan`` is the time of the full scan of the episode index column
+that each item used to do.
+
+Example:
+    python tools/benchmark/online_buffer_lookup.py --num-frames 10000 100000 1000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flagscale.train.datasets.online_buffer import OnlineBuffer, compute_sampler_weights
+
+
+class _OfflineStub:
+    """An empty offline dataset, only the online weights are measured."""
+
+    def __len__(self):
+        return 0
+
+
+def fill(buffer, num_frames, episode_length, state_dim, chunk_frames):
+    added = 0
+    while added < num_frames:
+        num_episodes = max(1, min(chunk_frames, num_frames - added) // episode_length)
+        frame_index = np.tile(np.arange(episode_length), num_episodes)
+        buffer.add_data(
+            {
+                "index": np.arange(len(frame_index)),
+                "episode_index": np.repeat(np.arange(num_episodes), episode_length),
+                "frame_index": frame_index,
+                "timestamp": frame_index / 30.0,
+                "state": np.zeros((len(frame_index), state_dim), dtype=np.float32),
+            }
+        )
+        added += len(frame_index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--num-frames", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--episode-length", type=int, default=200)
+    parser.add_argument("--state-dim", type=int, default=14)
+    parser.add_argument("--chunk", type=int, default=50, help="delta timestamps per item")
+    parser.add_argument("--num-items", type=int, default=2000)
+    args = parser.parse_args()
+
+    delta_timestamps = {"state": [i / 30.0 for i in range(args.chunk)]}
+    spec = {"state": {"shape": (args.state_dim,), "dtype": np.dtype("float32")}}
+    print(f"{'frames':>9} {'getitem (us)':>13} {'scan (us)':>10} {'weights (ms)':>13}")
+    for num_frames in args.num_frames:
+        with tempfile.TemporaryDirectory() as write_dir:
+            buffer = OnlineBuffer(write_dir, spec, num_frames, fps=30, delta_timestamps=None)
+            fill(buffer, num_frames, args.episode_length, args.state_dim, chunk_frames=100_000)
+            buffer.set_delta_timestamps(delta_timestamps)
+            rng = np.random.default_rng(0)
+            items = rng.integers(0, len(buffer), args.num_items)
+
+            start = time.perf_counter()
+            for idx in items:
+                buffer[int(idx)]
+            getitem = (time.perf_counter() - start) / len(items) * 1e6
+
+            episode_index = buffer._data[OnlineBuffer.EPISODE_INDEX_KEY]
+            occupied = buffer._data[OnlineBuffer.OCCUPANCY_MASK_KEY]
+            start = time.perf_counter()
+            for idx in items[:200]:
+                np.where((episode_index == episode_index[idx]) & occupied)
+            scan = (time.perf_counter() - start) / min(200, len(items)) * 1e6
+
+            start = time.perf_counter()
+            compute_sampler_weights(
+                _OfflineStub(), online_dataset=buffer, online_sampling_ratio=1.0
+            )
+            weights = (time.perf_counter() - start) * 1e3
+            print(f"{num_frames:>9} {getitem:>13.1f} {scan:>10.1f} {weights:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure the latency of one job status sweep of the SSH launcher at simulated node counts.
+
+Hosts are simulated by a stand-in ssh client that runs the status script locally after
+sleeping for the network round trip, plus the handshake unless a master connection of the
+host exists. Three pollers are compared:
+    serial:    one host after another, a new ssh connection per query (the old behavior,
+               which also spent one more connection on a remote mkdir)
+    parallel:  concurrent queries, a new ssh connection per query
+    multiplex: concurrent queries over persistent master connections (steady state)
+
+Example:
+    python tools/benchmark/ssh_status_sweep.py --num-nodes 8 32 128 --handshake 0.15
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flagscale.runner.launcher.host_status import HostStatusPoller
+
+FAKE_SSH = """#!/bin/bash
+while [ $# -gt 0 ]; do
+  case "$1" in -o|-p) shift 2;; -O) exit 0;; -*) shift;; *) break;; esac
+done
+host=$1; shift
+master={masters}/$host
+if [ $# -eq 0 ]; then
+  sleep {handshake}; touch $master; exit 0
+fi
+[ {multiplex} = 1 ] && [ -f $master ] || sleep {handshake}
+sleep {rtt}
+exec bash -c "$*"
+"""
+
+STATUS_SCRIPT = "ps -p $$ -o state --no-headers\n"
+
+
+def make_fake_ssh(workdir, handshake, rtt, multiplex):
+    masters = os.path.join(workdir, f"masters_{multiplex}")
+    os.makedirs(masters, exist_ok=True)
+    path = os.path.join(workdir, f"fake_ssh_{multiplex}")
+    with open(path, "w") as f:
+        f.write(
+            FAKE_SSH.format(masters=masters, handshake=handshake, rtt=rtt, multiplex=int(multiplex))
+        )
+    os.chmod(path, 0o755)
+    return path
+
+
+def sweep(poller, num_nodes, repeat):
+    queries = [(f"node{i}", STATUS_SCRIPT) for i in range(num_nodes)]
+    # The first sweep opens the master connections
+    poller.query_all(queries)
+    start = time.monotonic()
+    for _ in range(repeat):
+        poller.query_all(queries)
+    return (time.monotonic() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--num-nodes", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--handshake", type=float, default=0.15, help="ssh handshake (s)")
+    parser.add_argument("--rtt", type=float, default=0.005, help="network round trip (s)")
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>6} {'serial (s)':>11} {'parallel (s)':>13} {'multiplex (s)':>14}")
+    with tempfile.TemporaryDirectory() as workdir:
+        plain_ssh = make_fake_ssh(workdir, args.handshake, args.rtt, multiplex=False)
+        multiplex_ssh = make_fake_ssh(workdir, args.handshake, args.rtt, multiplex=True)
+        for num_nodes in args.num_nodes:
+            pollers = [
+                HostStatusPoller(max_workers=1, multiplex=False, ssh_command=plain_ssh),
+                HostStatusPoller(
+                    max_workers=args.max_workers, multiplex=False, ssh_command=plain_ssh
+                ),
+                HostStatusPoller(max_workers=args.max_workers, ssh_command=multiplex_ssh),
+            ]
+            times = [sweep(poller, num_nodes, args.repeat) for poller in pollers]
+            for poller in pollers:
+                poller.close()
+            print(f"{num_nodes:>6} {times[0]:>11.3f} {times[1]:>13.3f} {times[2]:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
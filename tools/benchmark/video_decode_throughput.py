@@ -0,0 +1,123 @@
+"""
+Measure the video frame decode throughput of LeRobot datasets on synthetic mp4 files.
+
+Synthetic videos of noise frames are written locally, each file holding several episodes like
+the v3.0 dataset layout. Batches of samples are drawn as a shuffling sampler would, each
+sample querying a few frames around its timestamp. Two decoders are compared:
+    per-sample: one torchcodec query per sample (the old behavior)
+    batched:    all queries of a batch on the same file decoded in one sorted pass
+Both use a bounded decoder cache, smaller than the number of files with ``--cache-size``.
+
+Example:
+    python tools/benchmark/video_decode_throughput.py --num-files 8 --batch-size 32 64
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import av
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from flagscale.train.datasets.video_utils import (
+    VideoDecoderCache,
+    decode_video_frames_torchcodec,
+    decode_video_frames_torchcodec_batch,
+)
+
+
+def write_video(path, num_frames, fps, size, gop, seed):
+    rng = np.random.default_rng(seed)
+    with av.open(path, "w") as container:
+        stream = container.add_stream("libx264", rate=fps)
+        stream.width, stream.height = size, size
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"g": str(gop)}
+        for _ in range(num_frames):
+            image = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+            for packet in stream.encode(av.VideoFrame.from_ndarray(image, format="rgb24")):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def make_batches(paths, num_frames, fps, deltas, batch_size, num_batches, seed):
+    rng = random.Random(seed)
+    batches = []
+    for _ in range(num_batches):
+        batch = []
+        for _ in range(batch_size):
+            path = rng.choice(paths)
+            frame = rng.randrange(len(deltas), num_frames)
+            batch.append((path, [(frame + delta) / fps for delta in deltas]))
+        batches.append(batch)
+    return batches
+
+
+def per_sample(batches, tolerance_s, cache):
+    for batch in batches:
+        for path, timestamps in batch:
+            decode_video_frames_torchcodec(path, timestamps, tolerance_s, decoder_cache=cache)
+
+
+def batched(batches, tolerance_s, cache):
+    for batch in batches:
+        by_file = {}
+        for path, timestamps in batch:
+            by_file.setdefault(path, []).append(timestamps)
+        for path, timestamps_list in by_file.items():
+            decode_video_frames_torchcodec_batch(
+                path, timestamps_list, tolerance_s, decoder_cache=cache
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--num-files", type=int, default=8)
+    parser.add_argument("--frames-per-file", type=int, default=600)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--size", type=int, default=224, help="frame height and width")
+    parser.add_argument("--gop", type=int, default=2, help="frames between key frames")
+    parser.add_argument("--deltas", type=int, nargs="+", default=[-1, 0])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[8, 32, 64])
+    parser.add_argument("--num-batches", type=int, default=10)
+    parser.add_argument("--cache-size", type=int, default=4)
+    args = parser.parse_args()
+
+    tolerance_s = 0.5 / args.fps
+    print(f"{'batch':>6} {'per-sample (frames/s)':>22} {'batched (frames/s)':>19}")
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = []
+        for i in range(args.num_files):
+            path = os.path.join(workdir, f"file-{i:03d}.mp4")
+            write_video(path, args.frames_per_file, args.fps, args.size, args.gop, seed=i)
+            paths.append(path)
+        for batch_size in args.batch_size:
+            batches = make_batches(
+                paths,
+                args.frames_per_file,
+                args.fps,
+                args.deltas,
+                batch_size,
+                args.num_batches,
+                seed=batch_size,
+            )
+            num_frames = batch_size * args.num_batches * len(args.deltas)
+            rates = []
+            for decode in (per_sample, batched):
+                cache = VideoDecoderCache(max_size=args.cache_size)
+                start = time.monotonic()
+                decode(batches, tolerance_s, cache)
+                rates.append(num_frames / (time.monotonic() - start))
+                assert cache.size() <= args.cache_size
+                cache.clear()
+            print(f"{batch_size:>6} {rates[0]:>22.1f} {rates[1]:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()